@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -47,6 +48,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
+    "chat.assets.AssetMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -126,6 +128,40 @@ STATICFILES_DIRS = [
     BASE_DIR / "static",
 ]
 
+# Bundled, minified and content-hashed CSS/JS built from static/ by
+# `manage.py build_assets` and served at /assets/; see chat/assets.py
+ASSET_BUILD_DIR = os.getenv("ASSET_BUILD_DIR", str(BASE_DIR / ".assets"))
+
+# Caches
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Web search results and fetched pages persist across restarts; a share of
+# the entries is culled whenever MAX_ENTRIES is reached
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "web_search": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": BASE_DIR / ".cache" / "web_search",
+        "OPTIONS": {"MAX_ENTRIES": int(os.getenv("WEB_SEARCH_CACHE_ENTRIES", "1000"))},
+    },
+    "url_fetch": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": BASE_DIR / ".cache" / "url_fetch",
+        "OPTIONS": {"MAX_ENTRIES": int(os.getenv("URL_FETCH_CACHE_ENTRIES", "500"))},
+    },
+}
+
+# Large message bodies (tool output, logs) are kept outside the database in
+# a content-addressed store; see chat/blob_store.py
+
+MESSAGE_BLOB_DIR = os.getenv("MESSAGE_BLOB_DIR", str(BASE_DIR / ".blobs"))
+
+# Conversations nobody has opened for a while are moved to compressed
+# per-month archive files; see chat/archive.py
+CONVERSATION_ARCHIVE_DIR = os.getenv("CONVERSATION_ARCHIVE_DIR", str(BASE_DIR / ".archive"))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+"""Benchmark deleting many conversations at once
+
+Usage: python bench_bulk_delete.py [conversations]
+Loads two sets of ``conversations`` generated conversations (default 2,000)
+of 100 messages each into a throwaway SQLite database, then deletes one set
+with the ORM cascade (``QuerySet.delete()``) and the other with
+``bulk_ops.delete_conversations``. While each runs, a second thread writes
+a row every few milliseconds and reports how long its longest write waited
+for the lock.
+"""
+
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "aichat.settings")
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.core.management import call_command  # noqa: E402
+from django.db import OperationalError, connection, transaction  # noqa: E402
+from django.test import override_settings  # noqa: E402
+
+from chat.bulk_ops import delete_conversations  # noqa: E402
+from chat.models import Conversation  # noqa: E402
+
+WORDS = ["the", "file", "output", "run", "error", "data", "function", "result", "value", "test"]
+MESSAGES_PER_CONVERSATION = 100
+
+
+def load(total, title):
+    rng = random.Random(7)
+    with transaction.atomic(), connection.cursor() as cursor:
+        for i in range(total):
+            cursor.execute(
+                "INSERT INTO chat_conversation (title, created_at, updated_at, archive_file, archive_member)"
+                " VALUES (%s, '2025-01-01 00:00:00', '2025-01-01 00:00:00', '', '')",
+                [title],
+            )
+            conversation_id = cursor.lastrowid
+            cursor.executemany(
+                "INSERT INTO chat_message (conversation_id, content, is_user, created_at,"
+                " tool_suggested, tool_used, body_sha256, body_size)"
+                " VALUES (%s, %s, %s, '2025-01-01 00:00:00', 0, 0, '', 0)",
+                [
+                    (conversation_id, " ".join(rng.choices(WORDS, k=rng.randint(8, 60))), j % 2 == 0)
+                    for j in range(MESSAGES_PER_CONVERSATION)
+                ],
+            )
+
+
+class Probe(threading.Thread):
+    """Writes a row every few milliseconds, timing the slowest write"""
+
+    def __init__(self):
+        super().__init__(daemon=True)
+        self.done = threading.Event()
+        self.longest = 0.0
+        self.failed = 0
+
+    def run(self):
+        try:
+            while not self.done.is_set():
+                started = time.perf_counter()
+                try:
+                    Conversation.objects.create(title="probe")
+                except OperationalError:
+                    # Gave up after the 5 second busy timeout
+                    self.failed += 1
+                self.longest = max(self.longest, time.perf_counter() - started)
+                time.sleep(0.005)
+        finally:
+            connection.close()
+
+
+def timed(label, delete):
+    probe = Probe()
+    probe.start()
+    started = time.perf_counter()
+    delete()
+    elapsed = time.perf_counter() - started
+    probe.done.set()
+    probe.join()
+    print(f"   {label:22} {elapsed:7.2f}s   other writer: longest wait {probe.longest * 1000:8.1f} ms, "
+          f"{probe.failed} writes failed")
+
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 2_000
+    workdir = tempfile.mkdtemp(prefix="bench_bulk_")
+    try:
+        with override_settings(DEBUG=False, MESSAGE_BLOB_DIR=os.path.join(workdir, "blobs")):
+            # Set for the probe thread's connection too
+            settings.DATABASES["default"]["NAME"] = os.path.join(workdir, "bench.sqlite3")
+            connection.settings_dict["NAME"] = settings.DATABASES["default"]["NAME"]
+            call_command("migrate", verbosity=0)
+            print(f"\n📥 Load 2 x {total} conversations of {MESSAGES_PER_CONVERSATION} messages")
+            load(total, "cascade")
+            load(total, "chunked")
+
+            print("\n🗑️  Delete each set")
+            timed("ORM cascade", lambda: Conversation.objects.filter(title="cascade").delete())
+            ids = list(Conversation.objects.filter(title="chunked").values_list("id", flat=True))
+            timed("chunked raw batches", lambda: delete_conversations(ids))
+    finally:
+        connection.close()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+"""Benchmark 'search files:' on a large synthetic workspace
+
+Usage: python bench_code_search.py [files]
+Creates a throwaway workspace with ``files`` small source files (default
+100,000), then times the parallel scan, the index build and indexed queries.
+"""
+
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+from chat.code_search import TrigramIndex, scan_search
+
+WORDS = ["request", "response", "session", "handler", "payload", "config",
+         "cache", "stream", "buffer", "worker", "client", "server", "token"]
+
+
+def timed(label, fn, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - started)
+    print(f"   {label:45} {best * 1000:10.2f} ms")
+    return result
+
+
+def make_source(rng, i):
+    lines = []
+    for j in range(30):
+        a, b = rng.choice(WORDS), rng.choice(WORDS)
+        lines.append(f"def {a}_{b}_{j}(value):\n    return value + {rng.randint(0, 10**6)}\n")
+    if i % 5000 == 0:
+        lines.append("def rare_symbol_lookup():\n    pass\n")
+    return "".join(lines)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    rng = random.Random(1)
+    workspace = tempfile.mkdtemp(prefix="bench_search_")
+    try:
+        print(f"\n📁 Creating {count} files in {workspace}")
+        for i in range(count):
+            directory = os.path.join(workspace, f"pkg_{i // 1000:03d}")
+            if i % 1000 == 0:
+                os.makedirs(directory)
+            with open(os.path.join(directory, f"module_{i:06d}.py"), "w") as f:
+                f.write(make_source(rng, i))
+
+        print("\n🔎 Parallel scan (fallback, no index)")
+        timed("scan: rare_symbol_lookup", lambda: scan_search(workspace, "rare_symbol_lookup"), repeat=1)
+
+        print("\n🏗️  Building the trigram index")
+        index = TrigramIndex(workspace)
+        started = time.perf_counter()
+        index.start_build()
+        while not index.ready:
+            time.sleep(0.05)
+        print(f"   built in {time.perf_counter() - started:.1f}s, {len(index._postings)} trigrams")
+
+        print("\n⚡ Indexed queries")
+        found = timed("index: rare_symbol_lookup", lambda: index.search("rare_symbol_lookup"))
+        print(f"   {len(found[0])} matches")
+        timed("index: no such symbol", lambda: index.search("no_such_symbol_anywhere"))
+        timed("index: common word (first 50 matches)", lambda: index.search("session_token"))
+
+        print("\n✏️  Incremental update")
+        target = os.path.join(workspace, "pkg_000", "module_000001.py")
+        with open(target, "a") as f:
+            f.write("def freshly_added_symbol():\n    pass\n")
+        timed("update_file", lambda: index.update_file(target))
+        found = timed("index: freshly_added_symbol", lambda: index.search("freshly_added_symbol"))
+        print(f"   {len(found[0])} matches")
+    finally:
+        shutil.rmtree(workspace, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+"""Benchmark moving stale conversations to the cold archive
+
+Usage: python bench_conversation_archive.py [conversations]
+Loads ``conversations`` generated conversations (default 5,000) of 50
+messages each into a throwaway SQLite database, nine in ten of them last
+updated months ago. Archives the stale ones with ``archive_conversations
+--vacuum`` and reports the database size before and after, the size of the
+archive files, and the time to open an archived conversation (rehydrating
+it) against opening a hot one.
+"""
+
+import io
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "aichat.settings")
+django.setup()
+
+from django.core.management import call_command  # noqa: E402
+from django.db import connection, transaction  # noqa: E402
+from django.test import override_settings  # noqa: E402
+
+from chat.archive import rehydrate  # noqa: E402
+from chat.models import Conversation  # noqa: E402
+
+WORDS = ["the", "file", "output", "run", "error", "data", "function", "result", "value", "test",
+         "please", "check", "why", "does", "this", "fail", "when", "call", "with", "large",
+         "Traceback", "(most", "recent", "call", "last):", "line", "import", "numpy", "pandas"]
+MESSAGES_PER_CONVERSATION = 50
+
+
+def load(total):
+    rng = random.Random(5)
+    with transaction.atomic(), connection.cursor() as cursor:
+        for i in range(total):
+            stamp = "2026-10-01 00:00:00" if i % 10 == 0 else f"2025-{i % 12 + 1:02d}-01 00:00:00"
+            cursor.execute(
+                "INSERT INTO chat_conversation (title, created_at, updated_at, archive_file, archive_member)"
+                " VALUES (%s, %s, %s, '', '')",
+                [f"Conversation {i}", stamp, stamp],
+            )
+            conversation_id = cursor.lastrowid
+            cursor.executemany(
+                "INSERT INTO chat_message (conversation_id, content, is_user, created_at,"
+                " tool_suggested, tool_used, body_sha256, body_size) VALUES (%s, %s, %s, %s, 0, 0, '', 0)",
+                [
+                    (conversation_id, " ".join(rng.choices(WORDS, k=rng.randint(8, 120))), j % 2 == 0, stamp)
+                    for j in range(MESSAGES_PER_CONVERSATION)
+                ],
+            )
+
+
+def timed_open(conversation):
+    started = time.perf_counter()
+    rehydrate(conversation)
+    list(conversation.messages.all())
+    return (time.perf_counter() - started) * 1000
+
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 5_000
+    workdir = tempfile.mkdtemp(prefix="bench_archive_")
+    db_path = os.path.join(workdir, "bench.sqlite3")
+    archive_dir = os.path.join(workdir, "archive")
+    try:
+        with override_settings(
+            DEBUG=False, MESSAGE_BLOB_DIR=os.path.join(workdir, "blobs"), CONVERSATION_ARCHIVE_DIR=archive_dir
+        ):
+            connection.settings_dict["NAME"] = db_path
+            call_command("migrate", verbosity=0)
+            print(f"\n📥 Load {total} conversations of {MESSAGES_PER_CONVERSATION} messages")
+            load(total)
+            call_command("rebuild_search_index", stdout=io.StringIO())
+            print(f"   hot database {os.path.getsize(db_path) / 2**20:.1f} MB")
+
+            print("\n🧊 Archive conversations untouched for 90 days")
+            started = time.perf_counter()
+            call_command("archive_conversations", "--days=90", "--vacuum", stdout=io.StringIO())
+            elapsed = time.perf_counter() - started
+            archived = sum(os.path.getsize(os.path.join(archive_dir, name)) for name in os.listdir(archive_dir))
+            print(f"   took {elapsed:.1f}s")
+            print(f"   hot database {os.path.getsize(db_path) / 2**20:.1f} MB, "
+                  f"{len(os.listdir(archive_dir))} archive files {archived / 2**20:.1f} MB")
+
+            print("\n📂 Open a conversation")
+            hot = Conversation.objects.filter(archive_file="").first()
+            cold = Conversation.objects.exclude(archive_file="").first()
+            print(f"   hot                 {timed_open(hot):8.1f} ms")
+            print(f"   archived            {timed_open(cold):8.1f} ms (rehydrated)")
+            print(f"   archived, reopened  {timed_open(cold):8.1f} ms")
+    finally:
+        connection.close()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+"""Benchmark exporting and importing a large chat history as JSON Lines
+
+Usage: python bench_history_transfer.py [messages]
+Loads ``messages`` generated messages (default 1,000,000) across
+conversations of 50 messages each into a throwaway SQLite database, exports
+them with ``export_conversations`` to a gzipped file, then imports that file
+into a second, empty database. Reports the time and throughput of each step
+and the peak resident memory after it, which should stay flat as the
+history grows.
+"""
+
+import io
+import os
+import random
+import resource
+import shutil
+import sys
+import tempfile
+import time
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "aichat.settings")
+django.setup()
+
+from django.core.management import call_command  # noqa: E402
+from django.db import connection, transaction  # noqa: E402
+from django.test import override_settings  # noqa: E402
+
+from chat.models import Message  # noqa: E402
+
+WORDS = ["the", "file", "output", "run", "error", "data", "function", "result", "value", "test",
+         "please", "check", "why", "does", "this", "fail", "when", "call", "with", "large"]
+BATCH = 50_000
+
+
+def use_database(path):
+    connection.close()
+    connection.settings_dict["NAME"] = path
+    call_command("migrate", verbosity=0)
+
+
+def load(total):
+    rng = random.Random(11)
+    now = "2026-01-01 00:00:00"
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.executemany(
+            "INSERT INTO chat_conversation (title, created_at, updated_at) VALUES (%s, %s, %s)",
+            [(f"Conversation {i}", now, now) for i in range(total // 50 + 1)],
+        )
+        for start in range(0, total, BATCH):
+            cursor.executemany(
+                "INSERT INTO chat_message (conversation_id, content, is_user, created_at,"
+                " tool_suggested, tool_used, body_sha256, body_size) VALUES (%s, %s, %s, %s, 0, 0, '', 0)",
+                [
+                    (i // 50 + 1, " ".join(rng.choices(WORDS, k=rng.randint(8, 60))), i % 2 == 0, now)
+                    for i in range(start, min(start + BATCH, total))
+                ],
+            )
+
+
+def report(label, total, elapsed):
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"   {label:10} {elapsed:8.1f}s {total / elapsed:12,.0f} messages/s {peak:10.0f} MB peak RSS")
+
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    workdir = tempfile.mkdtemp(prefix="bench_transfer_")
+    export_path = os.path.join(workdir, "history.jsonl.gz")
+    try:
+        with override_settings(DEBUG=False, MESSAGE_BLOB_DIR=os.path.join(workdir, "blobs")):
+            use_database(os.path.join(workdir, "source.sqlite3"))
+            print(f"\n📥 Load {total} messages")
+            started = time.perf_counter()
+            load(total)
+            report("load", total, time.perf_counter() - started)
+
+            print("\n🚚 Transfer")
+            started = time.perf_counter()
+            call_command("export_conversations", output=export_path, stderr=io.StringIO())
+            report("export", total, time.perf_counter() - started)
+            print(f"   {os.path.getsize(export_path) / 2**20:.1f} MB gzipped export")
+
+            use_database(os.path.join(workdir, "target.sqlite3"))
+            started = time.perf_counter()
+            call_command("import_conversations", export_path, stdout=io.StringIO())
+            report("import", total, time.perf_counter() - started)
+            assert Message.objects.count() == total
+    finally:
+        connection.close()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
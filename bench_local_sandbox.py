@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+"""Benchmark the local sandbox backend against the old per-call mock sandbox
+
+Usage: python bench_local_sandbox.py [entries]
+Creates a throwaway workspace with ``entries`` files (default 100,000) and
+times directory listing, per-call overhead and ranged reads of a large file.
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from chat.local_sandbox import LocalSandbox
+
+
+def legacy_list_files(workspace_dir, directory_path):
+    """The old MockDaytonaSandbox listing: resolve, iterdir and stat per entry"""
+    workspace = Path(workspace_dir).resolve()
+    p = (workspace / directory_path).resolve()
+    items = []
+    for item in p.iterdir():
+        item_type = "DIR" if item.is_dir() else "FILE"
+        size = item.stat().st_size if item.is_file() else 0
+        items.append(f"{item_type}: {item.name} ({size} bytes)")
+    return "\n".join(sorted(items))
+
+
+def legacy_read_lines(path, start, end):
+    """The old read path: the whole file as a string, then sliced"""
+    with open(path, "r", encoding="utf-8") as f:
+        content = f.read()
+    return "".join(content.splitlines(keepends=True)[start - 1 : end])
+
+
+def timed(label, fn, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    print(f"   {label:45} {best * 1000:10.2f} ms")
+    return best
+
+
+def main():
+    entries = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    workspace = tempfile.mkdtemp(prefix="bench_ws_")
+    try:
+        print(f"\n📁 Creating {entries} entries in {workspace}")
+        big_dir = os.path.join(workspace, "big")
+        os.makedirs(big_dir)
+        for i in range(entries):
+            if i % 10 == 0:
+                os.mkdir(os.path.join(big_dir, f"dir_{i:06d}"))
+            else:
+                with open(os.path.join(big_dir, f"file_{i:06d}.txt"), "wb") as f:
+                    f.write(b"x" * (i % 512))
+
+        sandbox = LocalSandbox(workspace)
+
+        print("\n📋 Listing a directory")
+        old = timed("legacy iterdir + stat per entry", lambda: legacy_list_files(workspace, "big"))
+        new = timed("LocalSandbox scandir", lambda: sandbox.list_files("big"))
+        print(f"   speedup: {old / new:.1f}x")
+
+        print("\n🔁 Per-call overhead (1000 info calls)")
+        target = "big/file_000001.txt"
+        old = timed(
+            "new sandbox per call (old behaviour)",
+            lambda: [LocalSandbox(workspace).get_file_info(target) for _ in range(1000)],
+        )
+        new = timed("reused sandbox", lambda: [sandbox.get_file_info(target) for _ in range(1000)])
+        print(f"   speedup: {old / new:.1f}x")
+
+        print("\n📖 Line range deep inside a 200 MB file")
+        big_file = os.path.join(workspace, "big.log")
+        line = b"0123456789" * 7 + b"\n"
+        with open(big_file, "wb") as f:
+            for _ in range(200):
+                f.write(line * (1024 * 1024 // len(line)))
+        total_lines = os.path.getsize(big_file) // len(line)
+        start = total_lines - 100
+        old = timed("read whole file, then slice", lambda: legacy_read_lines(big_file, start, start + 20), repeat=1)
+        new = timed(
+            "LocalSandbox mmap range",
+            lambda: sandbox.read_file_range("big.log", start_line=start, end_line=start + 20),
+        )
+        print(f"   speedup: {old / new:.1f}x")
+        timed("LocalSandbox tail:100", lambda: sandbox.read_file_range("big.log", tail=100))
+    finally:
+        shutil.rmtree(workspace, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
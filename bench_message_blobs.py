@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+"""Benchmark loading a conversation with large tool outputs, inline versus offloaded
+
+Usage: python bench_message_blobs.py [messages] [large_mb]
+Builds two copies of one conversation of ``messages`` messages (default
+200), every tenth a ``large_mb`` MB tool output (default 2), once with
+bodies stored inline and once with long bodies in the blob store. Times
+loading the conversation and formatting it as model history, and reports
+the peak Python memory and the database size.
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "aichat.settings")
+django.setup()
+
+from django.core.management import call_command  # noqa: E402
+from django.db import connection, transaction  # noqa: E402
+from django.test import override_settings  # noqa: E402
+
+from chat import blob_store, models as chat_models  # noqa: E402
+from chat.ai_utils import format_messages_for_gemini  # noqa: E402
+from chat.models import Conversation, Message  # noqa: E402
+
+
+def build(messages, large_bytes):
+    conversation = Conversation.objects.create(title="bench")
+    line = "Traceback (most recent call last): File \"train.py\", line 42, in <module>\n"
+    with transaction.atomic():
+        for i in range(messages):
+            if i % 10 == 9:
+                content = f"{i}: " + line * (large_bytes // len(line))
+            else:
+                content = f"Message {i}: what does the output above tell us about the run?"
+            Message.objects.create(conversation=conversation, content=content, is_user=i % 2 == 0)
+    return conversation
+
+
+def measure(label, conversation, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        tracemalloc.start()
+        started = time.perf_counter()
+        history = format_messages_for_gemini(Conversation.objects.get(id=conversation.id).messages.all())
+        elapsed = time.perf_counter() - started
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        best = min(best, elapsed)
+    size = sum(len(part["parts"]) for part in history)
+    print(f"   {label:20} {best * 1000:9.1f} ms {peak / 2**20:9.1f} MB peak {size / 2**20:9.1f} MB of history")
+
+
+def main():
+    messages = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    large_bytes = int(float(sys.argv[2]) * 2**20) if len(sys.argv) > 2 else 2 * 2**20
+    workdir = tempfile.mkdtemp(prefix="bench_blobs_")
+    try:
+        for label, threshold in (("inline", sys.maxsize), ("offloaded", blob_store.MESSAGE_BLOB_THRESHOLD)):
+            db_path = os.path.join(workdir, f"{label}.sqlite3")
+            connection.close()
+            connection.settings_dict["NAME"] = db_path
+            with override_settings(MESSAGE_BLOB_DIR=os.path.join(workdir, "blobs")):
+                call_command("migrate", verbosity=0)
+                chat_models.MESSAGE_BLOB_THRESHOLD = threshold
+                conversation = build(messages, large_bytes)
+                print(f"\n💬 {messages} messages, {label} (database {os.path.getsize(db_path) / 2**20:.1f} MB)")
+                measure("load + format", conversation)
+    finally:
+        connection.close()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
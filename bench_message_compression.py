@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+"""Benchmark message compression: storage saved against CPU per read
+
+Usage: python bench_message_compression.py [messages]
+Generates ``messages`` chat messages (default 20,000) resembling this app's
+traffic: tracebacks, install logs, directory listings, source files and
+prose. A dictionary is trained on the first half and every codec is measured
+on the second half, so the dictionary is never tested on its own samples.
+"""
+
+import os
+import random
+import sys
+import time
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "aichat.settings")
+django.setup()
+
+from chat import compression  # noqa: E402
+
+MODULES = ["views", "models", "ai_utils", "daytona_file_ops", "local_sandbox", "url_fetch", "uploads"]
+PACKAGES = ["numpy", "pandas", "requests", "django", "matplotlib", "scikit-learn", "torch"]
+WORDS = ["the", "file", "output", "run", "error", "data", "function", "result", "value", "test",
+         "please", "check", "why", "does", "this", "fail", "when", "I", "call", "with", "large"]
+
+
+def traceback_text(rng):
+    frames = [
+        f'  File "/workspace/chat/{rng.choice(MODULES)}.py", line {rng.randint(1, 900)}, in {rng.choice(WORDS)}_{rng.choice(WORDS)}\n'
+        f"    result = {rng.choice(WORDS)}({rng.choice(WORDS)}, timeout={rng.randint(1, 60)})"
+        for _ in range(rng.randint(3, 12))
+    ]
+    return "Traceback (most recent call last):\n" + "\n".join(frames) + f"\nKeyError: '{rng.choice(WORDS)}'"
+
+
+def install_log(rng):
+    lines = []
+    for package in rng.sample(PACKAGES, rng.randint(2, 6)):
+        version = f"{rng.randint(0, 3)}.{rng.randint(0, 30)}.{rng.randint(0, 9)}"
+        lines += [
+            f"Collecting {package}=={version}",
+            f"  Downloading {package}-{version}-cp311-cp311-manylinux_2_17_x86_64.whl ({rng.randint(1, 90)}.{rng.randint(0, 9)} MB)",
+            f"Requirement already satisfied: packaging>=20.0 in /usr/local/lib/python3.11/site-packages (from {package}) (24.0)",
+        ]
+    return "\n".join(lines) + f"\nSuccessfully installed {' '.join(rng.sample(PACKAGES, 2))}"
+
+
+def listing(rng):
+    entries = [
+        f"{rng.choice(['📄', '📁'])} {rng.choice(MODULES)}{rng.choice(['.py', '.json', '.txt', '/'])} ({rng.randint(0, 90000)} bytes)"
+        for _ in range(rng.randint(5, 40))
+    ]
+    return "Contents of '/workspace':\n" + "\n".join(entries)
+
+
+def source(rng):
+    body = []
+    for _ in range(rng.randint(2, 8)):
+        name = f"{rng.choice(WORDS)}_{rng.choice(WORDS)}"
+        body.append(
+            f"def {name}(request, conversation_id):\n"
+            f"    conversation = get_object_or_404(Conversation, id=conversation_id)\n"
+            f"    data = json.loads(request.body)\n"
+            f"    return JsonResponse({{\"{rng.choice(WORDS)}\": data.get(\"{rng.choice(WORDS)}\")}})\n"
+        )
+    return "from django.http import JsonResponse\nfrom .models import Conversation\n\n\n" + "\n\n".join(body)
+
+
+def prose(rng):
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(10, 120))).capitalize() + "?"
+
+
+KINDS = [traceback_text, install_log, listing, source, prose]
+
+
+def measure(label, texts, encode):
+    stored = [encode(text) for text in texts]
+    size = sum(len(value.encode("utf-8") if isinstance(value, str) else value) for value in stored)
+    started = time.perf_counter()
+    for value in stored:
+        compression.decompress(value)
+    per_read = (time.perf_counter() - started) / len(stored)
+    return label, size, per_read
+
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    rng = random.Random(7)
+    corpus = [rng.choice(KINDS)(rng) for _ in range(total)]
+    training, texts = corpus[: total // 2], corpus[total // 2:]
+    plain = sum(len(text.encode("utf-8")) for text in texts)
+    threshold = compression.COMPRESS_THRESHOLD
+
+    started = time.perf_counter()
+    dictionary = compression.train_dictionary(training)
+    print(f"\n📚 Trained a {len(dictionary)} byte dictionary on {len(training)} messages "
+          f"in {time.perf_counter() - started:.2f}s")
+    compression.set_active_dictionary(1, dictionary)
+
+    def without_dictionary(text):
+        return compression.compress(text) if len(text) >= threshold else text
+
+    def with_dictionary(text):
+        return compression.compress(text, 1, dictionary) if len(text) >= threshold else text
+
+    print(f"\n🗜️  {len(texts)} messages, {plain / 2**20:.2f} MB of text (threshold {threshold} chars)")
+    for label, size, per_read in (
+        measure("plain text", texts, lambda text: text),
+        measure("zlib", texts, without_dictionary),
+        measure("zlib + trained dictionary", texts, with_dictionary),
+    ):
+        print(f"   {label:28} {size / 2**20:8.2f} MB  {size / plain:6.1%} of text"
+              f"  {per_read * 1e6:8.2f} µs/read")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+"""Benchmark rendering message bodies per view against storing the HTML
+
+Usage: python bench_message_render.py [messages]
+Loads a conversation of ``messages`` messages (default 300), every other one
+a tool output of a few hundred log lines with a fenced code block, into a
+throwaway database. Times rendering the bodies the old way (loading and
+decompressing ``content``, then ``|linebreaks`` in the template) against
+joining the stored HTML, and then a full GET of the conversation page.
+"""
+
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "aichat.settings")
+django.setup()
+
+from django.core.management import call_command  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.template import Context, Template  # noqa: E402
+from django.test import Client, override_settings  # noqa: E402
+from django.urls import reverse  # noqa: E402
+
+from chat.message_render import ensure_rendered  # noqa: E402
+from chat.models import Conversation, Message  # noqa: E402
+
+PER_VIEW = Template('{% for message in messages %}<div class="message-body">{{ message.content|linebreaks }}</div>{% endfor %}')
+STORED = Template('{% for message in messages %}<div class="message-body">{{ message.html|safe }}</div>{% endfor %}')
+
+
+def tool_output(rng, i):
+    lines = [f"[{i}:{n:04d}] step {rng.randint(0, 999)} <ok> elapsed={rng.random():.3f}s" for n in range(rng.randint(200, 400))]
+    return "Ran the build:\n\n```text\n" + "\n".join(lines[:20]) + "\n```\n\n" + "\n".join(lines[20:])
+
+
+def timed(label, fn, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        size = fn()
+        best = min(best, time.perf_counter() - started)
+    print(f"   {label:44} {best * 1000:8.1f} ms  ({size / 1024:.0f} KB)")
+
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    workdir = tempfile.mkdtemp(prefix="bench_render_")
+    try:
+        with override_settings(
+            DEBUG=False, ALLOWED_HOSTS=["testserver"], MESSAGE_BLOB_DIR=os.path.join(workdir, "blobs"),
+            ASSET_BUILD_DIR=os.path.join(workdir, "assets"),
+        ):
+            connection.settings_dict["NAME"] = os.path.join(workdir, "bench.sqlite3")
+            call_command("migrate", verbosity=0)
+            rng = random.Random(3)
+            conversation = Conversation.objects.create(title="Build logs")
+            for i in range(total):
+                content = f"Please run step {i} again" if i % 2 == 0 else tool_output(rng, i)
+                Message.objects.create(conversation=conversation, content=content, is_user=i % 2 == 0)
+            print(f"\n📝 {total} messages")
+
+            def per_view():
+                return len(PER_VIEW.render(Context({"messages": list(conversation.messages.all())})))
+
+            def stored():
+                messages = ensure_rendered(list(conversation.messages.defer("content")))
+                return len(STORED.render(Context({"messages": messages})))
+
+            client = Client()
+            url = reverse("conversation_detail", args=[conversation.id])
+
+            timed("load + |linebreaks on every view (before)", per_view)
+            timed("load stored HTML", stored)
+            timed("GET conversation page", lambda: len(client.get(url).content))
+    finally:
+        connection.close()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
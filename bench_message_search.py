@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+"""Benchmark full-text search over a large synthetic chat history
+
+Usage: python bench_message_search.py [messages]
+Migrates a throwaway SQLite database, loads ``messages`` generated messages
+(default 1,000,000) across conversations of 50 messages each, then times
+ranked, highlighted searches for common, rare and prefix terms. Words are
+drawn from a 20,000-word vocabulary with Zipf frequencies, so the most
+common ones behave like stopwords and appear in nearly every message.
+"""
+
+import io
+import itertools
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "aichat.settings")
+django.setup()
+
+from django.core.management import call_command  # noqa: E402
+from django.db import connection, transaction  # noqa: E402
+
+from chat.message_search import search  # noqa: E402
+
+SYLLABLES = ["ka", "lo", "mi", "ne", "ru", "ta", "po", "si", "de", "va", "zu", "be",
+             "gra", "sto", "fen", "dri", "mul", "pex", "tor", "qui", "sha", "wen", "yo", "bli"]
+VOCABULARY_SIZE = 20_000
+BATCH = 50_000
+
+
+def timed(label, fn, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - started)
+    print(f"   {label:45} {best * 1000:10.2f} ms")
+    return result
+
+
+def vocabulary(rng):
+    words = {}
+    while len(words) < VOCABULARY_SIZE:
+        words["".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))] = None
+    return list(words)
+
+
+def load(total):
+    rng = random.Random(42)
+    words = vocabulary(rng)
+    weights = list(itertools.accumulate(1 / rank for rank in range(1, len(words) + 1)))
+    now = "2026-01-01 00:00:00"
+    with transaction.atomic(), connection.cursor() as cursor:
+        conversations = total // 50 + 1
+        cursor.executemany(
+            "INSERT INTO chat_conversation (title, created_at, updated_at) VALUES (%s, %s, %s)",
+            [(" ".join(rng.choices(words[:2000], k=3)), now, now) for _ in range(conversations)],
+        )
+        for start in range(0, total, BATCH):
+            rows = []
+            for i in range(start, min(start + BATCH, total)):
+                text = " ".join(rng.choices(words, cum_weights=weights, k=rng.randint(8, 60)))
+                if i % 100_000 == 0:
+                    text += " zeppelin"
+                rows.append((i // 50 + 1, text, i % 2 == 0, now, False, ""))
+            cursor.executemany(
+                "INSERT INTO chat_message (conversation_id, content, is_user, created_at, tool_suggested, tool_used)"
+                " VALUES (%s, %s, %s, %s, %s, %s)",
+                rows,
+            )
+    call_command("rebuild_search_index", stdout=io.StringIO())
+    return words
+
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    workdir = tempfile.mkdtemp(prefix="bench_search_")
+    try:
+        connection.settings_dict["NAME"] = os.path.join(workdir, "bench.sqlite3")
+        call_command("migrate", verbosity=0)
+
+        print(f"\n📥 Load {total} messages")
+        started = time.perf_counter()
+        words = load(total)
+        print(f"   loaded and indexed in {time.perf_counter() - started:.1f}s")
+
+        print("\n🔎 First page of ranked, highlighted results")
+        timed("rare term", lambda: search("zeppelin"))
+        timed("no match", lambda: search("kubernetes"))
+        for rank in (1000, 200, 50, 5, 0):
+            word, other = words[rank], words[rank + 1]
+            print(f"   -- word #{rank + 1} by frequency")
+            timed(f"'{word}'", lambda: search(word))
+            timed(f"'{word} {other}'", lambda: search(f"{word} {other}"))
+            timed(f"prefix while typing '{word[:3]}'", lambda: search(word[:3]))
+        timed(f"page 5 of '{words[50]}'", lambda: search(words[50], page=5))
+    finally:
+        connection.close()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+"""Benchmark path confinement: resolve-then-open against one confined walk
+
+Usage: python bench_path_confinement.py [calls]
+Times ``calls`` (default 20,000) confined opens and stats of a file five
+directories deep, the old way (``Path.resolve()`` on the workspace and the
+target, a ``startswith`` check, then a second lookup by path) and through
+``WorkspaceRoot`` (workspace resolved once, one ``openat`` walk).
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from chat.path_confinement import WorkspaceRoot
+
+
+def legacy_resolve(workspace_dir, file_path):
+    """The old check: resolve both paths on every call, then compare prefixes"""
+    workspace = Path(workspace_dir).resolve()
+    full = (workspace / file_path).resolve()
+    if not str(full).startswith(str(workspace)):
+        raise PermissionError(file_path)
+    return full
+
+
+def legacy_open(workspace_dir, file_path):
+    fd = os.open(legacy_resolve(workspace_dir, file_path), os.O_RDONLY)
+    os.close(fd)
+
+
+def legacy_stat(workspace_dir, file_path):
+    return os.stat(legacy_resolve(workspace_dir, file_path))
+
+
+def confined_open(root, file_path):
+    rel_path, error = root.relative(file_path)
+    os.close(root.open(rel_path))
+
+
+def confined_stat(root, file_path):
+    rel_path, error = root.relative(file_path)
+    return root.stat(rel_path)
+
+
+def timed(label, fn, calls, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(calls):
+            fn()
+        best = min(best, time.perf_counter() - started)
+    print(f"   {label:45} {best * 1e6 / calls:10.2f} µs/call")
+    return best
+
+
+def main():
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    workspace = tempfile.mkdtemp(prefix="bench_confine_")
+    try:
+        target = "src/app/models/user/fields/name.py"
+        os.makedirs(os.path.join(workspace, os.path.dirname(target)))
+        with open(os.path.join(workspace, target), "w") as f:
+            f.write("x = 1\n")
+        root = WorkspaceRoot(workspace)
+
+        print(f"\n🔓 Open a file five directories deep ({calls} calls)")
+        old = timed("resolve + startswith, then open", lambda: legacy_open(workspace, target), calls)
+        new = timed("WorkspaceRoot.open (openat walk)", lambda: confined_open(root, target), calls)
+        print(f"   speedup: {old / new:.1f}x")
+
+        print(f"\n📊 Stat the same file ({calls} calls)")
+        old = timed("resolve + startswith, then stat", lambda: legacy_stat(workspace, target), calls)
+        new = timed("WorkspaceRoot.stat (openat walk)", lambda: confined_stat(root, target), calls)
+        print(f"   speedup: {old / new:.1f}x")
+
+        print(f"\n🚫 Reject a sibling-prefix path ({calls} calls)")
+        sibling = workspace + "2/secret.txt"
+        timed("WorkspaceRoot.relative", lambda: root.relative(sibling), calls)
+        try:
+            legacy_resolve(workspace, sibling)
+            print("   legacy check: accepted (sibling prefix slips through)")
+        except PermissionError:
+            print("   legacy check: rejected")
+    finally:
+        shutil.rmtree(workspace, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+"""Benchmark bytes sent per page view with built, cached assets
+
+Usage: python bench_static_assets.py
+Builds the asset bundles into a throwaway directory, renders the
+conversation list and a conversation page, and reports for each the bytes
+of a first visit (HTML plus every bundle, gzipped) and a repeat visit
+(HTML only: bundles are cached as immutable, so the browser asks for
+nothing). For comparison it reports what the same views cost with the page
+CSS and JS inline, as before the build step: the sources went out in every
+HTML response and each of the shared stylesheets was revalidated.
+"""
+
+import os
+import re
+import shutil
+import tempfile
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "aichat.settings")
+django.setup()
+
+from django.core.management import call_command  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test import Client, override_settings  # noqa: E402
+from django.urls import reverse  # noqa: E402
+
+from chat import assets  # noqa: E402
+from chat.models import Conversation, Message  # noqa: E402
+
+
+def source_bytes(name):
+    return sum(os.path.getsize(os.path.join(assets.SOURCE_DIR, path)) for path in assets.BUNDLES[name])
+
+
+def report(client, label, url):
+    html = client.get(url).content
+    bundles = re.findall(rb'"/assets/([\w.-]+)"', html)
+    first = len(html)
+    for built in bundles:
+        response = client.get(assets.ASSET_URL + built.decode(), HTTP_ACCEPT_ENCODING="gzip")
+        first += len(b"".join(response.streaming_content))
+
+    names = {built: name for name, built in assets.current_manifest()["files"].items()}
+    page_sources = sum(source_bytes(names[built.decode()]) for built in bundles if not built.startswith(b"app."))
+    inline = len(html) + page_sources
+    # The shared stylesheets were served as they are, uncompressed
+    uses_shared = any(built.startswith(b"app.") for built in bundles)
+    shared = len(assets.BUNDLES["app.css"]) if uses_shared else 0
+    inline_first = inline + (source_bytes("app.css") if uses_shared else 0)
+
+    print(f"\n📄 {label}")
+    print(f"   inline (before)   first visit {inline_first / 1024:7.1f} KB   "
+          f"repeat {inline / 1024:7.1f} KB + {shared} revalidations")
+    print(f"   built bundles     first visit {first / 1024:7.1f} KB   "
+          f"repeat {len(html) / 1024:7.1f} KB + 0 requests")
+
+
+def main():
+    workdir = tempfile.mkdtemp(prefix="bench_assets_")
+    try:
+        with override_settings(
+            DEBUG=False, ALLOWED_HOSTS=["testserver"], ASSET_BUILD_DIR=os.path.join(workdir, "assets"),
+            MESSAGE_BLOB_DIR=os.path.join(workdir, "blobs"),
+        ):
+            connection.settings_dict["NAME"] = os.path.join(workdir, "bench.sqlite3")
+            call_command("migrate", verbosity=0)
+            conversation = Conversation.objects.create(title="Bench")
+            for i in range(20):
+                Message.objects.create(conversation=conversation, content=f"Message {i}\n" * 5, is_user=i % 2 == 0)
+
+            manifest = assets.build()
+            print("\n📦 Bundles (minified / gzip)")
+            for name, built in manifest["files"].items():
+                sizes = manifest["sizes"][built]
+                print(f"   {name:26} {source_bytes(name) / 1024:6.1f} KB source → {sizes[''] / 1024:6.1f} KB"
+                      f" / {sizes.get('.gz', sizes['']) / 1024:5.1f} KB")
+
+            client = Client()
+            report(client, "Conversation list", reverse("conversation_list"))
+            report(client, "Conversation with 20 messages", reverse("conversation_detail", args=[conversation.id]))
+    finally:
+        connection.close()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+"""Benchmark the cost of tool invocation accounting on the calling thread
+
+Usage: python bench_tool_metrics.py [calls]
+Times ``calls`` calls (default 100,000) of a trivial tool function bare,
+wrapped with ``tool_metrics.tracked`` (queued for the background writer),
+and wrapped with a synchronous ``ToolInvocation.objects.create`` per call,
+then times writing the queue to a throwaway database in batches.
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "aichat.settings")
+django.setup()
+
+from django.core.management import call_command  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test import override_settings  # noqa: E402
+
+from chat import tool_metrics  # noqa: E402
+from chat.models import ToolInvocation  # noqa: E402
+
+
+def info(file_path, conversation_id=None):
+    return f"File: {file_path}\nSize: 1024 bytes"
+
+
+def per_call(label, fn, calls):
+    started = time.perf_counter()
+    for i in range(calls):
+        fn(f"/workspace/src/module_{i % 100}.py", conversation_id=1)
+    elapsed = time.perf_counter() - started
+    print(f"   {label:34} {elapsed / calls * 1e6:8.2f} µs/call")
+
+
+def main():
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    workdir = tempfile.mkdtemp(prefix="bench_tools_")
+    try:
+        with override_settings(DEBUG=False):
+            connection.settings_dict["NAME"] = os.path.join(workdir, "bench.sqlite3")
+            call_command("migrate", verbosity=0)
+            tool_metrics.writer = tool_metrics.InvocationWriter(interval=0, max_pending=calls)
+
+            def synchronous(file_path, conversation_id=None):
+                started = time.perf_counter()
+                result = info(file_path)
+                ToolInvocation.objects.create(
+                    tool="info file", args_sha256="", target=file_path, backend="bench",
+                    conversation_id=conversation_id, duration_ms=(time.perf_counter() - started) * 1000,
+                )
+                return result
+
+            print(f"\n🛠️  {calls} tool calls")
+            per_call("bare", info, calls)
+            per_call("tracked (queued)", tool_metrics.tracked("info file", "bench", target="file_path")(info), calls)
+            per_call("one INSERT per call", synchronous, calls // 10)
+
+            started = time.perf_counter()
+            written = tool_metrics.writer.flush()
+            elapsed = time.perf_counter() - started
+            print(f"\n💾 Writer flushed {written} invocations in {elapsed:.2f}s "
+                  f"({elapsed / written * 1e6:.1f} µs each, off the request thread)")
+    finally:
+        connection.close()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
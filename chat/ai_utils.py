@@ -1,14 +1,46 @@
 import os
 import json
-import requests
 from django.conf import settings
 from dotenv import load_dotenv
 import logging
+import threading
+
+from .code_search import parse_search_args
+from .file_patch import is_unchanged_result, trim_patch
+from .file_ranges import STREAM_CHUNK_SIZE, parse_read_args
+from .file_tree import parse_list_args
+from .tool_metrics import is_error_result, tracked
+from .url_fetch import fetch_url
+from .web_search import web_search
 
 logger = logging.getLogger(__name__)
 
 load_dotenv()
 
+# Tool reference included in prompts that may lead to tool use
+TOOL_HELP = """Available tools (Secure Daytona Sandbox Operations):
+- read file:/path/to/file.txt - Read file contents securely
+- read file:/path/to/file.txt lines:10-20 - Read a line range (also head:N, tail:N, offset:N length:N)
+- write file:/path/to/file.txt content:your content - Write to file securely
+- edit file:/path/to/file.txt followed on the next lines by SEARCH/REPLACE blocks or a unified diff - Change part of a file without rewriting it:
+  <<<<<<< SEARCH
+  exact existing lines
+  =======
+  replacement lines
+  >>>>>>> REPLACE
+- delete file:/path/to/file.txt - Delete a file securely
+- list checkpoints: - Show the checkpoints taken before each file change in this conversation
+- restore checkpoint:3 - Undo every file change made since checkpoint 3
+- diff checkpoint:3 - Show what changed since checkpoint 3 (diff checkpoint:3 5 compares two checkpoints)
+- list files:/path/to/directory - List directory contents securely
+- list files:/path/to/directory tree depth:3 include:*.py exclude:tests - Recursive tree in one call (limit:N caps entries)
+- info file:/path/to/file.txt - Get file information securely
+- search files:text to find - Find lines containing the text across the workspace (also glob:*.py, limit:N)
+- run code:your python code - Execute Python code securely (variables persist within this conversation)
+- restart kernel: - Clear this conversation's Python state
+- search web:your query - Search the web for information
+- fetch url:https://example.com/page - Read the text of a web page (e.g. documentation found by a search)"""
+
 # Lazy Gemini model loader so tools can run without a key
 _model_cache = None
 
@@ -34,7 +66,7 @@ def _get_gemini_model():
         return None
 
 
-def get_ai_response(messages):
+def get_ai_response(messages, conversation_id=None):
     import time
 
     model = _get_gemini_model()
@@ -83,14 +115,7 @@ def get_ai_response(messages):
                 if is_sensitive:
                     system_prompt = f"""You are an AI assistant with access to powerful tools. The user's request appears to involve sensitive operations (preferences, keys, or authentication).
 
-Available tools (Secure Daytona Sandbox Operations):
-- read file:/path/to/file.txt - Read file contents securely
-- write file:/path/to/file.txt content:your content - Write to file securely  
-- delete file:/path/to/file.txt - Delete a file securely
-- list files:/path/to/directory - List directory contents securely
-- info file:/path/to/file.txt - Get file information securely
-- run code:your python code - Execute Python code securely
-- search web:your query - Search the web for information
+{TOOL_HELP}
 
 User request: {last_message}
 
@@ -98,14 +123,7 @@ Please respond naturally and use the appropriate tool if needed. Be helpful but
                 else:
                     system_prompt = f"""You are an AI assistant with access to powerful tools for file operations, code execution, and web search.
 
-Available tools (Secure Daytona Sandbox Operations):
-- read file:/path/to/file.txt - Read file contents securely
-- write file:/path/to/file.txt content:your content - Write to file securely  
-- delete file:/path/to/file.txt - Delete a file securely
-- list files:/path/to/directory - List directory contents securely
-- info file:/path/to/file.txt - Get file information securely
-- run code:your python code - Execute Python code securely
-- search web:your query - Search the web for information
+{TOOL_HELP}
 
 User request: {last_message}
 
@@ -115,7 +133,9 @@ Please respond naturally and use the appropriate tool if needed. Be helpful and
 
                 # Check if the AI response contains tool commands and execute them
                 ai_response = response.text
-                executed_result = execute_tool_commands_from_response(ai_response)
+                executed_result = execute_tool_commands_from_response(
+                    ai_response, conversation_id
+                )
 
                 if executed_result:
                     return executed_result, True
@@ -250,73 +270,326 @@ except Exception:
     _TOOL_BACKEND = 'secure'
 
 
-def read_file(file_path):
-    """Read content from a file using Daytona container operations"""
+def _tool(name, target=None):
+    """Record every call of the decorated tool as a ToolInvocation"""
+    return tracked(name, _TOOL_BACKEND, target)
+
+
+# Web tools don't go through the sandbox backend
+web_search = tracked("search web", "web")(web_search)
+fetch_url = tracked("fetch url", "web", target="url")(fetch_url)
+
+
+@_tool("read file", target="file_path")
+def read_file(file_path, **options):
+    """Read content from a file using Daytona container operations
+
+    With range options (offset/length, head/tail, start_line/end_line) only
+    that slice is read; full reads are previewed up to the inline limit.
+    """
+    if options:
+        return daytona_ops.read_file_range(file_path, **options)
     return daytona_ops.read_file(file_path)
 
 
-def write_file(file_path, content):
-    """Write content to a file using Daytona container operations"""
-    return daytona_ops.write_file(file_path, content)
+def open_file_stream(file_path, chunk_size=STREAM_CHUNK_SIZE):
+    """Open a file for chunked streaming; returns (chunk iterator, error)"""
+    return daytona_ops.open_stream(file_path, chunk_size)
+
+
+def write_upload_chunk(upload_id, offset, blocks):
+    """Stage one chunk of a resumable upload; returns an error or None"""
+    return daytona_ops.write_upload_chunk(upload_id, offset, blocks)
+
+
+def finish_upload(upload_id, file_path, size, sha256=""):
+    """Verify a staged upload and move it to ``file_path`` in the workspace"""
+    return daytona_ops.finish_upload(upload_id, file_path, size, sha256)
+
+
+def discard_upload(upload_id):
+    daytona_ops.discard_upload(upload_id)
+
+
+def mirror_metrics():
+    """Staleness and sync statistics of the local workspace mirror, if enabled"""
+    mirror = getattr(daytona_ops, 'mirror', None)
+    if mirror is None:
+        return {"enabled": False}
+    return mirror.metrics()
+
+
+def _read_file_command(arg_text):
+    """Run a 'read file:' command including any trailing range options"""
+    file_path, options = parse_read_args(arg_text)
+    if file_path is None:
+        return options
+    return read_file(file_path, **options)
 
 
-def delete_file(file_path):
+def read_stream_target(user_message):
+    """Return the path of a full-file 'read file:' command, else None
+
+    Full reads only carry a preview in the chat message; the view uses this
+    to hand the client a URL that streams the whole file in chunks.
+    """
+    import re
+
+    read_match = re.match(r"read\s+file:(.+)", user_message, re.IGNORECASE)
+    if not read_match:
+        return None
+    file_path, options = parse_read_args(read_match.group(1))
+    if file_path is None or options:
+        return None
+    return file_path
+
+
+def _checkpointed(conversation_id, label, file_path, change, replaces=True):
+    """Checkpoint ``file_path`` for the conversation, then run ``change()``
+
+    ``replaces`` is False for changes that may leave the file in place (an
+    edit that turns out to change nothing), so the checkpoint must not share
+    the live file's inode. The checkpoint is dropped again when the change
+    fails or changes nothing, so every checkpoint marks a change that
+    actually happened.
+    """
+    create_fn = getattr(daytona_ops, 'create_checkpoint', None)
+    checkpoint_id = None
+    if conversation_id is not None and callable(create_fn):
+        try:
+            checkpoint_id = create_fn(conversation_id, label, [file_path], replaces=replaces)
+        except Exception as e:
+            logger.warning("Checkpoint before '%s' failed: %s", label, e)
+    result = change()
+    if checkpoint_id is not None and (is_error_result(result) or is_unchanged_result(result)):
+        try:
+            daytona_ops.drop_checkpoint(conversation_id, checkpoint_id)
+        except Exception as e:
+            logger.warning("Dropping checkpoint #%s failed: %s", checkpoint_id, e)
+    return result
+
+
+@_tool("write file", target="file_path")
+def write_file(file_path, content, conversation_id=None):
+    """Write content to a file using Daytona container operations
+
+    With a conversation id the file's previous state is checkpointed first.
+    """
+    return _checkpointed(
+        conversation_id,
+        f"write file:{file_path}",
+        file_path,
+        lambda: daytona_ops.write_file(file_path, content),
+    )
+
+
+@_tool("edit file", target="file_path")
+def edit_file(file_path, patch, conversation_id=None):
+    """Apply search/replace blocks or a unified diff to a file"""
+    edit_fn = getattr(daytona_ops, 'edit_file', None)
+    if callable(edit_fn):
+        return _checkpointed(
+            conversation_id, f"edit file:{file_path}", file_path, lambda: edit_fn(file_path, patch), replaces=False
+        )
+    return "Error: File editing not supported by Daytona operations backend"
+
+
+def _edit_file_command(arg_text, conversation_id=None):
+    """Run an 'edit file:' command: the path, then the patch on later lines"""
+    file_path, _, patch = arg_text.partition("\n")
+    file_path = file_path.strip()
+    if not file_path or not patch.strip():
+        return "Error: Usage is 'edit file:<path>' followed by the patch on the next lines"
+    return edit_file(file_path, trim_patch(patch), conversation_id)
+
+
+@_tool("delete file", target="file_path")
+def delete_file(file_path, conversation_id=None):
     """Delete a file using Daytona container operations"""
-    return daytona_ops.delete_file(file_path)
+    return _checkpointed(
+        conversation_id,
+        f"delete file:{file_path}",
+        file_path,
+        lambda: daytona_ops.delete_file(file_path),
+    )
+
 
+@_tool("list checkpoints")
+def list_checkpoints(conversation_id=None):
+    """List the conversation's workspace checkpoints, newest first"""
+    list_fn = getattr(daytona_ops, 'list_checkpoints', None)
+    if conversation_id is None or not callable(list_fn):
+        return "Error: Checkpoints are only available within a conversation"
+    return list_fn(conversation_id)
 
-def list_files(directory_path):
-    """List files and directories using Daytona container operations"""
+
+def _checkpoint_ids(arg_text):
+    """Parse 'N' or 'N M' (also 'N..M'); returns (ids, error)"""
+    import re
+
+    ids = re.split(r"\s+|\.\.", arg_text.strip().lstrip("#"))
+    try:
+        return [int(part.lstrip("#")) for part in ids if part], None
+    except ValueError:
+        return None, f"Error: Invalid checkpoint number '{arg_text.strip()}'"
+
+
+@_tool("restore checkpoint")
+def restore_checkpoint(arg_text, conversation_id=None):
+    """Undo every file change made since a checkpoint"""
+    restore_fn = getattr(daytona_ops, 'restore_checkpoint', None)
+    if conversation_id is None or not callable(restore_fn):
+        return "Error: Checkpoints are only available within a conversation"
+    ids, error = _checkpoint_ids(arg_text)
+    if error:
+        return error
+    if len(ids) != 1:
+        return "Error: Usage is 'restore checkpoint:<number>'"
+    return restore_fn(conversation_id, ids[0])
+
+
+@_tool("diff checkpoint")
+def diff_checkpoints(arg_text, conversation_id=None):
+    """Diff the workspace since a checkpoint, or between two checkpoints"""
+    diff_fn = getattr(daytona_ops, 'diff_checkpoints', None)
+    if conversation_id is None or not callable(diff_fn):
+        return "Error: Checkpoints are only available within a conversation"
+    ids, error = _checkpoint_ids(arg_text)
+    if error:
+        return error
+    if len(ids) not in (1, 2):
+        return "Error: Usage is 'diff checkpoint:<number>' or 'diff checkpoint:<from> <to>'"
+    return diff_fn(conversation_id, *ids)
+
+
+@_tool("list files", target="directory_path")
+def list_files(directory_path, **options):
+    """List files and directories using Daytona container operations
+
+    With tree options (tree, depth, include, exclude, limit) the directory
+    is listed recursively as a compact tree.
+    """
+    if options.get("tree"):
+        tree_fn = getattr(daytona_ops, 'list_tree', None)
+        if callable(tree_fn):
+            return tree_fn(directory_path, **options)
     return daytona_ops.list_files(directory_path)
 
 
+def _list_files_command(arg_text):
+    """Run a 'list files:' command including any trailing tree options"""
+    directory_path, options = parse_list_args(arg_text)
+    if directory_path is None:
+        return options
+    return list_files(directory_path, **options)
+
+
+@_tool("info file", target="file_path")
 def get_file_info(file_path):
     """Get file information using Daytona container operations"""
     return daytona_ops.get_file_info(file_path)
 
 
-def execute_code(code, language="python"):
-    """Execute code using Daytona container operations (or secure fallback)"""
+@_tool("search files")
+def search_files(query, **options):
+    """Search file contents across the workspace (glob/limit options)"""
+    search_fn = getattr(daytona_ops, 'search_files', None)
+    if callable(search_fn):
+        return search_fn(query, **options)
+    return "Error: File search not supported by Daytona operations backend"
+
+
+def _search_files_command(arg_text):
+    """Run a 'search files:' command including any trailing options"""
+    query, options = parse_search_args(arg_text)
+    if query is None:
+        return options
+    return search_files(query, **options)
+
+
+@_tool("run code")
+def execute_code(code, language="python", conversation_id=None):
+    """Execute code using Daytona container operations (or secure fallback)
+
+    With a conversation id the Daytona backend runs the code in that
+    conversation's persistent kernel, so state carries over between runs.
+    """
     # daytona_ops may be SecureDaytonaOperations in fallback mode, which also supports execute_code
     exec_fn = getattr(daytona_ops, 'execute_code', None)
     if callable(exec_fn):
-        return exec_fn(code, language)
+        return exec_fn(code, language, conversation_id=conversation_id)
     return "Error: Code execution not supported by Daytona operations backend"
 
 
-def web_search(query, num_results=5):
-    """Perform web search using a free API"""
-    try:
-        # Using DuckDuckGo's instant answer API (no API key required)
-        url = "https://api.duckduckgo.com/"
-        params = {"q": query, "format": "json", "no_html": 1, "skip_disambig": 1}
-
-        response = requests.get(url, params=params, timeout=10)
-        response.raise_for_status()
+# Cancel callbacks of streaming runs in progress, keyed by run id. Cancel
+# requests are served by another thread of the same process.
+_active_runs = {}
+_active_runs_lock = threading.Lock()
 
-        data = response.json()
 
-        results = []
+def run_code_target(user_message):
+    """Return the code of a 'run code:' command, else None"""
+    import re
 
-        # Add abstract if available
-        if data.get("Abstract"):
-            results.append(f"Abstract: {data['Abstract']}")
+    code_match = re.match(r"run\s+code:(.+)", user_message, re.IGNORECASE | re.DOTALL)
+    if not code_match:
+        return None
+    return code_match.group(1).strip()
 
-        # Add related topics
-        if data.get("RelatedTopics"):
-            for topic in data["RelatedTopics"][:num_results]:
-                if isinstance(topic, dict) and "Text" in topic:
-                    results.append(f"• {topic['Text']}")
 
-        if not results:
-            return f"No results found for query: {query}"
+@_tool("run code")
+def stream_code(code, run_id, language="python", conversation_id=None):
+    """Run code and yield ("output", line) events, then ("done", result)
 
-        return f"Web search results for '{query}':\n\n" + "\n\n".join(results)
+    Output is passed on a line at a time as the backend produces it. While
+    the run is in progress it can be stopped with cancel_run(run_id).
+    """
+    stream_fn = getattr(daytona_ops, 'stream_code', None)
+    if not callable(stream_fn):
+        yield "done", execute_code(code, language, conversation_id)
+        return
 
-    except requests.RequestException as e:
-        return f"Error performing web search: {str(e)}"
+    pending = ""
+    try:
+        for kind, value in stream_fn(code, language, conversation_id=conversation_id):
+            if kind == "cancel":
+                with _active_runs_lock:
+                    _active_runs[run_id] = (conversation_id, value)
+            elif kind == "output":
+                lines = (pending + value).split("\n")
+                pending = lines.pop()
+                for line in lines:
+                    yield "output", line + "\n"
+            else:
+                if pending:
+                    yield "output", pending
+                yield "done", value
+    finally:
+        with _active_runs_lock:
+            _active_runs.pop(run_id, None)
+
+
+def cancel_run(run_id, conversation_id=None):
+    """Stop a streaming run; returns False if it is not (or no longer) running"""
+    with _active_runs_lock:
+        entry = _active_runs.get(run_id)
+    if entry is None or entry[0] != conversation_id:
+        return False
+    try:
+        entry[1]()
     except Exception as e:
-        return f"Error during web search: {str(e)}"
+        logger.warning("Cancelling run %s failed: %s", run_id, e)
+        return False
+    return True
+
+
+@_tool("restart kernel")
+def restart_kernel(conversation_id=None):
+    """Discard a conversation's kernel state; the next run starts a fresh one"""
+    restart_fn = getattr(daytona_ops, 'restart_kernel', None)
+    if callable(restart_fn):
+        return restart_fn(conversation_id)
+    return "Error: Kernels not supported by Daytona operations backend"
 
 
 def analyze_task_for_tools(user_message):
@@ -329,11 +602,18 @@ def analyze_task_for_tools(user_message):
     tool_command_patterns = [
         r"read\s+file:",
         r"write\s+file:",
+        r"edit\s+file:",
         r"delete\s+file:",
+        r"list\s+checkpoints:",
+        r"restore\s+checkpoint:",
+        r"diff\s+checkpoint:",
         r"list\s+files:",
         r"info\s+file:",
+        r"search\s+files:",
         r"run\s+code:",
+        r"restart\s+kernel:",
         r"search\s+web:",
+        r"fetch\s+url:",
     ]
 
     for pattern in tool_command_patterns:
@@ -432,7 +712,7 @@ def analyze_task_for_tools(user_message):
     return None
 
 
-def execute_tool_commands_from_response(response_text):
+def execute_tool_commands_from_response(response_text, conversation_id=None):
     """Extract and execute tool commands from AI response"""
     import re
 
@@ -446,7 +726,7 @@ def execute_tool_commands_from_response(response_text):
     read_matches = re.findall(r"read\s+file:(.+)", clean_text, re.IGNORECASE)
     for match in read_matches:
         try:
-            result = read_file(match.strip())
+            result = _read_file_command(match)
             if result:
                 results.append(result)
         except Exception as e:
@@ -459,27 +739,57 @@ def execute_tool_commands_from_response(response_text):
     for match in write_matches:
         try:
             file_path, content = match[0].strip(), match[1].strip()
-            result = write_file(file_path, content)
+            result = write_file(file_path, content, conversation_id)
             if result:
                 results.append(result)
         except Exception as e:
             results.append(f"Error writing file: {str(e)}")
 
+    # File edit command (the patch runs until the next edit command)
+    edit_matches = list(re.finditer(r"edit\s+file:", clean_text, re.IGNORECASE))
+    for match, following in zip(edit_matches, edit_matches[1:] + [None]):
+        end = following.start() if following else len(clean_text)
+        try:
+            result = _edit_file_command(clean_text[match.end() : end], conversation_id)
+            if result:
+                results.append(result)
+        except Exception as e:
+            results.append(f"Error editing file: {str(e)}")
+
     # File delete command
     delete_matches = re.findall(r"delete\s+file:(.+)", clean_text, re.IGNORECASE)
     for match in delete_matches:
         try:
-            result = delete_file(match.strip())
+            result = delete_file(match.strip(), conversation_id)
             if result:
                 results.append(result)
         except Exception as e:
             results.append(f"Error deleting file: {str(e)}")
 
+    # Checkpoint commands
+    if re.search(r"list\s+checkpoints:", clean_text, re.IGNORECASE):
+        try:
+            results.append(list_checkpoints(conversation_id))
+        except Exception as e:
+            results.append(f"Error listing checkpoints: {str(e)}")
+
+    for match in re.findall(r"restore\s+checkpoint:(.+)", clean_text, re.IGNORECASE):
+        try:
+            results.append(restore_checkpoint(match, conversation_id))
+        except Exception as e:
+            results.append(f"Error restoring checkpoint: {str(e)}")
+
+    for match in re.findall(r"diff\s+checkpoint:(.+)", clean_text, re.IGNORECASE):
+        try:
+            results.append(diff_checkpoints(match, conversation_id))
+        except Exception as e:
+            results.append(f"Error comparing checkpoints: {str(e)}")
+
     # List files command
     list_matches = re.findall(r"list\s+files:(.+)", clean_text, re.IGNORECASE)
     for match in list_matches:
         try:
-            result = list_files(match.strip())
+            result = _list_files_command(match)
             if result:
                 results.append(result)
         except Exception as e:
@@ -495,16 +805,33 @@ def execute_tool_commands_from_response(response_text):
         except Exception as e:
             results.append(f"Error getting file info: {str(e)}")
 
+    # File search command
+    search_file_matches = re.findall(r"search\s+files:(.+)", clean_text, re.IGNORECASE)
+    for match in search_file_matches:
+        try:
+            result = _search_files_command(match)
+            if result:
+                results.append(result)
+        except Exception as e:
+            results.append(f"Error searching files: {str(e)}")
+
     # Code execution command
     code_matches = re.findall(r"run\s+code:(.+)", clean_text, re.IGNORECASE | re.DOTALL)
     for match in code_matches:
         try:
-            result = execute_code(match.strip(), "python")
+            result = execute_code(match.strip(), "python", conversation_id)
             if result:
                 results.append(result)
         except Exception as e:
             results.append(f"Error executing code: {str(e)}")
 
+    # Kernel restart command
+    if re.search(r"restart\s+kernel:", clean_text, re.IGNORECASE):
+        try:
+            results.append(restart_kernel(conversation_id))
+        except Exception as e:
+            results.append(f"Error restarting kernel: {str(e)}")
+
     # Web search command
     search_matches = re.findall(r"search\s+web:(.+)", clean_text, re.IGNORECASE)
     for match in search_matches:
@@ -515,12 +842,20 @@ def execute_tool_commands_from_response(response_text):
         except Exception as e:
             results.append(f"Error performing web search: {str(e)}")
 
+    # URL fetch command
+    fetch_matches = re.findall(r"fetch\s+url:\s*(\S+)", clean_text, re.IGNORECASE)
+    for match in fetch_matches:
+        try:
+            results.append(fetch_url(match))
+        except Exception as e:
+            results.append(f"Error fetching '{match}': {str(e)}")
+
     if results:
         return "\n\n".join(results)
     return None
 
 
-def execute_ai_command(user_message):
+def execute_ai_command(user_message, conversation_id=None):
     """Parse and execute AI commands for file operations and web search
 
     Returns a tuple: (ai_text, action_output)
@@ -530,8 +865,7 @@ def execute_ai_command(user_message):
     # File read command: "read file:/path/to/file.txt"
     read_match = re.match(r"read\s+file:(.+)", user_message, re.IGNORECASE)
     if read_match:
-        file_path = read_match.group(1).strip()
-        result = read_file(file_path)
+        result = _read_file_command(read_match.group(1))
         return result, result
 
     # File write command: "write file:/path/to/file.txt content:your content here"
@@ -541,21 +875,41 @@ def execute_ai_command(user_message):
     if write_match:
         file_path = write_match.group(1).strip()
         content = write_match.group(2).strip()
-        result = write_file(file_path, content)
+        result = write_file(file_path, content, conversation_id)
+        return result, result
+
+    # File edit command: "edit file:/path/to/file.txt" then the patch on the next lines
+    edit_match = re.match(r"edit\s+file:(.+)", user_message, re.IGNORECASE | re.DOTALL)
+    if edit_match:
+        result = _edit_file_command(edit_match.group(1), conversation_id)
         return result, result
 
     # File delete command: "delete file:/path/to/file.txt"
     delete_match = re.match(r"delete\s+file:(.+)", user_message, re.IGNORECASE)
     if delete_match:
         file_path = delete_match.group(1).strip()
-        result = delete_file(file_path)
+        result = delete_file(file_path, conversation_id)
+        return result, result
+
+    # Checkpoint commands: "list checkpoints:", "restore checkpoint:3", "diff checkpoint:3 5"
+    if re.match(r"list\s+checkpoints:", user_message, re.IGNORECASE):
+        result = list_checkpoints(conversation_id)
+        return result, result
+
+    restore_match = re.match(r"restore\s+checkpoint:(.+)", user_message, re.IGNORECASE)
+    if restore_match:
+        result = restore_checkpoint(restore_match.group(1), conversation_id)
+        return result, result
+
+    diff_match = re.match(r"diff\s+checkpoint:(.+)", user_message, re.IGNORECASE)
+    if diff_match:
+        result = diff_checkpoints(diff_match.group(1), conversation_id)
         return result, result
 
     # List files command: "list files:/path/to/directory"
     list_match = re.match(r"list\s+files:(.+)", user_message, re.IGNORECASE)
     if list_match:
-        directory_path = list_match.group(1).strip()
-        result = list_files(directory_path)
+        result = _list_files_command(list_match.group(1))
         return result, result
 
     # File info command: "info file:/path/to/file.txt"
@@ -565,11 +919,22 @@ def execute_ai_command(user_message):
         result = get_file_info(file_path)
         return result, result
 
+    # File search command: "search files:text to find glob:*.py"
+    search_files_match = re.match(r"search\s+files:(.+)", user_message, re.IGNORECASE)
+    if search_files_match:
+        result = _search_files_command(search_files_match.group(1))
+        return result, result
+
     # Code execution command: "run code:your python code here"
     code_match = re.match(r"run\s+code:(.+)", user_message, re.IGNORECASE | re.DOTALL)
     if code_match:
         code = code_match.group(1).strip()
-        result = execute_code(code, "python")
+        result = execute_code(code, "python", conversation_id)
+        return result, result
+
+    # Kernel restart command: "restart kernel:"
+    if re.match(r"restart\s+kernel:", user_message, re.IGNORECASE):
+        result = restart_kernel(conversation_id)
         return result, result
 
     # Web search command: "search web:your query here"
@@ -579,10 +944,16 @@ def execute_ai_command(user_message):
         result = web_search(query)
         return result, result
 
+    # URL fetch command: "fetch url:https://example.com/page"
+    fetch_match = re.match(r"fetch\s+url:\s*(\S+)", user_message, re.IGNORECASE)
+    if fetch_match:
+        result = fetch_url(fetch_match.group(1))
+        return result, result
+
     return None, None  # No command matched
 
 
-def execute_ai_command_with_meta(user_message):
+def execute_ai_command_with_meta(user_message, conversation_id=None):
     """Like execute_ai_command but also returns the parsed command string for UI.
 
     Returns a tuple: (ai_text, action_output, action_command)
@@ -593,9 +964,8 @@ def execute_ai_command_with_meta(user_message):
     # File read command
     read_match = re.match(r"read\s+file:(.+)", user_message, re.IGNORECASE)
     if read_match:
-        file_path = read_match.group(1).strip()
-        result = read_file(file_path)
-        return result, result, f"read file:{file_path}"
+        result = _read_file_command(read_match.group(1))
+        return result, result, f"read file:{read_match.group(1).strip()}"
 
     # File write command
     write_match = re.match(
@@ -604,23 +974,44 @@ def execute_ai_command_with_meta(user_message):
     if write_match:
         file_path = write_match.group(1).strip()
         content = write_match.group(2).strip()
-        result = write_file(file_path, content)
+        result = write_file(file_path, content, conversation_id)
         # Do not include full content in command echo to avoid UI noise
         return result, result, f"write file:{file_path} content:<{len(content)} chars>"
 
+    # File edit command
+    edit_match = re.match(r"edit\s+file:(.+)", user_message, re.IGNORECASE | re.DOTALL)
+    if edit_match:
+        result = _edit_file_command(edit_match.group(1), conversation_id)
+        file_path, _, patch = edit_match.group(1).partition("\n")
+        return result, result, f"edit file:{file_path.strip()} patch:<{len(patch)} chars>"
+
     # File delete command
     delete_match = re.match(r"delete\s+file:(.+)", user_message, re.IGNORECASE)
     if delete_match:
         file_path = delete_match.group(1).strip()
-        result = delete_file(file_path)
+        result = delete_file(file_path, conversation_id)
         return result, result, f"delete file:{file_path}"
 
+    # Checkpoint commands
+    if re.match(r"list\s+checkpoints:", user_message, re.IGNORECASE):
+        result = list_checkpoints(conversation_id)
+        return result, result, "list checkpoints:"
+
+    restore_match = re.match(r"restore\s+checkpoint:(.+)", user_message, re.IGNORECASE)
+    if restore_match:
+        result = restore_checkpoint(restore_match.group(1), conversation_id)
+        return result, result, f"restore checkpoint:{restore_match.group(1).strip()}"
+
+    diff_match = re.match(r"diff\s+checkpoint:(.+)", user_message, re.IGNORECASE)
+    if diff_match:
+        result = diff_checkpoints(diff_match.group(1), conversation_id)
+        return result, result, f"diff checkpoint:{diff_match.group(1).strip()}"
+
     # List files command
     list_match = re.match(r"list\s+files:(.+)", user_message, re.IGNORECASE)
     if list_match:
-        directory_path = list_match.group(1).strip()
-        result = list_files(directory_path)
-        return result, result, f"list files:{directory_path}"
+        result = _list_files_command(list_match.group(1))
+        return result, result, f"list files:{list_match.group(1).strip()}"
 
     # File info command
     info_match = re.match(r"info\s+file:(.+)", user_message, re.IGNORECASE)
@@ -629,14 +1020,25 @@ def execute_ai_command_with_meta(user_message):
         result = get_file_info(file_path)
         return result, result, f"info file:{file_path}"
 
+    # File search command
+    search_files_match = re.match(r"search\s+files:(.+)", user_message, re.IGNORECASE)
+    if search_files_match:
+        result = _search_files_command(search_files_match.group(1))
+        return result, result, f"search files:{search_files_match.group(1).strip()}"
+
     # Code execution command
     code_match = re.match(r"run\s+code:(.+)", user_message, re.IGNORECASE | re.DOTALL)
     if code_match:
         code = code_match.group(1).strip()
-        result = execute_code(code, "python")
+        result = execute_code(code, "python", conversation_id)
         code_preview = code[:60].replace("\n", " ⏎ ") + ("..." if len(code) > 60 else "")
         return result, result, f"run code:{code_preview}"
 
+    # Kernel restart command
+    if re.match(r"restart\s+kernel:", user_message, re.IGNORECASE):
+        result = restart_kernel(conversation_id)
+        return result, result, "restart kernel:"
+
     # Web search command
     search_match = re.match(r"search\s+web:(.+)", user_message, re.IGNORECASE)
     if search_match:
@@ -644,4 +1046,11 @@ def execute_ai_command_with_meta(user_message):
         result = web_search(query)
         return result, result, f"search web:{query}"
 
+    # URL fetch command
+    fetch_match = re.match(r"fetch\s+url:\s*(\S+)", user_message, re.IGNORECASE)
+    if fetch_match:
+        url = fetch_match.group(1)
+        result = fetch_url(url)
+        return result, result, f"fetch url:{url}"
+
     return None, None, None
@@ -0,0 +1,175 @@
+"""Cold storage for conversations nobody has opened in a while
+
+``archive_conversations`` moves the messages of conversations not updated
+for ``ARCHIVE_AFTER_DAYS`` days out of the database into one zip file per
+month of last activity (``<CONVERSATION_ARCHIVE_DIR>/2025-03.zip``), each
+conversation a deflated member in the ``history_transfer`` export format.
+The Conversation row stays behind as a stub naming its file and member, so
+the conversation is still listed and its title still searchable; opening
+it calls ``rehydrate``, which loads the messages back.
+
+Archive files are only ever extended: a run copies the month's file,
+appends to the copy, fsyncs it and renames it into place, and messages are
+deleted from the database only after that. A crash at any point leaves
+either the old file or the new one, never a torn one. Runs appending to the
+same file take turns on an exclusive lock (``<file>.lock``) held from the
+copy to the rename, so neither replaces the other's members.
+"""
+
+import fcntl
+import json
+import os
+import shutil
+import tempfile
+import zipfile
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Max
+from django.utils import timezone
+
+from .history_transfer import IMPORT_BATCH_SIZE, export_lines, message_from_record
+from .models import Conversation, Message
+
+# Conversations not updated for this many days are archived
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "90"))
+# Conversations appended per copy of an archive file
+ARCHIVE_BATCH_SIZE = 200
+
+
+def archive_path(name):
+    return os.path.join(settings.CONVERSATION_ARCHIVE_DIR, name)
+
+
+def period_name(conversation):
+    return f"{conversation.updated_at:%Y-%m}.zip"
+
+
+def _member_name(names, conversation_id):
+    # A conversation archived again after being opened gets a new member;
+    # the old one is left in place
+    name, n = f"{conversation_id}.jsonl", 1
+    while name in names:
+        n += 1
+        name = f"{conversation_id}.{n}.jsonl"
+    return name
+
+
+def _append(name, conversations):
+    """Write ``conversations`` into archive file ``name``; returns {id: member}"""
+    path = archive_path(name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(f"{path}.lock", "a") as lock:
+        fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+        return _append_locked(path, conversations)
+
+
+def _append_locked(path, conversations):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+    os.close(fd)
+    members = {}
+    try:
+        if os.path.exists(path):
+            shutil.copyfile(path, tmp_path)
+        mode = "a" if os.path.getsize(tmp_path) else "w"
+        with zipfile.ZipFile(tmp_path, mode, compression=zipfile.ZIP_DEFLATED, compresslevel=9) as archive:
+            names = set(archive.namelist())
+            for conversation in conversations:
+                member = members[conversation.id] = _member_name(names, conversation.id)
+                names.add(member)
+                with archive.open(member, "w") as f:
+                    for line in export_lines([conversation.id]):
+                        f.write(line.encode("utf-8"))
+        with open(tmp_path, "rb") as f:
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return members
+
+
+def _message_state(conversation_id):
+    return Message.objects.filter(conversation_id=conversation_id).aggregate(count=Count("id"), last=Max("id"))
+
+
+def stale_conversations(days=ARCHIVE_AFTER_DAYS, now=None):
+    cutoff = (now or timezone.now()) - timedelta(days=days)
+    return Conversation.objects.filter(archive_file="", updated_at__lt=cutoff)
+
+
+def archive_conversations(days=ARCHIVE_AFTER_DAYS, now=None):
+    """Move conversations not updated for ``days`` days to the archive
+
+    Returns ``{"conversations": n, "messages": n}``.
+    """
+    return archive_selected(stale_conversations(days, now).order_by("updated_at", "id").values_list("id", flat=True))
+
+
+def archive_selected(ids):
+    """Move the given conversations to the archive, skipping ones already there
+
+    Returns ``{"conversations": n, "messages": n}``.
+    """
+    counts = {"conversations": 0, "messages": 0}
+    ids = list(ids)
+    for start in range(0, len(ids), ARCHIVE_BATCH_SIZE):
+        periods = defaultdict(list)
+        for conversation in Conversation.objects.filter(id__in=ids[start:start + ARCHIVE_BATCH_SIZE], archive_file=""):
+            periods[period_name(conversation)].append(conversation)
+        for name, conversations in periods.items():
+            states = {conversation.id: _message_state(conversation.id) for conversation in conversations}
+            members = _append(name, conversations)
+            with transaction.atomic():
+                for conversation in conversations:
+                    # Leave conversations that changed while being written
+                    # out; their member is never referenced
+                    if _message_state(conversation.id) != states[conversation.id]:
+                        continue
+                    if not Conversation.objects.filter(
+                        id=conversation.id, updated_at=conversation.updated_at, archive_file=""
+                    ).update(archive_file=name, archive_member=members[conversation.id]):
+                        continue
+                    deleted, _ = Message.objects.filter(conversation_id=conversation.id).delete()
+                    counts["conversations"] += 1
+                    counts["messages"] += deleted
+    return counts
+
+
+def archived_lines(conversation):
+    """The parsed records of an archived conversation's member"""
+    with zipfile.ZipFile(archive_path(conversation.archive_file)) as archive:
+        with archive.open(conversation.archive_member) as member:
+            for line in member:
+                yield json.loads(line)
+
+
+def rehydrate(conversation):
+    """Load an archived conversation's messages back into the database
+
+    Returns whether this call restored them; a no-op for hot conversations.
+    """
+    if not conversation.archive_file:
+        return False
+    with transaction.atomic():
+        # Only the request that clears the stub restores the messages, so
+        # concurrent opens never duplicate them
+        claimed = Conversation.objects.filter(
+            id=conversation.id, archive_file=conversation.archive_file
+        ).update(archive_file="", archive_member="")
+        if claimed:
+            batch = []
+            for line_number, record in enumerate(archived_lines(conversation), 1):
+                if record.get("type") != "message":
+                    continue
+                message = message_from_record(record, conversation, line_number)
+                message.offload()
+                batch.append(message)
+                if len(batch) >= IMPORT_BATCH_SIZE:
+                    Message.objects.bulk_create(batch)
+                    batch = []
+            Message.objects.bulk_create(batch)
+    conversation.archive_file = conversation.archive_member = ""
+    return bool(claimed)
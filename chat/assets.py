@@ -0,0 +1,380 @@
+"""Bundled, minified and fingerprinted static assets
+
+BUNDLES lists the source files (under ``static/``) concatenated into each
+asset the templates load with ``{% asset "app.css" %}``. ``build`` minifies
+every bundle, names it after a hash of its content
+(``app.3f9c2e1a7b04.css``) and writes it to ASSET_BUILD_DIR alongside
+``.gz`` and, when the ``brotli`` package is installed, ``.br`` variants,
+plus ``manifest.json`` mapping bundle names to built files.
+
+``serve`` (mounted by AssetMiddleware at ASSET_URL) sends the smallest
+variant the client accepts with a year-long ``immutable`` Cache-Control:
+a changed bundle gets a new name, so a cached one never needs revalidating.
+
+``python manage.py build_assets`` builds at deploy time. Without a manifest
+(or, under DEBUG, once a source is newer than it) the first page rendered
+builds one.
+"""
+
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import tempfile
+import threading
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, HttpResponseNotAllowed, HttpResponseNotFound
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+ASSET_URL = "/assets/"
+SOURCE_DIR = os.path.join(settings.BASE_DIR, "static")
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+HASH_LENGTH = 12
+
+_SHARED_CSS = ["css/tokens.css", "css/base.css", "css/components.css", "css/layout.css",
+               "css/animations.css", "css/mobile.css"]
+
+BUNDLES = {
+    "app.css": _SHARED_CSS,
+    "login.css": [path for path in _SHARED_CSS if path != "css/layout.css"] + ["css/pages/login.css"],
+    "conversation_list.css": ["css/pages/conversation_list.css"],
+    "conversation_detail.css": ["css/pages/conversation_detail.css"],
+    "new_conversation.css": ["css/pages/new_conversation.css"],
+    "conversation_list.js": ["js/conversation_list.js"],
+    "conversation_detail.js": ["js/conversation_detail.js"],
+    "login.js": ["js/login.js"],
+}
+
+# Variants, best first, as (Content-Encoding, file suffix)
+ENCODINGS = [("br", ".br"), ("gzip", ".gz")]
+
+_CSS_COMMENTS = re.compile(r"""("(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*')|/\*.*?\*/""", re.S)
+_CSS_SPACE = re.compile(r"""("(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*')|;?\s*(})\s*|\s*([{;,>])\s*|(:)\s+|\s+""")
+
+
+def minify_css(text):
+    """Drop comments and the whitespace CSS doesn't need"""
+    text = _CSS_COMMENTS.sub(lambda m: m.group(1) or "", text)
+
+    def collapse(m):
+        if m.group(1):
+            return m.group(1)
+        return m.group(2) or m.group(3) or m.group(4) or " "
+
+    return _CSS_SPACE.sub(collapse, text).strip() + "\n"
+
+
+# A "/" after one of these starts a regular expression rather than dividing
+_REGEX_AFTER = set("(,=:[!&|?{};+-*%<>~^")
+_REGEX_KEYWORDS = {"return", "typeof", "case", "do", "else", "in", "of", "void", "throw", "delete", "new"}
+# Spaces next to these can go, unless that would fuse two operators
+# ("a + +b") or start a comment
+_JS_PUNCTUATION = set("{}()[];,:=<>!&|?*%^~+-/")
+_JS_FUSED = {"++", "--", "//", "/*", "*/"}
+# Line breaks after or before these never end a statement
+_JS_JOIN_AFTER = set("{([,;")
+_JS_JOIN_BEFORE = set("})]")
+
+
+def _scan_quoted(text, i, quote):
+    """Index just past the string or regex starting at ``text[i]``"""
+    in_class = False
+    i += 1
+    while i < len(text):
+        c = text[i]
+        if c == "\\":
+            i += 2
+            continue
+        if quote == "/":
+            if c == "[":
+                in_class = True
+            elif c == "]":
+                in_class = False
+            elif c == "/" and not in_class:
+                return i + 1
+        elif c == quote:
+            return i + 1
+        i += 1
+    return i
+
+
+def _scan_template(text, i):
+    """Index just past a template literal chunk and whether it opened ``${``"""
+    while i < len(text):
+        c = text[i]
+        if c == "\\":
+            i += 2
+        elif c == "`":
+            return i + 1, False
+        elif c == "$" and text[i + 1:i + 2] == "{":
+            return i + 2, True
+        else:
+            i += 1
+    return i, False
+
+
+def minify_js(text):
+    """Drop comments, indentation and redundant whitespace from a script
+
+    Line breaks are kept wherever automatic semicolon insertion could
+    depend on them, so no parsing is needed to stay correct.
+    """
+    out = []
+    i, n = 0, len(text)
+    # Brace depth inside each open template substitution
+    templates = []
+    pending = ""
+
+    def last_significant():
+        return out[-1][-1] if out else ""
+
+    def emit(token):
+        nonlocal pending
+        if pending:
+            before, after = last_significant(), token[0]
+            if "\n" in pending and before not in _JS_JOIN_AFTER and after not in _JS_JOIN_BEFORE and before:
+                out.append("\n")
+            elif not before:
+                pass
+            elif (before in _JS_PUNCTUATION or after in _JS_PUNCTUATION) and before + after not in _JS_FUSED:
+                pass
+            else:
+                out.append(" ")
+            pending = ""
+        out.append(token)
+
+    while i < n:
+        c = text[i]
+        if c in " \t\r\n":
+            j = i
+            while j < n and text[j] in " \t\r\n":
+                j += 1
+            pending += "\n" if "\n" in text[i:j] else " "
+            i = j
+        elif c == "/" and text[i + 1:i + 2] == "/":
+            while i < n and text[i] != "\n":
+                i += 1
+        elif c == "/" and text[i + 1:i + 2] == "*":
+            end = text.find("*/", i + 2)
+            end = n if end < 0 else end + 2
+            pending += "\n" if "\n" in text[i:end] else " "
+            i = end
+        elif c in "'\"":
+            j = _scan_quoted(text, i, c)
+            emit(text[i:j])
+            i = j
+        elif c == "/":
+            word = re.search(r"(\w+)$", "".join(out[-3:]))
+            before = last_significant()
+            if not before or before in _REGEX_AFTER or (word and word.group(1) in _REGEX_KEYWORDS):
+                j = _scan_quoted(text, i, "/")
+                while j < n and (text[j].isalnum() or text[j] == "_"):
+                    j += 1
+            else:
+                j = i + 1
+            emit(text[i:j])
+            i = j
+        elif c == "`" or (c == "}" and templates and templates[-1] == 0):
+            if c == "}":
+                templates.pop()
+            j, opened = _scan_template(text, i + 1)
+            if opened:
+                templates.append(0)
+            emit(text[i:j])
+            i = j
+        else:
+            if templates and c == "{":
+                templates[-1] += 1
+            elif templates and c == "}":
+                templates[-1] -= 1
+            j = i + 1
+            if c.isalnum() or c in "_$":
+                while j < n and (text[j].isalnum() or text[j] in "_$"):
+                    j += 1
+            emit(text[i:j])
+            i = j
+    return "".join(out) + "\n"
+
+
+MINIFIERS = {".css": minify_css, ".js": minify_js}
+
+
+def build_dir():
+    return settings.ASSET_BUILD_DIR
+
+
+def manifest_path():
+    return os.path.join(build_dir(), "manifest.json")
+
+
+def hashed_name(name, content):
+    base, ext = os.path.splitext(name)
+    return f"{base}.{hashlib.sha256(content).hexdigest()[:HASH_LENGTH]}{ext}"
+
+
+def bundle(name):
+    """The minified content of bundle ``name``"""
+    minify = MINIFIERS[os.path.splitext(name)[1]]
+    sources = []
+    for path in BUNDLES[name]:
+        with open(os.path.join(SOURCE_DIR, path), encoding="utf-8") as f:
+            sources.append(f.read())
+    return minify("\n".join(sources)).encode("utf-8")
+
+
+def _write(path, data):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        # mkstemp creates files readable by the owner only
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def variants(data):
+    """Precompressed encodings of ``data`` worth keeping, as {suffix: bytes}"""
+    compressed = {".gz": gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        compressed[".br"] = brotli.compress(data, quality=11)
+    return {suffix: body for suffix, body in compressed.items() if len(body) < len(data)}
+
+
+def build():
+    """Write every bundle and its variants, then the manifest
+
+    Files from the previous build stay, so pages rendered just before a
+    deploy still load; older ones are removed. Returns the manifest.
+    """
+    os.makedirs(build_dir(), exist_ok=True)
+    previous = read_manifest() or {"files": {}}
+    files, sizes = {}, {}
+    for name in BUNDLES:
+        data = bundle(name)
+        built = files[name] = hashed_name(name, data)
+        path = os.path.join(build_dir(), built)
+        sizes[built] = {"": len(data)}
+        if not os.path.exists(path):
+            for suffix, body in variants(data).items():
+                _write(path + suffix, body)
+            _write(path, data)
+        for _, suffix in ENCODINGS:
+            if os.path.exists(path + suffix):
+                sizes[built][suffix] = os.path.getsize(path + suffix)
+
+    manifest = {"files": files, "sizes": sizes}
+    _write(manifest_path(), json.dumps(manifest, indent=2).encode("utf-8"))
+
+    keep = set(files.values()) | set(previous["files"].values())
+    for entry in os.listdir(build_dir()):
+        stem = entry
+        for _, suffix in ENCODINGS:
+            stem = stem.removesuffix(suffix)
+        if entry != "manifest.json" and stem not in keep and not entry.startswith("."):
+            os.unlink(os.path.join(build_dir(), entry))
+    return manifest
+
+
+def read_manifest():
+    try:
+        with open(manifest_path(), encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def _sources_changed(since):
+    return any(
+        os.path.getmtime(os.path.join(SOURCE_DIR, path)) > since
+        for paths in BUNDLES.values()
+        for path in paths
+    )
+
+
+_loaded = {"key": None, "manifest": None}
+_lock = threading.Lock()
+
+
+def current_manifest():
+    """The manifest, building the assets first if there is none yet"""
+    with _lock:
+        path = manifest_path()
+        try:
+            mtime = os.path.getmtime(path)
+        except FileNotFoundError:
+            mtime = None
+        if mtime is None or (settings.DEBUG and _sources_changed(mtime)):
+            manifest = build()
+            _loaded.update(key=(path, os.path.getmtime(path)), manifest=manifest)
+        elif _loaded["key"] != (path, mtime):
+            _loaded.update(key=(path, mtime), manifest=read_manifest())
+        return _loaded["manifest"]
+
+
+def asset_url(name):
+    try:
+        return ASSET_URL + current_manifest()["files"][name]
+    except KeyError:
+        raise ValueError(f"Unknown asset '{name}' (expected one of {', '.join(BUNDLES)})") from None
+
+
+def _accepted(request):
+    accepted = set()
+    for part in request.headers.get("Accept-Encoding", "").split(","):
+        coding, _, params = part.strip().partition(";")
+        if params.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            accepted.add(coding.strip().lower())
+    return accepted
+
+
+def serve(request, name):
+    """Response for built file ``name``, precompressed when the client allows"""
+    if request.method not in ("GET", "HEAD"):
+        return HttpResponseNotAllowed(["GET", "HEAD"])
+    # Only hashed bundle files are served; not the manifest, not subpaths
+    if not re.fullmatch(r"[\w-]+\.[0-9a-f]{%d}\.(css|js)" % HASH_LENGTH, name):
+        return HttpResponseNotFound()
+    path = os.path.join(build_dir(), name)
+    if not os.path.exists(path):
+        return HttpResponseNotFound()
+
+    etag = f'"{name.rsplit(".", 2)[1]}"'
+    if etag in request.headers.get("If-None-Match", ""):
+        response = HttpResponse(status=304)
+    else:
+        accepted = _accepted(request)
+        encoding, suffix = next(
+            ((coding, suffix) for coding, suffix in ENCODINGS
+             if coding in accepted and os.path.exists(path + suffix)),
+            (None, ""),
+        )
+        content_type, _ = mimetypes.guess_type(name)
+        response = FileResponse(open(path + suffix, "rb"), content_type=f"{content_type}; charset=utf-8")
+        if encoding:
+            response["Content-Encoding"] = encoding
+    response["ETag"] = etag
+    response["Cache-Control"] = CACHE_CONTROL
+    response["Vary"] = "Accept-Encoding"
+    return response
+
+
+class AssetMiddleware:
+    """Serves built assets under ASSET_URL before the rest of the stack runs"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if request.path.startswith(ASSET_URL):
+            return serve(request, request.path[len(ASSET_URL):])
+        return self.get_response(request)
@@ -0,0 +1,98 @@
+"""Content-addressed store for large message bodies
+
+A body is written once under the SHA-256 of its UTF-8 bytes
+(``<root>/ab/cd/abcd…``), so repeated tool output is stored a single time.
+Messages keep only the hash, the size and a short preview; the full text is
+read from here when it is asked for. Unreferenced blobs are removed by the
+``prune_message_blobs`` command.
+"""
+
+import hashlib
+import os
+import tempfile
+import time
+
+from django.conf import settings
+
+from .uploads import is_sha256
+
+# Bodies longer than this many characters are moved out of the message row
+MESSAGE_BLOB_THRESHOLD = int(os.getenv("MESSAGE_BLOB_THRESHOLD", str(32 * 1024)))
+# Characters of an offloaded body kept in the row (and sent to the model)
+MESSAGE_PREVIEW_CHARS = int(os.getenv("MESSAGE_PREVIEW_CHARS", "2000"))
+# Blobs younger than this are never pruned: the message row referencing a
+# freshly written blob may not be committed yet
+BLOB_PRUNE_GRACE = 3600
+
+
+class BlobStore:
+    def __init__(self, root):
+        self.root = root
+
+    def path(self, digest):
+        if not is_sha256(digest):
+            raise ValueError(f"invalid blob digest '{digest}'")
+        return os.path.join(self.root, digest[:2], digest[2:4], digest)
+
+    def put(self, text):
+        """Store ``text``; returns ``(sha256, size in bytes)``"""
+        data = text.encode("utf-8")
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.path(digest)
+        if os.path.exists(path):
+            # Refresh the mtime so a concurrent prune keeps it
+            os.utime(path)
+            return digest, len(data)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        return digest, len(data)
+
+    def get(self, digest):
+        with open(self.path(digest), "rb") as f:
+            return f.read().decode("utf-8")
+
+    def open(self, digest):
+        return open(self.path(digest), "rb")
+
+    def digests(self):
+        """(digest, mtime) of every stored blob"""
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            for name in filenames:
+                if is_sha256(name):
+                    yield name, os.stat(os.path.join(dirpath, name)).st_mtime
+
+    def prune(self, referenced, grace=BLOB_PRUNE_GRACE):
+        """Delete blobs not in ``referenced`` and older than ``grace`` seconds; returns (count, bytes)"""
+        cutoff = time.time() - grace
+        removed = freed = 0
+        for digest, mtime in list(self.digests()):
+            if digest in referenced or mtime > cutoff:
+                continue
+            path = self.path(digest)
+            try:
+                size = os.path.getsize(path)
+                os.unlink(path)
+            except FileNotFoundError:
+                continue
+            removed += 1
+            freed += size
+        return removed, freed
+
+
+def get_blob_store():
+    return BlobStore(settings.MESSAGE_BLOB_DIR)
+
+
+def preview(text, size):
+    """The part of an offloaded body kept in the row, with a note saying it is cut"""
+    return (
+        text[:MESSAGE_PREVIEW_CHARS].rstrip()
+        + f"\n\n[Output truncated: showing {MESSAGE_PREVIEW_CHARS} of {len(text)} characters ({size} bytes)]"
+    )
@@ -0,0 +1,137 @@
+"""Operations on many conversations at once
+
+Conversations are picked by explicit ids or by a filter (``select_ids``).
+Deletes bypass the ORM cascade, which would load and signal every message:
+messages go in raw ``DELETE`` batches of at most BULK_DELETE_ROWS rows, each
+its own transaction, with a BULK_DELETE_PAUSE pause after each, so no
+single statement holds the database write lock for long and other requests
+get to write in between. (SQLite's busy handler sleeps while it waits, so
+without the pause a waiting writer would rarely catch the lock free.)
+"""
+
+import os
+import time
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import Conversation
+
+# Messages deleted per transaction
+BULK_DELETE_ROWS = int(os.getenv("BULK_DELETE_ROWS", "2000"))
+# Seconds between those transactions
+BULK_DELETE_PAUSE = float(os.getenv("BULK_DELETE_PAUSE", "0.05"))
+# Conversations handled per statement
+BULK_CHUNK_SIZE = 500
+
+FILTERS = ("older_than_days", "title", "title_contains", "archived")
+
+
+def _chunks(ids, size=BULK_CHUNK_SIZE):
+    for start in range(0, len(ids), size):
+        yield ids[start:start + size]
+
+
+def _placeholders(values):
+    return ", ".join(["%s"] * len(values))
+
+
+def select_ids(ids=None, filters=None):
+    """Ids of existing conversations among ``ids`` and/or matching ``filters``
+
+    ``filters`` may hold ``older_than_days`` (not updated for that many
+    days), ``title`` (exact), ``title_contains`` (case-insensitive) and
+    ``archived`` (true or false). Raises ValueError for a bad selection.
+    """
+    if ids is None and not filters:
+        raise ValueError("Give 'ids' or a non-empty 'filter'")
+    conversations = Conversation.objects.all()
+    for key, value in (filters or {}).items():
+        if key == "older_than_days":
+            if not isinstance(value, (int, float)) or isinstance(value, bool) or value < 0:
+                raise ValueError("older_than_days must be a non-negative number")
+            conversations = conversations.filter(updated_at__lt=timezone.now() - timedelta(days=value))
+        elif key in ("title", "title_contains"):
+            if not isinstance(value, str):
+                raise ValueError(f"{key} must be a string")
+            lookup = "title" if key == "title" else "title__icontains"
+            conversations = conversations.filter(**{lookup: value})
+        elif key == "archived":
+            if not isinstance(value, bool):
+                raise ValueError("archived must be true or false")
+            conversations = conversations.exclude(archive_file="") if value else conversations.filter(archive_file="")
+        else:
+            raise ValueError(f"Unknown filter '{key}' (expected one of {', '.join(FILTERS)})")
+
+    if ids is None:
+        return list(conversations.order_by("id").values_list("id", flat=True))
+    if not isinstance(ids, list) or not all(isinstance(i, int) and not isinstance(i, bool) for i in ids):
+        raise ValueError("ids must be a list of integers")
+    selected = []
+    for chunk in _chunks(sorted(set(ids))):
+        selected += conversations.filter(id__in=chunk).order_by("id").values_list("id", flat=True)
+    return selected
+
+
+def delete_conversations(ids, batch_rows=None, pause=None):
+    """Delete conversations and their messages in bounded transactions
+
+    Returns ``{"conversations": n, "messages": n}``.
+    """
+    batch_rows = batch_rows or BULK_DELETE_ROWS
+    pause = BULK_DELETE_PAUSE if pause is None else pause
+    counts = {"conversations": 0, "messages": 0}
+    for chunk in _chunks(list(ids)):
+        marks = _placeholders(chunk)
+        while True:
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute(
+                    f"DELETE FROM chat_message WHERE id IN (SELECT id FROM chat_message "
+                    f"WHERE conversation_id IN ({marks}) LIMIT %s)",
+                    [*chunk, batch_rows],
+                )
+                deleted = cursor.rowcount
+            counts["messages"] += deleted
+            if deleted < batch_rows:
+                break
+            time.sleep(pause)
+        with transaction.atomic(), connection.cursor() as cursor:
+            # Catch messages added since the batches above, then the rows
+            cursor.execute(f"DELETE FROM chat_message WHERE conversation_id IN ({marks})", chunk)
+            counts["messages"] += cursor.rowcount
+            cursor.execute(f"DELETE FROM chat_conversation WHERE id IN ({marks})", chunk)
+            counts["conversations"] += cursor.rowcount
+    return counts
+
+
+def rename_conversations(ids, title):
+    """Give every conversation in ``ids`` the same title; returns how many changed"""
+    title = _clean_title(title)
+    renamed = 0
+    for chunk in _chunks(list(ids)):
+        with transaction.atomic():
+            renamed += Conversation.objects.filter(id__in=chunk).update(title=title, updated_at=timezone.now())
+    return renamed
+
+
+def rename_each(titles):
+    """Rename conversations from a ``{id: title}`` mapping; returns how many changed"""
+    titles = {int(conversation_id): _clean_title(title) for conversation_id, title in titles.items()}
+    renamed = 0
+    now = timezone.now()
+    for chunk in _chunks(sorted(titles)):
+        with transaction.atomic():
+            conversations = list(Conversation.objects.filter(id__in=chunk))
+            for conversation in conversations:
+                conversation.title = titles[conversation.id]
+                conversation.updated_at = now
+            Conversation.objects.bulk_update(conversations, ["title", "updated_at"])
+        renamed += len(conversations)
+    return renamed
+
+
+def _clean_title(title):
+    if not isinstance(title, str) or not title.strip():
+        raise ValueError("Title cannot be empty")
+    return title.strip()[:200]
@@ -0,0 +1,382 @@
+"""Per-conversation workspace checkpoints built from before-images
+
+Used directly by the local backend and uploaded as-is into Daytona sandboxes,
+so it must only use the standard library.
+
+    python checkpoints.py <conversation_id> save <label> <path>...
+    python checkpoints.py <conversation_id> drop <checkpoint_id>
+    python checkpoints.py <conversation_id> list
+    python checkpoints.py <conversation_id> restore <checkpoint_id>
+    python checkpoints.py <conversation_id> diff <from_id> [<to_id>]
+
+Paths are relative to the current directory (the workspace). A checkpoint
+holds the files a tool call is about to change, as they were before it ran:
+a reflink where possible, a hard link when the tool is known to replace
+the file rather than rewrite it in place (so the old inode is left
+untouched), and a copy otherwise. Taking one costs time proportional to the files changed, not
+the size of the workspace.
+
+The state of a file at checkpoint N is its image in the oldest checkpoint
+>= N that recorded it, or the live file if none did.
+"""
+
+import difflib
+import errno
+import fcntl
+import json
+import os
+import shutil
+import stat
+import sys
+import tempfile
+import time
+
+CHECKPOINT_DIR = ".prime/checkpoints"
+# Checkpoints kept per conversation; older ones are pruned
+CHECKPOINT_LIMIT = int(os.getenv("CHECKPOINT_LIMIT", "50"))
+DIFF_OUTPUT_LIMIT = 64 * 1024
+# Larger files are reported as changed without a line diff
+DIFF_FILE_LIMIT = 1024 * 1024
+
+FICLONE = 0x40049409  # Linux ioctl: share extents copy-on-write (btrfs, xfs)
+
+
+class CheckpointError(Exception):
+    """The checkpoint does not exist or cannot be used"""
+
+
+def _clone_file(src, dst, allow_link=True, src_dir_fd=None):
+    """Copy ``src`` to ``dst`` as cheaply as the filesystem allows
+
+    ``src`` is taken relative to ``src_dir_fd`` if given, and is opened
+    without following a final symlink (ELOOP). Returns False, creating
+    nothing, if it is not a regular file.
+    """
+    fd = os.open(src, os.O_RDONLY | os.O_NOFOLLOW | os.O_NONBLOCK, dir_fd=src_dir_fd)
+    with os.fdopen(fd, "rb") as fsrc:
+        st = os.fstat(fd)
+        if not stat.S_ISREG(st.st_mode):
+            return False
+        try:
+            with open(dst, "wb") as fdst:
+                fcntl.ioctl(fdst.fileno(), FICLONE, fd)
+            _copy_times(st, dst)
+            return True
+        except OSError:
+            if os.path.exists(dst):
+                os.unlink(dst)
+        if allow_link:
+            try:
+                os.link(src, dst, src_dir_fd=src_dir_fd, follow_symlinks=False)
+                linked = os.stat(dst, follow_symlinks=False)
+                if (linked.st_dev, linked.st_ino) == (st.st_dev, st.st_ino):
+                    return True
+                # Something else was put in its place after it was opened
+                os.unlink(dst)
+            except OSError:
+                pass
+        with open(dst, "wb") as fdst:
+            shutil.copyfileobj(fsrc, fdst)
+        _copy_times(st, dst)
+        return True
+
+
+def _copy_times(st, dst):
+    os.chmod(dst, st.st_mode & 0o7777)
+    os.utime(dst, ns=(st.st_atime_ns, st.st_mtime_ns))
+
+
+class CheckpointStore:
+    """Checkpoints of one conversation, under .prime/checkpoints in ``root``
+
+    ``allow_link`` is False where the backend may rewrite files in place,
+    so images must not share an inode with the live file.
+    """
+
+    def __init__(self, root, conversation_id, limit=CHECKPOINT_LIMIT, allow_link=True):
+        self.root = os.path.realpath(root)
+        self.directory = os.path.join(
+            self.root, CHECKPOINT_DIR, f"conversation-{int(conversation_id)}"
+        )
+        self.limit = limit
+        self.allow_link = allow_link
+
+    def _ids(self):
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        return sorted(int(name) for name in names if name.isdigit())
+
+    def _inside(self, rel_path):
+        real = os.path.realpath(os.path.join(self.root, rel_path))
+        return real.startswith(self.root + os.sep)
+
+    def _at(self, rel_path, action):
+        """Default for ``save``'s ``at``: resolve the path with realpath"""
+        real = os.path.realpath(os.path.join(self.root, rel_path))
+        if not real.startswith(self.root + os.sep):
+            raise PermissionError(errno.EACCES, "Path leads outside the workspace")
+        return action(None, real), os.path.relpath(real, self.root)
+
+    def manifest(self, checkpoint_id):
+        path = os.path.join(self.directory, str(checkpoint_id), "manifest.json")
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            raise CheckpointError(f"checkpoint #{checkpoint_id} does not exist")
+
+    def save(self, label, paths, prune=True, at=None):
+        """Record the current state of ``paths``; returns the checkpoint id
+
+        ``at(rel_path, action)`` runs ``action(dir_fd, name)`` on the file
+        and returns (result, resolved rel path), raising PermissionError
+        for one outside the root; the default resolves paths with realpath.
+        Files are recorded under their resolved paths.
+        """
+        at = at or self._at
+        os.makedirs(self.directory, exist_ok=True)
+        staging = tempfile.mkdtemp(prefix=".new-", dir=self.directory)
+        try:
+            files = {}
+            pending = os.path.join(staging, "pending")
+
+            def capture(dir_fd, name):
+                try:
+                    return "file" if _clone_file(name, pending, self.allow_link, dir_fd) else None
+                except FileNotFoundError:
+                    return "absent"
+
+            for rel_path in dict.fromkeys(os.path.normpath(p) for p in paths):
+                if rel_path.startswith(".."):
+                    continue
+                try:
+                    kind, rel_path = at(rel_path, capture)
+                except (FileNotFoundError, NotADirectoryError):
+                    kind = "absent"
+                except PermissionError:
+                    continue
+                if kind == "file":
+                    image = os.path.join(staging, "files", rel_path)
+                    os.makedirs(os.path.dirname(image), exist_ok=True)
+                    os.rename(pending, image)
+                if kind:
+                    files[rel_path] = kind
+            manifest = {"label": label, "created": time.time(), "files": files}
+            with open(os.path.join(staging, "manifest.json"), "w", encoding="utf-8") as f:
+                json.dump(manifest, f)
+
+            # Publish under the next free id; a concurrent save takes the other
+            while True:
+                ids = self._ids()
+                checkpoint_id = ids[-1] + 1 if ids else 1
+                try:
+                    os.rename(staging, os.path.join(self.directory, str(checkpoint_id)))
+                    break
+                except OSError:
+                    if not os.path.isdir(os.path.join(self.directory, str(checkpoint_id))):
+                        raise
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        if prune:
+            self._prune()
+        return checkpoint_id
+
+    def drop(self, checkpoint_id):
+        """Forget a checkpoint whose tool call turned out to change nothing"""
+        shutil.rmtree(os.path.join(self.directory, str(checkpoint_id)), ignore_errors=True)
+
+    def _prune(self):
+        for checkpoint_id in self._ids()[: -self.limit]:
+            self.drop(checkpoint_id)
+
+    def _state(self, rel_path, checkpoint_id, manifests):
+        """("file", image) / ("absent", None) at a checkpoint, or None for the live file"""
+        for number, manifest in manifests:
+            if number >= checkpoint_id and rel_path in manifest["files"]:
+                if manifest["files"][rel_path] == "absent":
+                    return "absent", None
+                return "file", os.path.join(self.directory, str(number), "files", rel_path)
+        return None
+
+    def _changed_since(self, from_id, to_id=None):
+        """(manifests from ``from_id`` on, paths recorded between the two checkpoints)"""
+        ids = self._ids()
+        if from_id not in ids:
+            raise CheckpointError(f"checkpoint #{from_id} does not exist")
+        if to_id is not None and to_id not in ids:
+            raise CheckpointError(f"checkpoint #{to_id} does not exist")
+        if to_id is not None and to_id <= from_id:
+            raise CheckpointError(f"checkpoint #{to_id} is not newer than #{from_id}")
+        manifests = [(number, self.manifest(number)) for number in ids if number >= from_id]
+        paths = {}
+        for number, manifest in manifests:
+            if to_id is None or number < to_id:
+                paths.update(dict.fromkeys(manifest["files"]))
+        return manifests, sorted(paths)
+
+    def restore(self, checkpoint_id):
+        """Return every file changed since ``checkpoint_id`` to its state then
+
+        The current state is checkpointed first, so a restore can itself be
+        undone. Returns (undo checkpoint id, [(path, "restored"|"removed")]).
+        """
+        manifests, paths = self._changed_since(checkpoint_id)
+        # Pruned only afterwards: the images being restored must stay put
+        undo_id = self.save(f"before restoring checkpoint #{checkpoint_id}", paths, prune=False)
+        changes = []
+        for rel_path in paths:
+            if not self._inside(rel_path):
+                continue
+            kind, image = self._state(rel_path, checkpoint_id, manifests)
+            full_path = os.path.join(self.root, rel_path)
+            if kind == "absent":
+                if os.path.isfile(full_path) or os.path.islink(full_path):
+                    os.unlink(full_path)
+                    changes.append((rel_path, "removed"))
+                continue
+            # Copied, not linked, so later in-place writes cannot alter the image
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(prefix=".restore-", dir=os.path.dirname(full_path))
+            os.close(fd)
+            try:
+                _clone_file(image, temp_path, allow_link=False)
+                os.replace(temp_path, full_path)
+            except BaseException:
+                if os.path.exists(temp_path):
+                    os.unlink(temp_path)
+                raise
+            changes.append((rel_path, "restored"))
+        self._prune()
+        return undo_id, changes
+
+    def diff(self, from_id, to_id=None):
+        """Unified diff of the files changed between two checkpoints (or since one)"""
+        manifests, paths = self._changed_since(from_id, to_id)
+        new_label = "current" if to_id is None else f"checkpoint #{to_id}"
+        parts = []
+        for rel_path in paths:
+            old = self._state(rel_path, from_id, manifests)
+            new = self._state(rel_path, to_id, manifests) if to_id is not None else None
+            if new is None:
+                full_path = os.path.join(self.root, rel_path)
+                new = ("file", full_path) if os.path.isfile(full_path) else ("absent", None)
+            parts.append(
+                _diff_file(rel_path, old, new, f"checkpoint #{from_id}", new_label)
+            )
+        return [part for part in parts if part]
+
+    def list(self):
+        return [(number, self.manifest(number)) for number in reversed(self._ids())]
+
+
+def _read_lines(state):
+    kind, path = state
+    if kind == "absent":
+        return []
+    with open(path, "rb") as f:
+        data = f.read(DIFF_FILE_LIMIT + 1)
+    if len(data) > DIFF_FILE_LIMIT or b"\0" in data:
+        return None
+    return data.decode("utf-8", errors="replace").splitlines(keepends=True)
+
+
+def _diff_file(rel_path, old, new, old_label, new_label):
+    if old[0] == "absent" and new[0] == "absent":
+        return ""
+    old_lines, new_lines = _read_lines(old), _read_lines(new)
+    if old_lines is None or new_lines is None:
+        if old[0] == new[0] == "file" and _same_content(old[1], new[1]):
+            return ""
+        return f"Binary or large file {rel_path} differs\n"
+    lines = difflib.unified_diff(
+        old_lines,
+        new_lines,
+        f"a/{rel_path} ({old_label})" if old[0] == "file" else "/dev/null",
+        f"b/{rel_path} ({new_label})" if new[0] == "file" else "/dev/null",
+    )
+    return "".join(
+        line if line.endswith("\n") else line + "\n\\ No newline at end of file\n"
+        for line in lines
+    )
+
+
+def _same_content(a, b):
+    with open(a, "rb") as fa, open(b, "rb") as fb:
+        while True:
+            block_a, block_b = fa.read(65536), fb.read(65536)
+            if block_a != block_b:
+                return False
+            if not block_a:
+                return True
+
+
+def format_checkpoint_list(checkpoints):
+    if not checkpoints:
+        return "No checkpoints for this conversation yet (one is taken before each file change)."
+    lines = ["Checkpoints for this conversation (newest first):", ""]
+    for number, manifest in checkpoints:
+        created = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(manifest["created"]))
+        count = len(manifest["files"])
+        lines.append(
+            f"#{number}  {created}  {manifest['label']}  ({count} file{'s' if count != 1 else ''})"
+        )
+    return "\n".join(lines)
+
+
+def format_restore_result(checkpoint_id, undo_id, changes):
+    if not changes:
+        return f"Nothing to restore: no files changed since checkpoint #{checkpoint_id}"
+    lines = [f"Restored the workspace to checkpoint #{checkpoint_id}:"]
+    lines.extend(f"  {action} {path}" for path, action in changes)
+    lines.append(f"(The state before the restore was saved as checkpoint #{undo_id}.)")
+    return "\n".join(lines)
+
+
+def format_diff_result(from_id, to_id, parts):
+    target = "the current workspace" if to_id is None else f"checkpoint #{to_id}"
+    if not parts:
+        return f"No differences between checkpoint #{from_id} and {target}"
+    text = "".join(parts)
+    result = f"Changes from checkpoint #{from_id} to {target}:\n\n"
+    if len(text) > DIFF_OUTPUT_LIMIT:
+        return result + text[:DIFF_OUTPUT_LIMIT] + "\n[Truncated: diff is too long; compare fewer checkpoints]"
+    return result + text
+
+
+def run(root, conversation_id, command, args):
+    """Run a checkpoint command; returns (output text, exit status)"""
+    store = CheckpointStore(root, conversation_id, allow_link=False)
+    try:
+        if command == "save":
+            return json.dumps({"id": store.save(args[0], args[1:])}), 0
+        if command == "drop":
+            store.drop(int(args[0]))
+            return "", 0
+        if command == "list":
+            return format_checkpoint_list(store.list()), 0
+        if command == "restore":
+            undo_id, changes = store.restore(int(args[0]))
+            return format_restore_result(int(args[0]), undo_id, changes), 0
+        if command == "diff":
+            from_id = int(args[0])
+            to_id = int(args[1]) if len(args) > 1 else None
+            return format_diff_result(from_id, to_id, store.diff(from_id, to_id)), 0
+    except CheckpointError as e:
+        return f"Error: {e}", 1
+    except (OSError, ValueError) as e:
+        return f"Error: checkpoint {command} failed: {e}", 1
+    return f"Error: unknown checkpoint command '{command}'", 1
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    output, status = run(".", argv[0], argv[1], argv[2:])
+    print(output)
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
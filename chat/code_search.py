@@ -0,0 +1,398 @@
+import fnmatch
+import os
+import re
+import threading
+import time
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+
+SEARCH_RESULT_LIMIT = 50
+# Larger files are neither indexed nor scanned
+MAX_SEARCH_FILE_BYTES = 512 * 1024
+# In-place edits do not touch directory mtimes, so file mtimes are re-checked
+# at most this often (seconds)
+FULL_CHECK_INTERVAL = int(os.getenv("SEARCH_FULL_CHECK_INTERVAL", "60"))
+SCAN_WORKERS = 8
+SCAN_BATCH = 256
+MAX_LINE_CHARS = 200
+SKIP_DIRS = {
+    ".git",
+    ".hg",
+    ".svn",
+    ".prime",
+    ".venv",
+    "venv",
+    "node_modules",
+    "__pycache__",
+    ".mypy_cache",
+    ".pytest_cache",
+}
+
+_SEARCH_OPTION_RE = re.compile(r"\s+(glob|limit):(\S+)\s*$", re.IGNORECASE)
+
+
+def parse_search_args(arg_text):
+    """Split 'search files:' arguments into (query, options)
+
+    Supported trailing options:
+      glob:*.py   only search paths matching the pattern
+      limit:N     return at most N matching lines
+    Returns (None, error) for a malformed option or an empty query.
+    """
+    text = arg_text.strip()
+    options = {}
+    while True:
+        match = _SEARCH_OPTION_RE.search(text)
+        if not match:
+            break
+        key, value = match.group(1).lower(), match.group(2)
+        text = text[: match.start()].rstrip()
+        if key == "limit":
+            try:
+                options["limit"] = int(value)
+            except ValueError:
+                return None, f"Error: Invalid limit value '{value}'"
+            if options["limit"] < 1:
+                return None, f"Error: Invalid limit '{value}'"
+        else:
+            options["glob"] = value
+    if not text:
+        return None, "Error: Search query cannot be empty"
+    return text, options
+
+
+def trigrams(text):
+    return {text[i : i + 3] for i in range(len(text) - 2)}
+
+
+def path_matches(rel_path, glob):
+    # A pattern without a slash matches file names anywhere in the tree
+    if glob is None:
+        return True
+    if "/" in glob:
+        return fnmatch.fnmatch(rel_path, glob)
+    return fnmatch.fnmatch(os.path.basename(rel_path), glob)
+
+
+def _read_text(full_path):
+    """Decoded file text, or None for binary or oversized files"""
+    try:
+        with open(full_path, "rb") as f:
+            data = f.read(MAX_SEARCH_FILE_BYTES + 1)
+    except OSError:
+        return None
+    if len(data) > MAX_SEARCH_FILE_BYTES or b"\0" in data[:8192]:
+        return None
+    return data.decode("utf-8", errors="replace")
+
+
+def match_lines(text, needle, limit):
+    """(line number, line) pairs containing ``needle`` (already lowercased)"""
+    lowered = text.lower()
+    if len(lowered) != len(text):
+        # Case folding changed offsets; report the folded lines instead
+        text = lowered
+    matches = []
+    line_no = 1
+    counted_to = 0
+    pos = lowered.find(needle)
+    while pos != -1 and len(matches) < limit:
+        line_no += lowered.count("\n", counted_to, pos)
+        counted_to = pos
+        start = lowered.rfind("\n", 0, pos) + 1
+        end = lowered.find("\n", pos)
+        if end == -1:
+            end = len(lowered)
+        matches.append((line_no, text[start:end].strip()[:MAX_LINE_CHARS]))
+        pos = lowered.find(needle, end)
+    return matches
+
+
+def _walk(root):
+    """Yield (relative dir, dir mtime_ns, [(name, mtime_ns, size)]) per directory
+
+    Symlinks are not followed, so nothing outside the tree is visited.
+    """
+    pending = [""]
+    while pending:
+        rel_dir = pending.pop()
+        full_dir = os.path.join(root, rel_dir)
+        files = []
+        try:
+            dir_mtime = os.stat(full_dir).st_mtime_ns
+            with os.scandir(full_dir) as scanner:
+                for entry in scanner:
+                    if entry.is_dir(follow_symlinks=False):
+                        if entry.name not in SKIP_DIRS:
+                            pending.append(os.path.join(rel_dir, entry.name))
+                    elif entry.is_file(follow_symlinks=False):
+                        st = entry.stat(follow_symlinks=False)
+                        files.append((entry.name, st.st_mtime_ns, st.st_size))
+        except OSError:
+            continue
+        yield rel_dir, dir_mtime, files
+
+
+def _scan_batch(root, rel_paths, needle, limit):
+    results = []
+    for rel_path in rel_paths:
+        text = _read_text(os.path.join(root, rel_path))
+        if text is None:
+            continue
+        for line_no, line in match_lines(text, needle, limit):
+            results.append((rel_path, line_no, line))
+    return results
+
+
+def scan_search(root, query, glob=None, limit=SEARCH_RESULT_LIMIT):
+    """Search by reading every file with a thread pool (no index needed)
+
+    Returns (matches, truncated) in path order.
+    """
+    needle = query.lower()
+    rel_paths = sorted(
+        os.path.join(rel_dir, name)
+        for rel_dir, _, files in _walk(root)
+        for name, _, size in files
+        if size <= MAX_SEARCH_FILE_BYTES and path_matches(os.path.join(rel_dir, name), glob)
+    )
+    batches = [rel_paths[i : i + SCAN_BATCH] for i in range(0, len(rel_paths), SCAN_BATCH)]
+    matches = []
+    with ThreadPoolExecutor(max_workers=SCAN_WORKERS) as pool:
+        futures = [pool.submit(_scan_batch, root, batch, needle, limit + 1) for batch in batches]
+        for future in futures:
+            matches.extend(future.result())
+            if len(matches) > limit:
+                for pending in futures:
+                    pending.cancel()
+                break
+    return matches[:limit], len(matches) > limit
+
+
+class TrigramIndex:
+    """Inverted trigram index over the text files of a directory tree
+
+    Each file gets an integer id; every lowercase trigram maps to a compact
+    array of the ids of files containing it. A query is narrowed to files
+    holding all of its rarest trigrams before any file is read.
+
+    The index is built once in a background thread (queries meanwhile fall
+    back to a parallel scan) and then kept current by update_file /
+    remove_file from the backend's writes, plus a lazy refresh before each
+    query that rescans only directories whose mtime changed.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self._lock = threading.RLock()
+        self._ids = {}  # relative path -> file id
+        self._paths = []  # file id -> relative path, None once removed
+        self._mtimes = {}  # relative path -> mtime_ns when indexed
+        self._postings = {}  # trigram -> array of file ids
+        self._dirs = {}  # relative dir -> (mtime_ns, set of file names)
+        self._dead = 0
+        self._pending = set()
+        self._building = False
+        self._last_full_check = 0.0
+        self.ready = False
+
+    def start_build(self):
+        """Build the index in the background unless done or in progress"""
+        with self._lock:
+            if self.ready or self._building:
+                return
+            self._building = True
+        threading.Thread(target=self._build, name="trigram-index", daemon=True).start()
+
+    def _build(self):
+        try:
+            for rel_dir, dir_mtime, files in _walk(self.root):
+                with self._lock:
+                    self._dirs[rel_dir] = (dir_mtime, {name for name, _, _ in files})
+                    for name, mtime, _ in files:
+                        self._index_file(os.path.join(rel_dir, name), mtime)
+            with self._lock:
+                # Writes that raced the build are applied now
+                for rel_path in self._pending:
+                    self._reindex(rel_path)
+                self._pending.clear()
+                self._last_full_check = time.monotonic()
+                self.ready = True
+        finally:
+            with self._lock:
+                self._building = False
+
+    def _index_file(self, rel_path, mtime):
+        self._drop(rel_path)
+        text = _read_text(os.path.join(self.root, rel_path))
+        if text is None:
+            return
+        file_id = len(self._paths)
+        self._paths.append(rel_path)
+        self._ids[rel_path] = file_id
+        self._mtimes[rel_path] = mtime
+        postings = self._postings
+        for gram in trigrams(text.lower()):
+            ids = postings.get(gram)
+            if ids is None:
+                postings[gram] = array("I", (file_id,))
+            else:
+                ids.append(file_id)
+
+    def _drop(self, rel_path):
+        file_id = self._ids.pop(rel_path, None)
+        self._mtimes.pop(rel_path, None)
+        if file_id is None:
+            return
+        self._paths[file_id] = None
+        self._dead += 1
+        if self._dead > 1024 and self._dead > len(self._ids):
+            self._compact()
+
+    def _compact(self):
+        """Purge removed file ids from the posting arrays"""
+        live = self._paths
+        for gram in list(self._postings):
+            ids = array("I", (i for i in self._postings[gram] if live[i] is not None))
+            if ids:
+                self._postings[gram] = ids
+            else:
+                del self._postings[gram]
+        self._dead = 0
+
+    def _reindex(self, rel_path):
+        try:
+            st = os.stat(os.path.join(self.root, rel_path))
+        except OSError:
+            self._drop(rel_path)
+            return
+        self._index_file(rel_path, st.st_mtime_ns)
+
+    def _relative(self, full_path):
+        return os.path.relpath(full_path, self.root)
+
+    def update_file(self, full_path):
+        """Re-index one file after it was written"""
+        rel_path = self._relative(full_path)
+        with self._lock:
+            if self.ready:
+                self._reindex(rel_path)
+            elif self._building:
+                self._pending.add(rel_path)
+
+    def remove_file(self, full_path):
+        """Drop one file after it was deleted"""
+        self.update_file(full_path)
+
+    def refresh(self):
+        """Pick up changes made outside the backend (e.g. by code runs)"""
+        with self._lock:
+            for rel_dir, (mtime, names) in list(self._dirs.items()):
+                if rel_dir not in self._dirs:
+                    continue  # removed along with a parent during this pass
+                try:
+                    current = os.stat(os.path.join(self.root, rel_dir)).st_mtime_ns
+                except OSError:
+                    self._forget_dir(rel_dir)
+                    continue
+                if current != mtime:
+                    self._rescan_dir(rel_dir, names)
+
+            if time.monotonic() - self._last_full_check > FULL_CHECK_INTERVAL:
+                for rel_path, mtime in list(self._mtimes.items()):
+                    try:
+                        current = os.stat(os.path.join(self.root, rel_path)).st_mtime_ns
+                    except OSError:
+                        current = None
+                    if current != mtime:
+                        self._reindex(rel_path)
+                self._last_full_check = time.monotonic()
+
+    def _forget_dir(self, rel_dir):
+        prefix = rel_dir + os.sep
+        for known in [d for d in self._dirs if d == rel_dir or d.startswith(prefix)]:
+            _, names = self._dirs.pop(known)
+            for name in names:
+                self._drop(os.path.join(known, name))
+
+    def _rescan_dir(self, rel_dir, old_names):
+        full_dir = os.path.join(self.root, rel_dir)
+        names = set()
+        try:
+            dir_mtime = os.stat(full_dir).st_mtime_ns
+            with os.scandir(full_dir) as scanner:
+                for entry in scanner:
+                    rel_path = os.path.join(rel_dir, entry.name)
+                    if entry.is_dir(follow_symlinks=False):
+                        if entry.name not in SKIP_DIRS and rel_path not in self._dirs:
+                            for sub_dir, sub_mtime, files in _walk(os.path.join(self.root, rel_path)):
+                                sub_rel = os.path.normpath(os.path.join(rel_path, sub_dir))
+                                self._dirs[sub_rel] = (sub_mtime, {n for n, _, _ in files})
+                                for name, mtime, _ in files:
+                                    self._index_file(os.path.join(sub_rel, name), mtime)
+                    elif entry.is_file(follow_symlinks=False):
+                        names.add(entry.name)
+                        mtime = entry.stat(follow_symlinks=False).st_mtime_ns
+                        if self._mtimes.get(rel_path) != mtime:
+                            self._index_file(rel_path, mtime)
+        except OSError:
+            self._forget_dir(rel_dir)
+            return
+        for name in old_names - names:
+            self._drop(os.path.join(rel_dir, name))
+        self._dirs[rel_dir] = (dir_mtime, names)
+
+    def candidates(self, needle):
+        """Paths of files that contain every trigram of ``needle``"""
+        with self._lock:
+            lists = []
+            for gram in trigrams(needle):
+                ids = self._postings.get(gram)
+                if ids is None:
+                    return []
+                lists.append(ids)
+            lists.sort(key=len)
+            # The rarest few trigrams narrow things enough; files are read anyway
+            found = set(lists[0])
+            for ids in lists[1:4]:
+                found.intersection_update(ids)
+            paths = self._paths
+            return sorted(paths[i] for i in found if paths[i] is not None)
+
+    def search(self, query, glob=None, limit=SEARCH_RESULT_LIMIT):
+        """Returns (matches, truncated), or None if the index cannot serve it
+
+        Queries shorter than a trigram, or made before the first build has
+        finished, return None so the caller can fall back to scan_search.
+        """
+        needle = query.lower()
+        if len(needle) < 3 or not self.ready:
+            self.start_build()
+            return None
+        self.refresh()
+
+        matches = []
+        for rel_path in self.candidates(needle):
+            if not path_matches(rel_path, glob):
+                continue
+            text = _read_text(os.path.join(self.root, rel_path))
+            if text is None:
+                continue
+            for line_no, line in match_lines(text, needle, limit + 1 - len(matches)):
+                matches.append((rel_path, line_no, line))
+            if len(matches) > limit:
+                break
+        return matches[:limit], len(matches) > limit
+
+
+def format_search_results(query, matches, truncated):
+    """Render (path, line number, line) matches as 'search files:' output"""
+    if not matches:
+        return f"No matches for '{query}'"
+    file_count = len({path for path, _, _ in matches})
+    lines = [f"{path}:{line_no}: {line}" for path, line_no, line in matches]
+    header = f"Search results for '{query}' ({len(matches)} matches in {file_count} files):"
+    result = header + "\n\n" + "\n".join(lines)
+    if truncated:
+        result += f"\n\n[Showing the first {len(matches)} matches; narrow the query or add glob:]"
+    return result
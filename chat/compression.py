@@ -0,0 +1,184 @@
+"""Transparent compression for message bodies
+
+``CompressedTextField`` stores values longer than ``COMPRESS_THRESHOLD``
+characters as a BLOB: a one-byte marker, the id of the preset dictionary
+used (0 for none) and a raw deflate stream. Shorter values stay plain TEXT,
+so rows written before compression existed still read back unchanged.
+
+Chat text is dominated by tool output and code that repeat the same lines
+across messages, which a single message is too short to exploit. A preset
+dictionary trained on the corpus (``train_compression_dictionary``) gives
+zlib those lines up front. Dictionaries are stored in
+``chat_compressiondictionary`` and never changed, so every row can always
+be decompressed.
+
+SQLite connections get a ``chat_decompress(value)`` function so triggers,
+views and the full-text index can read the plain text.
+"""
+
+import os
+import struct
+import threading
+import time
+import zlib
+from collections import Counter
+
+from django.db import connection, models
+
+# Values shorter than this are stored as plain text
+COMPRESS_THRESHOLD = int(os.getenv("MESSAGE_COMPRESS_THRESHOLD", "256"))
+COMPRESS_LEVEL = int(os.getenv("MESSAGE_COMPRESS_LEVEL", "6"))
+# zlib only looks back 32 KB, so a longer dictionary is never used
+DICTIONARY_SIZE = 32 * 1024
+# Seconds before another process's newly trained dictionary is picked up
+DICTIONARY_REFRESH = 300
+
+MARKER = b"\xc5"
+HEADER = struct.Struct(">cI")
+WBITS = -15  # raw deflate: no zlib header or checksum
+
+_dictionaries = {}
+_active = {"id": None, "checked": 0.0}
+_lock = threading.Lock()
+
+
+class CompressionError(ValueError):
+    pass
+
+
+def _fetch_dictionary(execute, dictionary_id):
+    row = execute("SELECT data FROM chat_compressiondictionary WHERE id = %s", [dictionary_id])
+    if row is None:
+        raise CompressionError(f"compression dictionary {dictionary_id} does not exist")
+    return bytes(row[0])
+
+
+def _django_execute(sql, params):
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchone()
+
+
+def get_dictionary(dictionary_id, execute=_django_execute):
+    data = _dictionaries.get(dictionary_id)
+    if data is None:
+        data = _dictionaries[dictionary_id] = _fetch_dictionary(execute, dictionary_id)
+    return data
+
+
+def active_dictionary():
+    """(id, data) of the newest dictionary, or (0, None) before one is trained"""
+    now = time.monotonic()
+    if _active["id"] is None or now - _active["checked"] > DICTIONARY_REFRESH:
+        with _lock:
+            try:
+                row = _django_execute("SELECT MAX(id) FROM chat_compressiondictionary", [])
+            except Exception:
+                # Table not migrated yet
+                row = None
+            _active["id"] = (row and row[0]) or 0
+            _active["checked"] = now
+    dictionary_id = _active["id"]
+    return dictionary_id, get_dictionary(dictionary_id) if dictionary_id else None
+
+
+def set_active_dictionary(dictionary_id, data):
+    with _lock:
+        _dictionaries[dictionary_id] = data
+        _active["id"] = dictionary_id
+        _active["checked"] = time.monotonic()
+
+
+def clear_dictionary_cache():
+    with _lock:
+        _dictionaries.clear()
+        _active["id"] = None
+
+
+def compress(text, dictionary_id=0, dictionary=None):
+    """Encoded value for ``text``; the plain string when compression doesn't pay"""
+    data = text.encode("utf-8")
+    if dictionary:
+        compressor = zlib.compressobj(COMPRESS_LEVEL, zlib.DEFLATED, WBITS, zdict=dictionary)
+    else:
+        compressor = zlib.compressobj(COMPRESS_LEVEL, zlib.DEFLATED, WBITS)
+        dictionary_id = 0
+    packed = HEADER.pack(MARKER, dictionary_id) + compressor.compress(data) + compressor.flush()
+    return packed if len(packed) < len(data) else text
+
+
+def decompress(value, execute=_django_execute):
+    """Plain text of a stored value; str values are returned as they are"""
+    if value is None or isinstance(value, str):
+        return value
+    value = bytes(value)
+    if len(value) < HEADER.size or value[:1] != MARKER:
+        raise CompressionError("stored value is neither text nor a compressed body")
+    _, dictionary_id = HEADER.unpack_from(value)
+    if dictionary_id:
+        decompressor = zlib.decompressobj(WBITS, zdict=get_dictionary(dictionary_id, execute))
+    else:
+        decompressor = zlib.decompressobj(WBITS)
+    return (decompressor.decompress(value[HEADER.size:]) + decompressor.flush()).decode("utf-8")
+
+
+class CompressedTextField(models.TextField):
+    """A TextField whose long values are compressed in the database"""
+
+    def from_db_value(self, value, expression, connection):
+        return decompress(value)
+
+    def to_python(self, value):
+        if isinstance(value, (bytes, memoryview)):
+            return decompress(value)
+        return super().to_python(value)
+
+    def get_prep_value(self, value):
+        value = super().get_prep_value(value)
+        if value is None or len(value) < COMPRESS_THRESHOLD:
+            return value
+        return compress(value, *active_dictionary())
+
+
+def train_dictionary(samples, size=DICTIONARY_SIZE):
+    """A zlib preset dictionary from sample texts
+
+    Lines that recur across samples (log lines, imports, boilerplate) are
+    weighted by how many samples contain them times their length; frequent
+    words fill what is left. zlib reaches the end of the dictionary most
+    cheaply, so the most valuable strings go last.
+    """
+    lines = Counter()
+    words = Counter()
+    for text in samples:
+        lines.update({line for line in text.splitlines() if 8 <= len(line) <= 200})
+        words.update({word for word in text.split() if 4 <= len(word) <= 40})
+
+    # Recurring lines get two thirds of the space, frequent words the rest
+    picked, budget = [], size * 2 // 3
+    for _, line in sorted(((count * len(line), line) for line, count in lines.items() if count > 1), reverse=True):
+        cost = len(line.encode("utf-8")) + 1
+        if cost <= budget:
+            picked.append(line + "\n")
+            budget -= cost
+    filler, budget = [], size - (size * 2 // 3 - budget)
+    for _, word in sorted(((count * len(word), word) for word, count in words.items() if count > 1), reverse=True):
+        cost = len(word.encode("utf-8")) + 1
+        if cost <= budget:
+            filler.append(word + " ")
+            budget -= cost
+    # Least valuable first: words, then lines, each in ascending value
+    return ("".join(reversed(filler)) + "".join(reversed(picked))).encode("utf-8")[-size:]
+
+
+def register_sqlite_functions(sender, connection, **kwargs):
+    """connection_created handler adding ``chat_decompress()`` to SQLite connections"""
+    if connection.vendor != "sqlite":
+        return
+    raw = connection.connection
+
+    def execute(sql, params):
+        return raw.execute(sql.replace("%s", "?"), params).fetchone()
+
+    raw.create_function("chat_decompress", 1, lambda value: decompress(value, execute), deterministic=True)
+
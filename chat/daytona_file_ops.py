@@ -1,14 +1,58 @@
+import base64
+import codecs
+import mmap
 import os
+import re
 import json
-from pathlib import Path
+import shlex
+import signal
+import time
+import uuid
 from django.conf import settings
 
+from . import checkpoints, file_patch, kernel_server
+from .code_search import (
+    MAX_LINE_CHARS,
+    SEARCH_RESULT_LIMIT,
+    SKIP_DIRS,
+    format_search_results,
+    path_matches,
+)
+from .path_confinement import confine
+from .remote_metadata import RemoteMetadata
+from .file_tree import DEFAULT_TREE_DEPTH, TREE_ENTRY_LIMIT, format_tree, tree_lines
+from .file_ranges import (
+    READ_INLINE_LIMIT,
+    STREAM_CHUNK_SIZE,
+    format_read_result,
+    iter_chunks,
+    read_range,
+    read_range_mmap,
+    remote_range_command,
+)
+from .local_sandbox import MMAP_THRESHOLD
+from .uploads import check_upload, format_upload_result, staging_name
+from .workspace_mirror import MIRROR_DIR, WorkspaceMirror
+
 try:
     from daytona import Daytona, DaytonaConfig
     DAYTONA_AVAILABLE = True
 except ImportError:
     DAYTONA_AVAILABLE = False
 
+# Sandbox-side support files (kernel script, per-run code, kernel sockets)
+KERNEL_DIR = ".prime"
+KERNEL_SERVER_PATH = f"{KERNEL_DIR}/kernel_server.py"
+FILE_PATCH_PATH = f"{KERNEL_DIR}/file_patch.py"
+CHECKPOINTS_PATH = f"{KERNEL_DIR}/checkpoints.py"
+CHECKPOINT_LIMIT = checkpoints.CHECKPOINT_LIMIT
+KERNEL_IDLE_TIMEOUT = int(os.getenv("DAYTONA_KERNEL_IDLE_TIMEOUT", "900"))
+KERNEL_MEMORY_MB = int(os.getenv("DAYTONA_KERNEL_MEMORY_MB", "1024"))
+KERNEL_RUN_TIMEOUT = int(os.getenv("DAYTONA_KERNEL_RUN_TIMEOUT", "120"))
+# Streaming runs are polled for new output at this interval (seconds)
+STREAM_POLL_INTERVAL = float(os.getenv("DAYTONA_STREAM_POLL_INTERVAL", "0.5"))
+STREAM_OUTPUT_LIMIT = kernel_server.OUTPUT_LIMIT
+
 
 class DaytonaFileOperations:
     """Secure file operations using Daytona containers via SDK
@@ -22,6 +66,9 @@ class DaytonaFileOperations:
         self.container_name = "file-ops-sandbox"
         self.daytona_config = self._load_daytona_config()
         self.sandbox = None
+        self._kernel_tooling_ready = False
+        self.metadata = RemoteMetadata(self._run_command)
+        self.mirror = None
         self._init_daytona_sandbox()
 
     def _load_daytona_config(self):
@@ -54,29 +101,51 @@ class DaytonaFileOperations:
         except Exception as e:
             print(f"Failed to initialize Daytona sandbox: {e}")
             self.sandbox = None
+            return
 
-    def _validate_path(self, file_path):
-        """Validate and sanitize file path"""
-        # Map legacy /project/workspace to the sandbox workspace
-        if isinstance(file_path, str) and file_path.startswith("/project/workspace"):
-            suffix = file_path[len("/project/workspace"):]
-            file_path = os.path.join(self.workspace_dir, suffix.lstrip("/"))
-
-        # Convert to absolute path
-        if not os.path.isabs(file_path):
-            file_path = os.path.join(self.workspace_dir, file_path)
-
-        # Security: Ensure path is within workspace
-        try:
-            path_obj = Path(file_path).resolve()
-            workspace_obj = Path(self.workspace_dir).resolve()
+        if MIRROR_DIR:
+            sandbox_id = str(getattr(self.sandbox, "id", "") or "default")
+            self.mirror = WorkspaceMirror(
+                self._run_command, self._write_tooling_file, os.path.join(MIRROR_DIR, sandbox_id)
+            )
+            self.mirror.start()
 
-            if not str(path_obj).startswith(str(workspace_obj)):
-                return None, "Access denied: Path must be within workspace directory"
+    def _validate_path(self, file_path):
+        """Validate and sanitize file path
 
-            return str(path_obj), None
-        except Exception as e:
-            return None, f"Invalid path: {str(e)}"
+        Purely lexical: the files live in the sandbox, so nothing is looked
+        up locally. Symlinks are checked remotely (see _remote_stat).
+        Legacy /project/workspace paths map to the sandbox workspace.
+        """
+        return confine(self.workspace_dir, file_path)
+
+    def _remote_path(self, validated_path):
+        """Path relative to the workspace, as the sandbox sees it"""
+        return os.path.relpath(validated_path, self.workspace_dir)
+
+    def _remote_stat(self, relative_path):
+        """Cached sandbox-side metadata; (stat, error) with symlink escapes denied"""
+        info = self.metadata.stat(relative_path)
+        if info.exists and not info.inside:
+            return None, "Access denied: Path must be within workspace directory"
+        return info, None
+
+    def _read_stat(self, relative_path):
+        """Metadata for a read-only operation, from the mirror while it is fresh"""
+        info = self.mirror.lookup(relative_path) if self.mirror else None
+        if info is not None:
+            return info, None
+        return self._remote_stat(relative_path)
+
+    def _invalidate_all(self):
+        """Forget cached metadata and stop serving reads from the mirror until it reconciles"""
+        self.metadata.invalidate_all()
+        if self.mirror:
+            self.mirror.mark_stale()
+
+    def _mirrored_file(self, relative_path):
+        """Local path of the mirrored copy of a file, or None to read the sandbox"""
+        return self.mirror.local_file(relative_path) if self.mirror else None
 
     def _use_sdk_fallback(self, operation, *args, **kwargs):
         """Fallback method when SDK is not available"""
@@ -85,8 +154,43 @@ class DaytonaFileOperations:
             "Install with: pip install daytona and set DAYTONA_API_KEY"
         )
 
+    def _run_command(self, command):
+        """Run a shell command inside the sandbox
+
+        Returns (exit_code, stdout, stderr). Tries the SDK process API first,
+        then the exec-style methods some SDK versions expose on the sandbox.
+        """
+        process = getattr(self.sandbox, "process", None)
+        methods = [(getattr(process, "exec", None), command)]
+        for method_name in ("exec", "execute", "run"):
+            methods.append((getattr(self.sandbox, method_name, None), ["sh", "-c", command]))
+
+        for method, arg in methods:
+            if not callable(method):
+                continue
+            try:
+                result = method(arg)
+            except Exception:
+                continue
+            if isinstance(result, str):
+                return 0, result, ""
+            stdout = getattr(result, "stdout", None)
+            if stdout is None:
+                stdout = getattr(result, "result", "")
+            return (
+                getattr(result, "exit_code", 0),
+                stdout or "",
+                getattr(result, "stderr", "") or "",
+            )
+
+        raise RuntimeError("Daytona sandbox execution interface not available")
+
     def read_file(self, file_path):
-        """Read file content securely in container"""
+        """Read file content securely in container (previewed above the inline limit)"""
+        return self.read_file_range(file_path)
+
+    def read_file_range(self, file_path, **options):
+        """Read a byte or line range of a file without downloading all of it"""
         validated_path, error = self._validate_path(file_path)
         if error or not validated_path:
             return error or "Error: Invalid file path"
@@ -95,18 +199,43 @@ class DaytonaFileOperations:
             return self._use_sdk_fallback("read_file")
 
         try:
-            # Check file size (limit to 10MB) using local stat for validation
-            file_size = os.path.getsize(validated_path)
-            if file_size > 10 * 1024 * 1024:  # 10MB
-                return "Error: File too large (max 10MB)"
-
-            # Read file using Daytona SDK
-            # Convert absolute path to relative path for sandbox
-            relative_path = os.path.relpath(validated_path, self.workspace_dir)
-
-            # Use sandbox filesystem to read file
-            content = self.sandbox.fs.read_file(relative_path)
-            return f"File content from {file_path}:\n\n{content}"
+            relative_path = self._remote_path(validated_path)
+            info, error = self._read_stat(relative_path)
+            if error:
+                return error
+            if not info.exists:
+                return f"Error: File '{file_path}' not found"
+            if info.is_dir:
+                return f"Error: '{file_path}' is a directory"
+            file_size = info.size
+
+            local_path = self._mirrored_file(relative_path)
+            if local_path:
+                with open(local_path, "rb") as f:
+                    if os.fstat(f.fileno()).st_size >= MMAP_THRESHOLD:
+                        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                            data, truncated = read_range_mmap(mm, options)
+                    else:
+                        data, truncated = read_range(f, options)
+                return format_read_result(file_path, data, truncated, options, file_size)
+
+            if not options and file_size <= READ_INLINE_LIMIT:
+                # Small full reads go straight through the sandbox filesystem
+                content = self.sandbox.fs.read_file(relative_path)
+                return format_read_result(file_path, content, False, options)
+
+            # Ranges and large files are cut inside the sandbox; base64 keeps
+            # the bytes intact through the text-only exec API
+            exit_code, stdout, stderr = self._run_command(
+                f"{remote_range_command(relative_path, options)} | base64"
+            )
+            if exit_code:
+                return f"Error reading file '{file_path}': {stderr or stdout}"
+            data = base64.b64decode(stdout)
+            truncated = len(data) > READ_INLINE_LIMIT
+            return format_read_result(
+                file_path, data[:READ_INLINE_LIMIT], truncated, options, file_size
+            )
 
         except FileNotFoundError:
             return f"Error: File '{file_path}' not found"
@@ -115,6 +244,57 @@ class DaytonaFileOperations:
         except Exception as e:
             return f"Error reading file '{file_path}': {str(e)}"
 
+    def open_stream(self, file_path, chunk_size=STREAM_CHUNK_SIZE):
+        """Stream a file out of the sandbox as successive ranged reads
+
+        Returns (chunk iterator, error); only one chunk is held in memory.
+        """
+        validated_path, error = self._validate_path(file_path)
+        if error or not validated_path:
+            return None, error or "Error: Invalid file path"
+
+        if not self.sandbox:
+            return None, self._use_sdk_fallback("open_stream")
+
+        relative_path = self._remote_path(validated_path)
+        try:
+            info, error = self._read_stat(relative_path)
+        except Exception as e:
+            return None, f"Error reading file '{file_path}': {str(e)}"
+        if error:
+            return None, error
+        if not info.exists or info.is_dir:
+            return None, f"Error: File '{file_path}' not found"
+
+        local_path = self._mirrored_file(relative_path)
+        if local_path:
+            f = open(local_path, "rb")
+
+            def local_chunks():
+                with f:
+                    yield from iter_chunks(f, chunk_size)
+
+            return local_chunks(), None
+
+        def chunks():
+            offset = 0
+            while True:
+                command = remote_range_command(
+                    relative_path, {"offset": offset, "length": chunk_size}, limit=chunk_size
+                )
+                # base64 keeps binary files intact through the text-only exec API
+                exit_code, stdout, stderr = self._run_command(f"{command} | base64")
+                if exit_code:
+                    raise IOError(stderr or stdout)
+                chunk = base64.b64decode(stdout)
+                if chunk:
+                    yield chunk
+                if len(chunk) < chunk_size:
+                    break
+                offset += len(chunk)
+
+        return chunks(), None
+
     def write_file(self, file_path, content):
         """Write file content securely in container"""
         validated_path, error = self._validate_path(file_path)
@@ -129,14 +309,26 @@ class DaytonaFileOperations:
             if len(content.encode("utf-8")) > 10 * 1024 * 1024:
                 return "Error: Content too large (max 10MB)"
 
-            # Create directory if needed using local filesystem for validation
-            dir_name = os.path.dirname(validated_path)
-            if dir_name:
-                os.makedirs(dir_name, exist_ok=True)
+            relative_path = self._remote_path(validated_path)
+            parent = os.path.dirname(relative_path) or "."
+            # The file and its directory are checked in one remote call
+            found = self.metadata.stat_many([relative_path, parent])
+            info, parent_info = found[relative_path], found[parent]
+            if (info.exists and not info.inside) or (parent_info.exists and not parent_info.inside):
+                return "Access denied: Path must be within workspace directory"
+            if info.is_dir:
+                return f"Error: '{file_path}' is a directory"
+
+            # Create the parent directory in the sandbox if needed
+            if not parent_info.exists:
+                self._run_command(f"mkdir -p {shlex.quote(parent)}")
+                self.metadata.invalidate(parent)
 
             # Write file using Daytona SDK
-            relative_path = os.path.relpath(validated_path, self.workspace_dir)
             self.sandbox.fs.write_file(relative_path, content)
+            self.metadata.invalidate(relative_path)
+            if self.mirror:
+                self.mirror.put(relative_path, content.encode("utf-8"))
 
             return f"Successfully wrote to {file_path}"
 
@@ -145,6 +337,53 @@ class DaytonaFileOperations:
         except Exception as e:
             return f"Error writing file '{file_path}': {str(e)}"
 
+    def edit_file(self, file_path, patch):
+        """Apply search/replace blocks or a unified diff inside the sandbox
+
+        Only the patch is uploaded; the sandbox applies it and atomically
+        replaces the file, so transfer scales with the change, not the file.
+        """
+        validated_path, error = self._validate_path(file_path)
+        if error or not validated_path:
+            return error or "Error: Invalid file path"
+
+        if not self.sandbox:
+            return self._use_sdk_fallback("edit_file")
+
+        try:
+            relative_path = self._remote_path(validated_path)
+            info, error = self._remote_stat(relative_path)
+            if error:
+                return error
+            if not info.exists:
+                return f"Error: File '{file_path}' does not exist"
+            if info.is_dir:
+                return f"Error: '{file_path}' is a directory"
+
+            self._ensure_kernel_tooling()
+            patch_path = f"{KERNEL_DIR}/runs/{uuid.uuid4().hex}.patch"
+            self.sandbox.fs.write_file(patch_path, patch)
+            _, stdout, _ = self._run_command(
+                f"python {FILE_PATCH_PATH} {shlex.quote(relative_path)} {patch_path}; "
+                f"status=$?; rm -f {patch_path}; exit $status"
+            )
+            self.metadata.invalidate(relative_path)
+
+            result = json.loads(stdout.strip().splitlines()[-1])
+            if result["ok"]:
+                if self.mirror:
+                    self.mirror.refresh([relative_path])
+                return file_patch.format_edit_result(
+                    file_path, result["added"], result["removed"], result.get("changed", True)
+                )
+            if result["conflict"]:
+                return file_patch.format_conflict(file_path, result["message"])
+            return f"Error editing file '{file_path}': {result['message']}"
+        except (ValueError, IndexError):
+            return f"Error editing file '{file_path}': unexpected output from the sandbox"
+        except Exception as e:
+            return f"Error editing file '{file_path}': {str(e)}"
+
     def delete_file(self, file_path):
         """Delete file securely in container"""
         validated_path, error = self._validate_path(file_path)
@@ -155,18 +394,158 @@ class DaytonaFileOperations:
             return self._use_sdk_fallback("delete_file")
 
         try:
-            if not os.path.exists(validated_path):
+            relative_path = self._remote_path(validated_path)
+            info, error = self._remote_stat(relative_path)
+            if error:
+                return error
+            if not info.exists:
                 return f"Error: File '{file_path}' does not exist"
 
             # Delete file using Daytona SDK
-            relative_path = os.path.relpath(validated_path, self.workspace_dir)
             self.sandbox.fs.delete_file(relative_path)
+            self.metadata.invalidate(relative_path)
+            if self.mirror:
+                self.mirror.remove(relative_path)
 
             return f"Successfully deleted {file_path}"
 
         except Exception as e:
             return f"Error deleting file '{file_path}': {str(e)}"
 
+    def write_upload_chunk(self, upload_id, offset, blocks):
+        """Upload one chunk of a resumable upload; returns an error or None
+
+        Each chunk is stored in the sandbox as its own part file named by its
+        zero-padded offset, so a resent chunk replaces the earlier attempt and
+        the parts concatenate in order.
+        """
+        if not self.sandbox:
+            return self._use_sdk_fallback("write_upload_chunk")
+
+        try:
+            staging = staging_name(upload_id)
+            if not offset:
+                self._run_command(f"rm -rf {staging} {staging}.part; mkdir -p {staging}")
+            self.sandbox.fs.write_file(f"{staging}/{offset:016d}", b"".join(blocks))
+            return None
+        except Exception as e:
+            return f"Error writing upload chunk: {str(e)}"
+
+    def finish_upload(self, upload_id, file_path, size, sha256=""):
+        """Join the staged parts in the sandbox, verify them and move the file into place"""
+        validated_path, error = self._validate_path(file_path)
+        if error or not validated_path:
+            return error or "Error: Invalid file path"
+
+        if not self.sandbox:
+            return self._use_sdk_fallback("finish_upload")
+
+        try:
+            relative_path = self._remote_path(validated_path)
+            parent = os.path.dirname(relative_path) or "."
+            found = self.metadata.stat_many([relative_path, parent])
+            info, parent_info = found[relative_path], found[parent]
+            if (info.exists and not info.inside) or (parent_info.exists and not parent_info.inside):
+                return "Access denied: Path must be within workspace directory"
+            if info.is_dir:
+                return f"Error: '{file_path}' is a directory"
+
+            staging = staging_name(upload_id)
+            assembled = f"{staging}.part"
+            exit_code, stdout, stderr = self._run_command(
+                f'mkdir -p {staging} && for p in {staging}/*; do if [ -f "$p" ]; then cat "$p"; fi; done > {assembled} && '
+                f'echo "$(wc -c < {assembled} | tr -d " ") $(sha256sum {assembled} | cut -d " " -f 1)"'
+            )
+            if exit_code:
+                return f"Error uploading file '{file_path}': {stderr or stdout}"
+            received, digest = stdout.strip().splitlines()[-1].split()
+            error = check_upload(file_path, int(received), size, digest, sha256)
+            if error:
+                self._run_command(f"rm -f {assembled}")
+                return error
+
+            target = shlex.quote(relative_path)
+            exit_code, stdout, stderr = self._run_command(
+                f"mkdir -p {shlex.quote(parent)} && mv -f {assembled} {target} && rm -rf {staging}"
+            )
+            self.metadata.invalidate(relative_path)
+            if self.mirror:
+                # Picked up by the next reconciliation, changed blocks only
+                self.mirror.mark_stale()
+            if exit_code:
+                return f"Error uploading file '{file_path}': {stderr or stdout}"
+            return format_upload_result(file_path, int(received), digest)
+        except (ValueError, IndexError):
+            return f"Error uploading file '{file_path}': unexpected output from the sandbox"
+        except Exception as e:
+            return f"Error uploading file '{file_path}': {str(e)}"
+
+    def discard_upload(self, upload_id):
+        if self.sandbox:
+            staging = staging_name(upload_id)
+            self._run_command(f"rm -rf {staging} {staging}.part")
+
+    def _checkpoint_command(self, conversation_id, *args):
+        """Run the checkpoint script in the sandbox; returns (exit_code, output)"""
+        self._ensure_kernel_tooling()
+        quoted = " ".join(shlex.quote(str(arg)) for arg in args)
+        exit_code, stdout, stderr = self._run_command(
+            f"CHECKPOINT_LIMIT={CHECKPOINT_LIMIT} python {CHECKPOINTS_PATH} "
+            f"{int(conversation_id)} {quoted}"
+        )
+        return exit_code, (stdout or stderr).strip()
+
+    def create_checkpoint(self, conversation_id, label, paths, replaces=True):
+        """Copy the files a tool is about to change inside the sandbox; returns the checkpoint id
+
+        Copies are reflinks where the sandbox filesystem supports them. They
+        are never hard links, since SDK uploads may rewrite files in place,
+        so ``replaces`` makes no difference here.
+        """
+        if not self.sandbox:
+            return None
+        rel_paths = []
+        for file_path in paths:
+            validated_path, error = self._validate_path(file_path)
+            if not error and validated_path:
+                rel_paths.append(self._remote_path(validated_path))
+        exit_code, output = self._checkpoint_command(conversation_id, "save", label, *rel_paths)
+        if exit_code:
+            raise IOError(output)
+        return json.loads(output.splitlines()[-1])["id"]
+
+    def drop_checkpoint(self, conversation_id, checkpoint_id):
+        if self.sandbox:
+            self._checkpoint_command(conversation_id, "drop", int(checkpoint_id))
+
+    def list_checkpoints(self, conversation_id):
+        if not self.sandbox:
+            return self._use_sdk_fallback("list_checkpoints")
+        try:
+            return self._checkpoint_command(conversation_id, "list")[1]
+        except Exception as e:
+            return f"Error listing checkpoints: {str(e)}"
+
+    def restore_checkpoint(self, conversation_id, checkpoint_id):
+        """Put every file changed since the checkpoint back as it was"""
+        if not self.sandbox:
+            return self._use_sdk_fallback("restore_checkpoint")
+        try:
+            output = self._checkpoint_command(conversation_id, "restore", int(checkpoint_id))[1]
+            self._invalidate_all()
+            return output
+        except Exception as e:
+            return f"Error restoring checkpoint #{checkpoint_id}: {str(e)}"
+
+    def diff_checkpoints(self, conversation_id, from_id, to_id=None):
+        if not self.sandbox:
+            return self._use_sdk_fallback("diff_checkpoints")
+        args = [int(from_id)] + ([int(to_id)] if to_id is not None else [])
+        try:
+            return self._checkpoint_command(conversation_id, "diff", *args)[1]
+        except Exception as e:
+            return f"Error comparing checkpoints: {str(e)}"
+
     def list_files(self, directory_path):
         """List directory contents securely in container"""
         validated_path, error = self._validate_path(directory_path)
@@ -177,21 +556,26 @@ class DaytonaFileOperations:
             return self._use_sdk_fallback("list_files")
 
         try:
-            if not os.path.exists(validated_path):
+            relative_path = self._remote_path(validated_path)
+            info, error = self._read_stat(relative_path)
+            if error:
+                return error
+            if not info.exists:
                 return f"Error: Directory '{directory_path}' does not exist"
 
-            if not os.path.isdir(validated_path):
+            if not info.is_dir:
                 return f"Error: '{directory_path}' is not a directory"
 
-            # List files using Daytona SDK
-            relative_path = os.path.relpath(validated_path, self.workspace_dir)
-            files = self.sandbox.fs.list_files(relative_path)
+            files = self.mirror.list_dir(relative_path) if self.mirror else None
+            if files is None:
+                # List files using Daytona SDK
+                files = [(f.name, f.is_dir) for f in self.sandbox.fs.list_files(relative_path)]
 
             if files:
                 formatted_files = []
-                for file_info in files:
-                    file_type = "DIR" if file_info.is_dir else "FILE"
-                    formatted_files.append(f"{file_type}: {file_info.name}")
+                for name, is_dir in files:
+                    file_type = "DIR" if is_dir else "FILE"
+                    formatted_files.append(f"{file_type}: {name}")
 
                 return f"Contents of {directory_path}:\n\n" + "\n".join(
                     sorted(formatted_files)
@@ -204,6 +588,95 @@ class DaytonaFileOperations:
         except Exception as e:
             return f"Error listing directory '{directory_path}': {str(e)}"
 
+    def list_tree(
+        self,
+        directory_path,
+        depth=DEFAULT_TREE_DEPTH,
+        include=None,
+        exclude=None,
+        limit=TREE_ENTRY_LIMIT,
+        **_,
+    ):
+        """List a directory recursively with one find command in the sandbox"""
+        validated_path, error = self._validate_path(directory_path)
+        if error or not validated_path:
+            return error or "Error: Invalid directory path"
+
+        if not self.sandbox:
+            return self._use_sdk_fallback("list_tree")
+
+        try:
+            relative_path = self._remote_path(validated_path)
+            info = self.mirror.lookup(relative_path) if self.mirror else None
+            if info is not None:
+                if not info.is_dir:
+                    return f"Error: Directory '{directory_path}' does not exist"
+                base = "" if relative_path == "." else relative_path + "/"
+                lines = tree_lines(
+                    lambda rel_dir: self.mirror.list_dir(base + rel_dir if rel_dir else relative_path),
+                    depth,
+                    include,
+                    exclude,
+                )
+                return format_tree(directory_path, lines, depth, limit)
+
+            # Noise directories are printed but not descended into
+            prune = " -o ".join(f"-name {shlex.quote(name)}" for name in sorted(SKIP_DIRS))
+            exit_code, stdout, _ = self._run_command(
+                f"test -d {shlex.quote(relative_path)} || exit 2; "
+                f"find {shlex.quote(relative_path)} -mindepth 1 -maxdepth {depth} "
+                f"\\( -type d \\( {prune} \\) -prune -printf '%y\\t%P\\n' \\) "
+                f"-o -printf '%y\\t%P\\n' 2>/dev/null"
+            )
+            if exit_code == 2:
+                return f"Error: Directory '{directory_path}' does not exist"
+
+            children = {}
+            for line in stdout.splitlines():
+                kind, tab, rel_path = line.partition("\t")
+                if not tab:
+                    continue
+                parent, _, name = rel_path.rpartition("/")
+                children.setdefault(parent, []).append((name, kind == "d"))
+
+            lines = tree_lines(children.get, depth, include, exclude)
+            return format_tree(directory_path, lines, depth, limit)
+        except Exception as e:
+            return f"Error listing directory '{directory_path}': {str(e)}"
+
+    def search_files(self, query, glob=None, limit=SEARCH_RESULT_LIMIT):
+        """Find lines containing ``query`` (case-insensitive) with grep in the sandbox
+
+        The files live in the remote sandbox, so the search runs there in a
+        single command rather than against a local index.
+        """
+        if not self.sandbox:
+            return self._use_sdk_fallback("search_files")
+
+        try:
+            command = ["grep", "-rnIiF", "-m", str(limit + 1)]
+            command += [f"--exclude-dir={name}" for name in sorted(SKIP_DIRS)]
+            if glob and "/" not in glob:
+                command.append(f"--include={glob}")
+            command += ["-e", query, "--", "."]
+            exit_code, stdout, stderr = self._run_command(
+                " ".join(shlex.quote(part) for part in command) + f" | head -n {limit + 1}"
+            )
+
+            matches = []
+            for line in stdout.splitlines():
+                match = re.match(r"^\./(.+?):(\d+):(.*)$", line)
+                if not match:
+                    continue
+                path = match.group(1)
+                if not path_matches(path, glob):
+                    continue
+                matches.append((path, int(match.group(2)), match.group(3).strip()[:MAX_LINE_CHARS]))
+            matches.sort()
+            return format_search_results(query, matches[:limit], len(matches) > limit)
+        except Exception as e:
+            return f"Error searching files: {str(e)}"
+
     def get_file_info(self, file_path):
         """Get file information (size, type, permissions)"""
         validated_path, error = self._validate_path(file_path)
@@ -214,27 +687,52 @@ class DaytonaFileOperations:
             return self._use_sdk_fallback("get_file_info")
 
         try:
-            if not os.path.exists(validated_path):
+            info, error = self._read_stat(self._remote_path(validated_path))
+            if error:
+                return error
+            if not info.exists:
                 return f"Error: File '{file_path}' does not exist"
 
-            # Get file info using local stat for now (SDK doesn't have direct file info method)
-            stat_info = os.stat(validated_path)
-            file_type = "Directory" if os.path.isdir(validated_path) else "File"
-            size_mb = stat_info.st_size / (1024 * 1024)
+            file_type = "Directory" if info.is_dir else "File"
+            size_mb = info.size / (1024 * 1024)
 
             return f"""File Information for {file_path}:
 Type: {file_type}
-Size: {size_mb:.2f} MB ({stat_info.st_size} bytes)
-Modified: {stat_info.st_mtime}
-Permissions: {oct(stat_info.st_mode)[-3:]}"""
+Size: {size_mb:.2f} MB ({info.size} bytes)
+Modified: {info.mtime}
+Permissions: {oct(info.mode)[-3:]}"""
         except Exception as e:
             return f"Error getting file info '{file_path}': {str(e)}"
 
-    def execute_code(self, code: str, language: str = "python"):
+    def _ensure_kernel_tooling(self):
+        """Upload the kernel server, patch and checkpoint scripts into the sandbox once per process"""
+        if self._kernel_tooling_ready:
+            return
+        self._run_command(f"mkdir -p {KERNEL_DIR}/runs {KERNEL_DIR}/kernels")
+        for module, remote_path in (
+            (kernel_server, KERNEL_SERVER_PATH),
+            (file_patch, FILE_PATCH_PATH),
+            (checkpoints, CHECKPOINTS_PATH),
+        ):
+            with open(module.__file__, "r", encoding="utf-8") as f:
+                self.sandbox.fs.write_file(remote_path, f.read())
+        self._kernel_tooling_ready = True
+
+    def _write_tooling_file(self, remote_path, text):
+        """Write a support file under the sandbox's kernel directory"""
+        self._ensure_kernel_tooling()
+        self.sandbox.fs.write_file(remote_path, text)
+
+    def _kernel_socket(self, conversation_id):
+        return f"{KERNEL_DIR}/kernels/conversation-{int(conversation_id)}.sock"
+
+    def execute_code(self, code: str, language: str = "python", conversation_id=None):
         """Execute code inside the Daytona container sandbox.
 
-        Supports Python by writing a temporary file into the workspace and running it.
-        If the Daytona SDK doesn't expose an exec interface, returns a clear error.
+        Each run gets its own uniquely named script in the sandbox. With a
+        conversation id it runs in that conversation's persistent kernel
+        (started on demand, stopped after it idles), so variables, imports
+        and loaded data carry over between runs.
         """
         if not self.sandbox:
             return self._use_sdk_fallback("execute_code")
@@ -243,32 +741,28 @@ Permissions: {oct(stat_info.st_mode)[-3:]}"""
             if language.lower() != "python":
                 return f"Error: Unsupported language '{language}'. Only 'python' is supported."
 
-            # Write code to a temp file inside the workspace
-            rel_path = "tmp_daytona_exec.py"
-            abs_path = os.path.join(self.workspace_dir, rel_path)
-            os.makedirs(os.path.dirname(abs_path), exist_ok=True)
-            with open(abs_path, "w", encoding="utf-8") as f:
-                f.write(code)
-
-            # Try common execution methods offered by SDKs
-            for method_name in ("exec", "execute", "run"):
-                method = getattr(self.sandbox, method_name, None)
-                if callable(method):
-                    try:
-                        result = method(["python", rel_path])
-                        # Handle string or rich result objects
-                        if isinstance(result, str):
-                            return f"Execution result (python):\n{result}"
-                        stdout = getattr(result, "stdout", "")
-                        stderr = getattr(result, "stderr", "")
-                        exit_code = getattr(result, "exit_code", 0)
-                        output = stdout or ""
-                        if stderr:
-                            output += ("\n--- stderr ---\n" + stderr)
-                        return f"Execution result (exit={exit_code}):\n" + (output or "<no output>")
-                    except Exception:
-                        continue
+            self._ensure_kernel_tooling()
+            run_path = f"{KERNEL_DIR}/runs/{uuid.uuid4().hex}.py"
+            self.sandbox.fs.write_file(run_path, code)
 
+            if conversation_id is None:
+                command = f"python {run_path}; status=$?; rm -f {run_path}; exit $status"
+            else:
+                command = (
+                    f"python {KERNEL_SERVER_PATH} run {self._kernel_socket(conversation_id)} "
+                    f"{run_path} --idle-timeout {KERNEL_IDLE_TIMEOUT} "
+                    f"--memory-mb {KERNEL_MEMORY_MB} --timeout {KERNEL_RUN_TIMEOUT}"
+                )
+
+            self._invalidate_all()
+            exit_code, stdout, stderr = self._run_command(command)
+            # The code may have changed any file
+            self._invalidate_all()
+            output = stdout
+            if stderr:
+                output += "\n--- stderr ---\n" + stderr
+            return f"Execution result (exit={exit_code}):\n" + (output or "<no output>")
+        except RuntimeError:
             return (
                 "Error: Daytona sandbox execution interface not available. "
                 "Ensure your SDK version supports command execution."
@@ -276,6 +770,126 @@ Permissions: {oct(stat_info.st_mode)[-3:]}"""
         except Exception as e:
             return f"Error executing code: {str(e)}"
 
+    def stream_code(self, code: str, language: str = "python", conversation_id=None):
+        """Run code in the background and yield its output while it runs
+
+        The run writes to a log file in the sandbox which is polled with one
+        command per interval. Yields ("cancel", callable) once started,
+        ("output", text) pieces, then ("done", formatted result).
+        """
+        if not self.sandbox or language.lower() != "python":
+            yield "done", self.execute_code(code, language, conversation_id)
+            return
+
+        try:
+            self._ensure_kernel_tooling()
+            run_id = uuid.uuid4().hex
+            run_path = f"{KERNEL_DIR}/runs/{run_id}.py"
+            log_path = f"{KERNEL_DIR}/runs/{run_id}.log"
+            exit_path = f"{KERNEL_DIR}/runs/{run_id}.exit"
+            self.sandbox.fs.write_file(run_path, code)
+            self._invalidate_all()
+
+            if conversation_id is None:
+                inner = f"python {run_path} >> {log_path} 2>&1; status=$?; rm -f {run_path}"
+            else:
+                socket_path = self._kernel_socket(conversation_id)
+                inner = (
+                    f"python {KERNEL_SERVER_PATH} run {socket_path} {run_path} "
+                    f"--log {log_path} --idle-timeout {KERNEL_IDLE_TIMEOUT} "
+                    f"--memory-mb {KERNEL_MEMORY_MB} --timeout {KERNEL_RUN_TIMEOUT} "
+                    f">> {log_path} 2>&1; status=$?"
+                )
+            _, stdout, _ = self._run_command(
+                f": > {log_path}; setsid sh -c '{inner}; echo $status > {exit_path}' "
+                f"> /dev/null 2>&1 < /dev/null & echo $!"
+            )
+            pid = int(stdout.strip().splitlines()[-1])
+        except RuntimeError:
+            yield "done", (
+                "Error: Daytona sandbox execution interface not available. "
+                "Ensure your SDK version supports command execution."
+            )
+            return
+        except Exception as e:
+            yield "done", f"Error executing code: {str(e)}"
+            return
+
+        def cancel():
+            # A kernel run is interrupted (state kept); a plain run is killed
+            if conversation_id is None:
+                # The exit file is written here since its writer dies too
+                self._run_command(
+                    f"python -c 'import os, signal; os.killpg({pid}, signal.SIGKILL)'; "
+                    f"[ -e {exit_path} ] || echo {-signal.SIGKILL} > {exit_path}"
+                )
+            else:
+                self._run_command(f"python {KERNEL_SERVER_PATH} interrupt {socket_path}")
+            return True
+
+        yield "cancel", cancel
+
+        parts = []
+        # Bytes of the log read so far; output is decoded separately so a
+        # character split across two polls is not mangled
+        offset = 0
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        exit_code = None
+        # Kernel runs enforce their own timeout; plain runs get the same budget
+        deadline = time.monotonic() + KERNEL_RUN_TIMEOUT + 10
+        try:
+            while exit_code is None:
+                if conversation_id is None and time.monotonic() > deadline:
+                    cancel()
+                # The exit file is read before the log, so once it exists
+                # the log read in the same command is complete
+                room = max(STREAM_OUTPUT_LIMIT - offset, 0)
+                _, stdout, _ = self._run_command(
+                    f"echo \"exit=$(cat {exit_path} 2>/dev/null)\"; "
+                    f"tail -c +{offset + 1} {log_path} | head -c {room} | base64"
+                )
+                status_line, _, encoded = stdout.partition("\n")
+                if status_line.strip() != "exit=":
+                    exit_code = status_line.strip()[len("exit="):]
+                data = base64.b64decode(encoded)
+                offset += len(data)
+                chunk = decoder.decode(data, final=exit_code is not None)
+                if chunk:
+                    parts.append(chunk)
+                    yield "output", chunk
+                if exit_code is None:
+                    time.sleep(STREAM_POLL_INTERVAL)
+        finally:
+            self._invalidate_all()
+            try:
+                if exit_code is None:
+                    # The client went away mid-run; do not leave it running
+                    cancel()
+                self._run_command(f"rm -f {run_path} {log_path} {exit_path}")
+            except Exception:
+                pass
+
+        output = "".join(parts)
+        if offset >= STREAM_OUTPUT_LIMIT:
+            output += "\n[Output truncated]\n"
+        yield "done", f"Execution result (exit={exit_code}):\n" + (output or "<no output>")
+
+    def restart_kernel(self, conversation_id):
+        """Stop a conversation's kernel; the next run starts with fresh state"""
+        if not self.sandbox:
+            return self._use_sdk_fallback("restart_kernel")
+        if conversation_id is None:
+            return "Error: Kernels are per conversation; no conversation given"
+
+        try:
+            self._ensure_kernel_tooling()
+            self._run_command(
+                f"python {KERNEL_SERVER_PATH} stop {self._kernel_socket(conversation_id)}"
+            )
+            return "Kernel restarted: Python state for this conversation was cleared"
+        except Exception as e:
+            return f"Error restarting kernel: {str(e)}"
+
 
 # Global instance
 daytona_ops = DaytonaFileOperations()
@@ -0,0 +1,274 @@
+"""Apply search/replace blocks or unified diffs to a file, atomically
+
+Used directly by the local backend and uploaded as-is into Daytona sandboxes,
+so it must only use the standard library.
+
+    python file_patch.py <file> <patch_file>
+
+prints a JSON object {"ok": bool, "message": str, "added": n, "removed": n,
+"changed": bool} and exits 0 when the edit was applied (``changed`` is false
+when it left the text as it was), 1 when it did not apply.
+
+Search/replace blocks (applied in order; each SEARCH must match exactly once):
+
+    <<<<<<< SEARCH
+    old lines
+    =======
+    new lines
+    >>>>>>> REPLACE
+
+Unified diffs are applied hunk by hunk; a hunk whose context has moved is
+located by searching outwards from its line number, as patch(1) does.
+"""
+
+import json
+import os
+import re
+import sys
+import tempfile
+
+_BLOCK_RE = re.compile(
+    r"^<<<<<<< SEARCH[ \t]*\r?\n(.*?)^=======[ \t]*\r?\n(.*?)^>>>>>>> REPLACE[ \t]*$",
+    re.MULTILINE | re.DOTALL,
+)
+_HUNK_RE = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+UNCHANGED_PREFIX = "No changes to "
+
+
+class PatchConflict(Exception):
+    """The patch does not apply to the file's current content"""
+
+
+def is_search_replace(patch):
+    return "<<<<<<< SEARCH" in patch
+
+
+def is_unified_diff(patch):
+    return any(_HUNK_RE.match(line) for line in patch.splitlines())
+
+
+def apply_search_replace(text, patch):
+    """Apply SEARCH/REPLACE blocks; returns (new text, added, removed)"""
+    blocks = _BLOCK_RE.findall(patch)
+    if not blocks:
+        raise PatchConflict("no complete SEARCH/REPLACE block found")
+    crlf = "\r\n" in text
+    added = removed = 0
+    for number, (search, replace) in enumerate(blocks, 1):
+        if crlf:
+            search = search.replace("\r\n", "\n").replace("\n", "\r\n")
+            replace = replace.replace("\r\n", "\n").replace("\n", "\r\n")
+        if not search:
+            raise PatchConflict(f"block {number}: SEARCH text is empty")
+        count = text.count(search)
+        if count == 0:
+            raise PatchConflict(f"block {number}: SEARCH text not found in the file")
+        if count > 1:
+            raise PatchConflict(
+                f"block {number}: SEARCH text matches {count} places; include more surrounding lines"
+            )
+        text = text.replace(search, replace, 1)
+        removed += search.count("\n")
+        added += replace.count("\n")
+    return text, added, removed
+
+
+def _parse_hunks(patch):
+    """Hunks of a unified diff, each body read to the line counts in its @@ header
+
+    Inside a body, lines such as "--- x" are removals like any other; file
+    headers are only recognised between hunks.
+    """
+    hunks = []
+    current = None
+    old_left = new_left = 0
+    for line in patch.splitlines():
+        if current is not None and (old_left or new_left):
+            kind = line[:1] if line else " "  # blank context lines lose their space
+            if kind == " " and old_left and new_left:
+                old_left, new_left = old_left - 1, new_left - 1
+            elif kind == "-" and old_left:
+                old_left -= 1
+            elif kind == "+" and new_left:
+                new_left -= 1
+            elif kind == "\\":
+                _mark_noeol(current)
+                continue
+            else:
+                raise PatchConflict(f"hunk {len(hunks)} does not match the line counts in its @@ header")
+            current["lines"].append((kind, line[1:]))
+            continue
+        header = _HUNK_RE.match(line)
+        if header:
+            old_left = 1 if header.group(2) is None else int(header.group(2))
+            new_left = 1 if header.group(4) is None else int(header.group(4))
+            current = {"start": int(header.group(1)), "lines": []}
+            hunks.append(current)
+        elif line.startswith("\\") and current is not None:
+            # "\ No newline at end of file" after a hunk's last line
+            _mark_noeol(current)
+        elif line[:1] in ("+", "-", " ") and not line.startswith(("--- ", "+++ ")) and current is not None:
+            raise PatchConflict(f"hunk {len(hunks)} has more lines than its @@ header counts")
+        # Anything else between hunks (file headers, "diff --git", prose) is skipped
+    if current is not None and (old_left or new_left):
+        if old_left != new_left:
+            raise PatchConflict(f"hunk {len(hunks)} is shorter than its @@ header says")
+        # Trailing blank context lines are often trimmed along with the prose
+        current["lines"].extend([(" ", "")] * old_left)
+    if not hunks:
+        raise PatchConflict("no @@ hunks found in the diff")
+    return hunks
+
+
+def _mark_noeol(hunk):
+    """Mark the hunk's last line as having no newline at the end of the file"""
+    if hunk["lines"]:
+        hunk["lines"][-1] = hunk["lines"][-1] + ("noeol",)
+
+
+def _find_block(lines, block, expected):
+    """Index where ``block`` occurs, searching outwards from ``expected``"""
+    size = len(block)
+    last = len(lines) - size
+    expected = min(max(expected, 0), max(last, 0))
+    for distance in range(max(expected, last - expected) + 1):
+        for index in (expected - distance, expected + distance):
+            if 0 <= index <= last and lines[index : index + size] == block:
+                return index
+    return None
+
+
+def apply_unified_diff(text, patch):
+    """Apply unified diff hunks; returns (new text, added, removed)"""
+    newline = "\r\n" if "\r\n" in text else "\n"
+    ends_with_newline = text.endswith("\n") or not text
+    lines = text.split(newline)
+    if ends_with_newline:
+        lines.pop()
+
+    offset = 0
+    added = removed = 0
+    for number, hunk in enumerate(_parse_hunks(patch), 1):
+        old = [entry[1] for entry in hunk["lines"] if entry[0] in (" ", "-")]
+        new = [entry[1] for entry in hunk["lines"] if entry[0] in (" ", "+")]
+        # Zero-length old ranges name the line *after* which to insert
+        expected = hunk["start"] - (1 if old else 0) + offset
+        index = _find_block(lines, old, expected) if old else expected
+        if index is None or index > len(lines):
+            raise PatchConflict(
+                f"hunk {number} (line {hunk['start']}) does not match the file's current content"
+            )
+        lines[index : index + len(old)] = new
+        offset += len(new) - len(old)
+        added += sum(1 for entry in hunk["lines"] if entry[0] == "+")
+        removed += sum(1 for entry in hunk["lines"] if entry[0] == "-")
+
+        for entry in hunk["lines"]:
+            if len(entry) == 3:
+                ends_with_newline = entry[0] == "-"
+
+    result = newline.join(lines)
+    if ends_with_newline and lines:
+        result += newline
+    return result, added, removed
+
+
+def trim_patch(text):
+    """Cut prose that follows the patch in an LLM response"""
+    if is_search_replace(text):
+        end = text.rfind(">>>>>>> REPLACE")
+        return text[: end + len(">>>>>>> REPLACE")] if end != -1 else text
+    kept = []
+    started = False
+    for line in text.splitlines():
+        if line.startswith(("--- ", "+++ ", "@@")):
+            started = True
+        elif started and line[:1] not in (" ", "+", "-", "\\", ""):
+            break
+        if started:
+            kept.append(line)
+    while kept and not kept[-1]:
+        kept.pop()
+    return "\n".join(kept) + "\n" if kept else text
+
+
+def apply_patch(text, patch):
+    """Apply either patch format to ``text``; raises PatchConflict"""
+    if is_search_replace(patch):
+        return apply_search_replace(text, patch)
+    if is_unified_diff(patch):
+        return apply_unified_diff(text, patch)
+    raise PatchConflict("expected SEARCH/REPLACE blocks or a unified diff")
+
+
+def replace_file_atomic(path, text):
+    """Write ``text`` to a temp file beside ``path`` and rename it into place
+
+    Readers see either the old or the new file, never a partial one, and
+    the original permissions are kept.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(prefix=".edit-", dir=directory)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8", newline="") as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(temp_path, os.stat(path).st_mode & 0o7777)
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.unlink(temp_path)
+        except OSError:
+            pass
+        raise
+
+
+def edit_file(path, patch):
+    """Apply a patch to a file in place; returns (added, removed, changed)
+
+    A patch that leaves the text as it was does not touch the file.
+    """
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        text = f.read()
+    new_text, added, removed = apply_patch(text, patch)
+    changed = new_text != text
+    if changed:
+        replace_file_atomic(path, new_text)
+    return added, removed, changed
+
+
+def format_edit_result(file_path, added, removed, changed=True):
+    if not changed:
+        return f"{UNCHANGED_PREFIX}{file_path}: the edit leaves it as it was"
+    return f"Successfully edited {file_path} (+{added} -{removed} lines)"
+
+
+def is_unchanged_result(result):
+    """Whether an edit's result text reports that the file was left as it was"""
+    return isinstance(result, str) and result.startswith(UNCHANGED_PREFIX)
+
+
+def format_conflict(file_path, message):
+    return f"Error: Edit conflict in '{file_path}': {message}. The file was not changed."
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    path, patch_path = argv
+    with open(patch_path, "r", encoding="utf-8", newline="") as f:
+        patch = f.read()
+    try:
+        added, removed, changed = edit_file(path, patch)
+    except PatchConflict as e:
+        print(json.dumps({"ok": False, "conflict": True, "message": str(e)}))
+        return 1
+    except (OSError, UnicodeDecodeError) as e:
+        print(json.dumps({"ok": False, "conflict": False, "message": str(e)}))
+        return 1
+    print(json.dumps({"ok": True, "added": added, "removed": removed, "changed": changed}))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,259 @@
+import re
+import shlex
+from collections import deque
+
+# Largest slice of a file returned inline to the chat (full reads are previewed
+# at this size and the rest is streamed to the client in chunks)
+READ_INLINE_LIMIT = 64 * 1024
+STREAM_CHUNK_SIZE = 64 * 1024
+TRUNCATION_MARKER = "[Truncated:"
+
+_RANGE_OPTION_RE = re.compile(
+    r"\s+(lines|offset|length|head|tail):(\S+)\s*$", re.IGNORECASE
+)
+
+
+def parse_read_args(arg_text):
+    """Split 'read file:' arguments into (path, range options)
+
+    Supported trailing options:
+      lines:10-20     line range (1-based, inclusive)
+      offset:N        byte offset, optionally with length:N
+      head:N / tail:N first / last N lines
+    Returns (path, options) where options is an empty dict for a full read,
+    or (None, error) when an option value is malformed.
+    """
+    text = arg_text.strip()
+    options = {}
+    while True:
+        match = _RANGE_OPTION_RE.search(text)
+        if not match:
+            break
+        key, value = match.group(1).lower(), match.group(2)
+        text = text[: match.start()].rstrip()
+        try:
+            if key == "lines":
+                start, _, end = value.partition("-")
+                options["start_line"] = int(start)
+                options["end_line"] = int(end) if end else int(start)
+            else:
+                options[key] = int(value)
+        except ValueError:
+            return None, f"Error: Invalid {key} value '{value}'"
+
+    for key, value in options.items():
+        if value < 0 or (key in ("start_line", "end_line") and value < 1):
+            return None, f"Error: Invalid {key.replace('_', ' ')} '{value}'"
+    if options.get("end_line", 1) < options.get("start_line", 1):
+        return None, "Error: Line range end must not precede its start"
+    if "length" in options and "offset" not in options:
+        options["offset"] = 0
+    return text, options
+
+
+def describe_range(options):
+    """Human-readable label for a range spec, used in tool output headers"""
+    if "start_line" in options:
+        return f"lines {options['start_line']}-{options['end_line']}"
+    if "head" in options:
+        return f"first {options['head']} lines"
+    if "tail" in options:
+        return f"last {options['tail']} lines"
+    if "offset" in options:
+        if "length" in options:
+            return f"bytes {options['offset']}-{options['offset'] + options['length']}"
+        return f"bytes {options['offset']}-end"
+    return "full file"
+
+
+def read_range(fh, options, limit=READ_INLINE_LIMIT):
+    """Read the requested range from a binary file object
+
+    Reads at most ``limit`` bytes regardless of the range requested, so
+    memory stays bounded for any file size. Returns (data, truncated).
+    """
+    if "start_line" in options:
+        return _read_lines(fh, options["start_line"], options["end_line"], limit)
+    if "head" in options:
+        return _read_lines(fh, 1, options["head"], limit)
+    if "tail" in options:
+        # Keep the end of the file when the tail is over the limit
+        data = b"".join(_tail_lines(fh, options["tail"], max_bytes=limit))
+        return data[-limit:], len(data) > limit
+    else:
+        fh.seek(options.get("offset", 0))
+        wanted = options.get("length")
+        if wanted is None or wanted > limit:
+            data = fh.read(limit + 1)
+            return data[:limit], len(data) > limit
+        return fh.read(wanted), False
+
+
+def _read_lines(fh, start, end, limit, block_size=STREAM_CHUNK_SIZE):
+    """Lines ``start``-``end`` (1-based) of a binary file; returns (data, truncated)
+
+    The file is read a block at a time rather than a line at a time, so a
+    file without newlines is never loaded whole: reading stops once
+    ``limit`` bytes are collected.
+    """
+    buf = bytearray()
+    line = 1
+    while line <= end:
+        block = fh.read(block_size)
+        if not block:
+            break
+        pos = 0
+        if line < start:
+            # Skip whole blocks while they end before the first wanted line
+            found = block.count(b"\n")
+            if line + found < start:
+                line += found
+                continue
+            while line < start:
+                pos = block.index(b"\n", pos) + 1
+                line += 1
+        while pos < len(block) and line <= end:
+            newline = block.find(b"\n", pos)
+            stop = len(block) if newline < 0 else newline + 1
+            buf += block[pos:stop]
+            if len(buf) > limit:
+                return bytes(buf[:limit]), True
+            pos = stop
+            if newline >= 0:
+                line += 1
+    return bytes(buf), False
+
+
+def _tail_lines(fh, count, block_size=STREAM_CHUNK_SIZE, max_bytes=READ_INLINE_LIMIT):
+    """Return the last ``count`` lines by scanning backwards from EOF"""
+    if count == 0:
+        return []
+    fh.seek(0, 2)
+    pos = fh.tell()
+    data = b""
+    # One extra newline is needed when the file ends with one
+    while pos > 0 and data.count(b"\n") <= count and len(data) <= max_bytes:
+        step = min(block_size, pos)
+        pos -= step
+        fh.seek(pos)
+        data = fh.read(step) + data
+    return deque(data.splitlines(keepends=True), maxlen=count)
+
+
+def iter_chunks(fh, chunk_size=STREAM_CHUNK_SIZE):
+    """Yield a binary file object's contents in fixed-size chunks"""
+    while True:
+        chunk = fh.read(chunk_size)
+        if not chunk:
+            break
+        yield chunk
+
+
+def remote_range_command(path, options, limit=READ_INLINE_LIMIT):
+    """Build a POSIX shell command reading the range inside a sandbox
+
+    Output is capped at ``limit + 1`` bytes so the caller can detect
+    truncation without pulling the whole file over the wire.
+    """
+    qpath = shlex.quote(path)
+    if "start_line" in options:
+        start, end = options["start_line"], options["end_line"]
+        cmd = f"sed -n '{start},{end}p;{end}q' {qpath}"
+    elif "head" in options:
+        cmd = f"head -n {options['head']} {qpath}"
+    elif "tail" in options:
+        cmd = f"tail -n {options['tail']} {qpath}"
+    else:
+        offset = options.get("offset", 0)
+        cmd = f"tail -c +{offset + 1} {qpath}"
+        if options.get("length") is not None and options["length"] <= limit:
+            return f"{cmd} | head -c {options['length']}"
+    return f"{cmd} | head -c {limit + 1}"
+
+
+def format_read_result(file_path, data, truncated, options, total_size=None):
+    """Format range output the same way for both tool backends"""
+    shown = len(data)
+    if isinstance(data, bytes):
+        data = data.decode("utf-8", errors="replace")
+    if not options:
+        header = f"File content from {file_path}:"
+    else:
+        header = f"File content from {file_path} ({describe_range(options)}):"
+    if truncated:
+        of_total = f" of {total_size}" if total_size is not None else ""
+        data += (
+            f"\n\n{TRUNCATION_MARKER} showing {shown}{of_total} bytes. "
+            "Use lines:, offset:/length:, head: or tail: to read more]"
+        )
+    return f"{header}\n\n{data}"
+
+
+def is_truncated(output):
+    """True when a read result carries the truncation note"""
+    return bool(output) and TRUNCATION_MARKER in output[-200:]
+
+
+def _line_start(mm, line_no, block_size=1024 * 1024):
+    """Byte offset where 1-based line ``line_no`` starts in a mapped file
+
+    Newlines are counted a block at a time at C speed, so skipping to a line
+    deep inside a large file never iterates line by line in Python.
+    """
+    remaining = line_no - 1
+    pos = 0
+    size = len(mm)
+    while remaining and pos < size:
+        block = mm[pos : pos + block_size]
+        found = block.count(b"\n")
+        if found < remaining:
+            remaining -= found
+            pos += len(block)
+            continue
+        for _ in range(remaining):
+            pos = mm.find(b"\n", pos) + 1
+        remaining = 0
+    return min(pos, size)
+
+
+def read_range_mmap(mm, options, limit=READ_INLINE_LIMIT):
+    """Same contract as read_range, for a memory-mapped file"""
+    size = len(mm)
+    if "start_line" in options or "head" in options:
+        start_line = options.get("start_line", 1)
+        end_line = options.get("end_line", options.get("head", 0))
+        if end_line < start_line:
+            return b"", False
+        start = _line_start(mm, start_line)
+        end = start
+        for _ in range(end_line - start_line + 1):
+            nl = mm.find(b"\n", end, min(size, start + limit + 1))
+            if nl < 0:
+                end = min(size, start + limit + 1)
+                break
+            end = nl + 1
+    elif "tail" in options:
+        end = size
+        start = size
+        # Skip a trailing newline so it does not count as an empty last line
+        search_end = size - 1 if size and mm[size - 1 : size] == b"\n" else size
+        for _ in range(options["tail"]):
+            nl = mm.rfind(b"\n", max(0, size - limit - 1), search_end)
+            if nl < 0:
+                start = max(0, size - limit - 1) if size > limit else 0
+                break
+            start = nl + 1
+            search_end = nl
+        if options["tail"] == 0:
+            start = size
+        data = mm[start:end]
+        return data[-limit:], len(data) > limit
+    else:
+        start = min(options.get("offset", 0), size)
+        wanted = options.get("length")
+        end = size if wanted is None else min(size, start + wanted)
+        if wanted is not None and wanted <= limit:
+            return mm[start:end], False
+
+    data = mm[start : min(end, start + limit + 1)]
+    return data[:limit], len(data) > limit
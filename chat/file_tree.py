@@ -0,0 +1,161 @@
+import fnmatch
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from .code_search import SKIP_DIRS
+
+DEFAULT_TREE_DEPTH = 3
+MAX_TREE_DEPTH = 20
+TREE_ENTRY_LIMIT = 500
+# Directory snapshots kept in memory (least recently used are dropped)
+MAX_SNAPSHOTS = 8192
+# Directories modified this recently are not cached: another change within
+# the filesystem's timestamp granularity would leave the mtime unchanged
+RACY_WINDOW_NS = 2 * 10**9
+
+_LIST_OPTION_RE = re.compile(
+    r"\s+(?:(depth|include|exclude|limit):(\S+)|(tree))\s*$", re.IGNORECASE
+)
+
+
+def parse_list_args(arg_text):
+    """Split 'list files:' arguments into (path, options)
+
+    Supported trailing options (any of them selects tree mode):
+      tree                 recursive listing
+      depth:N              levels to expand (default 3)
+      include:*.py,*.md    only show files matching a pattern
+      exclude:tests,*.pyc  skip matching files and directories
+      limit:N              show at most N entries (default 500)
+    Returns (None, error) when an option value is malformed.
+    """
+    text = arg_text.strip()
+    options = {}
+    while True:
+        match = _LIST_OPTION_RE.search(text)
+        if not match:
+            break
+        text = text[: match.start()].rstrip()
+        options["tree"] = True
+        key, value = match.group(1), match.group(2)
+        if key is None:
+            continue
+        key = key.lower()
+        if key in ("depth", "limit"):
+            try:
+                options[key] = int(value)
+            except ValueError:
+                return None, f"Error: Invalid {key} value '{value}'"
+            if options[key] < 1:
+                return None, f"Error: Invalid {key} '{value}'"
+        else:
+            options[key] = [p for p in value.split(",") if p]
+    if options.get("depth", 1) > MAX_TREE_DEPTH:
+        return None, f"Error: Depth may be at most {MAX_TREE_DEPTH}"
+    return text, options
+
+
+def _matches_any(rel_path, name, patterns):
+    # Patterns with a slash match the relative path, others just the name
+    return any(
+        fnmatch.fnmatch(rel_path if "/" in pattern else name, pattern) for pattern in patterns
+    )
+
+
+def tree_lines(list_dir, depth=DEFAULT_TREE_DEPTH, include=None, exclude=None):
+    """Lines of a compact indented tree, directories first
+
+    ``list_dir(rel_dir)`` returns the [(name, is_dir)] entries of a directory
+    relative to the tree root ("" for the root itself). Directories beyond
+    the depth limit, and noise such as .git or node_modules, are shown but
+    not expanded. With ``include`` only matching files, and the directories
+    leading to them, are shown.
+    """
+
+    def visit(rel_dir, level):
+        out = []
+        entries = list_dir(rel_dir) or []
+        for name, is_dir in sorted(entries, key=lambda e: (not e[1], e[0])):
+            rel_path = f"{rel_dir}/{name}" if rel_dir else name
+            if exclude and _matches_any(rel_path, name, exclude):
+                continue
+            indent = "  " * level
+            if is_dir:
+                if name in SKIP_DIRS or level + 1 >= depth:
+                    if not include:
+                        out.append(f"{indent}{name}/ …")
+                    continue
+                children = visit(rel_path, level + 1)
+                if children or not include:
+                    out.append(f"{indent}{name}/")
+                    out.extend(children)
+            elif not include or _matches_any(rel_path, name, include):
+                out.append(f"{indent}{name}")
+        return out
+
+    return visit("", 0)
+
+
+def format_tree(directory_path, lines, depth, limit=TREE_ENTRY_LIMIT):
+    """Render tree lines as 'list files:' output, capped at ``limit`` entries"""
+    if not lines:
+        return f"Tree of {directory_path} (depth {depth}):\n\n(no matching entries)"
+    shown = lines[:limit]
+    result = f"Tree of {directory_path} (depth {depth}, {len(lines)} entries):\n\n" + "\n".join(shown)
+    if len(lines) > limit:
+        result += (
+            f"\n\n[Showing {limit} of {len(lines)} entries; "
+            "narrow with depth:, include: or exclude:]"
+        )
+    return result
+
+
+class DirectorySnapshotCache:
+    """Directory entries cached by directory mtime
+
+    A snapshot is reused for as long as the directory's mtime is unchanged
+    (adding, removing or renaming an entry always updates it), so repeated
+    tree listings cost one stat per directory instead of a full scandir.
+    """
+
+    def __init__(self, max_entries=MAX_SNAPSHOTS):
+        self._snapshots = OrderedDict()  # dir path -> (mtime_ns, entries)
+        self._lock = threading.Lock()
+        self.max_entries = max_entries
+
+    def entries(self, full_dir, stat_dir=None, scan_dir=None):
+        """[(name, is_dir)] for a directory, or None if it cannot be read
+
+        ``stat_dir`` and ``scan_dir`` stand in for ``os.stat`` and
+        ``os.scandir`` for callers that reach directories another way;
+        ``full_dir`` is then whatever they take, and the cache key.
+        """
+        stat_dir = stat_dir or os.stat
+        scan_dir = scan_dir or os.scandir
+        try:
+            mtime = stat_dir(full_dir).st_mtime_ns
+        except OSError:
+            return None
+        with self._lock:
+            cached = self._snapshots.get(full_dir)
+            if cached is not None and cached[0] == mtime:
+                self._snapshots.move_to_end(full_dir)
+                return cached[1]
+
+        try:
+            with scan_dir(full_dir) as scanner:
+                # Symlinked directories are not followed out of the tree
+                entries = [(e.name, e.is_dir(follow_symlinks=False)) for e in scanner]
+        except OSError:
+            return None
+        if time.time_ns() - mtime < RACY_WINDOW_NS:
+            return entries
+        with self._lock:
+            self._snapshots[full_dir] = (mtime, entries)
+            self._snapshots.move_to_end(full_dir)
+            while len(self._snapshots) > self.max_entries:
+                self._snapshots.popitem(last=False)
+        return entries
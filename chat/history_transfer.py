@@ -0,0 +1,220 @@
+"""Export and import of conversation history as JSON Lines
+
+An export is a header line followed by each conversation and then its
+messages, one JSON object per line::
+
+    {"type": "header", "format": "aichat-history", "version": 1}
+    {"type": "conversation", "id": 7, "title": "...", "created_at": "...", "updated_at": "..."}
+    {"type": "message", "conversation": 7, "content": "...", "is_user": true, ...}
+
+Both directions stream: the export reads rows with chunked ``.iterator()``
+queries and the import writes them with ``bulk_create`` in batches, one
+transaction per batch, so memory stays flat however much history there is.
+Offloaded bodies are exported in full and offloaded again on import.
+Imported conversations get new ids; the ids in the file only tie messages
+to their conversation. Archived conversations are exported with the
+messages from their archive file.
+"""
+
+import datetime
+import gzip
+import json
+import sys
+
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Conversation, Message
+
+FORMAT = "aichat-history"
+VERSION = 1
+# Rows fetched per database round trip while exporting
+EXPORT_CHUNK_SIZE = 2000
+# Rows written per transaction while importing
+IMPORT_BATCH_SIZE = 2000
+# Lines are joined into chunks of about this many bytes for HTTP responses
+STREAM_CHUNK_BYTES = 64 * 1024
+
+
+class HistoryFormatError(ValueError):
+    def __init__(self, line_number, message):
+        super().__init__(f"line {line_number}: {message}")
+        self.line_number = line_number
+
+
+def _line(record):
+    return json.dumps(record, ensure_ascii=False) + "\n"
+
+
+def message_record(message):
+    return {
+        "type": "message",
+        "conversation": message.conversation_id,
+        "content": message.full_content(),
+        "is_user": message.is_user,
+        "created_at": message.created_at.isoformat(),
+        "tool_suggested": message.tool_suggested,
+        "tool_used": message.tool_used,
+    }
+
+
+def export_lines(conversation_ids=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yield the export, one line at a time"""
+    conversations = Conversation.objects.order_by("id")
+    messages = Message.objects.order_by("conversation_id", "id")
+    if conversation_ids is not None:
+        conversations = conversations.filter(id__in=conversation_ids)
+        messages = messages.filter(conversation_id__in=conversation_ids)
+
+    yield _line({"type": "header", "format": FORMAT, "version": VERSION})
+    # Two ordered streams merged on conversation id, so neither side is
+    # ever held in memory
+    messages = messages.iterator(chunk_size=chunk_size)
+    message = next(messages, None)
+    for conversation in conversations.iterator(chunk_size=chunk_size):
+        yield _line(
+            {
+                "type": "conversation",
+                "id": conversation.id,
+                "title": conversation.title,
+                "created_at": conversation.created_at.isoformat(),
+                "updated_at": conversation.updated_at.isoformat(),
+            }
+        )
+        if conversation.archive_file:
+            # Archived messages are only in the cold tier
+            from .archive import archived_lines
+
+            for record in archived_lines(conversation):
+                if record.get("type") == "message":
+                    yield _line(record)
+        while message is not None and message.conversation_id <= conversation.id:
+            if message.conversation_id == conversation.id:
+                yield _line(message_record(message))
+            message = next(messages, None)
+
+
+def export_chunks(conversation_ids=None, chunk_bytes=STREAM_CHUNK_BYTES):
+    """The export as UTF-8 chunks of about ``chunk_bytes``, for streaming responses"""
+    buffer, size = [], 0
+    for line in export_lines(conversation_ids):
+        data = line.encode("utf-8")
+        buffer.append(data)
+        size += len(data)
+        if size >= chunk_bytes:
+            yield b"".join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield b"".join(buffer)
+
+
+def _timestamp(record, key, line_number):
+    value = record.get(key)
+    if value is None:
+        return timezone.now()
+    parsed = parse_datetime(value) if isinstance(value, str) else None
+    if parsed is None:
+        raise HistoryFormatError(line_number, f"'{key}' is not an ISO 8601 timestamp")
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed, datetime.timezone.utc)
+    return parsed
+
+
+def message_from_record(record, conversation, line_number):
+    """An unsaved Message for ``conversation`` from an exported message record"""
+    content = record.get("content")
+    if not isinstance(content, str):
+        raise HistoryFormatError(line_number, "message content must be a string")
+    return Message(
+        conversation=conversation,
+        content=content,
+        is_user=bool(record.get("is_user", True)),
+        created_at=_timestamp(record, "created_at", line_number),
+        tool_suggested=bool(record.get("tool_suggested", False)),
+        tool_used=bool(record.get("tool_used", False)),
+    )
+
+
+class _Batch:
+    def __init__(self):
+        self.conversations = []
+        self.updated_at = []
+        self.messages = []
+
+    def __len__(self):
+        return len(self.conversations) + len(self.messages)
+
+    def write(self):
+        with transaction.atomic():
+            Conversation.objects.bulk_create(self.conversations)
+            # bulk_create lets auto_now overwrite updated_at; bulk_update doesn't
+            for conversation, updated_at in zip(self.conversations, self.updated_at):
+                conversation.updated_at = updated_at
+            Conversation.objects.bulk_update(self.conversations, ["updated_at"])
+            for message in self.messages:
+                message.offload()
+            Message.objects.bulk_create(self.messages)
+        self.conversations, self.updated_at, self.messages = [], [], []
+
+
+def import_lines(lines, batch_size=IMPORT_BATCH_SIZE):
+    """Import an export from an iterable of lines (str or bytes)
+
+    Messages must follow the conversation they belong to, as they do in an
+    export. Each batch commits on its own, so after a HistoryFormatError
+    the batches before the bad line stay imported.
+
+    Returns ``{"conversations": n, "messages": n}``.
+    """
+    counts = {"conversations": 0, "messages": 0}
+    batch = _Batch()
+    current_id = current = None
+    seen_header = False
+    for line_number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as exc:
+            raise HistoryFormatError(line_number, f"invalid JSON ({exc})") from exc
+        kind = record.get("type") if isinstance(record, dict) else None
+
+        if not seen_header:
+            if kind != "header" or record.get("format") != FORMAT:
+                raise HistoryFormatError(line_number, f"not an {FORMAT} export")
+            if record.get("version") != VERSION:
+                raise HistoryFormatError(line_number, f"unsupported version {record.get('version')!r}")
+            seen_header = True
+        elif kind == "conversation":
+            current_id = record.get("id")
+            current = Conversation(
+                title=str(record.get("title") or "Imported Chat")[:200],
+                created_at=_timestamp(record, "created_at", line_number),
+            )
+            batch.conversations.append(current)
+            batch.updated_at.append(_timestamp(record, "updated_at", line_number))
+            counts["conversations"] += 1
+        elif kind == "message":
+            if current is None or record.get("conversation") != current_id:
+                raise HistoryFormatError(line_number, "message does not follow its conversation")
+            batch.messages.append(message_from_record(record, current, line_number))
+            counts["messages"] += 1
+        else:
+            raise HistoryFormatError(line_number, f"unknown record type {kind!r}")
+
+        if len(batch) >= batch_size:
+            batch.write()
+    if not seen_header:
+        raise HistoryFormatError(0, "the export is empty")
+    batch.write()
+    return counts
+
+
+def open_history(path, mode):
+    """Open an export file for ``mode`` 'r' or 'w'; '-' is stdin/stdout, '.gz' is gzip"""
+    if path == "-":
+        return sys.stdin.buffer if mode == "r" else sys.stdout.buffer
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "b")
+    return open(path, mode + "b")
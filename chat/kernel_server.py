@@ -0,0 +1,347 @@
+"""Persistent Python kernel for one conversation, run inside the sandbox
+
+This file is uploaded into the sandbox as-is and must only use the standard
+library. One kernel process per conversation listens on a Unix socket and
+executes snippets in a namespace that survives between runs, so imports and
+loaded data stay in memory.
+
+    python kernel_server.py run <socket> <code_file>   # starts the kernel if needed
+    python kernel_server.py run <socket> <code_file> --log <file>  # stream output to a file
+    python kernel_server.py interrupt <socket>         # stop the running snippet, keep state
+    python kernel_server.py stop <socket>
+    python kernel_server.py serve <socket>             # normally spawned by 'run'
+"""
+
+import argparse
+import contextlib
+import fcntl
+import io
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+import traceback
+
+DEFAULT_IDLE_TIMEOUT = 15 * 60
+DEFAULT_RUN_TIMEOUT = 120
+DEFAULT_MEMORY_MB = 1024
+OUTPUT_LIMIT = 256 * 1024
+
+# Exit codes understood by the web app
+EXIT_OK = 0
+EXIT_ERROR = 1
+EXIT_KERNEL_LOST = 3
+
+
+def _send(conn, payload):
+    conn.sendall(json.dumps(payload).encode("utf-8") + b"\n")
+
+
+def _recv(conn):
+    buf = bytearray()
+    while not buf.endswith(b"\n"):
+        chunk = conn.recv(65536)
+        if not chunk:
+            return None
+        buf += chunk
+    return json.loads(buf.decode("utf-8"))
+
+
+class _CappedWriter(io.TextIOBase):
+    def __init__(self, limit, log=None):
+        self.parts = []
+        self.size = 0
+        self.limit = limit
+        self.truncated = False
+        self.log = log
+
+    def writable(self):
+        return True
+
+    def write(self, text):
+        room = self.limit - self.size
+        if room > 0:
+            self.parts.append(text[:room])
+            self.size += min(len(text), room)
+            if self.log is not None:
+                self.log.write(text[:room])
+                self.log.flush()
+        if len(text) > room:
+            self.truncated = True
+        return len(text)
+
+    def getvalue(self):
+        return "".join(self.parts)
+
+
+class _RunTimeout(Exception):
+    pass
+
+
+def _on_alarm(signum, frame):
+    raise _RunTimeout()
+
+
+_executing = False
+
+
+def _on_interrupt(signum, frame):
+    # Only interrupt user code; never the accept loop
+    if _executing:
+        raise KeyboardInterrupt()
+
+
+def _pid_path(sock_path):
+    return os.path.splitext(sock_path)[0] + ".pid"
+
+
+@contextlib.contextmanager
+def _start_lock(sock_path):
+    """Hold ``<socket>.lock`` while a kernel is started or its socket removed
+
+    Runs that find no kernel take this lock and check again before
+    spawning, so two first runs of a conversation share one kernel.
+    """
+    with open(sock_path + ".lock", "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        yield
+
+
+def _read_pid(path):
+    with open(path) as f:
+        return int(f.read().strip())
+
+
+def _unlink_own(path, check):
+    """Remove ``path`` only while ``check(path)`` says it is still ours"""
+    try:
+        if check(path):
+            os.unlink(path)
+    except (OSError, ValueError):
+        pass
+
+
+def serve(sock_path, idle_timeout, memory_mb):
+    import resource
+
+    limit = memory_mb * 1024 * 1024
+    resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    signal.signal(signal.SIGALRM, _on_alarm)
+    signal.signal(signal.SIGINT, _on_interrupt)
+    try:
+        _connect(sock_path).close()
+        return  # another kernel already serves this socket
+    except OSError:
+        pass
+    with open(_pid_path(sock_path), "w") as f:
+        f.write(str(os.getpid()))
+
+    if os.path.exists(sock_path):
+        os.unlink(sock_path)  # left behind by a kernel that died
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(sock_path)
+    server.listen(4)
+    server.settimeout(idle_timeout)
+    bound = os.stat(sock_path).st_ino
+
+    namespace = {"__name__": "__main__"}
+    try:
+        while True:
+            try:
+                conn, _ = server.accept()
+            except socket.timeout:
+                return  # idle for too long
+            with conn:
+                request = _recv(conn)
+                if request is None:
+                    continue
+                if request.get("op") == "shutdown":
+                    _send(conn, {"ok": True})
+                    return
+                _send(conn, _execute(namespace, request))
+    finally:
+        server.close()
+        # A kernel started after this one went idle owns the paths by now
+        _unlink_own(sock_path, lambda path: os.stat(path).st_ino == bound)
+        _unlink_own(_pid_path(sock_path), lambda path: _read_pid(path) == os.getpid())
+
+
+def _execute(namespace, request):
+    global _executing
+
+    log = open(request["log"], "a", encoding="utf-8") if request.get("log") else None
+    out = _CappedWriter(OUTPUT_LIMIT, log)
+    saved = sys.stdout, sys.stderr
+    sys.stdout = sys.stderr = out
+    started = time.monotonic()
+    failed = timed_out = interrupted = False
+    signal.alarm(int(request.get("timeout") or DEFAULT_RUN_TIMEOUT))
+    _executing = True
+    try:
+        exec(compile(request["code"], "<snippet>", "exec"), namespace)
+    except _RunTimeout:
+        failed = timed_out = True
+    except KeyboardInterrupt:
+        failed = interrupted = True
+    except BaseException:
+        failed = True
+        etype, value, tb = sys.exc_info()
+        while tb is not None and tb.tb_frame.f_code.co_filename != "<snippet>":
+            tb = tb.tb_next
+        traceback.print_exception(etype, value, tb, file=out)
+    finally:
+        _executing = False
+        signal.alarm(0)
+        sys.stdout, sys.stderr = saved
+        if log is not None:
+            log.close()
+    return {
+        "output": out.getvalue(),
+        "truncated": out.truncated,
+        "failed": failed,
+        "timed_out": timed_out,
+        "interrupted": interrupted,
+        "duration": time.monotonic() - started,
+    }
+
+
+def _connect(sock_path):
+    conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    conn.connect(sock_path)
+    return conn
+
+
+def _spawn(sock_path, args):
+    """Connect to the kernel, starting it first if none is listening
+
+    Returns ``(conn, started)``.
+    """
+    with _start_lock(sock_path):
+        try:
+            return _connect(sock_path), False
+        except OSError:
+            pass
+        log_path = os.path.splitext(sock_path)[0] + ".log"
+        with open(log_path, "ab") as log:
+            subprocess.Popen(
+                [
+                    sys.executable,
+                    os.path.abspath(__file__),
+                    "serve",
+                    sock_path,
+                    "--idle-timeout",
+                    str(args.idle_timeout),
+                    "--memory-mb",
+                    str(args.memory_mb),
+                ],
+                stdin=subprocess.DEVNULL,
+                stdout=log,
+                stderr=log,
+                start_new_session=True,
+            )
+        deadline = time.monotonic() + 10
+        while time.monotonic() < deadline:
+            try:
+                return _connect(sock_path), True
+            except OSError:
+                time.sleep(0.05)
+        raise RuntimeError("kernel did not start")
+
+
+def run(sock_path, code_file, args):
+    with open(code_file, "r", encoding="utf-8") as f:
+        code = f.read()
+    os.unlink(code_file)
+
+    # With --log, output goes to the log file as it is produced (for
+    # streaming) and only the notes below are added; otherwise to stdout
+    if args.log:
+        out = open(args.log, "a", encoding="utf-8")
+    else:
+        out = sys.stdout
+
+    try:
+        conn = _connect(sock_path)
+    except OSError:
+        conn, started = _spawn(sock_path, args)
+        if started:
+            out.write("[new kernel started]\n")
+            out.flush()
+
+    with conn:
+        try:
+            _send(conn, {"code": code, "timeout": args.timeout, "log": args.log})
+            reply = _recv(conn)
+        except OSError:
+            reply = None
+    if reply is None:
+        # The kernel died mid-run (e.g. killed for memory); state is gone.
+        # Its socket is removed unless another run has started a new one
+        with _start_lock(sock_path):
+            try:
+                _connect(sock_path).close()
+            except OSError:
+                try:
+                    os.unlink(sock_path)
+                except OSError:
+                    pass
+        out.write("Kernel died while running this code; its state has been lost.\n")
+        return EXIT_KERNEL_LOST
+
+    if not args.log:
+        out.write(reply["output"])
+    if reply["truncated"]:
+        out.write("\n[Output truncated]\n")
+    if reply["timed_out"]:
+        out.write(f"\nInterrupted after {args.timeout}s; kernel state was kept.\n")
+    if reply.get("interrupted"):
+        out.write("\nInterrupted; kernel state was kept.\n")
+    out.flush()
+    return EXIT_ERROR if reply["failed"] else EXIT_OK
+
+
+def interrupt(sock_path):
+    try:
+        os.kill(_read_pid(_pid_path(sock_path)), signal.SIGINT)
+    except (OSError, ValueError):
+        pass
+    return EXIT_OK
+
+
+def stop(sock_path):
+    try:
+        with _connect(sock_path) as conn:
+            _send(conn, {"op": "shutdown"})
+            _recv(conn)
+    except OSError:
+        pass
+    return EXIT_OK
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("command", choices=["serve", "run", "interrupt", "stop"])
+    parser.add_argument("socket")
+    parser.add_argument("code_file", nargs="?")
+    parser.add_argument("--idle-timeout", type=int, default=DEFAULT_IDLE_TIMEOUT)
+    parser.add_argument("--memory-mb", type=int, default=DEFAULT_MEMORY_MB)
+    parser.add_argument("--timeout", type=int, default=DEFAULT_RUN_TIMEOUT)
+    parser.add_argument("--log")
+    args = parser.parse_args(argv)
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.socket)), exist_ok=True)
+    if args.command == "serve":
+        serve(args.socket, args.idle_timeout, args.memory_mb)
+        return EXIT_OK
+    if args.command == "stop":
+        return stop(args.socket)
+    if args.command == "interrupt":
+        return interrupt(args.socket)
+    return run(args.socket, args.code_file, args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
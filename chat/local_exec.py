@@ -0,0 +1,487 @@
+"""Local Python execution on a pool of warm, pre-imported worker processes
+
+Each worker is a zygote: it starts once, imports the commonly used modules,
+then forks a fresh child for every snippet. The child inherits the warm
+interpreter copy-on-write, applies rlimits, installs audit hooks and runs
+the code; the worker enforces the wall-clock timeout and output cap and
+reports back. No Django imports here - this file is also the worker's entry
+point (``python chat/local_exec.py``).
+
+The rlimits, timeout and output cap are enforced by the kernel and the
+worker. The audit hooks that keep writes inside the workspace and block new
+processes are best-effort only: they see what goes through the Python
+APIs that raise audit events, and code can step around them (``ctypes``,
+``_posixsubprocess``, an extension module). They stop mistakes, not a
+determined snippet; this is not isolation, and untrusted code belongs in
+the Daytona sandbox.
+"""
+
+import atexit
+import codecs
+import json
+import os
+import queue
+import select
+import signal
+import struct
+import subprocess
+import sys
+import threading
+import time
+
+DEFAULT_POOL_SIZE = int(os.getenv("LOCAL_EXEC_WORKERS", "2"))
+DEFAULT_TIMEOUT = float(os.getenv("LOCAL_EXEC_TIMEOUT", "30"))
+DEFAULT_CPU_SECONDS = int(os.getenv("LOCAL_EXEC_CPU_SECONDS", "10"))
+DEFAULT_MEMORY_BYTES = int(os.getenv("LOCAL_EXEC_MEMORY_MB", "512")) * 1024 * 1024
+DEFAULT_OUTPUT_LIMIT = 256 * 1024
+MAX_FILE_BYTES = 64 * 1024 * 1024
+
+# Imported once per worker so snippets don't pay for them
+PRELOAD_MODULES = (
+    "collections",
+    "csv",
+    "datetime",
+    "decimal",
+    "functools",
+    "itertools",
+    "json",
+    "math",
+    "random",
+    "re",
+    "statistics",
+    "string",
+    "textwrap",
+    "traceback",
+    # Optional heavy hitters, skipped when not installed
+    "numpy",
+    "pandas",
+)
+
+_FRAME = struct.Struct("!I")
+
+_BLOCKED_EVENTS = {
+    "os.exec",
+    "os.fork",
+    "os.forkpty",
+    "os.posix_spawn",
+    "os.spawn",
+    "os.system",
+    "pty.spawn",
+    "subprocess.Popen",
+}
+_WRITE_EVENTS = {
+    "os.chmod",
+    "os.chown",
+    "os.link",
+    "os.mkdir",
+    "os.remove",
+    "os.rename",
+    "os.rmdir",
+    "os.symlink",
+    "os.truncate",
+    "os.utime",
+    "shutil.rmtree",
+}
+
+
+def _send_frame(stream, payload):
+    data = json.dumps(payload).encode("utf-8")
+    stream.write(_FRAME.pack(len(data)) + data)
+    stream.flush()
+
+
+def _recv_frame(stream):
+    header = stream.read(_FRAME.size)
+    if len(header) < _FRAME.size:
+        return None
+    (length,) = _FRAME.unpack(header)
+    return json.loads(stream.read(length).decode("utf-8"))
+
+
+# --- Worker side -----------------------------------------------------------
+
+
+def _confine_to_workspace(workspace, read_roots):
+    """Audit hook: writes only inside the workspace, no new processes
+
+    Best-effort (see the module docstring): only calls that raise these
+    audit events are checked.
+    """
+    workspace = os.path.realpath(workspace)
+    prefix = workspace.rstrip(os.sep) + os.sep
+    read_prefixes = tuple(
+        os.path.realpath(root).rstrip(os.sep) + os.sep for root in read_roots if root
+    ) + (prefix, "/dev/", "/proc/self/")
+
+    def inside(path, prefixes):
+        if isinstance(path, int):
+            return True
+        full = os.path.realpath(os.fsdecode(path))
+        return full == workspace or full.startswith(prefixes)
+
+    def hook(event, args):
+        if event in _BLOCKED_EVENTS:
+            raise PermissionError(f"{event} is not allowed in the sandbox")
+        if event == "open" and args and args[0] is not None:
+            path, mode, flags = args
+            writing = bool(flags & (os.O_WRONLY | os.O_RDWR | os.O_CREAT)) or (
+                isinstance(mode, str) and any(c in mode for c in "wax+")
+            )
+            if not inside(path, (prefix,) if writing else read_prefixes):
+                raise PermissionError(f"Access outside the workspace denied: {path}")
+        elif event in _WRITE_EVENTS and args:
+            for path in args[:2]:
+                if isinstance(path, (str, bytes, os.PathLike)) and not inside(path, (prefix,)):
+                    raise PermissionError(f"Access outside the workspace denied: {path}")
+
+    sys.addaudithook(hook)
+
+
+def _run_child(request, write_fd):
+    """Runs in the forked child; never returns"""
+    import resource
+    import traceback
+
+    try:
+        os.setsid()
+        cpu = request["cpu_seconds"]
+        resource.setrlimit(resource.RLIMIT_CPU, (cpu, cpu + 1))
+        resource.setrlimit(resource.RLIMIT_AS, (request["memory_bytes"], request["memory_bytes"]))
+        resource.setrlimit(resource.RLIMIT_FSIZE, (MAX_FILE_BYTES, MAX_FILE_BYTES))
+
+        os.dup2(write_fd, 1)
+        os.dup2(write_fd, 2)
+        os.close(write_fd)
+        null_fd = os.open(os.devnull, os.O_RDONLY)
+        os.dup2(null_fd, 0)
+        os.close(null_fd)
+        sys.stdin = open(0, "r", closefd=False)
+        sys.stdout = open(1, "w", buffering=1, closefd=False)
+        sys.stderr = open(2, "w", buffering=1, closefd=False)
+
+        os.chdir(request["workspace"])
+        _confine_to_workspace(request["workspace"], sys.path + [sys.prefix, sys.base_prefix])
+        sys.argv = ["<snippet>"]
+        code = compile(request["code"], "<snippet>", "exec")
+    except BaseException:
+        traceback.print_exc()
+        os._exit(1)
+
+    exit_code = 0
+    try:
+        exec(code, {"__name__": "__main__", "__builtins__": __builtins__})
+    except SystemExit as e:
+        exit_code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+    except BaseException:
+        # Start the traceback at the snippet, not at this runner
+        etype, value, tb = sys.exc_info()
+        while tb is not None and tb.tb_frame.f_code.co_filename != "<snippet>":
+            tb = tb.tb_next
+        traceback.print_exception(etype, value, tb)
+        exit_code = 1
+    finally:
+        try:
+            sys.stdout.flush()
+            sys.stderr.flush()
+        except Exception:
+            pass
+    os._exit(exit_code)
+
+
+def _wait_until(pid, deadline):
+    """Poll for ``pid`` to exit until ``deadline``; returns whether it did (still unreaped)"""
+    delay = 0.001
+    while True:
+        try:
+            if os.waitid(os.P_PID, pid, os.WEXITED | os.WNOHANG | os.WNOWAIT) is not None:
+                return True
+        except ChildProcessError:
+            return True
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return False
+        time.sleep(min(delay, remaining))
+        delay = min(delay * 2, 0.05)
+
+
+def _supervise(request, pid, read_fd, on_output=None):
+    """Collect a child's output under the timeout and output cap
+
+    ``on_output`` receives each piece of (capped) output as it arrives.
+    """
+    started = time.monotonic()
+    deadline = started + request["timeout"]
+    limit = request["output_limit"]
+    output = bytearray()
+    truncated = timed_out = False
+
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            timed_out = True
+            break
+        ready, _, _ = select.select([read_fd], [], [], remaining)
+        if not ready:
+            continue
+        chunk = os.read(read_fd, 65536)
+        if not chunk:
+            # The child closed its output, which need not mean it has exited
+            timed_out = not _wait_until(pid, deadline)
+            break
+        # Keep draining past the cap so the child never blocks on a full pipe
+        kept = chunk[: max(0, limit - len(output))]
+        output += kept
+        truncated = truncated or len(kept) < len(chunk)
+        if on_output is not None and kept:
+            on_output(kept)
+    if timed_out:
+        try:
+            os.killpg(pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+    os.close(read_fd)
+
+    _, status = os.waitpid(pid, 0)
+    return {
+        "exit_code": os.waitstatus_to_exitcode(status),
+        "output": output.decode("utf-8", errors="replace"),
+        "truncated": truncated,
+        "timed_out": timed_out,
+        "duration": time.monotonic() - started,
+    }
+
+
+def _worker_main():
+    """Zygote loop: preload modules, then fork one child per request"""
+    import importlib
+
+    for name in PRELOAD_MODULES:
+        try:
+            importlib.import_module(name)
+        except Exception:
+            pass
+
+    requests_in = sys.stdin.buffer
+    replies_out = sys.stdout.buffer
+    _send_frame(replies_out, {"ready": True, "pid": os.getpid()})
+
+    while True:
+        request = _recv_frame(requests_in)
+        if request is None:
+            return
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            _run_child(request, write_fd)
+        os.close(write_fd)
+
+        on_output = None
+        if request.get("stream"):
+            _send_frame(replies_out, {"type": "started", "pid": pid})
+            decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+
+            def on_output(data):
+                text = decoder.decode(data)
+                if text:
+                    _send_frame(replies_out, {"type": "output", "data": text})
+
+        result = _supervise(request, pid, read_fd, on_output)
+        result["type"] = "result"
+        _send_frame(replies_out, result)
+
+
+# --- Client side -----------------------------------------------------------
+
+
+class _Worker:
+    def __init__(self):
+        self.process = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__)],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            close_fds=True,
+        )
+        hello = _recv_frame(self.process.stdout)
+        if not hello or not hello.get("ready"):
+            self.close()
+            raise RuntimeError("Execution worker failed to start")
+
+    def send(self, request):
+        _send_frame(self.process.stdin, request)
+
+    def recv(self):
+        reply = _recv_frame(self.process.stdout)
+        if reply is None:
+            raise RuntimeError("Execution worker exited unexpectedly")
+        return reply
+
+    def run(self, request):
+        self.send(request)
+        return self.recv()
+
+    def close(self):
+        try:
+            self.process.stdin.close()
+        except Exception:
+            pass
+        try:
+            self.process.wait(timeout=1)
+        except Exception:
+            self.process.kill()
+
+
+class WarmInterpreterPool:
+    """Pool of zygote workers shared by all requests in this process"""
+
+    def __init__(
+        self,
+        workspace_dir,
+        size=DEFAULT_POOL_SIZE,
+        timeout=DEFAULT_TIMEOUT,
+        cpu_seconds=DEFAULT_CPU_SECONDS,
+        memory_bytes=DEFAULT_MEMORY_BYTES,
+        output_limit=DEFAULT_OUTPUT_LIMIT,
+    ):
+        self.workspace_dir = workspace_dir
+        self.size = size
+        self.timeout = timeout
+        self.cpu_seconds = cpu_seconds
+        self.memory_bytes = memory_bytes
+        self.output_limit = output_limit
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+        self._started = 0
+        atexit.register(self.shutdown)
+
+    def _acquire(self):
+        with self._lock:
+            if self._idle.empty() and self._started < self.size:
+                self._started += 1
+                try:
+                    return _Worker()
+                except Exception:
+                    self._started -= 1
+                    raise
+        try:
+            return self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise RuntimeError(
+                f"No execution worker became available within {self.timeout:g}s "
+                f"(all {self.size} are busy); try again shortly"
+            ) from None
+
+    def _replace(self, worker):
+        """Drop a broken worker and start a warm replacement in the background"""
+        worker.close()
+
+        def spawn():
+            try:
+                self._idle.put(_Worker())
+            except Exception:
+                with self._lock:
+                    self._started -= 1
+
+        threading.Thread(target=spawn, daemon=True).start()
+
+    def warm(self):
+        """Start all workers ahead of the first snippet"""
+        workers = []
+        with self._lock:
+            while self._started < self.size:
+                self._started += 1
+                workers.append(_Worker())
+        for worker in workers:
+            self._idle.put(worker)
+
+    def _request(self, code, timeout):
+        return {
+            "code": code,
+            "workspace": self.workspace_dir,
+            "timeout": timeout or self.timeout,
+            "cpu_seconds": self.cpu_seconds,
+            "memory_bytes": self.memory_bytes,
+            "output_limit": self.output_limit,
+        }
+
+    def run(self, code, timeout=None):
+        """Run a snippet in a fresh child of a warm worker; returns a result dict"""
+        request = self._request(code, timeout)
+        worker = self._acquire()
+        try:
+            result = worker.run(request)
+        except Exception:
+            self._replace(worker)
+            raise
+        self._idle.put(worker)
+        return result
+
+    def stream(self, code, timeout=None):
+        """Run a snippet, yielding output while it runs
+
+        Yields ("started", child_pid), then ("output", text) pieces, then
+        ("result", result dict). Closing the generator early kills the child.
+        """
+        request = self._request(code, timeout)
+        request["stream"] = True
+        worker = self._acquire()
+        child_pid = None
+        try:
+            worker.send(request)
+            while True:
+                frame = worker.recv()
+                if frame["type"] == "started":
+                    child_pid = frame["pid"]
+                    yield "started", child_pid
+                elif frame["type"] == "output":
+                    yield "output", frame["data"]
+                else:
+                    break
+        except BaseException:
+            # Consumer went away or the worker broke; don't reuse the worker
+            if child_pid:
+                kill_run(child_pid)
+            self._replace(worker)
+            raise
+        self._idle.put(worker)
+        yield "result", frame
+
+    def shutdown(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+def kill_run(child_pid):
+    """Kill a running snippet (and anything it started) by its child pid"""
+    try:
+        os.killpg(child_pid, signal.SIGKILL)
+        return True
+    except (ProcessLookupError, PermissionError):
+        return False
+
+
+def format_execution_result(result, cancelled=False):
+    """Render a pool result like the Daytona backend's execution output"""
+    output = result["output"] or "<no output>"
+    if result["truncated"]:
+        output += "\n\n[Output truncated]"
+    if cancelled:
+        return f"Execution cancelled after {result['duration']:.1f}s:\n{output}"
+    if result["timed_out"]:
+        return f"Error: Execution timed out after {result['duration']:.1f}s\n{output}"
+    exit_code = result["exit_code"]
+    if exit_code < 0:
+        try:
+            name = signal.Signals(-exit_code).name
+        except ValueError:
+            # Real-time signals have no name
+            name = f"signal {-exit_code}"
+        return f"Execution result (killed by {name}, CPU or memory limit reached):\n{output}"
+    return f"Execution result (exit={exit_code}):\n{output}"
+
+
+if __name__ == "__main__":
+    _worker_main()
@@ -0,0 +1,389 @@
+import hashlib
+import mmap
+import os
+import posixpath
+import stat
+
+from .checkpoints import (
+    CheckpointError,
+    CheckpointStore,
+    format_checkpoint_list,
+    format_diff_result,
+    format_restore_result,
+)
+from .code_search import (
+    SEARCH_RESULT_LIMIT,
+    TrigramIndex,
+    format_search_results,
+    scan_search,
+)
+from .file_patch import (
+    PatchConflict,
+    apply_patch,
+    format_conflict,
+    format_edit_result,
+)
+from .file_tree import (
+    DEFAULT_TREE_DEPTH,
+    TREE_ENTRY_LIMIT,
+    DirectorySnapshotCache,
+    format_tree,
+    tree_lines,
+)
+from .file_ranges import (
+    STREAM_CHUNK_SIZE,
+    format_read_result,
+    iter_chunks,
+    read_range,
+    read_range_mmap,
+)
+from .path_confinement import PathEscape, WorkspaceRoot
+from .uploads import UPLOAD_BLOCK_SIZE, check_upload, format_upload_result, staging_name
+
+# Files at least this large are memory-mapped for ranged reads
+MMAP_THRESHOLD = 1024 * 1024
+
+
+class LocalSandbox:
+    """Local filesystem backend used when no Daytona sandbox is configured.
+
+    One instance serves all requests: the workspace is resolved once, listings
+    come from a single ``os.scandir`` pass, and large files are memory-mapped
+    for ranged reads. Searches use a trigram index of the workspace that
+    writes and deletes keep current. All file operations are confined to the
+    workspace: each one reaches its target with a confined walk from the
+    workspace and acts on it relative to the directory it found there
+    (see path_confinement).
+    """
+
+    def __init__(self, workspace_dir: str = "/home/runner/workspace"):
+        self.workspace_dir = workspace_dir
+        self._root = WorkspaceRoot(workspace_dir)
+        self.workspace = self._root.path
+        self._search_index = TrigramIndex(self.workspace)
+        self._snapshots = DirectorySnapshotCache()
+
+    def _full_path(self, rel_path: str) -> str:
+        return os.path.join(self.workspace, rel_path)
+
+    def read_file(self, file_path: str) -> str:
+        """Read a file (previews files above the inline limit)"""
+        return self.read_file_range(file_path)
+
+    def read_file_range(self, file_path: str, **options) -> str:
+        """Read a byte or line range without loading the whole file"""
+        try:
+            rel_path, error = self._root.relative(file_path)
+            if error:
+                return error
+
+            with os.fdopen(self._root.open(rel_path), "rb") as f:
+                total_size = os.fstat(f.fileno()).st_size
+                if total_size >= MMAP_THRESHOLD:
+                    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                        data, truncated = read_range_mmap(mm, options)
+                else:
+                    data, truncated = read_range(f, options)
+            # Return path shown as provided by user to avoid leaking internal layout
+            return format_read_result(file_path, data, truncated, options, total_size)
+        except IsADirectoryError:
+            return f"Error: '{file_path}' is a directory"
+        except PathEscape as e:
+            return str(e)
+        except Exception as e:
+            return f"Error reading file '{file_path}': {str(e)}"
+
+    def open_stream(self, file_path: str, chunk_size: int = STREAM_CHUNK_SIZE):
+        """Open a file for chunked streaming; returns (chunk iterator, error)"""
+        rel_path, error = self._root.relative(file_path)
+        if error:
+            return None, error
+        try:
+            f = os.fdopen(self._root.open(rel_path), "rb")
+        except FileNotFoundError:
+            return None, f"Error: File '{file_path}' not found"
+        except PathEscape as e:
+            return None, str(e)
+        except Exception as e:
+            return None, f"Error reading file '{file_path}': {str(e)}"
+
+        def chunks():
+            with f:
+                yield from iter_chunks(f, chunk_size)
+
+        return chunks(), None
+
+    def write_file(self, file_path: str, content: str) -> str:
+        """Write a file, creating parent directories as needed
+
+        Files are written beside the target and renamed into place, which
+        leaves checkpoint hard links to the old version intact.
+        """
+        try:
+            rel_path, error = self._root.relative(file_path)
+            if error:
+                return error
+
+            rel_path = self._root.replace(rel_path, content.encode("utf-8"))
+            self._search_index.update_file(self._full_path(rel_path))
+            return f"Successfully wrote to {file_path}"
+        except PathEscape as e:
+            return str(e)
+        except Exception as e:
+            return f"Error writing file '{file_path}': {str(e)}"
+
+    def edit_file(self, file_path: str, patch: str) -> str:
+        """Apply search/replace blocks or a unified diff, replacing the file atomically"""
+        try:
+            rel_path, error = self._root.relative(file_path)
+            if error:
+                return error
+
+            try:
+                with open(self._root.open(rel_path), "r", encoding="utf-8", newline="") as f:
+                    text = f.read()
+            except FileNotFoundError:
+                return f"Error: File '{file_path}' does not exist"
+            try:
+                new_text, added, removed = apply_patch(text, patch)
+            except PatchConflict as e:
+                return format_conflict(file_path, e)
+            changed = new_text != text
+            if changed:
+                rel_path = self._root.replace(rel_path, new_text.encode("utf-8"))
+                self._search_index.update_file(self._full_path(rel_path))
+            return format_edit_result(file_path, added, removed, changed)
+        except PathEscape as e:
+            return str(e)
+        except Exception as e:
+            return f"Error editing file '{file_path}': {str(e)}"
+
+    def delete_file(self, file_path: str) -> str:
+        """Delete a file"""
+        try:
+            rel_path, error = self._root.relative(file_path)
+            if error:
+                return error
+
+            try:
+                rel_path = self._root.unlink(rel_path)
+            except FileNotFoundError:
+                return f"Error: File '{file_path}' does not exist"
+            self._search_index.remove_file(self._full_path(rel_path))
+            return f"Successfully deleted {file_path}"
+        except PathEscape as e:
+            return str(e)
+        except Exception as e:
+            return f"Error deleting file '{file_path}': {str(e)}"
+
+    def write_upload_chunk(self, upload_id: str, offset: int, blocks):
+        """Write one chunk of a resumable upload at ``offset``; returns an error or None
+
+        Anything already staged past ``offset`` is discarded, so a chunk that
+        failed its checksum is simply sent again.
+        """
+        flags = os.O_WRONLY if offset else os.O_WRONLY | os.O_CREAT | os.O_TRUNC
+        try:
+            try:
+                fd = self._root.open(staging_name(upload_id), flags, create_parents=True)
+            except FileNotFoundError:
+                return "Error: Upload data is missing; start the upload again"
+            with os.fdopen(fd, "wb") as f:
+                f.seek(offset)
+                for block in blocks:
+                    f.write(block)
+                f.truncate()
+            return None
+        except Exception as e:
+            return f"Error writing upload chunk: {str(e)}"
+
+    def finish_upload(self, upload_id: str, file_path: str, size: int, sha256: str = "") -> str:
+        """Verify a staged upload and move it into place atomically"""
+        try:
+            rel_path, error = self._root.relative(file_path)
+            if error:
+                return error
+
+            staging = staging_name(upload_id)
+            digest = hashlib.sha256()
+            received = 0
+            # An upload of nothing has no chunks, so nothing staged yet
+            with os.fdopen(self._root.open(staging, os.O_RDONLY | os.O_CREAT, create_parents=True), "rb") as f:
+                for chunk in iter_chunks(f, UPLOAD_BLOCK_SIZE):
+                    digest.update(chunk)
+                    received += len(chunk)
+            error = check_upload(file_path, received, size, digest.hexdigest(), sha256)
+            if error:
+                return error
+
+            try:
+                rel_path = self._root.rename(staging, rel_path)
+            except IsADirectoryError:
+                return f"Error: '{file_path}' is a directory"
+            self._search_index.update_file(self._full_path(rel_path))
+            return format_upload_result(file_path, received, digest.hexdigest())
+        except PathEscape as e:
+            return str(e)
+        except Exception as e:
+            return f"Error uploading file '{file_path}': {str(e)}"
+
+    def discard_upload(self, upload_id: str) -> None:
+        try:
+            self._root.unlink(staging_name(upload_id))
+        except OSError:
+            pass
+
+    def create_checkpoint(self, conversation_id, label: str, paths, replaces=True):
+        """Checkpoint the files a tool is about to change; returns the checkpoint id
+
+        They are hard-linked only when ``replaces`` promises the tool renames
+        a new file over each one (or deletes it); otherwise an in-place
+        write would alter the image too, so they are reflinked or copied.
+        """
+        rel_paths = []
+        for file_path in paths:
+            rel_path, error = self._root.relative(file_path)
+            if not error:
+                rel_paths.append(rel_path)
+        store = CheckpointStore(self.workspace, conversation_id, allow_link=replaces)
+        return store.save(label, rel_paths, at=self._root.at)
+
+    def drop_checkpoint(self, conversation_id, checkpoint_id: int) -> None:
+        CheckpointStore(self.workspace, conversation_id).drop(checkpoint_id)
+
+    def list_checkpoints(self, conversation_id) -> str:
+        try:
+            return format_checkpoint_list(CheckpointStore(self.workspace, conversation_id).list())
+        except Exception as e:
+            return f"Error listing checkpoints: {str(e)}"
+
+    def restore_checkpoint(self, conversation_id, checkpoint_id: int) -> str:
+        """Put every file changed since the checkpoint back as it was"""
+        try:
+            store = CheckpointStore(self.workspace, conversation_id)
+            undo_id, changes = store.restore(checkpoint_id)
+            for rel_path, _ in changes:
+                self._search_index.update_file(os.path.join(self.workspace, rel_path))
+            return format_restore_result(checkpoint_id, undo_id, changes)
+        except CheckpointError as e:
+            return f"Error: {e}"
+        except Exception as e:
+            return f"Error restoring checkpoint #{checkpoint_id}: {str(e)}"
+
+    def diff_checkpoints(self, conversation_id, from_id: int, to_id=None) -> str:
+        try:
+            parts = CheckpointStore(self.workspace, conversation_id).diff(from_id, to_id)
+            return format_diff_result(from_id, to_id, parts)
+        except CheckpointError as e:
+            return f"Error: {e}"
+        except Exception as e:
+            return f"Error comparing checkpoints: {str(e)}"
+
+    def list_files(self, directory_path: str) -> str:
+        """List a directory with one scandir pass
+
+        Entry types come from the dirent itself; only regular files are
+        stat'ed (once) for their size.
+        """
+        try:
+            rel_path, error = self._root.relative(directory_path)
+            if error:
+                return error
+
+            items = []
+            try:
+                with self._root.scandir(rel_path) as scanner:
+                    for entry in scanner:
+                        if entry.is_dir():
+                            items.append(f"DIR: {entry.name} (0 bytes)")
+                        elif entry.is_file():
+                            items.append(f"FILE: {entry.name} ({entry.stat().st_size} bytes)")
+                        else:
+                            items.append(f"FILE: {entry.name} (0 bytes)")
+            except FileNotFoundError:
+                return f"Error: Directory '{directory_path}' does not exist"
+
+            if not items:
+                return f"Contents of {directory_path}:\n\n(empty directory)"
+
+            items.sort()
+            return f"Contents of {directory_path}:\n\n" + "\n".join(items)
+        except NotADirectoryError:
+            return f"Error: '{directory_path}' is not a directory"
+        except PathEscape as e:
+            return str(e)
+        except Exception as e:
+            return f"Error listing directory '{directory_path}': {str(e)}"
+
+    def list_tree(
+        self,
+        directory_path: str,
+        depth=DEFAULT_TREE_DEPTH,
+        include=None,
+        exclude=None,
+        limit=TREE_ENTRY_LIMIT,
+        **_,
+    ) -> str:
+        """List a directory recursively from cached directory snapshots"""
+        try:
+            rel_path, error = self._root.relative(directory_path)
+            if error:
+                return error
+            try:
+                if not stat.S_ISDIR(self._root.stat(rel_path).st_mode):
+                    return f"Error: '{directory_path}' is not a directory"
+            except FileNotFoundError:
+                return f"Error: Directory '{directory_path}' does not exist"
+
+            def list_dir(rel_dir):
+                return self._snapshots.entries(
+                    posixpath.normpath(posixpath.join(rel_path, rel_dir)), self._root.stat, self._root.scandir
+                )
+
+            lines = tree_lines(list_dir, depth, include, exclude)
+            return format_tree(directory_path, lines, depth, limit)
+        except PathEscape as e:
+            return str(e)
+        except Exception as e:
+            return f"Error listing directory '{directory_path}': {str(e)}"
+
+    def get_file_info(self, file_path: str) -> str:
+        """Describe a file from a single stat call"""
+        try:
+            rel_path, error = self._root.relative(file_path)
+            if error:
+                return error
+
+            try:
+                stat_info = self._root.stat(rel_path)
+            except FileNotFoundError:
+                return f"Error: File '{file_path}' does not exist"
+            file_type = "Directory" if stat.S_ISDIR(stat_info.st_mode) else "File"
+
+            return f"""File Information for {file_path}:
+Type: {file_type}
+Size: {stat_info.st_size} bytes
+Modified: {stat_info.st_mtime}
+Permissions: {oct(stat_info.st_mode)[-3:]}"""
+        except PathEscape as e:
+            return str(e)
+        except Exception as e:
+            return f"Error getting file info '{file_path}': {str(e)}"
+
+    def search_files(self, query: str, glob=None, limit=SEARCH_RESULT_LIMIT) -> str:
+        """Find lines containing ``query`` (case-insensitive) across the workspace
+
+        Served from the trigram index once it is built; until then, and for
+        queries under three characters, files are scanned in parallel.
+        """
+        try:
+            found = self._search_index.search(query, glob, limit)
+            if found is None:
+                found = scan_search(self.workspace, query, glob, limit)
+            return format_search_results(query, *found)
+        except Exception as e:
+            return f"Error searching files: {str(e)}"
+
+    def execute_code(self, code: str, language: str) -> str:
+        """Mock code execution operation"""
+        return f"Mock code execution ({language}):\n{code}\n\n[Mock mode - actual execution requires Daytona API key]"
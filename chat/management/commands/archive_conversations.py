@@ -0,0 +1,52 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from chat.archive import ARCHIVE_AFTER_DAYS, archive_conversations, stale_conversations
+from chat.message_search import FTS_TABLES
+from chat.models import Message
+
+
+class Command(BaseCommand):
+    help = "Move conversations not updated for a while to compressed archive files"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=ARCHIVE_AFTER_DAYS,
+            help="Archive conversations not updated for this many days (default %(default)s)",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only report what would be archived",
+        )
+        parser.add_argument(
+            "--vacuum",
+            action="store_true",
+            help="Optimize the search index and VACUUM the database afterwards to return the space",
+        )
+
+    def handle(self, *args, **options):
+        if options["dry_run"]:
+            stale = stale_conversations(options["days"])
+            messages = Message.objects.filter(conversation__in=stale).count()
+            self.stdout.write(f"Would archive {stale.count()} conversations ({messages} messages)")
+            return
+
+        started = time.perf_counter()
+        counts = archive_conversations(options["days"])
+        self.stdout.write(
+            f"Archived {counts['conversations']} conversations ({counts['messages']} messages) "
+            f"in {time.perf_counter() - started:.1f}s"
+        )
+        if options["vacuum"]:
+            started = time.perf_counter()
+            with connection.cursor() as cursor:
+                for table in FTS_TABLES:
+                    cursor.execute(f"INSERT INTO {table}({table}) VALUES ('optimize')")
+                cursor.execute("VACUUM")
+            self.stdout.write(f"Vacuumed in {time.perf_counter() - started:.1f}s")
+        self.stdout.write(self.style.SUCCESS("Done"))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from chat.assets import ASSET_URL, build, build_dir
+
+
+class Command(BaseCommand):
+    help = "Bundle, minify and fingerprint the CSS and JS in static/, with gzip/brotli variants"
+
+    def handle(self, *args, **options):
+        manifest = build()
+        for name, built in manifest["files"].items():
+            sizes = manifest["sizes"][built]
+            variants = "".join(
+                f"  {suffix.lstrip('.')} {size / 1024:6.1f} KB" for suffix, size in sizes.items() if suffix
+            )
+            self.stdout.write(f"{ASSET_URL}{built:40} {sizes[''] / 1024:6.1f} KB{variants}")
+        self.stdout.write(self.style.SUCCESS(f"Wrote {len(manifest['files'])} bundles to {build_dir()}"))
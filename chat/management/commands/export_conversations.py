@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from chat.history_transfer import export_lines, open_history
+
+
+class Command(BaseCommand):
+    help = "Stream conversations and their messages to a JSON Lines file"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--output",
+            default="-",
+            help="File to write, gzipped if it ends in .gz (default: stdout)",
+        )
+        parser.add_argument(
+            "--conversation",
+            type=int,
+            action="append",
+            dest="conversations",
+            help="Export only this conversation id (repeatable)",
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        lines = 0
+        output = open_history(options["output"], "w")
+        try:
+            for line in export_lines(options["conversations"]):
+                output.write(line.encode("utf-8"))
+                lines += 1
+        finally:
+            if options["output"] == "-":
+                output.flush()
+            else:
+                output.close()
+        self.stderr.write(
+            self.style.SUCCESS(f"Exported {lines - 1} records in {time.perf_counter() - started:.1f}s")
+        )
@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from chat.history_transfer import IMPORT_BATCH_SIZE, HistoryFormatError, import_lines, open_history
+
+
+class Command(BaseCommand):
+    help = "Import conversations from a JSON Lines export, in batched transactions"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Export to read, gzipped if it ends in .gz ('-' for stdin)")
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=IMPORT_BATCH_SIZE,
+            help="Rows written per transaction (default %(default)s)",
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        source = open_history(options["path"], "r")
+        try:
+            counts = import_lines(source, batch_size=options["batch_size"])
+        except HistoryFormatError as exc:
+            raise CommandError(f"{options['path']}: {exc}")
+        finally:
+            if options["path"] != "-":
+                source.close()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Imported {counts['conversations']} conversations and {counts['messages']} messages "
+                f"in {time.perf_counter() - started:.1f}s"
+            )
+        )
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from chat.blob_store import BLOB_PRUNE_GRACE, get_blob_store
+from chat.models import Message
+
+
+class Command(BaseCommand):
+    help = "Delete stored message bodies that no message refers to any more"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--grace",
+            type=int,
+            default=BLOB_PRUNE_GRACE,
+            help="Keep blobs written within this many seconds (default %(default)s)",
+        )
+
+    def handle(self, *args, **options):
+        referenced = set(
+            Message.objects.exclude(body_sha256="").values_list("body_sha256", flat=True).distinct()
+        )
+        removed, freed = get_blob_store().prune(referenced, grace=options["grace"])
+        self.stdout.write(
+            self.style.SUCCESS(f"Removed {removed} unreferenced blobs ({freed} bytes)")
+        )
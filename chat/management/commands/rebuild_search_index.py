@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from chat.message_search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text search index over conversation titles and messages"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--no-optimize",
+            action="store_true",
+            help="Skip merging the index b-trees after the rebuild",
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        counts = rebuild_index(optimize=not options["no_optimize"])
+        elapsed = time.perf_counter() - started
+        for table, count in counts.items():
+            self.stdout.write(f"{table}: {count} rows")
+        self.stdout.write(self.style.SUCCESS(f"Search index rebuilt in {elapsed:.2f}s"))
@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand
+
+from chat.tool_metrics import PERCENTILES, prune, report
+
+
+class Command(BaseCommand):
+    help = "Show per-tool latency percentiles, payload totals and the slowest paths"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--hours",
+            type=float,
+            default=24,
+            help="Report on invocations from the last this many hours (default %(default)s)",
+        )
+        parser.add_argument(
+            "--top",
+            type=int,
+            default=10,
+            help="Number of slowest paths and URLs to list (default %(default)s)",
+        )
+        parser.add_argument(
+            "--prune-days",
+            type=int,
+            help="First delete invocations older than this many days",
+        )
+
+    def handle(self, *args, **options):
+        if options["prune_days"] is not None:
+            self.stdout.write(f"Deleted {prune(options['prune_days'])} old invocations")
+
+        data = report(options["hours"], options["top"])
+        if not data["tools"]:
+            self.stdout.write(f"No tool invocations in the last {options['hours']:g} hours")
+            return
+
+        percentiles = "".join(f"{f'p{p} ms':>10}" for p in PERCENTILES)
+        self.stdout.write(
+            f"{'tool':18}{'calls':>8}{'errors':>8}{percentiles}{'max ms':>10}{'KB in':>10}{'KB out':>10}"
+        )
+        for row in data["tools"]:
+            values = "".join(f"{row[f'p{p}_ms']:10.1f}" for p in PERCENTILES)
+            self.stdout.write(
+                f"{row['tool']:18}{row['calls']:8d}{row['errors']:8d}{values}{row['max_ms']:10.1f}"
+                f"{row['bytes_in'] / 1024:10.1f}{row['bytes_out'] / 1024:10.1f}"
+            )
+
+        if data["slowest"]:
+            self.stdout.write("\nSlowest paths:")
+            for row in data["slowest"]:
+                self.stdout.write(
+                    f"{row['duration_ms']:10.1f} ms  {row['tool']:14} {row['target']}"
+                    + ("" if row["status"] == "ok" else f"  ({row['status']})")
+                )
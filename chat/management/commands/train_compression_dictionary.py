@@ -0,0 +1,64 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from chat.compression import COMPRESS_THRESHOLD, set_active_dictionary, train_dictionary
+from chat.models import CompressionDictionary, Message
+
+
+class Command(BaseCommand):
+    help = "Train a compression dictionary on recent messages and use it for new writes"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sample",
+            type=int,
+            default=5000,
+            help="Number of recent messages to train on (default %(default)s)",
+        )
+        parser.add_argument(
+            "--recompress",
+            action="store_true",
+            help="Rewrite existing long messages with the new dictionary",
+        )
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        samples = list(
+            Message.objects.order_by("-id").values_list("content", flat=True)[: options["sample"]]
+        )
+        data = train_dictionary(samples)
+        if not data:
+            self.stdout.write("Not enough repeated text to train a dictionary")
+            return
+        dictionary = CompressionDictionary.objects.create(data=data, sample_count=len(samples))
+        set_active_dictionary(dictionary.id, data)
+        self.stdout.write(
+            f"Trained dictionary {dictionary.id} ({len(data)} bytes) from {len(samples)} messages"
+        )
+        if options["recompress"]:
+            started = time.perf_counter()
+            count = self.recompress(options["batch_size"])
+            self.stdout.write(f"Recompressed {count} messages in {time.perf_counter() - started:.1f}s")
+        self.stdout.write(self.style.SUCCESS("Done"))
+
+    def recompress(self, batch_size):
+        """Rewrite every message long enough to be compressed, one batch per transaction"""
+        count = last_id = 0
+        while True:
+            with transaction.atomic():
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        "SELECT id FROM chat_message WHERE id > %s "
+                        "AND (typeof(content) = 'blob' OR length(content) >= %s) ORDER BY id LIMIT %s",
+                        [last_id, COMPRESS_THRESHOLD, batch_size],
+                    )
+                    ids = [row[0] for row in cursor.fetchall()]
+                if not ids:
+                    return count
+                batch = list(Message.objects.filter(id__in=ids))
+                # Bodies are decompressed on load and compressed again on save
+                Message.objects.bulk_update(batch, ["content"])
+            count += len(ids)
+            last_id = ids[-1]
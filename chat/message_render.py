@@ -0,0 +1,63 @@
+"""Message bodies rendered to HTML once, when they are saved
+
+``render_message`` turns a body into the markup the conversation page
+shows: fenced code blocks (```lang ... ```) become ``.code-block`` panels
+and the text between them gets ``linebreaks`` paragraphs, everything
+escaped. ``Message.save`` stores the result with RENDER_VERSION, so a page
+view only joins stored HTML. Rows written without ``save`` (``bulk_create``
+on import and rehydration) or by an older renderer are rendered by
+``ensure_rendered`` when first shown. Bump RENDER_VERSION whenever the
+output changes.
+"""
+
+import re
+
+from django.utils.html import escape, linebreaks
+
+RENDER_VERSION = 1
+
+FENCE = re.compile(r"```(\w+)?\n(.*?)```", re.S)
+
+CODE_BLOCK = (
+    '<div class="code-block"><div class="code-header">'
+    '<span class="code-language">{language}</span>'
+    '<button class="copy-code-btn" onclick="copyCodeBlock(this)">Copy</button>'
+    "</div><pre><code>{code}</code></pre></div>"
+)
+
+
+def _text(text):
+    return linebreaks(text.strip("\n"), autoescape=True) if text.strip() else ""
+
+
+def render_message(content):
+    """Safe HTML for a message body"""
+    parts, position = [], 0
+    for match in FENCE.finditer(content):
+        parts.append(_text(content[position:match.start()]))
+        parts.append(CODE_BLOCK.format(language=escape(match.group(1) or "text"), code=escape(match.group(2).strip())))
+        position = match.end()
+    parts.append(_text(content[position:]))
+    return "\n".join(part for part in parts if part)
+
+
+def ensure_rendered(messages):
+    """Render messages whose stored HTML is missing or stale, and save it
+
+    ``messages`` may have ``content`` deferred; it is then loaded in one
+    query for the stale ones only.
+    """
+    stale = [message for message in messages if message.html_version != RENDER_VERSION]
+    if not stale:
+        return messages
+    model = type(stale[0])
+    deferred = [message.id for message in stale if "content" in message.get_deferred_fields()]
+    if deferred:
+        contents = dict(model.objects.filter(id__in=deferred).values_list("id", "content"))
+        for message in stale:
+            if message.id in contents:
+                message.content = contents[message.id]
+    for message in stale:
+        message.render()
+    model.objects.bulk_update(stale, ["html", "html_version"], batch_size=500)
+    return messages
@@ -0,0 +1,160 @@
+"""Full-text search over conversation titles and message content
+
+Backed by the FTS5 tables created in migration 0005, which triggers keep in
+step with ``chat_message`` and ``chat_conversation``. Each table is asked
+only for its best ``offset + limit`` rows in bm25 order, with at most
+``SEARCH_RANK_WINDOW`` of its newest matches scored, so a query costs the
+same on a million messages as on a few thousand; the two lists are then
+merged and the page is filled in from the ORM.
+"""
+
+import os
+import re
+from html import escape
+
+from django.db import connection
+
+from .models import Conversation, Message
+
+SEARCH_PAGE_SIZE = 20
+SEARCH_MAX_PAGE_SIZE = 100
+# Deepest result reachable by paging; each page costs O(offset + limit)
+SEARCH_MAX_OFFSET = 1000
+# Most matches per table scored for ranking, newest first (see _top)
+SEARCH_RANK_WINDOW = int(os.getenv("SEARCH_RANK_WINDOW", "2000"))
+# bm25 multiplier for title hits, which are short and usually what was meant
+TITLE_WEIGHT = 2.0
+SNIPPET_TOKENS = 16
+
+# Private-use markers survive html.escape and become <mark> afterwards,
+# so highlighted user text is never interpreted as markup
+_OPEN, _CLOSE = "\ue000", "\ue001"
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+FTS_TABLES = ("chat_message_fts", "chat_conversation_fts")
+
+
+def build_match(query):
+    """FTS5 MATCH expression for free text: every word required, the last one as a prefix
+
+    Words are quoted so operators and punctuation in user input (``AND``,
+    ``"``, ``*``, ``:``) are searched for rather than parsed. Returns "" when
+    the query has no words.
+    """
+    terms = _TOKEN.findall(query)
+    if not terms:
+        return ""
+    quoted = [f'"{term}"' for term in terms]
+    if not query.rstrip().endswith(tuple(" \"'")):
+        quoted[-1] += " *"
+    return " ".join(quoted)
+
+
+def _mark(text):
+    return escape(text).replace(_OPEN, "<mark>").replace(_CLOSE, "</mark>")
+
+
+def _top(table, columns, match, count):
+    """Best ``count`` rows of an FTS table for ``match`` in bm25 order
+
+    bm25 has to score every matching row before the first can be returned,
+    so a term found in most messages would cost a scan of the whole table.
+    Only the newest ``SEARCH_RANK_WINDOW`` matches are ranked; walking the
+    match list by rowid is cheap and stops early.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT rowid FROM {table} WHERE {table} MATCH %s ORDER BY rowid DESC LIMIT 1 OFFSET %s",
+            [match, SEARCH_RANK_WINDOW - 1],
+        )
+        row = cursor.fetchone()
+        cursor.execute(
+            f"SELECT rowid, {columns}, rank FROM {table} WHERE {table} MATCH %s AND rowid >= %s "
+            f"ORDER BY rank LIMIT %s",
+            [match, row[0] if row else 0, count],
+        )
+        return cursor.fetchall()
+
+
+def _top_messages(match, count):
+    columns = f"snippet(chat_message_fts, 0, '{_OPEN}', '{_CLOSE}', '…', {SNIPPET_TOKENS})"
+    return _top("chat_message_fts", columns, match, count)
+
+
+def _top_conversations(match, count):
+    columns = f"highlight(chat_conversation_fts, 0, '{_OPEN}', '{_CLOSE}')"
+    return _top("chat_conversation_fts", columns, match, count)
+
+
+def search(query, page=1, page_size=SEARCH_PAGE_SIZE):
+    """One page of ranked hits as ``(results, has_next)``
+
+    A hit is a dict with ``conversation_id``, ``message_id`` (None for a
+    title match), ``title`` and ``snippet`` as HTML-safe strings with the
+    matched terms in ``<mark>``, ``is_user`` and ``created_at``.
+    """
+    match = build_match(query)
+    page_size = max(1, min(page_size, SEARCH_MAX_PAGE_SIZE))
+    offset = (max(page, 1) - 1) * page_size
+    if not match or offset > SEARCH_MAX_OFFSET:
+        return [], False
+
+    # One extra row tells whether there is a next page
+    wanted = offset + page_size + 1
+    hits = [("message", rowid, text, rank) for rowid, text, rank in _top_messages(match, wanted)]
+    hits += [
+        ("conversation", rowid, text, rank * TITLE_WEIGHT)
+        for rowid, text, rank in _top_conversations(match, wanted)
+    ]
+    # bm25 ranks are negative; lower is better
+    hits.sort(key=lambda hit: hit[3])
+    has_next = len(hits) > offset + page_size
+    hits = hits[offset:offset + page_size]
+
+    message_ids = [rowid for kind, rowid, _, _ in hits if kind == "message"]
+    messages = Message.objects.only("conversation_id", "is_user", "created_at").in_bulk(message_ids)
+    conversation_ids = {rowid for kind, rowid, _, _ in hits if kind == "conversation"}
+    conversation_ids.update(message.conversation_id for message in messages.values())
+    conversations = Conversation.objects.only("title", "updated_at").in_bulk(conversation_ids)
+
+    results = []
+    for kind, rowid, text, rank in hits:
+        if kind == "message":
+            message = messages.get(rowid)
+            conversation = message and conversations.get(message.conversation_id)
+            if conversation is None:
+                continue
+            results.append({
+                "conversation_id": conversation.id,
+                "message_id": message.id,
+                "title": escape(conversation.title),
+                "snippet": _mark(text),
+                "is_user": message.is_user,
+                "created_at": message.created_at.isoformat(),
+            })
+        else:
+            conversation = conversations.get(rowid)
+            if conversation is None:
+                continue
+            results.append({
+                "conversation_id": conversation.id,
+                "message_id": None,
+                "title": _mark(text),
+                "snippet": "",
+                "is_user": None,
+                "created_at": conversation.updated_at.isoformat(),
+            })
+    return results, has_next
+
+
+def rebuild_index(optimize=True):
+    """Repopulate both FTS tables from their content tables; returns row counts"""
+    counts = {}
+    with connection.cursor() as cursor:
+        for table in FTS_TABLES:
+            cursor.execute(f"INSERT INTO {table}({table}) VALUES ('rebuild')")
+            if optimize:
+                cursor.execute(f"INSERT INTO {table}({table}) VALUES ('optimize')")
+            cursor.execute(f"SELECT COUNT(*) FROM {table}")
+            counts[table] = cursor.fetchone()[0]
+    return counts
@@ -0,0 +1,84 @@
+from django.db import migrations
+
+# External-content FTS5 tables: the text lives only in chat_message and
+# chat_conversation, the index holds tokens, and triggers keep it in step.
+FORWARD_SQL = [
+    """
+    CREATE VIRTUAL TABLE chat_message_fts USING fts5(
+        content,
+        content='chat_message',
+        content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2',
+        prefix='2 3'
+    )
+    """,
+    """
+    CREATE VIRTUAL TABLE chat_conversation_fts USING fts5(
+        title,
+        content='chat_conversation',
+        content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2',
+        prefix='2 3'
+    )
+    """,
+    """
+    CREATE TRIGGER chat_message_fts_insert AFTER INSERT ON chat_message BEGIN
+        INSERT INTO chat_message_fts(rowid, content) VALUES (new.id, new.content);
+    END
+    """,
+    """
+    CREATE TRIGGER chat_message_fts_delete AFTER DELETE ON chat_message BEGIN
+        INSERT INTO chat_message_fts(chat_message_fts, rowid, content)
+        VALUES ('delete', old.id, old.content);
+    END
+    """,
+    """
+    CREATE TRIGGER chat_message_fts_update AFTER UPDATE OF content ON chat_message BEGIN
+        INSERT INTO chat_message_fts(chat_message_fts, rowid, content)
+        VALUES ('delete', old.id, old.content);
+        INSERT INTO chat_message_fts(rowid, content) VALUES (new.id, new.content);
+    END
+    """,
+    """
+    CREATE TRIGGER chat_conversation_fts_insert AFTER INSERT ON chat_conversation BEGIN
+        INSERT INTO chat_conversation_fts(rowid, title) VALUES (new.id, new.title);
+    END
+    """,
+    """
+    CREATE TRIGGER chat_conversation_fts_delete AFTER DELETE ON chat_conversation BEGIN
+        INSERT INTO chat_conversation_fts(chat_conversation_fts, rowid, title)
+        VALUES ('delete', old.id, old.title);
+    END
+    """,
+    """
+    CREATE TRIGGER chat_conversation_fts_update AFTER UPDATE OF title ON chat_conversation BEGIN
+        INSERT INTO chat_conversation_fts(chat_conversation_fts, rowid, title)
+        VALUES ('delete', old.id, old.title);
+        INSERT INTO chat_conversation_fts(rowid, title) VALUES (new.id, new.title);
+    END
+    """,
+    "INSERT INTO chat_message_fts(chat_message_fts) VALUES ('rebuild')",
+    "INSERT INTO chat_conversation_fts(chat_conversation_fts) VALUES ('rebuild')",
+]
+
+REVERSE_SQL = [
+    "DROP TRIGGER IF EXISTS chat_message_fts_insert",
+    "DROP TRIGGER IF EXISTS chat_message_fts_delete",
+    "DROP TRIGGER IF EXISTS chat_message_fts_update",
+    "DROP TRIGGER IF EXISTS chat_conversation_fts_insert",
+    "DROP TRIGGER IF EXISTS chat_conversation_fts_delete",
+    "DROP TRIGGER IF EXISTS chat_conversation_fts_update",
+    "DROP TABLE IF EXISTS chat_message_fts",
+    "DROP TABLE IF EXISTS chat_conversation_fts",
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0004_upload'),
+    ]
+
+    operations = [
+        migrations.RunSQL(FORWARD_SQL, REVERSE_SQL),
+    ]
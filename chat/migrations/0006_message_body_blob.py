@@ -0,0 +1,89 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:31
+
+from django.db import migrations, models
+from django.db.models.functions import Length
+
+BATCH_SIZE = 500
+
+# Adding a field rebuilds chat_message, dropping the search triggers from
+# 0005; they are recreated after the fields are added or removed
+MESSAGE_TRIGGERS = [
+    """
+    CREATE TRIGGER IF NOT EXISTS chat_message_fts_insert AFTER INSERT ON chat_message BEGIN
+        INSERT INTO chat_message_fts(rowid, content) VALUES (new.id, new.content);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS chat_message_fts_delete AFTER DELETE ON chat_message BEGIN
+        INSERT INTO chat_message_fts(chat_message_fts, rowid, content)
+        VALUES ('delete', old.id, old.content);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS chat_message_fts_update AFTER UPDATE OF content ON chat_message BEGIN
+        INSERT INTO chat_message_fts(chat_message_fts, rowid, content)
+        VALUES ('delete', old.id, old.content);
+        INSERT INTO chat_message_fts(rowid, content) VALUES (new.id, new.content);
+    END
+    """,
+]
+DROP_MESSAGE_TRIGGERS = [
+    "DROP TRIGGER IF EXISTS chat_message_fts_insert",
+    "DROP TRIGGER IF EXISTS chat_message_fts_delete",
+    "DROP TRIGGER IF EXISTS chat_message_fts_update",
+]
+
+
+def offload_long_bodies(apps, schema_editor):
+    from chat.blob_store import MESSAGE_BLOB_THRESHOLD, get_blob_store, preview
+
+    Message = apps.get_model('chat', 'Message')
+    store = get_blob_store()
+    long_bodies = (
+        Message.objects.annotate(length=Length('content'))
+        .filter(length__gt=MESSAGE_BLOB_THRESHOLD, body_sha256='')
+        .order_by('id')
+    )
+    last_id = 0
+    while True:
+        batch = list(long_bodies.filter(id__gt=last_id)[:BATCH_SIZE])
+        if not batch:
+            break
+        for message in batch:
+            message.body_sha256, message.body_size = store.put(message.content)
+            message.content = preview(message.content, message.body_size)
+        Message.objects.bulk_update(batch, ['content', 'body_sha256', 'body_size'])
+        last_id = batch[-1].id
+
+
+def restore_long_bodies(apps, schema_editor):
+    from chat.blob_store import get_blob_store
+
+    Message = apps.get_model('chat', 'Message')
+    store = get_blob_store()
+    for message in Message.objects.exclude(body_sha256='').iterator():
+        message.content = store.get(message.body_sha256)
+        message.save(update_fields=['content'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0005_search_index'),
+    ]
+
+    operations = [
+        migrations.RunSQL(migrations.RunSQL.noop, MESSAGE_TRIGGERS),
+        migrations.AddField(
+            model_name='message',
+            name='body_sha256',
+            field=models.CharField(blank=True, db_index=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='message',
+            name='body_size',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.RunSQL(MESSAGE_TRIGGERS, DROP_MESSAGE_TRIGGERS),
+        migrations.RunPython(offload_long_bodies, restore_long_bodies),
+    ]
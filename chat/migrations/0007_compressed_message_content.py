@@ -0,0 +1,146 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:36
+
+import chat.compression
+from django.db import migrations, models
+
+BATCH_SIZE = 500
+# Messages sampled to train the first dictionary, and the fewest worth training on
+DICTIONARY_SAMPLE = 5000
+MIN_DICTIONARY_SAMPLE = 200
+
+# The message index moves from chat_message to a view of the decompressed
+# text, so the FTS table and triggers from 0005/0006 are replaced
+DROP_PLAIN_INDEX = [
+    "DROP TRIGGER IF EXISTS chat_message_fts_insert",
+    "DROP TRIGGER IF EXISTS chat_message_fts_delete",
+    "DROP TRIGGER IF EXISTS chat_message_fts_update",
+    "DROP TABLE IF EXISTS chat_message_fts",
+]
+CREATE_PLAIN_INDEX = [
+    """
+    CREATE VIRTUAL TABLE chat_message_fts USING fts5(
+        content,
+        content='chat_message',
+        content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2',
+        prefix='2 3'
+    )
+    """,
+    """
+    CREATE TRIGGER chat_message_fts_insert AFTER INSERT ON chat_message BEGIN
+        INSERT INTO chat_message_fts(rowid, content) VALUES (new.id, new.content);
+    END
+    """,
+    """
+    CREATE TRIGGER chat_message_fts_delete AFTER DELETE ON chat_message BEGIN
+        INSERT INTO chat_message_fts(chat_message_fts, rowid, content)
+        VALUES ('delete', old.id, old.content);
+    END
+    """,
+    """
+    CREATE TRIGGER chat_message_fts_update AFTER UPDATE OF content ON chat_message BEGIN
+        INSERT INTO chat_message_fts(chat_message_fts, rowid, content)
+        VALUES ('delete', old.id, old.content);
+        INSERT INTO chat_message_fts(rowid, content) VALUES (new.id, new.content);
+    END
+    """,
+    "INSERT INTO chat_message_fts(chat_message_fts) VALUES ('rebuild')",
+]
+CREATE_TEXT_INDEX = [
+    """
+    CREATE VIEW chat_message_text AS
+    SELECT id, chat_decompress(content) AS content FROM chat_message
+    """,
+    """
+    CREATE VIRTUAL TABLE chat_message_fts USING fts5(
+        content,
+        content='chat_message_text',
+        content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2',
+        prefix='2 3'
+    )
+    """,
+    """
+    CREATE TRIGGER chat_message_fts_insert AFTER INSERT ON chat_message BEGIN
+        INSERT INTO chat_message_fts(rowid, content) VALUES (new.id, chat_decompress(new.content));
+    END
+    """,
+    """
+    CREATE TRIGGER chat_message_fts_delete AFTER DELETE ON chat_message BEGIN
+        INSERT INTO chat_message_fts(chat_message_fts, rowid, content)
+        VALUES ('delete', old.id, chat_decompress(old.content));
+    END
+    """,
+    """
+    CREATE TRIGGER chat_message_fts_update AFTER UPDATE OF content ON chat_message BEGIN
+        INSERT INTO chat_message_fts(chat_message_fts, rowid, content)
+        VALUES ('delete', old.id, chat_decompress(old.content));
+        INSERT INTO chat_message_fts(rowid, content) VALUES (new.id, chat_decompress(new.content));
+    END
+    """,
+    "INSERT INTO chat_message_fts(chat_message_fts) VALUES ('rebuild')",
+]
+DROP_TEXT_INDEX = DROP_PLAIN_INDEX + ["DROP VIEW IF EXISTS chat_message_text"]
+
+
+def compress_bodies(apps, schema_editor):
+    from chat.compression import COMPRESS_THRESHOLD, set_active_dictionary, train_dictionary
+
+    Message = apps.get_model('chat', 'Message')
+    CompressionDictionary = apps.get_model('chat', 'CompressionDictionary')
+
+    samples = list(Message.objects.order_by('-id').values_list('content', flat=True)[:DICTIONARY_SAMPLE])
+    if len(samples) >= MIN_DICTIONARY_SAMPLE:
+        data = train_dictionary(samples)
+        if data:
+            dictionary = CompressionDictionary.objects.create(data=data, sample_count=len(samples))
+            set_active_dictionary(dictionary.id, data)
+
+    # The field compresses on save, so rewriting long plain rows is enough
+    last_id = 0
+    with schema_editor.connection.cursor() as cursor:
+        while True:
+            cursor.execute(
+                "SELECT id FROM chat_message WHERE id > %s AND typeof(content) = 'text' "
+                "AND length(content) >= %s ORDER BY id LIMIT %s",
+                [last_id, COMPRESS_THRESHOLD, BATCH_SIZE],
+            )
+            ids = [row[0] for row in cursor.fetchall()]
+            if not ids:
+                break
+            Message.objects.bulk_update(Message.objects.filter(id__in=ids), ['content'])
+            last_id = ids[-1]
+
+
+def decompress_bodies(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            "UPDATE chat_message SET content = chat_decompress(content) WHERE typeof(content) = 'blob'"
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0006_message_body_blob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CompressionDictionary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data', models.BinaryField()),
+                ('sample_count', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.RunSQL(DROP_PLAIN_INDEX, CREATE_PLAIN_INDEX),
+        migrations.AlterField(
+            model_name='message',
+            name='content',
+            field=chat.compression.CompressedTextField(),
+        ),
+        migrations.RunPython(compress_bodies, decompress_bodies),
+        migrations.RunSQL(CREATE_TEXT_INDEX, DROP_TEXT_INDEX),
+    ]
@@ -0,0 +1,88 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:39
+
+import django.utils.timezone
+from django.db import migrations, models
+
+# Altering a field rebuilds the table, dropping the search triggers (and, for
+# chat_message, failing while the chat_message_text view from 0007 refers to
+# it). The view is dropped first; both are recreated after each change, as
+# they stood after 0007.
+CONVERSATION_TRIGGERS = [
+    """
+    CREATE TRIGGER IF NOT EXISTS chat_conversation_fts_insert AFTER INSERT ON chat_conversation BEGIN
+        INSERT INTO chat_conversation_fts(rowid, title) VALUES (new.id, new.title);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS chat_conversation_fts_delete AFTER DELETE ON chat_conversation BEGIN
+        INSERT INTO chat_conversation_fts(chat_conversation_fts, rowid, title)
+        VALUES ('delete', old.id, old.title);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS chat_conversation_fts_update AFTER UPDATE OF title ON chat_conversation BEGIN
+        INSERT INTO chat_conversation_fts(chat_conversation_fts, rowid, title)
+        VALUES ('delete', old.id, old.title);
+        INSERT INTO chat_conversation_fts(rowid, title) VALUES (new.id, new.title);
+    END
+    """,
+]
+DROP_CONVERSATION_TRIGGERS = [
+    "DROP TRIGGER IF EXISTS chat_conversation_fts_insert",
+    "DROP TRIGGER IF EXISTS chat_conversation_fts_delete",
+    "DROP TRIGGER IF EXISTS chat_conversation_fts_update",
+]
+MESSAGE_TRIGGERS = [
+    """
+    CREATE TRIGGER IF NOT EXISTS chat_message_fts_insert AFTER INSERT ON chat_message BEGIN
+        INSERT INTO chat_message_fts(rowid, content) VALUES (new.id, chat_decompress(new.content));
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS chat_message_fts_delete AFTER DELETE ON chat_message BEGIN
+        INSERT INTO chat_message_fts(chat_message_fts, rowid, content)
+        VALUES ('delete', old.id, chat_decompress(old.content));
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS chat_message_fts_update AFTER UPDATE OF content ON chat_message BEGIN
+        INSERT INTO chat_message_fts(chat_message_fts, rowid, content)
+        VALUES ('delete', old.id, chat_decompress(old.content));
+        INSERT INTO chat_message_fts(rowid, content) VALUES (new.id, chat_decompress(new.content));
+    END
+    """,
+    """
+    CREATE VIEW IF NOT EXISTS chat_message_text AS
+    SELECT id, chat_decompress(content) AS content FROM chat_message
+    """,
+]
+DROP_MESSAGE_TRIGGERS = [
+    "DROP TRIGGER IF EXISTS chat_message_fts_insert",
+    "DROP TRIGGER IF EXISTS chat_message_fts_delete",
+    "DROP TRIGGER IF EXISTS chat_message_fts_update",
+    "DROP VIEW IF EXISTS chat_message_text",
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0007_compressed_message_content'),
+    ]
+
+    operations = [
+        migrations.RunSQL(migrations.RunSQL.noop, CONVERSATION_TRIGGERS),
+        migrations.AlterField(
+            model_name='conversation',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.RunSQL(CONVERSATION_TRIGGERS, DROP_CONVERSATION_TRIGGERS),
+        migrations.RunSQL(DROP_MESSAGE_TRIGGERS[3:], MESSAGE_TRIGGERS),
+        migrations.AlterField(
+            model_name='message',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.RunSQL(MESSAGE_TRIGGERS, DROP_MESSAGE_TRIGGERS),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:47
+
+from django.db import migrations, models
+
+# Adding a field rebuilds chat_conversation, dropping the search triggers
+# from 0005; they are recreated after the fields are added or removed
+CONVERSATION_TRIGGERS = [
+    """
+    CREATE TRIGGER IF NOT EXISTS chat_conversation_fts_insert AFTER INSERT ON chat_conversation BEGIN
+        INSERT INTO chat_conversation_fts(rowid, title) VALUES (new.id, new.title);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS chat_conversation_fts_delete AFTER DELETE ON chat_conversation BEGIN
+        INSERT INTO chat_conversation_fts(chat_conversation_fts, rowid, title)
+        VALUES ('delete', old.id, old.title);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS chat_conversation_fts_update AFTER UPDATE OF title ON chat_conversation BEGIN
+        INSERT INTO chat_conversation_fts(chat_conversation_fts, rowid, title)
+        VALUES ('delete', old.id, old.title);
+        INSERT INTO chat_conversation_fts(rowid, title) VALUES (new.id, new.title);
+    END
+    """,
+]
+DROP_CONVERSATION_TRIGGERS = [
+    "DROP TRIGGER IF EXISTS chat_conversation_fts_insert",
+    "DROP TRIGGER IF EXISTS chat_conversation_fts_delete",
+    "DROP TRIGGER IF EXISTS chat_conversation_fts_update",
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0008_created_at_defaults'),
+    ]
+
+    operations = [
+        migrations.RunSQL(migrations.RunSQL.noop, CONVERSATION_TRIGGERS),
+        migrations.AddField(
+            model_name='conversation',
+            name='archive_file',
+            field=models.CharField(blank=True, max_length=32),
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='archive_member',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+        migrations.RunSQL(CONVERSATION_TRIGGERS, DROP_CONVERSATION_TRIGGERS),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:55
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0009_conversation_archive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ToolInvocation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tool', models.CharField(max_length=32)),
+                ('args_sha256', models.CharField(max_length=64)),
+                ('target', models.CharField(blank=True, max_length=512)),
+                ('backend', models.CharField(max_length=16)),
+                ('conversation_id', models.IntegerField(blank=True, null=True)),
+                ('duration_ms', models.FloatField()),
+                ('bytes_in', models.BigIntegerField(default=0)),
+                ('bytes_out', models.BigIntegerField(default=0)),
+                ('status', models.CharField(choices=[('ok', 'OK'), ('error', 'Error'), ('cancelled', 'Cancelled')], default='ok', max_length=16)),
+                ('error_class', models.CharField(blank=True, max_length=64)),
+                ('created_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['tool', 'created_at'], name='chat_toolin_tool_8cffe7_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:18
+
+import chat.compression
+from django.db import migrations, models
+
+# Adding a field rebuilds chat_message, which drops the search triggers and
+# fails while the chat_message_text view from 0007 refers to it. The view
+# is dropped first; both are recreated after the fields are added or removed.
+MESSAGE_TRIGGERS = [
+    """
+    CREATE TRIGGER IF NOT EXISTS chat_message_fts_insert AFTER INSERT ON chat_message BEGIN
+        INSERT INTO chat_message_fts(rowid, content) VALUES (new.id, chat_decompress(new.content));
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS chat_message_fts_delete AFTER DELETE ON chat_message BEGIN
+        INSERT INTO chat_message_fts(chat_message_fts, rowid, content)
+        VALUES ('delete', old.id, chat_decompress(old.content));
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS chat_message_fts_update AFTER UPDATE OF content ON chat_message BEGIN
+        INSERT INTO chat_message_fts(chat_message_fts, rowid, content)
+        VALUES ('delete', old.id, chat_decompress(old.content));
+        INSERT INTO chat_message_fts(rowid, content) VALUES (new.id, chat_decompress(new.content));
+    END
+    """,
+    """
+    CREATE VIEW IF NOT EXISTS chat_message_text AS
+    SELECT id, chat_decompress(content) AS content FROM chat_message
+    """,
+]
+DROP_MESSAGE_TRIGGERS = [
+    "DROP TRIGGER IF EXISTS chat_message_fts_insert",
+    "DROP TRIGGER IF EXISTS chat_message_fts_delete",
+    "DROP TRIGGER IF EXISTS chat_message_fts_update",
+    "DROP VIEW IF EXISTS chat_message_text",
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0010_tool_invocation'),
+    ]
+
+    operations = [
+        migrations.RunSQL(DROP_MESSAGE_TRIGGERS[3:], MESSAGE_TRIGGERS),
+        migrations.AddField(
+            model_name='message',
+            name='html',
+            field=chat.compression.CompressedTextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='message',
+            name='html_version',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.RunSQL(MESSAGE_TRIGGERS, DROP_MESSAGE_TRIGGERS),
+    ]
@@ -0,0 +1,131 @@
+"""Sandbox side of the local workspace mirror, plus the shared delta helpers
+
+Uploaded as-is into Daytona sandboxes, so it must only use the standard
+library.
+
+    python mirror_sync.py manifest [skip_dir ...]
+    python mirror_sync.py fetch <request.json>
+
+``manifest`` prints one JSON list of [path, kind, size, mtime, mode] rows
+for the workspace (kind: "f" file, "d" directory, "s" directory that is
+listed but not descended into, "l" symlink or other). ``fetch`` reads a
+request {"files": [[path, block hashes or null], ...]} and prints one JSON
+object per file holding only the blocks whose hash differs from the
+mirror's copy, rsync-style, so an edited or appended file costs the bytes
+that changed rather than the whole file.
+"""
+
+import base64
+import hashlib
+import json
+import os
+import stat
+import sys
+
+BLOCK_SIZE = 64 * 1024
+
+
+def _block_hash(data):
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def block_hashes(path, block_size=BLOCK_SIZE):
+    """Hashes of the fixed-size blocks of a file"""
+    hashes = []
+    with open(path, "rb") as f:
+        while True:
+            block = f.read(block_size)
+            if not block:
+                return hashes
+            hashes.append(_block_hash(block))
+
+
+def manifest(root, skip_dirs):
+    rows = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        rel_dir = os.path.relpath(dirpath, root)
+        prefix = "" if rel_dir == "." else rel_dir + "/"
+        kept = []
+        for name in dirnames + filenames:
+            full_path = os.path.join(dirpath, name)
+            try:
+                st = os.lstat(full_path)
+            except OSError:
+                continue
+            if stat.S_ISDIR(st.st_mode):
+                kind = "s" if name in skip_dirs else "d"
+                if kind == "d":
+                    kept.append(name)
+            elif stat.S_ISREG(st.st_mode):
+                kind = "f"
+            else:
+                kind = "l"
+            rows.append([prefix + name, kind, st.st_size, st.st_mtime, st.st_mode & 0o7777])
+        dirnames[:] = kept
+    return rows
+
+
+def fetch(request, out=sys.stdout, block_size=BLOCK_SIZE):
+    for path, hashes in request["files"]:
+        try:
+            st = os.stat(path)
+            if not stat.S_ISREG(st.st_mode):
+                raise FileNotFoundError(path)
+            blocks = {}
+            with open(path, "rb") as f:
+                index = 0
+                while True:
+                    block = f.read(block_size)
+                    if not block:
+                        break
+                    if not hashes or index >= len(hashes) or hashes[index] != _block_hash(block):
+                        blocks[index] = base64.b64encode(block).decode("ascii")
+                    index += 1
+            row = {
+                "path": path,
+                "size": st.st_size,
+                "mtime": st.st_mtime,
+                "mode": st.st_mode & 0o7777,
+                "blocks": blocks,
+            }
+        except OSError:
+            row = {"path": path, "missing": True}
+        out.write(json.dumps(row) + "\n")
+
+
+def apply_delta(old_path, new_path, size, blocks, block_size=BLOCK_SIZE):
+    """Write the new version of a file from changed blocks plus the old copy
+
+    ``blocks`` maps block index to bytes; every other block below ``size``
+    is taken from ``old_path``.
+    """
+    old = open(old_path, "rb") if old_path and os.path.exists(old_path) else None
+    try:
+        with open(new_path, "wb") as f:
+            for index in range((size + block_size - 1) // block_size):
+                if index in blocks:
+                    f.write(blocks[index])
+                else:
+                    old.seek(index * block_size)
+                    f.write(old.read(block_size))
+            f.truncate(size)
+    finally:
+        if old:
+            old.close()
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[0] == "manifest":
+        print(json.dumps(manifest(".", set(argv[1:]))))
+    elif argv[0] == "fetch":
+        with open(argv[1], "r", encoding="utf-8") as f:
+            fetch(json.load(f))
+    else:
+        print(f"unknown command '{argv[0]}'", file=sys.stderr)
+        return 2
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,28 +1,148 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils import timezone
+
+from .blob_store import MESSAGE_BLOB_THRESHOLD, get_blob_store, preview
+from .compression import CompressedTextField
+from .message_render import RENDER_VERSION, render_message
 
 
 class Conversation(models.Model):
     title = models.CharField(max_length=200)
-    created_at = models.DateTimeField(auto_now_add=True)
+    # A default rather than auto_now_add so imported history keeps its dates
+    created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
+    # Set while the messages live in a cold archive file rather than in
+    # chat_message; the row stays as a stub so the conversation is listed
+    archive_file = models.CharField(max_length=32, blank=True)
+    archive_member = models.CharField(max_length=64, blank=True)
 
     def __str__(self):
         return self.title
 
+    @property
+    def is_archived(self):
+        return bool(self.archive_file)
+
 
 class Message(models.Model):
     conversation = models.ForeignKey(
         Conversation, on_delete=models.CASCADE, related_name="messages"
     )
-    content = models.TextField()
+    content = CompressedTextField()
     is_user = models.BooleanField(default=True)
-    created_at = models.DateTimeField(auto_now_add=True)
+    created_at = models.DateTimeField(default=timezone.now)
     tool_suggested = models.BooleanField(default=False)
     tool_used = models.BooleanField(default=False)
+    # Set when a long body was moved to the blob store; ``content`` then
+    # holds only a preview
+    body_sha256 = models.CharField(max_length=64, blank=True, db_index=True)
+    body_size = models.BigIntegerField(default=0)
+    # ``content`` rendered for the conversation page by the renderer version
+    # in ``html_version``; 0 until first rendered
+    html = CompressedTextField(blank=True)
+    html_version = models.PositiveSmallIntegerField(default=0)
 
     def __str__(self):
         return f"{'User' if self.is_user else 'AI'}: {self.content[:50]}"
 
+    @property
+    def is_offloaded(self):
+        return bool(self.body_sha256)
+
+    def full_content(self):
+        """The whole body, read from the blob store if it was offloaded"""
+        if not self.body_sha256:
+            return self.content
+        return get_blob_store().get(self.body_sha256)
+
+    def offload(self):
+        """Move a body over the threshold to the blob store, keeping a preview"""
+        if self.body_sha256 or len(self.content) <= MESSAGE_BLOB_THRESHOLD:
+            return False
+        self.body_sha256, self.body_size = get_blob_store().put(self.content)
+        self.content = preview(self.content, self.body_size)
+        return True
+
+    def render(self):
+        self.html = render_message(self.content)
+        self.html_version = RENDER_VERSION
+
+    def save(self, *args, **kwargs):
+        self.offload()
+        self.render()
+        super().save(*args, **kwargs)
+
     class Meta:
         ordering = ["created_at"]
+
+
+class CompressionDictionary(models.Model):
+    """A zlib preset dictionary trained on message bodies
+
+    Compressed rows name the dictionary they were written with, so these are
+    never edited or deleted; the newest one is used for new writes.
+    """
+
+    data = models.BinaryField()
+    sample_count = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Dictionary {self.id} ({len(self.data)} bytes from {self.sample_count} messages)"
+
+
+class ToolInvocation(models.Model):
+    """One call of a chat tool, for latency and payload accounting
+
+    Rows are buffered and written in batches by ``tool_metrics.writer``.
+    The conversation is kept as a plain id so the record outlives it.
+    """
+
+    STATUS_OK = "ok"
+    STATUS_ERROR = "error"
+    STATUS_CANCELLED = "cancelled"
+    STATUS_CHOICES = [(STATUS_OK, "OK"), (STATUS_ERROR, "Error"), (STATUS_CANCELLED, "Cancelled")]
+
+    tool = models.CharField(max_length=32)
+    args_sha256 = models.CharField(max_length=64)
+    # The path or URL the tool acted on, if any
+    target = models.CharField(max_length=512, blank=True)
+    backend = models.CharField(max_length=16)
+    conversation_id = models.IntegerField(null=True, blank=True)
+    duration_ms = models.FloatField()
+    bytes_in = models.BigIntegerField(default=0)
+    bytes_out = models.BigIntegerField(default=0)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=STATUS_OK)
+    error_class = models.CharField(max_length=64, blank=True)
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["tool", "created_at"])]
+
+    def __str__(self):
+        return f"{self.tool} {self.status} in {self.duration_ms:.1f} ms"
+
+
+class Upload(models.Model):
+    """A resumable chunked upload into the workspace
+
+    Only progress is kept here; the bytes are staged in the active backend
+    and never pass through the message store.
+    """
+
+    STATUS_PENDING = "pending"
+    STATUS_COMPLETE = "complete"
+    STATUS_CHOICES = [(STATUS_PENDING, "Pending"), (STATUS_COMPLETE, "Complete")]
+
+    upload_id = models.CharField(max_length=32, unique=True)
+    path = models.CharField(max_length=1024)
+    size = models.BigIntegerField()
+    sha256 = models.CharField(max_length=64, blank=True)
+    received = models.BigIntegerField(default=0)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.path} ({self.received}/{self.size} bytes)"
@@ -0,0 +1,352 @@
+"""Keeping tool paths inside the workspace
+
+``confine`` is the lexical check both backends share: the path is
+normalised and compared with ``os.path.commonpath``, so sibling prefixes
+such as ``/home/runner/workspace2`` are rejected. ``WorkspaceRoot`` adds the
+local side: the workspace is resolved once, and files are opened by walking
+down from a descriptor of the workspace one ``openat``-style step at a
+time with ``O_NOFOLLOW``. Symlinks met on the way are followed only while
+their targets stay inside the workspace, and since the file is opened by
+that same walk there is no window between checking a path and using it.
+"""
+
+import contextlib
+import errno
+import os
+import posixpath
+import stat
+import threading
+import uuid
+
+LEGACY_WORKSPACE = "/project/workspace"
+ACCESS_DENIED = "Access denied: Path must be within workspace directory"
+# Same bound as the kernel's, so link cycles fail the same way
+MAX_SYMLINKS = 40
+
+HAS_OPENAT = (
+    hasattr(os, "O_NOFOLLOW")
+    and hasattr(os, "O_DIRECTORY")
+    and {os.open, os.stat, os.unlink, os.mkdir, os.readlink, os.rename} <= os.supports_dir_fd
+)
+_DIR_FLAGS = os.O_RDONLY | getattr(os, "O_DIRECTORY", 0) | getattr(os, "O_NOFOLLOW", 0)
+_CLOEXEC = getattr(os, "O_CLOEXEC", 0)
+
+
+class PathEscape(PermissionError):
+    """A path, or a symlink along it, leads outside the workspace"""
+
+    def __init__(self):
+        super().__init__(errno.EACCES, ACCESS_DENIED)
+
+    def __str__(self):
+        return ACCESS_DENIED
+
+
+def is_within(path, root):
+    """Whether normalised absolute ``path`` is ``root`` or below it"""
+    try:
+        return os.path.commonpath([path, root]) == root
+    except ValueError:
+        # Different drives, or a relative path mixed with an absolute one
+        return False
+
+
+def confine(workspace, file_path, aliases=(LEGACY_WORKSPACE,)):
+    """Map a tool path into ``workspace`` without touching the filesystem
+
+    Relative paths are taken from the workspace; absolute ones must lie in
+    it or in one of ``aliases``, which are mapped onto it. Returns
+    (normalised absolute path, error).
+    """
+    try:
+        if os.path.isabs(file_path):
+            path = os.path.normpath(file_path)
+            for alias in aliases:
+                if is_within(path, alias):
+                    path = os.path.join(workspace, os.path.relpath(path, alias))
+                    break
+        else:
+            path = os.path.join(workspace, file_path)
+        path = os.path.normpath(path)
+        if not is_within(path, workspace):
+            return None, ACCESS_DENIED
+        return path, None
+    except Exception as e:
+        return None, f"Invalid path: {str(e)}"
+
+
+class WorkspaceRoot:
+    """A workspace directory, resolved once, that files are opened beneath
+
+    Relative paths passed to the methods are the ones ``relative`` returns.
+    Where ``openat`` is unavailable (Windows) they fall back to resolving
+    the path with ``realpath`` and checking it, which is not race-free.
+    """
+
+    def __init__(self, workspace_dir):
+        self.path = os.path.realpath(workspace_dir)
+        given = os.path.normpath(os.path.abspath(workspace_dir))
+        self.aliases = (LEGACY_WORKSPACE,) + ((given,) if given != self.path else ())
+        self._fd = None
+        self._lock = threading.Lock()
+
+    def relative(self, file_path):
+        """(workspace-relative path, error); "." is the workspace itself"""
+        path, error = confine(self.path, file_path, self.aliases)
+        if error:
+            return None, error
+        return os.path.relpath(path, self.path).replace(os.sep, "/"), None
+
+    def _root_fd(self):
+        if self._fd is None:
+            with self._lock:
+                if self._fd is None:
+                    self._fd = os.open(self.path, os.O_RDONLY | os.O_DIRECTORY | _CLOEXEC)
+        return self._fd
+
+    def _fallback_path(self, rel_path):
+        real = os.path.realpath(os.path.join(self.path, rel_path))
+        if not is_within(real, self.path):
+            raise PathEscape()
+        return real
+
+    def _follow(self, error, dir_fd, name, rel_path):
+        """Target of the symlink an O_NOFOLLOW open stopped at, else re-raise ``error``"""
+        # A symlink shows up as ELOOP, or as ENOTDIR when O_DIRECTORY is set
+        if error.errno not in (errno.ELOOP, errno.ENOTDIR):
+            raise error
+        try:
+            return self._link_target(dir_fd, name, rel_path)
+        except PathEscape:
+            raise
+        except OSError:
+            # Not a symlink after all: a file is in the way
+            raise error from None
+
+    def _link_target(self, dir_fd, name, rel_path):
+        """Workspace-relative target of the symlink at ``rel_path``"""
+        target = os.readlink(name, dir_fd=dir_fd)
+        if os.path.isabs(target):
+            target = os.path.normpath(target)
+            if not is_within(target, self.path):
+                raise PathEscape()
+            return os.path.relpath(target, self.path).replace(os.sep, "/")
+        # ``rel_path`` has no symlinks left above it, so ".." is lexical here
+        target = posixpath.normpath(posixpath.join(posixpath.dirname(rel_path), target))
+        if target == ".." or target.startswith("../"):
+            raise PathEscape()
+        return target
+
+    def walk(self, rel_path, create_parents=False):
+        """Open the directory holding ``rel_path``; returns (dir_fd, name, rel_path)
+
+        Intermediate symlinks are followed inside the workspace and the
+        returned ``rel_path`` has them resolved. ``name`` is "." for the
+        workspace itself. The caller closes ``dir_fd``.
+        """
+        links = 0
+        while True:
+            parts = [part for part in rel_path.split("/") if part not in ("", ".")]
+            if ".." in parts:
+                raise PathEscape()
+            dir_fd = os.open(".", os.O_RDONLY | os.O_DIRECTORY | _CLOEXEC, dir_fd=self._root_fd())
+            try:
+                for index, name in enumerate(parts[:-1]):
+                    try:
+                        next_fd = self._open_dir(name, dir_fd, create_parents)
+                    except OSError as e:
+                        target = self._follow(e, dir_fd, name, "/".join(parts[: index + 1]))
+                        links += 1
+                        if links > MAX_SYMLINKS:
+                            raise OSError(errno.ELOOP, "Too many levels of symbolic links")
+                        rel_path = "/".join([target] + parts[index + 1 :])
+                        break
+                    os.close(dir_fd)
+                    dir_fd = next_fd
+                else:
+                    found, dir_fd = dir_fd, None
+                    return found, parts[-1] if parts else ".", "/".join(parts) or "."
+            finally:
+                if dir_fd is not None:
+                    os.close(dir_fd)
+
+    @staticmethod
+    def _open_dir(name, dir_fd, create):
+        try:
+            return os.open(name, _DIR_FLAGS | _CLOEXEC, dir_fd=dir_fd)
+        except FileNotFoundError:
+            if not create:
+                raise
+        try:
+            os.mkdir(name, 0o777, dir_fd=dir_fd)
+        except FileExistsError:
+            pass
+        return os.open(name, _DIR_FLAGS | _CLOEXEC, dir_fd=dir_fd)
+
+    def _final(self, rel_path, action, create_parents=False):
+        """Run ``action(dir_fd, name)`` on the last component, following symlinks
+
+        ``action`` raises ELOOP (as O_NOFOLLOW does) when it meets a symlink;
+        the link is then resolved within the workspace and the walk retried.
+        Returns (action result, resolved rel_path).
+        """
+        for _ in range(MAX_SYMLINKS):
+            dir_fd, name, rel_path = self.walk(rel_path, create_parents)
+            try:
+                return action(dir_fd, name), rel_path
+            except OSError as e:
+                rel_path = self._follow(e, dir_fd, name, rel_path)
+            finally:
+                os.close(dir_fd)
+        raise OSError(errno.ELOOP, "Too many levels of symbolic links")
+
+    def at(self, rel_path, action):
+        """Run ``action(dir_fd, name)`` on a file inside the workspace
+
+        ``action`` must raise ELOOP on a symlink (open it with O_NOFOLLOW);
+        the link is then followed within the workspace. Where openat is
+        unavailable ``dir_fd`` is None and ``name`` a checked real path.
+        Returns (action result, resolved rel path).
+        """
+        if not HAS_OPENAT:
+            full_path = self._fallback_path(rel_path)
+            return action(None, full_path), os.path.relpath(full_path, self.path).replace(os.sep, "/")
+        return self._final(rel_path, action)
+
+    def open(self, rel_path, flags=os.O_RDONLY, mode=0o666, create_parents=False):
+        """Open a file inside the workspace; returns a descriptor"""
+        if not HAS_OPENAT:
+            full_path = self._fallback_path(rel_path)
+            if create_parents:
+                os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            return os.open(full_path, flags, mode)
+        flags |= os.O_NOFOLLOW | _CLOEXEC
+        return self._final(
+            rel_path, lambda dir_fd, name: os.open(name, flags, mode, dir_fd=dir_fd), create_parents
+        )[0]
+
+    def stat(self, rel_path):
+        """``os.stat`` of a path inside the workspace"""
+        if not HAS_OPENAT:
+            return os.stat(self._fallback_path(rel_path))
+
+        def stat_at(dir_fd, name):
+            st = os.stat(name, dir_fd=dir_fd, follow_symlinks=False)
+            if stat.S_ISLNK(st.st_mode):
+                raise OSError(errno.ELOOP, "symbolic link")
+            return st
+
+        return self._final(rel_path, stat_at)[0]
+
+    @contextlib.contextmanager
+    def scandir(self, rel_path):
+        """``os.scandir`` of a directory inside the workspace"""
+        if not HAS_OPENAT:
+            with os.scandir(self._fallback_path(rel_path)) as scanner:
+                yield scanner
+            return
+        fd = self.open(rel_path, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            with os.scandir(fd) as scanner:
+                yield scanner
+        finally:
+            os.close(fd)
+
+    def unlink(self, rel_path):
+        """Remove a file (a symlink itself, not its target); returns the resolved rel path"""
+        if not HAS_OPENAT:
+            parent, name = posixpath.split(rel_path)
+            full_path = os.path.join(self._fallback_path(parent or "."), name)
+            os.unlink(full_path)
+            return os.path.relpath(full_path, self.path).replace(os.sep, "/")
+        dir_fd, name, rel_path = self.walk(rel_path)
+        try:
+            os.unlink(name, dir_fd=dir_fd)
+        finally:
+            os.close(dir_fd)
+        return rel_path
+
+    def replace(self, rel_path, data):
+        """Write ``data`` to a temp file beside the target and rename it into place
+
+        Parent directories are created; an existing file keeps its
+        permissions. Returns the resolved rel path.
+        """
+        if not HAS_OPENAT:
+            full_path = self._fallback_path(rel_path)
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            temp_path = f"{full_path}.{uuid.uuid4().hex}.tmp"
+            with open(temp_path, "wb") as f:
+                f.write(data)
+            os.replace(temp_path, full_path)
+            return os.path.relpath(full_path, self.path).replace(os.sep, "/")
+
+        def replace_at(dir_fd, name):
+            st = _replaceable(dir_fd, name)
+            temp_name = f".{name}.{uuid.uuid4().hex}.tmp"
+            fd = os.open(
+                temp_name,
+                os.O_WRONLY | os.O_CREAT | os.O_EXCL | os.O_NOFOLLOW | _CLOEXEC,
+                0o666,
+                dir_fd=dir_fd,
+            )
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(data)
+                    f.flush()
+                    os.fsync(f.fileno())
+                    if st is not None:
+                        os.fchmod(f.fileno(), st.st_mode & 0o7777)
+                os.rename(temp_name, name, src_dir_fd=dir_fd, dst_dir_fd=dir_fd)
+            except BaseException:
+                try:
+                    os.unlink(temp_name, dir_fd=dir_fd)
+                except OSError:
+                    pass
+                raise
+
+        return self._final(rel_path, replace_at, create_parents=True)[1]
+
+    def rename(self, src_rel_path, rel_path):
+        """Move the file at ``src_rel_path`` over ``rel_path``
+
+        Both ends are reached by confined walks and renamed relative to
+        their directories. As with ``replace``, parents are created and a
+        symlink at the target is followed. Returns the resolved rel path.
+        """
+        if not HAS_OPENAT:
+            src_path = self._fallback_path(src_rel_path)
+            full_path = self._fallback_path(rel_path)
+            if os.path.isdir(full_path):
+                raise IsADirectoryError(errno.EISDIR, "Is a directory")
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            os.replace(src_path, full_path)
+            return os.path.relpath(full_path, self.path).replace(os.sep, "/")
+
+        src_fd, src_name, _ = self.walk(src_rel_path)
+        try:
+
+            def rename_at(dir_fd, name):
+                _replaceable(dir_fd, name)
+                os.rename(src_name, name, src_dir_fd=src_fd, dst_dir_fd=dir_fd)
+
+            return self._final(rel_path, rename_at, create_parents=True)[1]
+        finally:
+            os.close(src_fd)
+
+
+def _replaceable(dir_fd, name):
+    """``lstat`` of a file about to be renamed over, or None if there is none
+
+    Raises ELOOP for a symlink, so ``WorkspaceRoot._final`` follows it,
+    and EISDIR for a directory.
+    """
+    try:
+        st = os.stat(name, dir_fd=dir_fd, follow_symlinks=False)
+    except FileNotFoundError:
+        return None
+    if stat.S_ISLNK(st.st_mode):
+        raise OSError(errno.ELOOP, "symbolic link")
+    if stat.S_ISDIR(st.st_mode):
+        raise IsADirectoryError(errno.EISDIR, "Is a directory")
+    return st
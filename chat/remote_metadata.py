@@ -0,0 +1,105 @@
+import json
+import os
+import shlex
+import threading
+import time
+from collections import namedtuple
+
+# Seconds a remote stat result is trusted; writes through the backend
+# invalidate affected entries immediately
+STAT_CACHE_TTL = float(os.getenv("DAYTONA_STAT_CACHE_TTL", "5"))
+MAX_CACHED_PATHS = 4096
+
+# ``inside`` is False when the path resolves (via symlinks) outside the
+# sandbox working directory
+RemoteStat = namedtuple("RemoteStat", "exists is_dir size mtime mode inside")
+MISSING = RemoteStat(False, False, 0, 0.0, 0, True)
+
+# Runs inside the sandbox: stats every argument relative to the working
+# directory and prints one JSON list, so a whole batch is one round trip
+_STAT_SCRIPT = """
+import json, os, sys
+root = os.path.realpath(".")
+out = []
+for p in sys.argv[1:]:
+    try:
+        st = os.stat(p)
+    except OSError:
+        out.append(None)
+        continue
+    real = os.path.realpath(p)
+    out.append([os.path.isdir(p), st.st_size, st.st_mtime, st.st_mode & 0o7777,
+                real == root or real.startswith(root + os.sep)])
+print(json.dumps(out))
+"""
+
+
+def stat_command(paths):
+    """Shell command that prints the metadata of ``paths`` as a JSON list"""
+    args = " ".join(shlex.quote(p) for p in paths)
+    return f"python -c {shlex.quote(_STAT_SCRIPT)} {args}"
+
+
+def parse_stat_output(paths, stdout):
+    """Map each path to a RemoteStat from stat_command output"""
+    rows = json.loads(stdout.strip().splitlines()[-1])
+    if len(rows) != len(paths):
+        raise ValueError("stat output does not match the requested paths")
+    return {
+        path: MISSING if row is None else RemoteStat(True, *row)
+        for path, row in zip(paths, rows)
+    }
+
+
+class RemoteMetadata:
+    """Batched, TTL-cached file metadata for a remote sandbox
+
+    ``run_command(command)`` must return (exit_code, stdout, stderr) for a
+    shell command run in the sandbox's working directory. Any number of
+    uncached paths are fetched with a single command.
+    """
+
+    def __init__(self, run_command, ttl=STAT_CACHE_TTL):
+        self._run_command = run_command
+        self.ttl = ttl
+        self._cache = {}  # path -> (expires, RemoteStat)
+        self._lock = threading.Lock()
+
+    def stat(self, path):
+        return self.stat_many([path])[path]
+
+    def stat_many(self, paths):
+        """RemoteStat for every path, fetching the uncached ones in one call"""
+        now = time.monotonic()
+        found = {}
+        with self._lock:
+            for path in paths:
+                cached = self._cache.get(path)
+                if cached is not None and cached[0] > now:
+                    found[path] = cached[1]
+        missing = [p for p in dict.fromkeys(paths) if p not in found]
+        if missing:
+            exit_code, stdout, stderr = self._run_command(stat_command(missing))
+            if exit_code:
+                raise IOError(stderr or stdout or "remote stat failed")
+            fetched = parse_stat_output(missing, stdout)
+            found.update(fetched)
+            expires = time.monotonic() + self.ttl
+            with self._lock:
+                if len(self._cache) + len(fetched) > MAX_CACHED_PATHS:
+                    self._cache.clear()
+                for path, info in fetched.items():
+                    self._cache[path] = (expires, info)
+        return found
+
+    def invalidate(self, path):
+        """Forget a path, anything below it and its parent directory"""
+        parent = os.path.dirname(path) or "."
+        prefix = path.rstrip("/") + "/"
+        with self._lock:
+            for cached in [p for p in self._cache if p in (path, parent) or p.startswith(prefix)]:
+                del self._cache[cached]
+
+    def invalidate_all(self):
+        with self._lock:
+            self._cache.clear()
@@ -1,164 +1,133 @@
 import os
-from pathlib import Path
 
+from .file_ranges import STREAM_CHUNK_SIZE
+from .local_exec import WarmInterpreterPool, format_execution_result, kill_run
+from .local_sandbox import LocalSandbox
 
-class MockDaytonaSandbox:
-    """Mock sandbox for demonstration when no API key is available.
+# Retained name for callers that constructed the old per-call mock sandbox
+MockDaytonaSandbox = LocalSandbox
 
-    Ensures all file operations are confined to the sandbox workspace.
-    """
+
+class SecureDaytonaOperations:
+    """Secure file operations backed by the local workspace sandbox."""
 
     def __init__(self, workspace_dir: str = "/home/runner/workspace"):
+        self.mock_mode = True
         self.workspace_dir = workspace_dir
+        self._sandbox = LocalSandbox(workspace_dir)
+        self._exec_pool = None
 
-    def _resolve_within_workspace(self, file_path: str):
-        workspace = Path(self.workspace_dir).resolve()
-        p = Path(file_path)
-        try:
-            if p.is_absolute():
-                # Allow legacy /project/workspace paths by mapping them into the sandbox
-                try:
-                    rel = p.relative_to("/project/workspace")
-                    full = workspace / rel
-                except Exception:
-                    # If path is already within the real workspace, map it
-                    try:
-                        rel = p.relative_to(workspace)
-                        full = workspace / rel
-                    except Exception:
-                        return None, "Access denied: Path must be within workspace directory"
-            else:
-                full = (workspace / p)
-
-            full_resolved = full.resolve()
-            if not str(full_resolved).startswith(str(workspace)):
-                return None, "Access denied: Path must be within workspace directory"
-
-            return str(full_resolved), None
-        except Exception as e:
-            return None, f"Invalid path: {str(e)}"
+    def _get_exec_pool(self):
+        """Zygote worker pool, started on first use (POSIX only)"""
+        if self._exec_pool is None and hasattr(os, "fork"):
+            self._exec_pool = WarmInterpreterPool(self._sandbox.workspace)
+        return self._exec_pool
+
+    def _get_sandbox(self):
+        return self._sandbox
 
     def read_file(self, file_path: str) -> str:
-        """Mock file read operation"""
-        try:
-            full_path, error = self._resolve_within_workspace(file_path)
-            if error:
-                return error
-
-            with open(full_path, "r", encoding="utf-8") as f:
-                content = f.read()
-            # Return path shown as provided by user to avoid leaking internal layout
-            return f"File content from {file_path}:\n\n{content}"
-        except Exception as e:
-            return f"Error reading file '{file_path}': {str(e)}"
+        return self._get_sandbox().read_file(file_path)
+
+    def read_file_range(self, file_path: str, **options) -> str:
+        return self._get_sandbox().read_file_range(file_path, **options)
+
+    def open_stream(self, file_path: str, chunk_size: int = STREAM_CHUNK_SIZE):
+        return self._get_sandbox().open_stream(file_path, chunk_size)
 
     def write_file(self, file_path: str, content: str) -> str:
-        """Mock file write operation"""
-        try:
-            full_path, error = self._resolve_within_workspace(file_path)
-            if error:
-                return error
-
-            os.makedirs(os.path.dirname(full_path), exist_ok=True)
-            with open(full_path, "w", encoding="utf-8") as f:
-                f.write(content)
-            return f"Successfully wrote to {file_path}"
-        except Exception as e:
-            return f"Error writing file '{file_path}': {str(e)}"
+        return self._get_sandbox().write_file(file_path, content)
+
+    def edit_file(self, file_path: str, patch: str) -> str:
+        return self._get_sandbox().edit_file(file_path, patch)
 
     def delete_file(self, file_path: str) -> str:
-        """Mock file delete operation"""
-        try:
-            full_path, error = self._resolve_within_workspace(file_path)
-            if error:
-                return error
-
-            if Path(full_path).exists():
-                Path(full_path).unlink()
-                return f"Successfully deleted {file_path}"
-            else:
-                return f"Error: File '{file_path}' does not exist"
-        except Exception as e:
-            return f"Error deleting file '{file_path}': {str(e)}"
+        return self._get_sandbox().delete_file(file_path)
 
-    def list_files(self, directory_path: str) -> str:
-        """Mock directory listing operation"""
-        try:
-            full_path, error = self._resolve_within_workspace(directory_path)
-            if error:
-                return error
+    def write_upload_chunk(self, upload_id: str, offset: int, blocks):
+        return self._get_sandbox().write_upload_chunk(upload_id, offset, blocks)
 
-            p = Path(full_path)
-            if not p.exists():
-                return f"Error: Directory '{directory_path}' does not exist"
+    def finish_upload(self, upload_id: str, file_path: str, size: int, sha256: str = "") -> str:
+        return self._get_sandbox().finish_upload(upload_id, file_path, size, sha256)
 
-            items = []
-            for item in p.iterdir():
-                item_type = "DIR" if item.is_dir() else "FILE"
-                size = item.stat().st_size if item.is_file() else 0
-                items.append(f"{item_type}: {item.name} ({size} bytes)")
+    def discard_upload(self, upload_id: str) -> None:
+        self._get_sandbox().discard_upload(upload_id)
 
-            if not items:
-                return f"Contents of {directory_path}:\n\n(empty directory)"
+    def create_checkpoint(self, conversation_id, label: str, paths, replaces=True):
+        return self._get_sandbox().create_checkpoint(conversation_id, label, paths, replaces)
 
-            return f"Contents of {directory_path}:\n\n" + "\n".join(sorted(items))
-        except Exception as e:
-            return f"Error listing directory '{directory_path}': {str(e)}"
+    def drop_checkpoint(self, conversation_id, checkpoint_id: int) -> None:
+        self._get_sandbox().drop_checkpoint(conversation_id, checkpoint_id)
 
-    def get_file_info(self, file_path: str) -> str:
-        """Mock file info operation"""
-        try:
-            full_path, error = self._resolve_within_workspace(file_path)
-            if error:
-                return error
-
-            p = Path(full_path)
-            if not p.exists():
-                return f"Error: File '{file_path}' does not exist"
-
-            stat_info = p.stat()
-            file_type = "Directory" if p.is_dir() else "File"
-
-            return f"""File Information for {file_path}:
-Type: {file_type}
-Size: {stat_info.st_size} bytes
-Modified: {stat_info.st_mtime}
-Permissions: {oct(stat_info.st_mode)[-3:]}"""
-        except Exception as e:
-            return f"Error getting file info '{file_path}': {str(e)}"
+    def list_checkpoints(self, conversation_id) -> str:
+        return self._get_sandbox().list_checkpoints(conversation_id)
 
-    def execute_code(self, code: str, language: str) -> str:
-        """Mock code execution operation"""
-        return f"Mock code execution ({language}):\n{code}\n\n[Mock mode - actual execution requires Daytona API key]"
+    def restore_checkpoint(self, conversation_id, checkpoint_id: int) -> str:
+        return self._get_sandbox().restore_checkpoint(conversation_id, checkpoint_id)
 
+    def diff_checkpoints(self, conversation_id, from_id: int, to_id=None) -> str:
+        return self._get_sandbox().diff_checkpoints(conversation_id, from_id, to_id)
 
-class SecureDaytonaOperations:
-    """Secure file operations using mock implementation."""
+    def list_files(self, directory_path: str) -> str:
+        return self._get_sandbox().list_files(directory_path)
 
-    def __init__(self, workspace_dir: str = "/home/runner/workspace"):
-        self.mock_mode = True
-        self.workspace_dir = workspace_dir
+    def list_tree(self, directory_path: str, **options) -> str:
+        return self._get_sandbox().list_tree(directory_path, **options)
 
-    def _get_sandbox(self):
-        return MockDaytonaSandbox(self.workspace_dir)
+    def get_file_info(self, file_path: str) -> str:
+        return self._get_sandbox().get_file_info(file_path)
 
-    def read_file(self, file_path: str) -> str:
-        return self._get_sandbox().read_file(file_path)
+    def search_files(self, query: str, **options) -> str:
+        return self._get_sandbox().search_files(query, **options)
 
-    def write_file(self, file_path: str, content: str) -> str:
-        return self._get_sandbox().write_file(file_path, content)
+    def execute_code(self, code: str, language: str = "python", conversation_id=None) -> str:
+        """Run Python in a forked child of a warm, pre-imported worker
 
-    def delete_file(self, file_path: str) -> str:
-        return self._get_sandbox().delete_file(file_path)
+        Local runs are stateless, so the conversation id is not used.
+        """
+        pool = self._get_exec_pool()
+        if pool is None:
+            return self._get_sandbox().execute_code(code, language)
+        if language.lower() != "python":
+            return f"Error: Unsupported language '{language}'. Only 'python' is supported."
+        try:
+            return format_execution_result(pool.run(code))
+        except Exception as e:
+            return f"Error executing code: {str(e)}"
 
-    def list_files(self, directory_path: str) -> str:
-        return self._get_sandbox().list_files(directory_path)
+    def stream_code(self, code: str, language: str = "python", conversation_id=None):
+        """Run Python and yield its output while it runs
 
-    def get_file_info(self, file_path: str) -> str:
-        return self._get_sandbox().get_file_info(file_path)
+        Yields ("cancel", callable) once the child has started, ("output",
+        text) pieces as they are printed, then ("done", formatted result).
+        """
+        pool = self._get_exec_pool()
+        if pool is None or language.lower() != "python":
+            yield "done", self.execute_code(code, language, conversation_id)
+            return
+
+        cancelled = []
+        result = None
+        try:
+            for kind, value in pool.stream(code):
+                if kind == "started":
+
+                    def cancel(child_pid=value):
+                        cancelled.append(True)
+                        return kill_run(child_pid)
+
+                    yield "cancel", cancel
+                elif kind == "output":
+                    yield "output", value
+                else:
+                    result = value
+        except Exception as e:
+            yield "done", f"Error executing code: {str(e)}"
+            return
+        yield "done", format_execution_result(result, cancelled=bool(cancelled))
 
-    def execute_code(self, code: str, language: str = "python") -> str:
-        return self._get_sandbox().execute_code(code, language)
+    def restart_kernel(self, conversation_id=None) -> str:
+        return "Local code execution is stateless; there is no kernel to restart"
 
 
 # Global instance for secure operations
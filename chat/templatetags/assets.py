@@ -0,0 +1,11 @@
+from django import template
+
+from chat.assets import asset_url
+
+register = template.Library()
+
+
+@register.simple_tag
+def asset(name):
+    """URL of a built bundle from chat/assets.py, e.g. ``{% asset "app.css" %}``"""
+    return asset_url(name)
@@ -1,3 +1,1972 @@
-from django.test import TestCase
+import gzip
+import hashlib
+import io
+import json
+import mmap
+import os
+import shlex
+import shutil
+import signal
+import socket
+import subprocess
+import tempfile
+import threading
+import time
+import zipfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from unittest import mock
+from urllib.parse import parse_qs, urlparse
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from . import ai_utils
+from . import archive
+from . import assets
+from . import blob_store
+from . import bulk_ops
+from . import code_search
+from . import compression
+from . import daytona_file_ops
+from . import file_patch
+from . import file_ranges
+from . import file_tree
+from . import history_transfer
+from . import http_client
+from . import kernel_server
+from . import local_exec
+from . import message_render
+from . import message_search
+from . import path_confinement
+from . import remote_metadata
+from . import tool_metrics
+from . import url_fetch
+from . import views
+from . import web_search as search
+from . import workspace_mirror
+from .ai_utils import format_messages_for_gemini
+from .checkpoints import CheckpointStore
+from .daytona_file_ops import DaytonaFileOperations
+from .local_sandbox import LocalSandbox
+from .models import Conversation, Message, ToolInvocation, Upload
+
+
+# Tool calls made while tests are collected would otherwise be written by
+# the background thread in the middle of a test
+tool_metrics.writer.stop(discard=True)
+
+
+class ShellSandbox:
+    """Stands in for a Daytona sandbox: commands run with ``sh`` in a local directory"""
+
+    def __init__(self, workspace):
+        self.workspace = workspace
+        self.id = "local"
+        self.process = SimpleNamespace(exec=self.exec)
+        self.fs = SimpleNamespace(read_file=self.read_file, write_file=self.write_file, upload_file=self.write_file)
+
+    def exec(self, command):
+        done = subprocess.run(command, shell=True, cwd=self.workspace, capture_output=True)
+        # The SDK hands back decoded text
+        return SimpleNamespace(
+            exit_code=done.returncode,
+            result=done.stdout.decode("utf-8", errors="replace"),
+            stderr=done.stderr.decode("utf-8", errors="replace"),
+        )
+
+    def read_file(self, path):
+        with open(os.path.join(self.workspace, path), "rb") as f:
+            return f.read()
+
+    def write_file(self, path, content):
+        path = os.path.join(self.workspace, path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(content.encode("utf-8") if isinstance(content, str) else content)
+
+
+def shell_sandbox_ops(test):
+    """DaytonaFileOperations on a ShellSandbox in a temporary workspace"""
+    workspace = tempfile.mkdtemp(prefix="sandbox_")
+    test.addCleanup(shutil.rmtree, workspace, ignore_errors=True)
+    ops = DaytonaFileOperations()
+    ops.workspace_dir = workspace
+    ops.sandbox = ShellSandbox(workspace)
+    return ops
+
+
+class CountingReader(io.BytesIO):
+    def __init__(self, data):
+        super().__init__(data)
+        self.bytes_read = 0
+
+    def read(self, size=-1):
+        data = super().read(size)
+        self.bytes_read += len(data)
+        return data
+
+    def __next__(self):
+        line = super().__next__()
+        self.bytes_read += len(line)
+        return line
+
+
+class FileRangeTests(SimpleTestCase):
+    TEXT = b"".join(b"line %d\n" % i for i in range(1, 101))
+
+    def test_parse_read_args(self):
+        self.assertEqual(file_ranges.parse_read_args("/w/a.py lines:10-20"), ("/w/a.py", {"start_line": 10, "end_line": 20}))
+        self.assertEqual(file_ranges.parse_read_args("a.py length:5"), ("a.py", {"length": 5, "offset": 0}))
+        self.assertEqual(file_ranges.parse_read_args("my file.txt tail:3"), ("my file.txt", {"tail": 3}))
+        self.assertEqual(file_ranges.parse_read_args("a.py lines:x")[0], None)
+        self.assertEqual(file_ranges.parse_read_args("a.py lines:9-2")[0], None)
+
+    def test_ranges(self):
+        cases = [
+            ({"start_line": 3, "end_line": 4}, b"line 3\nline 4\n"),
+            ({"head": 2}, b"line 1\nline 2\n"),
+            ({"tail": 2}, b"line 99\nline 100\n"),
+            ({"offset": 7, "length": 7}, b"line 2\n"),
+            ({"start_line": 100, "end_line": 200}, b"line 100\n"),
+        ]
+        for options, expected in cases:
+            with self.subTest(options):
+                self.assertEqual(file_ranges.read_range(io.BytesIO(self.TEXT), options), (expected, False))
+
+    def test_mmap_and_remote_reads_agree(self):
+        directory = tempfile.mkdtemp(prefix="ranges_")
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        path = os.path.join(directory, "f.txt")
+        with open(path, "wb") as f:
+            f.write(self.TEXT)
+        for options in ({"start_line": 5, "end_line": 9}, {"head": 3}, {"tail": 4}, {"offset": 10}):
+            with self.subTest(options), open(path, "rb") as f:
+                expected = file_ranges.read_range(f, options, limit=40)
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    self.assertEqual(file_ranges.read_range_mmap(mm, options, limit=40), expected)
+                command = file_ranges.remote_range_command(path, options, limit=40)
+                output = subprocess.run(command, shell=True, capture_output=True).stdout
+                self.assertEqual((output[:40], len(output) > 40), expected)
+
+    def test_line_reads_without_newlines_stay_bounded(self):
+        for options in ({"head": 1}, {"start_line": 1, "end_line": 1}):
+            with self.subTest(options):
+                reader = CountingReader(b"x" * (8 * 1024 * 1024))
+                data, truncated = file_ranges.read_range(reader, options)
+                self.assertEqual((len(data), truncated), (file_ranges.READ_INLINE_LIMIT, True))
+                self.assertLessEqual(reader.bytes_read, file_ranges.READ_INLINE_LIMIT + file_ranges.STREAM_CHUNK_SIZE)
+
+    def test_sandbox_ranges_keep_binary_bytes(self):
+        ops = shell_sandbox_ops(self)
+        with open(os.path.join(ops.workspace_dir, "blob.bin"), "wb") as f:
+            f.write(b"\xff" * 40_000)
+        result = ops.read_file_range("blob.bin", offset=0)
+        self.assertFalse(file_ranges.is_truncated(result))
+        self.assertEqual(result.count("\ufffd"), 40_000)
+
+
+class RemoteMetadataTests(SimpleTestCase):
+    def setUp(self):
+        self.ops = shell_sandbox_ops(self)
+        self.commands = []
+        run_command = self.ops._run_command
+
+        def counted(command):
+            self.commands.append(command)
+            return run_command(command)
+
+        self.metadata = remote_metadata.RemoteMetadata(counted, ttl=60)
+        self.ops.metadata = self.metadata
+        self.ops._run_command = counted
+
+    def path(self, name):
+        return os.path.join(self.ops.workspace_dir, name)
+
+    def test_uncached_paths_are_fetched_in_one_command_and_reused(self):
+        os.mkdir(self.path("src"))
+        with open(self.path("src/a.py"), "w") as f:
+            f.write("x = 1\n")
+        found = self.metadata.stat_many(["src", "src/a.py", "gone"])
+        self.assertEqual(len(self.commands), 1)
+        self.assertEqual((found["src"].is_dir, found["src/a.py"].size), (True, 6))
+        self.assertEqual(found["gone"], remote_metadata.MISSING)
+        self.assertEqual(self.metadata.stat("src/a.py"), found["src/a.py"])
+        self.assertEqual(len(self.commands), 1)
+
+        # The path, its parent and anything below it are forgotten
+        self.metadata.invalidate("src/a.py")
+        self.metadata.stat_many(["src", "src/a.py", "gone"])
+        self.assertEqual(len(self.commands), 2)
+        self.assertTrue(self.commands[-1].endswith(" src src/a.py"))
+
+    def test_entries_expire_and_failures_are_raised(self):
+        metadata = remote_metadata.RemoteMetadata(self.ops._run_command, ttl=0)
+        metadata.stat(".")
+        metadata.stat(".")
+        self.assertEqual(len(self.commands), 2)
+        with self.assertRaises(IOError):
+            remote_metadata.RemoteMetadata(lambda command: (1, "", "no python")).stat(".")
+        with self.assertRaises(ValueError):
+            remote_metadata.parse_stat_output(["a", "b"], "[null]\n")
+
+    def test_backend_answers_describe_the_sandbox(self):
+        self.assertEqual(self.ops.write_file("deep/dir/a.txt", "hello"), "Successfully wrote to deep/dir/a.txt")
+        self.assertTrue(os.path.isfile(self.path("deep/dir/a.txt")))
+        self.assertIn("Size: 0.00 MB (5 bytes)", self.ops.get_file_info("deep/dir/a.txt"))
+        self.assertEqual(self.ops.read_file("deep"), "Error: 'deep' is a directory")
+        self.assertEqual(self.ops.read_file("nope.txt"), "Error: File 'nope.txt' not found")
+
+    def test_symlinks_out_of_the_workspace_are_denied(self):
+        outside = tempfile.mkdtemp(prefix="outside_")
+        self.addCleanup(shutil.rmtree, outside, ignore_errors=True)
+        with open(os.path.join(outside, "secret"), "w") as f:
+            f.write("secret")
+        os.symlink(outside, self.path("link"))
+        denied = "Access denied: Path must be within workspace directory"
+        self.assertEqual(self.ops.read_file("link/secret"), denied)
+        self.assertEqual(self.ops.write_file("link/new", "x"), denied)
+        self.assertFalse(os.path.exists(os.path.join(outside, "new")))
+
+    def test_code_runs_clear_the_cache(self):
+        self.assertEqual(self.ops.read_file("made.txt"), "Error: File 'made.txt' not found")
+        self.ops.execute_code("open('made.txt', 'w').write('by code')")
+        self.assertIn("by code", self.ops.read_file("made.txt"))
+
+
+class KernelServerTests(SimpleTestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir, ignore_errors=True)
+        self.sock = os.path.join(self.dir, "k.sock")
+        self.addCleanup(self.kernel, "stop")
+        self.runs = 0
+
+    def kernel(self, command, code=None, wait=True):
+        args = [command, self.sock]
+        if code is not None:
+            self.runs += 1
+            code_file = os.path.join(self.dir, f"code{self.runs}.py")
+            with open(code_file, "w") as f:
+                f.write(code)
+            args.append(code_file)
+        process = subprocess.Popen(
+            ["python", kernel_server.__file__, *args], stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True,
+        )
+        return process.communicate(timeout=30)[0] if wait else process
+
+    def test_state_is_kept_between_runs(self):
+        self.assertEqual(self.kernel("run", "x = 41"), "[new kernel started]\n")
+        self.assertEqual(self.kernel("run", "print(x + 1)"), "42\n")
+
+    def test_concurrent_first_runs_share_one_kernel(self):
+        runs = [self.kernel("run", "import os; print(os.getpid())", wait=False) for _ in range(4)]
+        outputs = [run.communicate(timeout=30)[0] for run in runs]
+        self.assertEqual(sum(out.count("[new kernel started]") for out in outputs), 1)
+        pids = {out.splitlines()[-1] for out in outputs}
+        self.assertEqual(len(pids), 1)
+        self.assertEqual(self.kernel("run", "import os; print(os.getpid())").strip(), pids.pop())
+
+    def test_a_second_server_leaves_the_running_one_alone(self):
+        self.kernel("run", "x = 1")
+        self.kernel("serve")
+        self.assertEqual(self.kernel("run", "print(x)"), "1\n")
+
+    def test_stop_removes_the_socket(self):
+        self.kernel("run", "x = 1")
+        self.kernel("stop")
+        self.assertFalse(os.path.exists(self.sock))
+        self.assertEqual(self.kernel("run", "print('x' in globals())"), "[new kernel started]\nFalse\n")
+
+
+class SandboxKernelTests(SimpleTestCase):
+    def setUp(self):
+        self.ops = shell_sandbox_ops(self)
+        for conversation_id in (1, 2):
+            self.addCleanup(self.ops.restart_kernel, conversation_id)
+
+    def test_state_is_kept_per_conversation(self):
+        self.assertIn("[new kernel started]", self.ops.execute_code("import math\nx = 6", conversation_id=1))
+        self.assertEqual(
+            self.ops.execute_code("print(math.factorial(x))", conversation_id=1), "Execution result (exit=0):\n720\n"
+        )
+        self.assertIn("NameError", self.ops.execute_code("print(x)", conversation_id=2))
+        self.assertIn("NameError", self.ops.execute_code("print(x)"))
+
+    def test_errors_keep_the_kernel_and_show_only_the_snippet(self):
+        self.ops.execute_code("x = 1", conversation_id=1)
+        result = self.ops.execute_code("x += 1\n1 / 0", conversation_id=1)
+        self.assertTrue(result.startswith("Execution result (exit=1):"))
+        self.assertIn('File "<snippet>", line 2', result)
+        self.assertNotIn("kernel_server", result)
+        self.assertEqual(self.ops.execute_code("print(x)", conversation_id=1), "Execution result (exit=0):\n2\n")
+
+    def test_restart_clears_the_state(self):
+        self.ops.execute_code("x = 1", conversation_id=1)
+        self.assertTrue(self.ops.restart_kernel(1).startswith("Kernel restarted"))
+        self.assertIn("NameError", self.ops.execute_code("print(x)", conversation_id=1))
+        self.assertTrue(self.ops.restart_kernel(None).startswith("Error: Kernels are per conversation"))
+
+
+class SandboxRunStreamTests(SimpleTestCase):
+    def setUp(self):
+        self.ops = shell_sandbox_ops(self)
+        patcher = mock.patch.object(daytona_file_ops, "STREAM_POLL_INTERVAL", 0.05)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def run_code(self, code):
+        events = list(self.ops.stream_code(code))
+        return [value for kind, value in events if kind == "output"], events[-1]
+
+    def test_output_split_inside_a_character_is_kept(self):
+        pieces, (kind, result) = self.run_code(
+            "import sys, time\n"
+            "out = sys.stdout.buffer\n"
+            "out.write(b'caf\\xc3'); out.flush(); time.sleep(0.3)\n"
+            "out.write(b'\\xa9 \\xff\\xfe'); out.flush(); time.sleep(0.3)\n"
+            "out.write(b' done\\n')\n"
+        )
+        self.assertEqual(kind, "done")
+        self.assertGreater(len(pieces), 1)
+        self.assertEqual("".join(pieces), "caf\u00e9 \ufffd\ufffd done\n")
+        self.assertIn("exit=0", result)
+
+
+class RunCodeStreamTests(TestCase):
+    def setUp(self):
+        self.ops = shell_sandbox_ops(self)
+        for target, attribute, value in (
+            (ai_utils, "daytona_ops", self.ops),
+            (daytona_file_ops, "STREAM_POLL_INTERVAL", 0.05),
+        ):
+            patcher = mock.patch.object(target, attribute, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.conversation = Conversation.objects.create(title="Runs")
+        self.addCleanup(self.ops.restart_kernel, self.conversation.id)
+
+    def start(self, code):
+        response = self.client.post(
+            reverse("run_code_stream", args=[self.conversation.id]),
+            {"content": f"run code:{code}"}, content_type="application/json",
+        )
+        return response, self.events(response)
+
+    def events(self, response):
+        for chunk in response.streaming_content:
+            head, _, data = chunk.decode().partition("\ndata: ")
+            yield head[len("event: "):], json.loads(data)
+
+    def test_output_is_streamed_line_by_line_and_saved(self):
+        _, events = self.start("import time\nprint('one', flush=True)\ntime.sleep(0.3)\nprint('two')")
+        events = list(events)
+        self.assertEqual((events[0][0], events[-1][0]), ("start", "done"))
+        self.assertEqual(
+            [data["text"] for kind, data in events if kind == "output"], ["[new kernel started]\n", "one\n", "two\n"]
+        )
+        done = events[-1][1]
+        self.assertEqual(done["action_status"], "success")
+        saved = self.conversation.messages.get(is_user=False)
+        self.assertEqual(saved.content, done["ai_message"]["content"])
+        self.assertIn("one\ntwo\n", saved.content)
+        self.assertTrue(saved.tool_used)
+
+    def test_cancel_interrupts_the_kernel_and_keeps_its_state(self):
+        _, events = self.start("x = 1\nimport time\nprint('waiting', flush=True)\ntime.sleep(30)\nx = 2")
+        start = next(events)[1]
+        self.assertEqual(next(events), ("output", {"text": "[new kernel started]\n"}))
+        self.assertEqual(next(events), ("output", {"text": "waiting\n"}))
+        self.assertEqual(self.client.post(start["cancel_url"]).json(), {"success": True})
+        rest = list(events)
+        self.assertIn("Interrupted; kernel state was kept", rest[-1][1]["ai_message"]["content"])
+        self.assertEqual(self.client.post(start["cancel_url"]).status_code, 404)
+
+        _, events = self.start("print(x)")
+        self.assertIn("1\n", [data.get("text") for kind, data in events])
+
+    def test_a_disconnected_client_stops_the_run_and_keeps_partial_output(self):
+        response, events = self.start("import time\nprint('partial', flush=True)\ntime.sleep(30)")
+        while next(events) != ("output", {"text": "partial\n"}):
+            pass
+        started = time.monotonic()
+        response.close()
+        self.assertLess(time.monotonic() - started, 10)
+        saved = self.conversation.messages.get(is_user=False)
+        self.assertTrue(saved.content.endswith("[Execution stopped: the client disconnected]"))
+        self.assertIn("[new kernel started]\npartial\n", saved.content)
+
+    def test_other_messages_and_unknown_runs_are_refused(self):
+        response = self.client.post(
+            reverse("run_code_stream", args=[self.conversation.id]), {"content": "hello"},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post(reverse("cancel_run", args=[self.conversation.id, "nope"]))
+        self.assertEqual(response.status_code, 404)
+
+
+class FilePatchTests(SimpleTestCase):
+    def test_search_replace(self):
+        patch = "<<<<<<< SEARCH\nb = 2\n=======\nb = 3\nc = 4\n>>>>>>> REPLACE\n"
+        self.assertEqual(file_patch.apply_patch("a = 1\nb = 2\n", patch), ("a = 1\nb = 3\nc = 4\n", 2, 1))
+
+    def test_search_replace_must_match_once(self):
+        patch = "<<<<<<< SEARCH\nx\n=======\ny\n>>>>>>> REPLACE\n"
+        with self.assertRaisesRegex(file_patch.PatchConflict, "matches 2 places"):
+            file_patch.apply_patch("x\nx\n", patch)
+        with self.assertRaisesRegex(file_patch.PatchConflict, "not found"):
+            file_patch.apply_patch("z\n", patch)
+
+    def test_search_replace_keeps_crlf(self):
+        patch = "<<<<<<< SEARCH\nb\n=======\nc\n>>>>>>> REPLACE\n"
+        self.assertEqual(file_patch.apply_patch("a\r\nb\r\n", patch)[0], "a\r\nc\r\n")
+
+    def test_unified_diff_finds_moved_context(self):
+        text = "".join(f"line {i}\n" for i in range(1, 21))
+        patch = "--- a/f\n+++ b/f\n@@ -3,3 +3,3 @@\n line 8\n-line 9\n+LINE 9\n line 10\n"
+        new_text, added, removed = file_patch.apply_patch(text, patch)
+        self.assertIn("line 8\nLINE 9\nline 10\n", new_text)
+        self.assertEqual((added, removed), (1, 1))
+
+    def test_header_like_lines_inside_a_hunk_are_body(self):
+        text = "select 1;\n-- old comment\nselect 2;\n"
+        patch = (
+            "--- a/q.sql\n+++ b/q.sql\n@@ -1,3 +1,3 @@\n select 1;\n"
+            "--- old comment\n+++ new comment\n select 2;\n"
+        )
+        self.assertEqual(file_patch.apply_patch(text, patch), ("select 1;\n++ new comment\nselect 2;\n", 1, 1))
+
+    def test_file_headers_between_hunks_are_skipped(self):
+        patch = (
+            "diff --git a/f b/f\n--- a/f\n+++ b/f\n@@ -1 +1 @@\n-a\n+A\n"
+            "--- a/f\n+++ b/f\n@@ -3 +3 @@\n-c\n+C\n"
+        )
+        self.assertEqual(file_patch.apply_patch("a\nb\nc\n", patch)[0], "A\nb\nC\n")
+
+    def test_line_counts_must_match_the_body(self):
+        with self.assertRaisesRegex(file_patch.PatchConflict, "more lines"):
+            file_patch.apply_patch("a\nb\n", "@@ -1,1 +1,1 @@\n-a\n+A\n+extra\n")
+        with self.assertRaisesRegex(file_patch.PatchConflict, "shorter"):
+            file_patch.apply_patch("a\nb\n", "@@ -1,3 +1,1 @@\n-a\n")
+
+    def test_no_newline_at_end_of_file(self):
+        patch = "@@ -1,2 +1,2 @@\n a\n-b\n+c\n\\ No newline at end of file\n"
+        self.assertEqual(file_patch.apply_patch("a\nb\n", patch)[0], "a\nc")
+
+    def test_trim_patch_cuts_trailing_prose(self):
+        reply = "@@ -1 +1 @@\n-a\n+b\n\nThis renames the variable.\n"
+        self.assertEqual(file_patch.trim_patch(reply), "@@ -1 +1 @@\n-a\n+b\n")
+
+    def test_edit_file_replaces_atomically_and_keeps_mode(self):
+        directory = tempfile.mkdtemp(prefix="patch_")
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        path = os.path.join(directory, "run.sh")
+        with open(path, "w") as f:
+            f.write("echo a\n")
+        os.chmod(path, 0o755)
+        inode = os.stat(path).st_ino
+
+        patch = "<<<<<<< SEARCH\necho a\n=======\necho b\n>>>>>>> REPLACE\n"
+        self.assertEqual(file_patch.edit_file(path, patch), (1, 1, True))
+        self.assertNotEqual(os.stat(path).st_ino, inode)
+        self.assertEqual(os.stat(path).st_mode & 0o777, 0o755)
+        self.assertEqual(os.listdir(directory), ["run.sh"])
+
+        inode = os.stat(path).st_ino
+        patch = "<<<<<<< SEARCH\necho b\n=======\necho b\n>>>>>>> REPLACE\n"
+        self.assertEqual(file_patch.edit_file(path, patch), (1, 1, False))
+        self.assertEqual(os.stat(path).st_ino, inode)
+
+
+class LocalSandboxTests(SimpleTestCase):
+    def setUp(self):
+        self.workspace = tempfile.mkdtemp(prefix="workspace_")
+        self.addCleanup(shutil.rmtree, self.workspace, ignore_errors=True)
+        self.sandbox = LocalSandbox(self.workspace)
+
+    def test_listing_reports_types_and_sizes_sorted(self):
+        self.sandbox.write_file("src/b.py", "print(1)\n")
+        self.sandbox.write_file("a.txt", "hello")
+        os.mkfifo(os.path.join(self.workspace, "pipe"))
+        self.assertEqual(
+            self.sandbox.list_files("."),
+            "Contents of .:\n\nDIR: src (0 bytes)\nFILE: a.txt (5 bytes)\nFILE: pipe (0 bytes)",
+        )
+        os.mkdir(os.path.join(self.workspace, "empty"))
+        self.assertEqual(self.sandbox.list_files("empty"), "Contents of empty:\n\n(empty directory)")
+        self.assertEqual(self.sandbox.list_files("a.txt"), "Error: 'a.txt' is not a directory")
+        self.assertEqual(self.sandbox.list_files("gone"), "Error: Directory 'gone' does not exist")
+
+    def test_large_files_are_mapped_and_read_like_small_ones(self):
+        text = "".join(f"row {i}\n" for i in range(2000))
+        self.sandbox.write_file("rows.txt", text)
+        small = self.sandbox.read_file_range("rows.txt", start_line=10, end_line=12)
+        with mock.patch("chat.local_sandbox.MMAP_THRESHOLD", 1), \
+                mock.patch.object(mmap, "mmap", side_effect=mmap.mmap) as mapped:
+            self.assertEqual(self.sandbox.read_file_range("rows.txt", start_line=10, end_line=12), small)
+        self.assertTrue(mapped.called)
+        self.assertIn("row 9\nrow 10\nrow 11\n", small)
+
+    def test_reading_a_directory_or_missing_file_is_an_error(self):
+        os.mkdir(os.path.join(self.workspace, "src"))
+        self.assertEqual(self.sandbox.read_file("src"), "Error: 'src' is a directory")
+        self.assertTrue(self.sandbox.read_file("gone.txt").startswith("Error reading file 'gone.txt'"))
+
+    def test_file_info_comes_from_one_stat(self):
+        self.sandbox.write_file("a.txt", "hello")
+        info = self.sandbox.get_file_info("a.txt")
+        self.assertIn("Type: File\nSize: 5 bytes", info)
+        self.assertIn("Type: Directory", self.sandbox.get_file_info("."))
+        self.assertEqual(self.sandbox.get_file_info("gone.txt"), "Error: File 'gone.txt' does not exist")
+
+
+class PathConfinementTests(SimpleTestCase):
+    DENIED = path_confinement.ACCESS_DENIED
+
+    def setUp(self):
+        base = tempfile.mkdtemp(prefix="confine_")
+        self.addCleanup(shutil.rmtree, base, ignore_errors=True)
+        self.workspace = os.path.join(base, "workspace")
+        self.outside = os.path.join(base, "outside")
+        for directory in (os.path.join(self.workspace, "src"), self.outside, self.workspace + "2"):
+            os.makedirs(directory)
+        for path, text in ((self.outside, "secret"), (self.workspace + "2", "sibling"),
+                           (os.path.join(self.workspace, "src"), "inside")):
+            with open(os.path.join(path, "data.txt"), "w") as f:
+                f.write(text)
+        self.sandbox = LocalSandbox(self.workspace)
+
+    def link(self, target, name):
+        os.symlink(target, os.path.join(self.workspace, name))
+
+    def test_lexical_checks_reject_siblings_and_parent_steps(self):
+        confine = path_confinement.confine
+        ws = self.workspace
+        self.assertEqual(confine(ws, ws + "2/data.txt"), (None, self.DENIED))
+        self.assertEqual(confine(ws, "../workspace2/data.txt"), (None, self.DENIED))
+        self.assertEqual(confine(ws, "src/../../outside"), (None, self.DENIED))
+        self.assertEqual(confine(ws, "/project/workspace2/x"), (None, self.DENIED))
+        self.assertEqual(confine(ws, "/project/workspace/src/a.py"), (ws + "/src/a.py", None))
+        self.assertEqual(confine(ws, "src/../a.py"), (ws + "/a.py", None))
+        self.assertEqual(confine(ws, ws), (ws, None))
+        self.assertEqual(self.sandbox.read_file(ws + "2/data.txt"), self.DENIED)
+
+        ops = DaytonaFileOperations()
+        ops.workspace_dir = "/home/runner/workspace"
+        self.assertEqual(ops._validate_path("/home/runner/workspace2/a"), (None, self.DENIED))
+        self.assertEqual(ops._validate_path("a/../b"), ("/home/runner/workspace/b", None))
+
+    def test_symlinks_leading_out_are_refused(self):
+        self.link(self.outside, "abs")
+        self.link("../outside", "rel")
+        self.link("src/../../outside/data.txt", "deep")
+        for name in ("abs/data.txt", "rel/data.txt", "deep"):
+            with self.subTest(name):
+                self.assertEqual(self.sandbox.read_file(name), self.DENIED)
+                self.assertEqual(self.sandbox.write_file(name, "overwritten"), self.DENIED)
+                self.assertEqual(self.sandbox.get_file_info(name), self.DENIED)
+        self.assertEqual(self.sandbox.list_files("abs"), self.DENIED)
+        self.assertEqual(self.sandbox.list_tree("abs"), self.DENIED)
+        self.assertEqual(self.sandbox.open_stream("rel/data.txt"), (None, self.DENIED))
+        self.assertEqual(self.sandbox.edit_file("rel/data.txt", "<<<<<<< SEARCH\nsecret\n=======\nx\n>>>>>>> REPLACE"),
+                         self.DENIED)
+        with open(os.path.join(self.outside, "data.txt")) as f:
+            self.assertEqual(f.read(), "secret")
+        checkpoint_id = self.sandbox.create_checkpoint(1, "edit", ["abs/data.txt", "rel/data.txt", "src/data.txt"])
+        store = CheckpointStore(self.workspace, 1)
+        self.assertEqual(store.manifest(checkpoint_id)["files"], {"src/data.txt": "file"})
+
+    def swap_for_link(self, name):
+        """Replace directory ``name`` with a symlink out of the workspace"""
+        path = os.path.join(self.workspace, name)
+        os.rename(path, path + ".orig")
+        os.symlink(self.outside, path)
+
+    def test_a_parent_swapped_for_a_symlink_mid_edit_is_not_written_through(self):
+        self.sandbox.write_file("src/data.txt", "inside\n")
+        real_apply = file_patch.apply_patch
+
+        def apply_and_swap(text, patch):
+            self.swap_for_link("src")
+            return real_apply(text, patch)
+
+        with mock.patch("chat.local_sandbox.apply_patch", side_effect=apply_and_swap):
+            result = self.sandbox.edit_file("src/data.txt", "<<<<<<< SEARCH\ninside\n=======\nedited\n>>>>>>> REPLACE")
+        self.assertEqual(result, self.DENIED)
+        with open(os.path.join(self.outside, "data.txt")) as f:
+            self.assertEqual(f.read(), "secret")
+
+    def test_a_parent_swapped_for_a_symlink_mid_upload_is_not_written_through(self):
+        upload_id = "0" * 32
+        self.assertIsNone(self.sandbox.write_upload_chunk(upload_id, 0, [b"payload"]))
+
+        def check_and_swap(*args):
+            self.swap_for_link("src")
+
+        with mock.patch("chat.local_sandbox.check_upload", side_effect=check_and_swap):
+            self.assertEqual(self.sandbox.finish_upload(upload_id, "src/data.txt", 7), self.DENIED)
+        with open(os.path.join(self.outside, "data.txt")) as f:
+            self.assertEqual(f.read(), "secret")
+
+    def test_symlinks_inside_the_workspace_are_followed(self):
+        self.link(os.path.join(self.workspace, "src"), "abs")
+        self.link("src/data.txt", "rel")
+        self.assertIn("inside", self.sandbox.read_file("abs/data.txt"))
+        self.assertIn("inside", self.sandbox.read_file("rel"))
+        self.sandbox.write_file("rel", "rewritten")
+        self.assertTrue(os.path.islink(os.path.join(self.workspace, "rel")))
+        with open(os.path.join(self.workspace, "src/data.txt")) as f:
+            self.assertEqual(f.read(), "rewritten")
+        # Deleting a link removes the link, not its target
+        self.sandbox.delete_file("rel")
+        self.assertTrue(os.path.exists(os.path.join(self.workspace, "src/data.txt")))
+
+    def test_symlink_loops_fail_instead_of_spinning(self):
+        self.link("b", "a")
+        self.link("a", "b")
+        self.link("loop", "loop")
+        for name in ("a", "a/data.txt", "loop"):
+            with self.subTest(name):
+                self.assertIn("Too many levels of symbolic links", self.sandbox.read_file(name))
+                self.assertIn("Too many levels of symbolic links", self.sandbox.write_file(name, "x"))
+
+    def test_workspace_reached_through_a_symlink(self):
+        alias = os.path.join(os.path.dirname(self.workspace), "alias")
+        os.symlink(self.workspace, alias)
+        sandbox = LocalSandbox(alias)
+        self.assertIn("inside", sandbox.read_file(os.path.join(alias, "src/data.txt")))
+        self.assertIn("inside", sandbox.read_file(os.path.join(self.workspace, "src/data.txt")))
+
+    def test_fallback_without_openat_still_confines(self):
+        self.link(self.outside, "abs")
+        self.link("src", "inner")
+        with mock.patch.object(path_confinement, "HAS_OPENAT", False):
+            self.assertEqual(self.sandbox.read_file("abs/data.txt"), self.DENIED)
+            self.assertEqual(self.sandbox.write_file("abs/new.txt", "x"), self.DENIED)
+            self.assertEqual(self.sandbox.list_tree("abs"), self.DENIED)
+            self.assertIn("inside", self.sandbox.read_file("inner/data.txt"))
+            self.assertEqual(self.sandbox.list_tree("inner"), "Tree of inner (depth 3, 1 entries):\n\ndata.txt")
+        self.assertFalse(os.path.exists(os.path.join(self.outside, "new.txt")))
+
+
+class CodeSearchTests(SimpleTestCase):
+    FILES = {
+        "app/models.py": "class Invoice:\n    total = 0  # TODO rounding\n",
+        "app/views.py": "def show(request):\n    return Invoice()\n",
+        "docs/notes.md": "Invoice totals are rounded.\n",
+        ".git/config": "invoice = true\n",
+        "data.bin": "invoice\0\n",
+    }
+
+    def setUp(self):
+        self.workspace = tempfile.mkdtemp(prefix="search_")
+        self.addCleanup(shutil.rmtree, self.workspace, ignore_errors=True)
+        for name, text in self.FILES.items():
+            self.write(name, text)
+
+    def write(self, name, text):
+        path = os.path.join(self.workspace, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            f.write(text)
+        return path
+
+    def built_index(self):
+        index = code_search.TrigramIndex(self.workspace)
+        index._build()
+        return index
+
+    def test_options_are_parsed_from_the_end(self):
+        self.assertEqual(code_search.parse_search_args("a b glob:*.py limit:3"), ("a b", {"glob": "*.py", "limit": 3}))
+        self.assertEqual(code_search.parse_search_args("  ")[1], "Error: Search query cannot be empty")
+        self.assertEqual(code_search.parse_search_args("x limit:0")[1], "Error: Invalid limit '0'")
+
+    def test_index_and_scan_agree_and_skip_binary_and_vcs_files(self):
+        expected = [
+            ("app/models.py", 1, "class invoice:"),
+            ("app/views.py", 2, "return invoice()"),
+            ("docs/notes.md", 1, "invoice totals are rounded."),
+        ]
+        index = self.built_index()
+        for glob, wanted in ((None, expected), ("*.py", expected[:2]), ("docs/*", expected[2:])):
+            with self.subTest(glob=glob):
+                found = code_search.scan_search(self.workspace, "INVOICE", glob)
+                self.assertEqual([(p, n, line.lower()) for p, n, line in found[0]], wanted)
+                self.assertEqual(index.search("INVOICE", glob), found)
+
+    def test_results_are_capped_at_the_limit(self):
+        matches, truncated = self.built_index().search("invoice", limit=2)
+        self.assertEqual((len(matches), truncated), (2, True))
+        result = code_search.format_search_results("invoice", matches, truncated)
+        self.assertTrue(result.startswith("Search results for 'invoice' (2 matches in 2 files):"))
+        self.assertIn("[Showing the first 2 matches;", result)
+
+    def test_index_follows_changes_made_outside_the_backend(self):
+        index = self.built_index()
+        self.write("lib/new.py", "invoice_id = 1\n")
+        os.unlink(os.path.join(self.workspace, "docs/notes.md"))
+        paths = [path for path, _, _ in index.search("invoice")[0]]
+        self.assertEqual(paths, ["app/models.py", "app/views.py", "lib/new.py"])
+
+        # An in-place edit leaves the directory alone; the periodic full check sees it
+        with open(os.path.join(self.workspace, "app/views.py"), "w") as f:
+            f.write("def show(request):\n    return None\n")
+        with mock.patch.object(code_search, "FULL_CHECK_INTERVAL", -1):
+            paths = [path for path, _, _ in index.search("invoice")[0]]
+        self.assertEqual(paths, ["app/models.py", "lib/new.py"])
+
+    def test_short_queries_and_unbuilt_index_fall_back_to_a_scan(self):
+        index = code_search.TrigramIndex(self.workspace)
+        with mock.patch.object(index, "start_build") as start_build:
+            self.assertIsNone(index.search("invoice"))
+        start_build.assert_called_once()
+        sandbox = LocalSandbox(self.workspace)
+        self.assertIn("app/models.py:2:", sandbox.search_files("TO"))
+
+    def test_sandbox_search_runs_grep_remotely(self):
+        ops = shell_sandbox_ops(self)
+        for name, text in self.FILES.items():
+            ops.sandbox.write_file(name, text)
+        self.assertEqual(ops.search_files("invoice", glob="*.py"), LocalSandbox(self.workspace).search_files(
+            "invoice", glob="*.py"
+        ))
+
+
+class FileTreeTests(SimpleTestCase):
+    def setUp(self):
+        self.workspace = tempfile.mkdtemp(prefix="tree_")
+        self.addCleanup(shutil.rmtree, self.workspace, ignore_errors=True)
+        for name in ("README.md", "app/models.py", "app/tests/test_models.py", "app/static/app.css",
+                     "node_modules/left-pad/index.js", "build/out.pyc"):
+            path = os.path.join(self.workspace, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            open(path, "w").close()
+
+    def test_options_select_tree_mode(self):
+        self.assertEqual(file_tree.parse_list_args("src tree"), ("src", {"tree": True}))
+        self.assertEqual(
+            file_tree.parse_list_args(". depth:2 include:*.py,*.md"),
+            (".", {"tree": True, "depth": 2, "include": ["*.py", "*.md"]}),
+        )
+        self.assertEqual(file_tree.parse_list_args("src"), ("src", {}))
+        self.assertEqual(file_tree.parse_list_args(". depth:x")[1], "Error: Invalid depth value 'x'")
+        self.assertEqual(file_tree.parse_list_args(". depth:99")[1], "Error: Depth may be at most 20")
+
+    def test_tree_lists_directories_first_within_the_depth(self):
+        sandbox = LocalSandbox(self.workspace)
+        self.assertEqual(sandbox.list_tree(".", depth=2), (
+            "Tree of . (depth 2, 8 entries):\n\n"
+            "app/\n  static/ …\n  tests/ …\n  models.py\nbuild/\n  out.pyc\nnode_modules/ …\nREADME.md"
+        ))
+
+    def test_include_and_exclude_filter_files_and_prune_directories(self):
+        sandbox = LocalSandbox(self.workspace)
+        self.assertEqual(sandbox.list_tree(".", include=["*.py"], exclude=["tests"]), (
+            "Tree of . (depth 3, 2 entries):\n\napp/\n  models.py"
+        ))
+        self.assertEqual(sandbox.list_tree(".", include=["*.rs"]), "Tree of . (depth 3):\n\n(no matching entries)")
+        self.assertIn("[Showing 3 of ", sandbox.list_tree(".", limit=3))
+
+    def test_snapshots_are_reused_until_the_directory_changes(self):
+        cache = file_tree.DirectorySnapshotCache()
+        app = os.path.join(self.workspace, "app")
+        with mock.patch.object(file_tree, "RACY_WINDOW_NS", 0), \
+                mock.patch.object(os, "scandir", side_effect=os.scandir) as scandir:
+            first = cache.entries(app)
+            self.assertEqual(cache.entries(app), first)
+            self.assertEqual(scandir.call_count, 1)
+            open(os.path.join(app, "views.py"), "w").close()
+            os.utime(app, ns=(0, os.stat(app).st_mtime_ns + 1))
+            self.assertIn(("views.py", False), cache.entries(app))
+            self.assertEqual(scandir.call_count, 2)
+        self.assertIsNone(cache.entries(os.path.join(self.workspace, "gone")))
+
+    def test_sandbox_tree_matches_the_local_one(self):
+        ops = shell_sandbox_ops(self)
+        shutil.rmtree(ops.workspace_dir)
+        shutil.copytree(self.workspace, ops.workspace_dir)
+        local = LocalSandbox(self.workspace)
+        for options in ({}, {"depth": 1}, {"include": ["*.py"]}, {"exclude": ["app/static"]}):
+            with self.subTest(options):
+                self.assertEqual(ops.list_tree(".", **options), local.list_tree(".", **options))
+        self.assertEqual(ops.list_tree("gone"), "Error: Directory 'gone' does not exist")
+
+
+class CheckpointTests(SimpleTestCase):
+    def setUp(self):
+        self.workspace = tempfile.mkdtemp(prefix="workspace_")
+        self.addCleanup(shutil.rmtree, self.workspace, ignore_errors=True)
+        self.sandbox = LocalSandbox(self.workspace)
+        patcher = mock.patch.object(ai_utils, "daytona_ops", self.sandbox)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.sandbox.write_file("notes.txt", "one\ntwo\n")
+        self.store = CheckpointStore(self.workspace, 1)
+
+    def path(self, name):
+        return os.path.join(self.workspace, name)
+
+    def image(self, checkpoint_id, name):
+        return os.path.join(self.store.directory, str(checkpoint_id), "files", name)
+
+    def test_noop_edit_leaves_no_checkpoint(self):
+        patch = "<<<<<<< SEARCH\none\n=======\none\n>>>>>>> REPLACE\n"
+        self.assertTrue(ai_utils.edit_file("notes.txt", patch, conversation_id=1).startswith("No changes"))
+        self.assertEqual(self.store.list(), [])
+
+        # A later in-place write cannot reach into an earlier checkpoint
+        ai_utils.write_file("notes.txt", "uno\ntwo\n", conversation_id=1)
+        with open(self.path("notes.txt"), "w") as f:
+            f.write("rewritten in place\n")
+        with open(self.image(1, "notes.txt")) as f:
+            self.assertEqual(f.read(), "one\ntwo\n")
+
+    def test_edit_checkpoint_never_shares_the_live_inode(self):
+        checkpoint_id = self.sandbox.create_checkpoint(1, "edit file:notes.txt", ["notes.txt"], replaces=False)
+        self.assertNotEqual(os.stat(self.image(checkpoint_id, "notes.txt")).st_ino, os.stat(self.path("notes.txt")).st_ino)
+
+    def test_restore_and_diff(self):
+        ai_utils.write_file("notes.txt", "uno\ntwo\n", conversation_id=1)
+        ai_utils.write_file("new.txt", "fresh\n", conversation_id=1)
+        self.assertIn("+uno", ai_utils.diff_checkpoints("1", conversation_id=1))
+
+        result = ai_utils.restore_checkpoint("1", conversation_id=1)
+        self.assertIn("restored notes.txt", result)
+        self.assertIn("removed new.txt", result)
+        with open(self.path("notes.txt")) as f:
+            self.assertEqual(f.read(), "one\ntwo\n")
+        self.assertFalse(os.path.exists(self.path("new.txt")))
+
+    def test_failed_change_drops_its_checkpoint(self):
+        patch = "<<<<<<< SEARCH\nmissing\n=======\nx\n>>>>>>> REPLACE\n"
+        self.assertTrue(ai_utils.edit_file("notes.txt", patch, conversation_id=1).startswith("Error"))
+        self.assertEqual(self.store.list(), [])
+
+
+class LocalExecTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.workspace = tempfile.mkdtemp(prefix="exec_")
+        cls.pool = local_exec.WarmInterpreterPool(
+            cls.workspace, size=1, timeout=10, cpu_seconds=1, memory_bytes=256 * 1024 * 1024, output_limit=1000
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.pool.shutdown()
+        shutil.rmtree(cls.workspace, ignore_errors=True)
+        super().tearDownClass()
+
+    def test_runs_in_the_workspace(self):
+        result = self.pool.run("import os\nprint(os.getcwd())\nopen('out.txt', 'w').write('ok')")
+        self.assertEqual((result["exit_code"], result["output"].strip()), (0, os.path.realpath(self.workspace)))
+        self.assertTrue(os.path.exists(os.path.join(self.workspace, "out.txt")))
+
+    def test_wall_clock_timeout(self):
+        result = self.pool.run("import time\ntime.sleep(30)", timeout=0.3)
+        self.assertTrue(result["timed_out"])
+        self.assertIn("timed out", local_exec.format_execution_result(result))
+
+    def test_timeout_applies_after_output_is_closed(self):
+        result = self.pool.run("import os, time\nos.close(1)\nos.close(2)\ntime.sleep(30)", timeout=0.3)
+        self.assertTrue(result["timed_out"])
+        self.assertLess(result["duration"], 5)
+
+    def test_output_is_capped(self):
+        result = self.pool.run("print('x' * 5000)\nprint('done')")
+        self.assertEqual((result["exit_code"], len(result["output"])), (0, 1000))
+        self.assertTrue(result["truncated"])
+
+    def test_memory_limit(self):
+        result = self.pool.run("data = bytearray(512 * 1024 * 1024)")
+        self.assertEqual(result["exit_code"], 1)
+        self.assertIn("MemoryError", result["output"])
+
+    def test_cpu_limit(self):
+        result = self.pool.run("while True:\n    pass")
+        self.assertFalse(result["timed_out"])
+        self.assertIn("killed by SIGXCPU", local_exec.format_execution_result(result))
+
+    def test_unnamed_signals_are_reported_by_number(self):
+        result = self.pool.run("import os, signal\nos.kill(os.getpid(), signal.SIGRTMIN + 6)")
+        self.assertEqual(result["exit_code"], -(signal.SIGRTMIN + 6))
+        self.assertIn(f"killed by signal {signal.SIGRTMIN + 6}", local_exec.format_execution_result(result))
+
+    def test_writes_outside_the_workspace_are_refused(self):
+        outside = tempfile.mkdtemp(prefix="outside_")
+        self.addCleanup(shutil.rmtree, outside, ignore_errors=True)
+        result = self.pool.run(f"open({os.path.join(outside, 'x')!r}, 'w')")
+        self.assertIn("PermissionError", result["output"])
+        self.assertEqual(os.listdir(outside), [])
+
+    def test_busy_pool_reports_no_worker(self):
+        stream = self.pool.stream("import time\ntime.sleep(30)")
+        self.assertEqual(next(stream)[0], "started")
+        self.addCleanup(stream.close)
+        with mock.patch.object(self.pool, "timeout", 0.1):
+            with self.assertRaisesRegex(RuntimeError, "No execution worker became available"):
+                self.pool.run("print(1)")
+
+
+class WorkspaceMirrorTests(SimpleTestCase):
+    """The mirror against a "sandbox" that is a local directory"""
+
+    def setUp(self):
+        self.remote = tempfile.mkdtemp(prefix="remote_")
+        local = tempfile.mkdtemp(prefix="mirror_")
+        self.addCleanup(shutil.rmtree, self.remote, ignore_errors=True)
+        self.addCleanup(shutil.rmtree, local, ignore_errors=True)
+        self.commands = []
+        self.mirror = workspace_mirror.WorkspaceMirror(self.run_command, self.write, os.path.join(local, "copy"))
+        self.write("src/app.py", "print('hello')\n")
+        self.write("notes.txt", "n" * 200_000)
+
+    def run_command(self, command):
+        self.commands.append(command)
+        done = subprocess.run(command, shell=True, cwd=self.remote, capture_output=True, text=True)
+        return done.returncode, done.stdout, done.stderr
+
+    @staticmethod
+    def action(command):
+        # python -c <script> <action> ...
+        return shlex.split(command)[3]
+
+    def write(self, rel_path, text):
+        path = os.path.join(self.remote, rel_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            f.write(text)
+
+    def fetches(self):
+        return sum(self.action(command) == "fetch" for command in self.commands)
+
+    def test_reconcile_mirrors_files_and_metadata(self):
+        self.mirror.reconcile()
+        self.assertEqual(sorted(self.mirror.list_dir("")), [("notes.txt", False), ("src", True)])
+        self.assertEqual(self.mirror.lookup("src/app.py").size, 15)
+        self.assertFalse(self.mirror.lookup("missing.txt").exists)
+        with open(self.mirror.local_file("src/app.py")) as f:
+            self.assertEqual(f.read(), "print('hello')\n")
+
+    def test_changed_files_fetch_only_changed_blocks(self):
+        self.mirror.reconcile()
+        fetched = self.mirror.stats["bytes_fetched"]
+        with open(os.path.join(self.remote, "notes.txt"), "a") as f:
+            f.write("appended")
+        self.mirror.reconcile()
+        self.assertLess(self.mirror.stats["bytes_fetched"] - fetched, 100_000)
+        self.assertGreater(self.mirror.stats["bytes_reused"], 100_000)
+        with open(self.mirror.local_file("notes.txt")) as f:
+            self.assertTrue(f.read().endswith("nappended"))
+
+    def test_oversized_files_are_metadata_only(self):
+        with mock.patch.object(workspace_mirror, "MIRROR_MAX_FILE_BYTES", 1000):
+            self.mirror.reconcile()
+            self.assertEqual(self.mirror.lookup("notes.txt").size, 200_000)
+            self.assertIsNone(self.mirror.local_file("notes.txt"))
+            self.assertFalse(os.path.exists(os.path.join(self.mirror.root, "notes.txt")))
+            self.assertEqual(self.mirror.stats["files_fetched"], 1)
+
+            fetches = self.fetches()
+            self.mirror.reconcile()
+            self.assertEqual(self.fetches(), fetches)  # nothing changed, nothing fetched
+
+    def test_deleted_files_are_dropped(self):
+        self.mirror.reconcile()
+        shutil.rmtree(os.path.join(self.remote, "src"))
+        self.mirror.reconcile()
+        self.assertEqual(sorted(self.mirror.list_dir("")), [(".prime", True), ("notes.txt", False)])
+        self.assertFalse(os.path.exists(os.path.join(self.mirror.root, "src")))
+
+    def test_paths_leading_out_of_the_mirror_are_ignored(self):
+        outside = os.path.dirname(self.mirror.root)
+        run_command = self.run_command
+        forged = {"size": 6, "mtime": 0, "mode": 0o644, "blocks": {"0": "Zm9yZ2Vk"}}
+
+        def hostile(command):
+            code, stdout, stderr = run_command(command)
+            if self.action(command) == "manifest":
+                rows = json.loads(stdout)
+                rows += [["../escape", "d", 0, 0, 0o755], [outside + "/abs.txt", "f", 6, 0, 0o644],
+                         ["src/../../up.txt", "f", 6, 0, 0o644]]
+                stdout = json.dumps(rows) + "\n"
+            else:
+                for path in ("../escape.txt", "src/unasked.py"):
+                    stdout += json.dumps({"path": path, **forged}) + "\n"
+            return code, stdout, stderr
+
+        self.mirror._run_command = hostile
+        with self.assertLogs("chat.workspace_mirror", "WARNING") as logs:
+            self.mirror.reconcile()
+        self.assertEqual(len(logs.output), 5)
+        self.assertEqual(sorted(os.listdir(outside)), ["copy"])
+        self.assertEqual(sorted(self.mirror.list_dir("")), [("notes.txt", False), ("src", True)])
+        self.assertEqual(self.mirror.list_dir("src"), [("app.py", False)])
+        with open(self.mirror.local_file("src/app.py")) as f:
+            self.assertEqual(f.read(), "print('hello')\n")
+
+    def test_a_script_left_in_the_sandbox_is_not_run(self):
+        self.mirror.reconcile()
+        # A code run replaces the script an earlier version left behind
+        self.write(".prime/mirror_sync.py", "print('[[\"../escape\", \"d\", 0, 0, 493]]')\n")
+        self.mirror.reconcile()
+        self.assertEqual(self.mirror.lookup("src/app.py").size, 15)
+        self.assertFalse(os.path.exists(os.path.join(os.path.dirname(self.mirror.root), "escape")))
+
+    def test_stale_mirror_answers_nothing(self):
+        self.mirror.reconcile()
+        self.mirror.mark_stale()
+        self.assertIsNone(self.mirror.lookup("src/app.py"))
+        self.assertIsNone(self.mirror.list_dir("src"))
+
+    def test_reads_do_not_wait_for_a_reconciliation(self):
+        self.mirror.reconcile()
+        self.write("src/new.py", "x = 1\n")
+        in_fetch, release = threading.Event(), threading.Event()
+        run_command = self.run_command
+
+        def slow_fetch(command):
+            if self.action(command) == "fetch":
+                in_fetch.set()
+                release.wait(5)
+            return run_command(command)
+
+        self.mirror._run_command = slow_fetch
+        thread = threading.Thread(target=self.mirror.reconcile)
+        thread.start()
+        self.addCleanup(thread.join, 5)
+        self.addCleanup(release.set)
+        self.assertTrue(in_fetch.wait(5))
+        # The pass holds the writer lock while the sandbox is busy
+        self.assertEqual(self.mirror.lookup("src/app.py").size, 15)
+        self.assertIn(("app.py", False), self.mirror.list_dir("src"))
+
+
+class StubSearchHandler(BaseHTTPRequestHandler):
+    """Answers like DuckDuckGo's instant answer API, with scripted failures"""
+
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        self.server.connections += 1
+
+    def do_GET(self):
+        self.server.requests += 1
+        status = self.server.statuses.pop(0) if self.server.statuses else 200
+        url = urlparse(self.path)
+        params = parse_qs(url.query)
+        query = params.get("q", params.get("srsearch", [""]))[0]
+        if status != 200:
+            data = {}
+        elif url.path == "/w/api.php":
+            data = {
+                "query": {
+                    "search": [
+                        {"title": "Django (web framework)", "snippet": f"<span>{query}</span> framework"},
+                        {"title": "Python", "snippet": "A language"},
+                    ]
+                }
+            }
+        elif query.startswith("nothing"):
+            data = {"Abstract": "", "RelatedTopics": []}
+        else:
+            data = {
+                "Abstract": f"About {query}",
+                "AbstractURL": "https://en.wikipedia.org/wiki/Django_(web_framework)",
+                "RelatedTopics": [{"Text": "A related topic", "FirstURL": "https://duckduckgo.com/Topic"}],
+            }
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class WebSearchTests(SimpleTestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), StubSearchHandler)
+        self.server.connections = 0
+        self.server.requests = 0
+        self.server.statuses = []
+        thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+        url = f"http://127.0.0.1:{self.server.server_address[1]}/"
+        self.patch(search, "DUCKDUCKGO_URL", url)
+        self.patch(search, "WIKIPEDIA_API_URL", url + "w/api.php")
+        self.patch(search, "WEB_SEARCH_PROVIDERS", ["duckduckgo"])
+        search.provider_stats.reset()
+        # A fresh pool per test, without backoff sleeps
+        self.patch(http_client, "_session", http_client.build_session(backoff=0))
+
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir, ignore_errors=True)
+        self.cache_dir = os.path.join(cache_dir, "web_search")
+        settings = override_settings(
+            CACHES={
+                "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+                "web_search": {
+                    "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+                    "LOCATION": self.cache_dir,
+                    "OPTIONS": {"MAX_ENTRIES": 4, "CULL_FREQUENCY": 2},
+                },
+            }
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def patch(self, target, attribute, value):
+        patcher = mock.patch.object(target, attribute, value)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_connections_are_kept_alive(self):
+        for query in ("django", "python", "sqlite"):
+            self.assertIn(f"About {query}", search.web_search(query))
+        self.assertEqual(self.server.requests, 3)
+        self.assertEqual(self.server.connections, 1)
+
+    def test_transient_errors_are_retried(self):
+        self.server.statuses = [503, 502]
+        self.assertIn("About django", search.web_search("django"))
+        self.assertEqual(self.server.requests, 3)
+
+    def test_gives_up_after_retries_and_does_not_cache_errors(self):
+        self.server.statuses = [500] * (http_client.HTTP_RETRIES + 1)
+        self.assertTrue(search.web_search("django").startswith("Error performing web search"))
+        self.assertEqual(self.server.requests, http_client.HTTP_RETRIES + 1)
+
+        self.assertIn("About django", search.web_search("django"))
+        self.assertEqual(self.server.requests, http_client.HTTP_RETRIES + 2)
+
+    def test_repeated_queries_are_served_from_the_cache(self):
+        search.web_search("Django  ORM")
+        self.assertIn("About Django  ORM", search.web_search("django orm"))
+        self.assertEqual(self.server.requests, 1)
+
+    def test_empty_results_are_cached_with_the_negative_ttl(self):
+        with mock.patch("django.core.cache.backends.filebased.FileBasedCache.set") as cache_set:
+            self.assertEqual(search.web_search("nothing here"), "No results found for query: nothing here")
+            search.web_search("django")
+        ttls = [call.args[2] for call in cache_set.call_args_list]
+        self.assertEqual(ttls, [search.WEB_SEARCH_NEGATIVE_TTL, search.WEB_SEARCH_CACHE_TTL])
+
+        search.web_search("nothing here")
+        search.web_search("nothing here")
+        self.assertEqual(self.server.requests, 3)
+
+    def test_cache_size_is_bounded(self):
+        for i in range(12):
+            search.web_search(f"query {i}")
+        self.assertLessEqual(len(os.listdir(self.cache_dir)), 4)
+
+    def test_providers_are_merged_by_url(self):
+        self.patch(search, "WEB_SEARCH_PROVIDERS", ["duckduckgo", "wikipedia"])
+        result = search.web_search("django")
+        # Both providers found the Django article; it is listed once, first
+        self.assertEqual(result.count("wikipedia.org/wiki/Django_(web_framework)"), 1)
+        self.assertLess(result.index("About django"), result.index("A related topic"))
+        self.assertIn("wiki/Python", result)
+        self.assertIn("Sources: duckduckgo, wikipedia", result)
+        self.assertEqual(self.server.requests, 2)
+
+
+class SearchFanOutTests(SimpleTestCase):
+    """search_all against in-process stand-in providers"""
+
+    def setUp(self):
+        providers = {
+            "first": lambda query, n: [
+                {"title": "Shared", "url": "https://www.example.com/page/?utm_source=x", "snippet": "short"},
+                {"title": "Only first", "url": "https://first.example/a", "snippet": "a"},
+            ],
+            "second": lambda query, n: [
+                {"title": "Other", "url": "https://second.example/b", "snippet": "b"},
+                {"title": "Shared", "url": "http://example.com/page", "snippet": "a longer snippet"},
+            ],
+            "slow": self.slow_provider,
+            "broken": self.broken_provider,
+        }
+        patcher = mock.patch.dict(search.PROVIDERS, providers)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        settings = override_settings(
+            CACHES={
+                "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+                "web_search": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"},
+            }
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+        search.provider_stats.reset()
+        self.slow_release = threading.Event()
+        self.addCleanup(self.slow_release.set)
+
+    def slow_provider(self, query, num_results):
+        self.slow_release.wait(5)
+        return [{"title": "Late", "url": "https://slow.example/", "snippet": "late"}]
+
+    def broken_provider(self, query, num_results):
+        raise ValueError("provider is down")
+
+    def test_duplicates_are_merged_across_providers(self):
+        results, outcomes = search.search_all("q", 5, ["first", "second"])
+        self.assertEqual(outcomes, {"first": "ok", "second": "ok"})
+        self.assertEqual([r["title"] for r in results], ["Shared", "Other", "Only first"])
+        self.assertEqual(results[0]["sources"], ["first", "second"])
+        self.assertEqual(results[0]["snippet"], "a longer snippet")
+
+    def test_deadline_returns_what_has_arrived(self):
+        started = time.monotonic()
+        results, outcomes = search.search_all("q", 5, ["first", "slow"], deadline=0.2)
+        self.assertLess(time.monotonic() - started, 2)
+        self.assertEqual(outcomes, {"first": "ok", "slow": "timeout"})
+        self.assertNotIn("Late", [r["title"] for r in results])
+        self.assertEqual(search.provider_stats.snapshot()["slow"]["timeouts"], 1)
+
+        # The late answer is still recorded once it arrives
+        self.slow_release.set()
+        for _ in range(50):
+            if search.provider_stats.snapshot()["slow"]["calls"]:
+                break
+            time.sleep(0.05)
+        self.assertEqual(search.provider_stats.snapshot()["slow"]["calls"], 1)
+
+    def test_errors_are_reported_per_provider(self):
+        results, outcomes = search.search_all("q", 5, ["broken", "second"])
+        self.assertEqual(outcomes["broken"], "provider is down")
+        self.assertEqual(len(results), 2)
+        stats = search.provider_stats.snapshot()
+        self.assertEqual(stats["broken"]["errors"], 1)
+        self.assertEqual(stats["broken"]["last_error"], "provider is down")
+        self.assertEqual(stats["second"]["results"], 2)
+        self.assertIsNotNone(stats["second"]["avg_ms"])
+
+    def test_all_providers_failing_is_an_error(self):
+        with mock.patch.object(search, "WEB_SEARCH_PROVIDERS", ["broken"]):
+            result = search.web_search("q")
+        self.assertEqual(result, "Error performing web search: broken: provider is down")
+
+
+class StubPageHandler(BaseHTTPRequestHandler):
+    """Serves a documentation-like page with an ETag, and a large page"""
+
+    protocol_version = "HTTP/1.1"
+    page = (
+        "<html><head><title>Stub  Docs</title><style>body { color: red }</style></head>"
+        "<body><nav>Home | About</nav><h1>Install</h1><p>Run  the\n installer.</p>"
+        "<ul><li>First</li><li>Second</li></ul><script>alert(1)</script>"
+        "<pre>  indented\n    code</pre></body></html>"
+    )
+
+    def do_GET(self):
+        self.server.requests.append(dict(self.headers))
+        if self.path == "/big":
+            body = b"<p>" + b"x" * (4 * 1024 * 1024) + b"</p>"
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html")
+        elif self.path == "/image":
+            body = b"\x89PNG"
+            self.send_response(200)
+            self.send_header("Content-Type", "image/png")
+        elif self.headers.get("If-None-Match") == '"v1"':
+            body = b""
+            self.send_response(304)
+            self.send_header("ETag", '"v1"')
+        else:
+            body = self.page.encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("ETag", '"v1"')
+            self.send_header("Cache-Control", "max-age=0")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def log_message(self, *args):
+        pass
+
+
+class FetchUrlTests(SimpleTestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), StubPageHandler)
+        self.server.requests = []
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.base = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+        for attribute, value in (
+            ("FETCH_ALLOW_PRIVATE", True),
+            ("FETCH_MAX_BYTES", 64 * 1024),
+        ):
+            patcher = mock.patch.object(url_fetch, attribute, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        session = http_client.build_session(backoff=0, adapter_class=url_fetch.VettedAdapter)
+        patcher = mock.patch.object(url_fetch, "_session", session)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        settings = override_settings(
+            CACHES={
+                "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+                "url_fetch": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "fetch"},
+            }
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def test_html_is_reduced_to_readable_text(self):
+        result = url_fetch.fetch_url(self.base + "/docs")
+        self.assertIn("Title: Stub Docs", result)
+        self.assertIn("# Install\n\nRun the installer.", result)
+        self.assertIn("- First\n- Second", result)
+        self.assertIn("  indented\n    code", result)
+        for noise in ("color: red", "alert(1)", "Home | About"):
+            self.assertNotIn(noise, result)
+
+    def test_repeat_fetches_are_revalidated_with_the_etag(self):
+        first = url_fetch.fetch_url(self.base + "/docs")
+        second = url_fetch.fetch_url(self.base + "/docs")
+        self.assertIn("[not modified]", second)
+        self.assertEqual(second.split("\n", 1)[1], first.split("\n", 1)[1])
+        self.assertEqual(self.server.requests[1].get("If-None-Match"), '"v1"')
+
+    def test_download_is_capped(self):
+        result = url_fetch.fetch_url(self.base + "/big")
+        self.assertIn("[Truncated:", result)
+        self.assertLessEqual(len(result), url_fetch.FETCH_TEXT_LIMIT + 500)
+
+    def test_binary_and_private_targets_are_refused(self):
+        with mock.patch.object(url_fetch, "FETCH_ALLOW_PRIVATE", False):
+            self.assertTrue(url_fetch.fetch_url(self.base + "/docs").startswith("Access denied"))
+        self.assertIn("only text and HTML pages", url_fetch.fetch_url(self.base + "/image"))
+        self.assertTrue(url_fetch.fetch_url("file:///etc/passwd").startswith("Error"))
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_connection_uses_the_vetted_lookup(self):
+        # rebind.test first answers with an allowed address nothing listens
+        # on, then with the stub server's; the second answer must not be used
+        answers = iter(["127.0.0.2", "127.0.0.1", "127.0.0.1"])
+        resolve = socket.getaddrinfo
+        port = self.server.server_address[1]
+
+        def rebinding(host, *args, **kwargs):
+            if host != "rebind.test":
+                return resolve(host, *args, **kwargs)
+            return [(socket.AF_INET, socket.SOCK_STREAM, 6, "", (next(answers), port))]
+
+        session = http_client.build_session(retries=0, adapter_class=url_fetch.VettedAdapter)
+        with mock.patch.object(url_fetch, "_session", session), \
+                mock.patch.object(url_fetch, "_allowed", lambda address: address != "127.0.0.1"), \
+                mock.patch.object(socket, "getaddrinfo", rebinding):
+            result = url_fetch.fetch_url(f"http://rebind.test:{port}/docs")
+        self.assertTrue(result.startswith("Error fetching"), result)
+        self.assertEqual(self.server.requests, [])
+
+
+class UploadTests(TestCase):
+    DATA = bytes(range(256)) * 40
+
+    def setUp(self):
+        self.workspace = tempfile.mkdtemp(prefix="workspace_")
+        self.addCleanup(shutil.rmtree, self.workspace, ignore_errors=True)
+        for target, attribute, value in (
+            (ai_utils, "daytona_ops", LocalSandbox(self.workspace)),
+            (views, "UPLOAD_CHUNK_SIZE", 4096),
+        ):
+            patcher = mock.patch.object(target, attribute, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def start(self, path="data/train.bin", data=DATA):
+        body = {"path": path, "size": len(data), "sha256": hashlib.sha256(data).hexdigest()}
+        response = self.client.post(reverse("start_upload"), body, content_type="application/json")
+        self.assertEqual(response.status_code, 201)
+        return response.json()
+
+    def send(self, state, offset, chunk, **headers):
+        return self.client.post(
+            f"{state['chunk_url']}?offset={offset}", chunk, content_type="application/octet-stream", **headers
+        )
+
+    def send_all(self, state, data=DATA):
+        for offset in range(0, len(data), state["chunk_size"]):
+            self.assertEqual(self.send(state, offset, data[offset:offset + state["chunk_size"]]).status_code, 200)
+
+    def test_chunks_are_assembled_verified_and_downloaded(self):
+        state = self.start()
+        self.send_all(state)
+        response = self.client.post(state["complete_url"])
+        self.assertEqual(response.json()["status"], Upload.STATUS_COMPLETE)
+        with open(os.path.join(self.workspace, "data/train.bin"), "rb") as f:
+            self.assertEqual(f.read(), self.DATA)
+        self.assertEqual(os.listdir(os.path.join(self.workspace, ".prime/uploads")), [])
+
+        response = self.client.get(reverse("download_file"), {"path": "data/train.bin"})
+        self.assertEqual(b"".join(response.streaming_content), self.DATA)
+        self.assertIn('filename="train.bin"', response["Content-Disposition"])
+
+    def test_an_interrupted_upload_resumes_from_the_received_offset(self):
+        state = self.start()
+        self.send(state, 0, self.DATA[:4096])
+        response = self.send(state, 8192, self.DATA[8192:12288])
+        self.assertEqual((response.status_code, response.json()["received"]), (409, 4096))
+        self.assertEqual(self.client.get(reverse("upload_status", args=[state["upload_id"]])).json()["received"], 4096)
+
+        # A chunk that arrives damaged is refused and simply sent again
+        bad = self.send(state, 4096, self.DATA[4096:8192], HTTP_X_CHUNK_SHA256="0" * 64)
+        self.assertEqual((bad.status_code, bad.json()["received"]), (400, 4096))
+        good_sha = hashlib.sha256(self.DATA[4096:8192]).hexdigest()
+        self.assertEqual(self.send(state, 4096, self.DATA[4096:8192], HTTP_X_CHUNK_SHA256=good_sha).status_code, 200)
+        self.send(state, 8192, self.DATA[8192:])
+        self.assertEqual(self.client.post(state["complete_url"]).status_code, 200)
+
+    def test_oversized_incomplete_and_corrupt_uploads_are_refused(self):
+        state = self.start(data=b"x" * 5000)
+        self.assertEqual(self.send(state, 0, b"x" * 4097).status_code, 413)
+        self.assertEqual(self.client.post(state["complete_url"]).status_code, 409)
+
+        state = self.start(data=b"abc")
+        Upload.objects.filter(upload_id=state["upload_id"]).update(sha256="0" * 64)
+        self.send(state, 0, b"abc")
+        response = self.client.post(state["complete_url"])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("Checksum mismatch", response.json()["error"])
+        self.assertFalse(os.path.exists(os.path.join(self.workspace, "data/train.bin")))
+
+    def test_uploads_outside_the_workspace_are_denied(self):
+        state = self.start(path="../escape.bin", data=b"abc")
+        self.send(state, 0, b"abc")
+        response = self.client.post(state["complete_url"])
+        self.assertEqual(response.status_code, 400)
+        self.assertTrue(response.json()["error"].startswith("Access denied"))
+        self.assertFalse(os.path.exists(os.path.join(os.path.dirname(self.workspace), "escape.bin")))
+
+    def test_cancel_discards_the_staged_bytes(self):
+        state = self.start()
+        self.send(state, 0, self.DATA[:4096])
+        self.assertEqual(self.client.post(reverse("cancel_upload", args=[state["upload_id"]])).json(), {"success": True})
+        self.assertEqual(os.listdir(os.path.join(self.workspace, ".prime/uploads")), [])
+        self.assertFalse(Upload.objects.exists())
+
+
+class MessageSearchTests(TestCase):
+    def setUp(self):
+        self.deploy = Conversation.objects.create(title="Deploying Django")
+        self.other = Conversation.objects.create(title="Weekend plans")
+        self.answer = Message.objects.create(
+            conversation=self.deploy, is_user=False,
+            content="Run gunicorn behind nginx and collect <static> files first.",
+        )
+        Message.objects.create(conversation=self.other, is_user=True, content="Hiking or a café visit?")
+
+    def test_matches_are_ranked_highlighted_and_escaped(self):
+        results, has_next = message_search.search("nginx static")
+        self.assertFalse(has_next)
+        self.assertEqual(len(results), 1)
+        hit = results[0]
+        self.assertEqual(hit["message_id"], self.answer.id)
+        self.assertEqual(hit["title"], "Deploying Django")
+        self.assertIn("<mark>nginx</mark>", hit["snippet"])
+        self.assertIn("&lt;<mark>static</mark>&gt;", hit["snippet"])
+
+    def test_index_follows_inserts_updates_and_deletes(self):
+        self.assertEqual(message_search.search("gunic")[0][0]["message_id"], self.answer.id)
+        self.answer.content = "Use uvicorn workers"
+        self.answer.save()
+        self.assertEqual(message_search.search("gunicorn")[0], [])
+        self.assertEqual(len(message_search.search("uvicorn")[0]), 1)
+
+        self.other.title = "Cafe crawl"
+        self.other.save()
+        titles = [hit["title"] for hit in message_search.search("cafe")[0]]
+        self.assertIn("<mark>Cafe</mark> crawl", titles)
+        self.assertEqual(len(titles), 2)  # "café" in the message matches without the accent
+
+        self.other.delete()
+        self.assertEqual(message_search.search("cafe")[0], [])
+
+    def test_query_syntax_is_not_interpreted(self):
+        for query in ('"', "AND", "nginx OR", "title:nginx", "*", "NEAR(a b)"):
+            message_search.search(query)
+        self.assertEqual(message_search.build_match("  ?! "), "")
+        self.assertEqual(message_search.build_match("deploy djan"), '"deploy" "djan" *')
+
+    def test_pagination_and_endpoint(self):
+        for i in range(5):
+            Message.objects.create(conversation=self.deploy, is_user=True, content=f"deploy step {i}")
+        first, has_next = message_search.search("deploy", page=1, page_size=4)
+        second, more = message_search.search("deploy", page=2, page_size=4)
+        self.assertTrue(has_next)
+        self.assertFalse(more)
+        self.assertEqual(len(first) + len(second), 6)
+        self.assertIsNone(first[0]["message_id"])  # the title outranks the messages
+
+        data = self.client.get(reverse("search_conversations"), {"q": "deploy", "page_size": 4}).json()
+        self.assertTrue(data["has_next"])
+        self.assertEqual(data["results"][0]["url"], reverse("conversation_detail", args=[self.deploy.id]))
+        self.assertEqual(self.client.get(reverse("search_conversations"), {"page": "x"}).status_code, 400)
+
+    def test_rebuild_command_restores_a_wiped_index(self):
+        with connection.cursor() as cursor:
+            cursor.execute("INSERT INTO chat_message_fts(chat_message_fts) VALUES ('delete-all')")
+        self.assertEqual(message_search.search("nginx")[0], [])
+        call_command("rebuild_search_index", stdout=io.StringIO())
+        self.assertEqual(len(message_search.search("nginx")[0]), 1)
+
+
+class TempDirSettingsMixin:
+    """Points each setting in ``temp_dir_settings`` at a fresh directory removed after the test"""
+
+    temp_dir_settings = ()
+
+    def setUp(self):
+        super().setUp()
+        root = tempfile.mkdtemp(prefix="settings_")
+        self.addCleanup(shutil.rmtree, root, ignore_errors=True)
+        settings = override_settings(**{name: os.path.join(root, name.lower()) for name in self.temp_dir_settings})
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+
+class MessageBlobTests(TempDirSettingsMixin, TestCase):
+    temp_dir_settings = ("MESSAGE_BLOB_DIR",)
+
+    def setUp(self):
+        super().setUp()
+        self.store = blob_store.get_blob_store()
+        self.conversation = Conversation.objects.create(title="Logs")
+        self.body = "".join(f"line {i}: needle\n" for i in range(5000))
+
+    def test_long_bodies_are_offloaded_and_deduplicated(self):
+        first = Message.objects.create(conversation=self.conversation, content=self.body, is_user=False)
+        second = Message.objects.create(conversation=self.conversation, content=self.body, is_user=False)
+        short = Message.objects.create(conversation=self.conversation, content="short", is_user=True)
+
+        first.refresh_from_db()
+        self.assertTrue(first.is_offloaded)
+        self.assertEqual(first.body_size, len(self.body.encode()))
+        self.assertLess(len(first.content), blob_store.MESSAGE_PREVIEW_CHARS + 200)
+        self.assertIn("[Output truncated:", first.content)
+        self.assertEqual(first.full_content(), self.body)
+        self.assertEqual(second.body_sha256, first.body_sha256)
+        self.assertEqual(len(list(self.store.digests())), 1)
+        self.assertFalse(short.is_offloaded)
+
+        history = format_messages_for_gemini(self.conversation.messages.all())
+        self.assertEqual(history[0]["parts"], first.content)
+        self.assertEqual(len(message_search.search("needle")[0]), 2)
+
+    def test_body_endpoint_streams_the_full_text(self):
+        message = Message.objects.create(conversation=self.conversation, content=self.body, is_user=False)
+        response = self.client.get(reverse("message_body", args=[message.id]))
+        self.assertEqual(b"".join(response.streaming_content).decode(), self.body)
+        self.assertContains(
+            self.client.get(reverse("conversation_detail", args=[self.conversation.id])),
+            reverse("message_body", args=[message.id]),
+        )
+
+    def test_prune_keeps_referenced_and_recent_blobs(self):
+        kept = Message.objects.create(conversation=self.conversation, content=self.body, is_user=False)
+        orphan = Message.objects.create(conversation=self.conversation, content=self.body + "x", is_user=False)
+        orphan.delete()
+        call_command("prune_message_blobs", stdout=io.StringIO())
+        self.assertEqual(len(list(self.store.digests())), 2)  # inside the grace period
+        call_command("prune_message_blobs", "--grace=0", stdout=io.StringIO())
+        self.assertEqual([digest for digest, _ in self.store.digests()], [kept.body_sha256])
+
+
+class MessageRenderTests(TestCase):
+    def setUp(self):
+        self.conversation = Conversation.objects.create(title="Render")
+
+    def test_bodies_render_escaped_with_code_blocks(self):
+        html = message_render.render_message("Try <this>:\n\n```python\nprint('<hi>')\n```\nthen\nrun it")
+        self.assertEqual(
+            html,
+            "<p>Try &lt;this&gt;:</p>\n"
+            '<div class="code-block"><div class="code-header"><span class="code-language">python</span>'
+            '<button class="copy-code-btn" onclick="copyCodeBlock(this)">Copy</button></div>'
+            "<pre><code>print(&#x27;&lt;hi&gt;&#x27;)</code></pre></div>\n"
+            "<p>then<br>run it</p>",
+        )
+        self.assertEqual(message_render.render_message("a\nb\n\nc"), "<p>a<br>b</p>\n\n<p>c</p>")
+
+    def test_page_reuses_stored_html_and_renders_stale_rows(self):
+        saved = Message.objects.create(conversation=self.conversation, content="hello **there**")
+        self.assertEqual(saved.html_version, message_render.RENDER_VERSION)
+        Message.objects.filter(id=saved.id).update(html="<p>stored copy</p>")
+        # As written by bulk_create on import, never rendered
+        imported = Message.objects.bulk_create([Message(conversation=self.conversation, content="from <import>")])[0]
+
+        url = reverse("conversation_detail", args=[self.conversation.id])
+        response = self.client.get(url)
+        self.assertContains(response, "<p>stored copy</p>")
+        self.assertContains(response, "<p>from &lt;import&gt;</p>")
+        self.assertEqual(Message.objects.get(id=imported.id).html_version, message_render.RENDER_VERSION)
+
+        # Rows from an older renderer are rendered again on the next view
+        Message.objects.filter(id=saved.id).update(html_version=message_render.RENDER_VERSION - 1)
+        self.assertContains(self.client.get(url), "<p>hello **there**</p>")
+        with self.assertNumQueries(3):  # conversation, messages without bodies, sidebar
+            self.client.get(url)
+
+
+class MessageCompressionTests(TestCase):
+    def setUp(self):
+        compression.clear_dictionary_cache()
+        self.addCleanup(compression.clear_dictionary_cache)
+        self.conversation = Conversation.objects.create(title="Builds")
+
+    def stored(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT typeof(content), length(content) FROM chat_message ORDER BY id")
+            return cursor.fetchall()
+
+    def traceback(self, i):
+        return "\n".join(
+            f'  File "/srv/app/handlers/module_{(i * 7 + j) % 13}.py", line {j * 3}, in handle_request'
+            for j in range(6)
+        ) + f"\nValueError: unexpected token {i}"
+
+    def test_long_bodies_are_compressed_and_stay_searchable(self):
+        body = "Step completed without warnings.\n" * 200 + "checksum mismatch"
+        Message.objects.create(conversation=self.conversation, content=body, is_user=False)
+        Message.objects.create(conversation=self.conversation, content="short", is_user=True)
+        (long_type, long_size), (short_type, _) = self.stored()
+        self.assertEqual((long_type, short_type), ("blob", "text"))
+        self.assertLess(long_size, len(body) // 10)
+        self.assertEqual(Message.objects.order_by("id").first().content, body)
+
+        hit = message_search.search("checksum")[0][0]
+        self.assertIn("<mark>checksum</mark> mismatch", hit["snippet"])
+
+    def test_trained_dictionary_shrinks_similar_messages(self):
+        for i in range(60):
+            Message.objects.create(conversation=self.conversation, content=self.traceback(i), is_user=False)
+        before = sum(size for _, size in self.stored())
+
+        call_command("train_compression_dictionary", "--recompress", stdout=io.StringIO())
+        after = sum(size for _, size in self.stored())
+        self.assertLess(after, before * 0.6)
+        self.assertEqual(
+            [m.content for m in Message.objects.order_by("id")],
+            [self.traceback(i) for i in range(60)],
+        )
+        # Another process starting cold reads the dictionary from the database
+        compression.clear_dictionary_cache()
+        self.assertEqual(Message.objects.order_by("id").last().content, self.traceback(59))
+        self.assertEqual(len(message_search.search("token 42")[0]), 1)
+
+
+class HistoryTransferTests(TempDirSettingsMixin, TestCase):
+    temp_dir_settings = ("MESSAGE_BLOB_DIR",)
+
+    def setUp(self):
+        super().setUp()
+        self.log = "".join(f"epoch {i}: loss falling\n" for i in range(4000))
+        self.conversation = Conversation.objects.create(title="Training run")
+        Message.objects.create(conversation=self.conversation, content="Why is it slow?", is_user=True)
+        Message.objects.create(conversation=self.conversation, content=self.log, is_user=False, tool_used=True)
+        Conversation.objects.create(title="Empty")
+        stamp = "2024-03-01T12:00:00+00:00"
+        Conversation.objects.update(created_at=stamp, updated_at=stamp)
+        Message.objects.update(created_at=stamp)
+
+    def snapshot(self):
+        return [
+            (c.title, c.created_at, c.updated_at,
+             [(m.full_content(), m.is_user, m.created_at, m.tool_used) for m in c.messages.order_by("id")])
+            for c in Conversation.objects.order_by("id")
+        ]
+
+    def test_export_and_import_round_trip(self):
+        before = self.snapshot()
+        path = os.path.join(tempfile.mkdtemp(prefix="export_"), "history.jsonl.gz")
+        self.addCleanup(shutil.rmtree, os.path.dirname(path), ignore_errors=True)
+        call_command("export_conversations", output=path, stderr=io.StringIO())
+        Conversation.objects.all().delete()
+
+        call_command("import_conversations", path, "--batch-size=2", stdout=io.StringIO())
+        self.assertEqual(self.snapshot(), before)
+        self.assertTrue(Message.objects.get(tool_used=True).is_offloaded)
+        self.assertEqual(len(message_search.search("slow")[0]), 1)
+
+    def test_http_export_and_import(self):
+        response = self.client.get(reverse("export_conversations"), {"conversation": self.conversation.id})
+        body = b"".join(response.streaming_content)
+        self.assertEqual([json.loads(line)["type"] for line in body.splitlines()],
+                         ["header", "conversation", "message", "message"])
+
+        response = self.client.post(reverse("import_conversations"), body, content_type="application/x-ndjson")
+        self.assertEqual(response.json(), {"success": True, "conversations": 1, "messages": 2})
+        self.assertEqual(Conversation.objects.filter(title="Training run").count(), 2)
+
+        response = self.client.post(
+            reverse("import_conversations"), body.replace(b'"message"', b'"note"', 1),
+            content_type="application/x-ndjson",
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("line 3", response.json()["error"])
+
+
+class ConversationArchiveTests(TempDirSettingsMixin, TestCase):
+    temp_dir_settings = ("MESSAGE_BLOB_DIR", "CONVERSATION_ARCHIVE_DIR")
+
+    def setUp(self):
+        super().setUp()
+        self.log = "".join(f"step {i}: compiling kernel\n" for i in range(3000))
+        self.old = Conversation.objects.create(title="Kernel build")
+        Message.objects.create(conversation=self.old, content="Build the kernel", is_user=True)
+        Message.objects.create(conversation=self.old, content=self.log, is_user=False, tool_used=True)
+        self.recent = Conversation.objects.create(title="Today")
+        Message.objects.create(conversation=self.recent, content="Hello", is_user=True)
+        Conversation.objects.filter(id=self.old.id).update(updated_at="2025-03-14T09:00:00+00:00")
+
+    def archive_old(self):
+        self.assertEqual(archive.archive_conversations(days=30), {"conversations": 1, "messages": 2})
+        return Conversation.objects.get(id=self.old.id)
+
+    def test_stale_conversations_are_replaced_by_stubs(self):
+        stub = self.archive_old()
+        self.assertEqual((stub.archive_file, stub.archive_member), ("2025-03.zip", f"{self.old.id}.jsonl"))
+        self.assertFalse(stub.messages.exists())
+        self.assertEqual(self.recent.messages.count(), 1)
+        self.assertContains(self.client.get(reverse("conversation_list")), "Archived")
+        self.assertEqual(len(message_search.search("kernel")[0]), 1)  # the title only
+
+    def test_export_reads_archived_messages(self):
+        self.archive_old()
+        exported = "".join(history_transfer.export_lines([self.old.id]))
+        self.assertIn("compiling kernel", exported)
+
+    def test_opening_an_archived_conversation_rehydrates_it(self):
+        stub = self.archive_old()
+        response = self.client.get(reverse("conversation_detail", args=[self.old.id]))
+        self.assertContains(response, "Build the kernel")
+        stub.refresh_from_db()
+        self.assertFalse(stub.is_archived)
+        self.assertEqual(str(stub.updated_at), "2025-03-14 09:00:00+00:00")
+        body = stub.messages.get(is_user=False)
+        self.assertTrue(body.tool_used)
+        self.assertEqual(body.full_content(), self.log)
+        self.assertEqual(len(message_search.search("compiling")[0]), 1)
+
+    def test_archiving_again_adds_a_member_next_to_the_first_copy(self):
+        self.archive_old()
+        self.client.get(reverse("conversation_detail", args=[self.old.id]))
+        self.assertEqual(archive.archive_conversations(days=30)["conversations"], 1)
+        self.assertEqual(Conversation.objects.get(id=self.old.id).archive_member, f"{self.old.id}.2.jsonl")
+
+    def test_concurrent_appends_to_one_file_keep_both(self):
+        first_inside, release = threading.Event(), threading.Event()
+
+        def export_lines(ids):
+            if ids == [1]:
+                first_inside.set()
+                release.wait(5)
+            yield json.dumps({"conversation": ids[0]}) + "\n"
+
+        members = {}
+
+        def append(conversation_id):
+            members.update(archive._append("2025-03.zip", [SimpleNamespace(id=conversation_id)]))
+
+        with mock.patch.object(archive, "export_lines", export_lines):
+            first = threading.Thread(target=append, args=(1,))
+            first.start()
+            self.assertTrue(first_inside.wait(5))
+            # The second run starts while the first holds its copy of the file
+            second = threading.Thread(target=append, args=(2,))
+            second.start()
+            second.join(0.2)
+            self.assertTrue(second.is_alive())
+            release.set()
+            first.join(5)
+            second.join(5)
+
+        self.assertEqual(members, {1: "1.jsonl", 2: "2.jsonl"})
+        with zipfile.ZipFile(archive.archive_path("2025-03.zip")) as zf:
+            self.assertEqual(sorted(zf.namelist()), ["1.jsonl", "2.jsonl"])
+
+
+class ToolMetricsTests(TestCase):
+    def setUp(self):
+        patcher = mock.patch.object(tool_metrics, "writer", tool_metrics.InvocationWriter(interval=0))
+        self.writer = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tools(self):
+        @tool_metrics.tracked("info file", "test", target="path")
+        def info(path, conversation_id=None):
+            if path == "/boom":
+                raise OSError("disk gone")
+            return "Access denied" if path.startswith("/etc") else read(path)
+
+        @tool_metrics.tracked("read file", "test", target="path")
+        def read(path):
+            return "x" * 100
+
+        @tool_metrics.tracked("run code", "test")
+        def run(code):
+            yield "output", "partial\n"
+            yield "done", "Error: exit 1"
+
+        return info, run
+
+    def test_calls_are_queued_until_flushed(self):
+        info, _ = self.tools()
+        for _ in range(3):
+            info("/workspace/a.py", conversation_id=7)
+        self.assertFalse(ToolInvocation.objects.exists())
+
+        self.assertEqual(self.writer.flush(), 3)  # the nested reads are not counted
+        first, second, _ = ToolInvocation.objects.order_by("id")
+        self.assertEqual((first.tool, first.status, first.target), ("info file", "ok", "/workspace/a.py"))
+        self.assertEqual((first.conversation_id, first.bytes_out), (7, 100))
+        self.assertEqual(first.args_sha256, second.args_sha256)
+
+    def test_failures_are_classified(self):
+        info, run = self.tools()
+        info("/etc/shadow")
+        with self.assertRaises(OSError):
+            info("/boom")
+        self.assertEqual(list(run("1/0"))[-1], ("done", "Error: exit 1"))
+
+        self.writer.flush()
+        self.assertEqual(
+            list(ToolInvocation.objects.order_by("id").values_list("tool", "status", "error_class")),
+            [("info file", "error", "AccessDenied"), ("info file", "error", "OSError"), ("run code", "error", "ToolError")],
+        )
+
+    def test_abandoned_stream_is_cancelled(self):
+        _, run = self.tools()
+        stream = run("print(1)")
+        next(stream)
+        stream.close()
+
+        self.writer.flush()
+        self.assertEqual(ToolInvocation.objects.get().status, "cancelled")
+
+    def test_report_view_and_command(self):
+        info, _ = self.tools()
+        for path in ("/workspace/a.py", "/workspace/b.py", "/etc/shadow"):
+            info(path)
+        self.writer.flush()
+
+        data = self.client.get(reverse("tool_metrics")).json()
+        by_tool = {row["tool"]: row for row in data["tools"]}
+        self.assertEqual((by_tool["info file"]["calls"], by_tool["info file"]["errors"]), (3, 1))
+        self.assertEqual(data["slowest"][0]["tool"], "info file")
+        out = io.StringIO()
+        call_command("tool_report", stdout=out)
+        self.assertIn("p99 ms", out.getvalue())
+
+    def test_queue_holds_sizes_not_payloads(self):
+        @tool_metrics.tracked("write file", "test", target="path")
+        def write(path, content):
+            return "y" * 5000
+
+        write("/workspace/big.txt", "x" * 10000)
+        (queued,) = self.writer._pending
+        self.assertEqual((queued["bytes_in"], queued["bytes_out"]), (10000 + len("/workspace/big.txt"), 5000))
+        self.assertFalse(any(isinstance(value, str) and len(value) > 100 for value in queued.values()))
+
+
+class BulkConversationTests(TempDirSettingsMixin, TestCase):
+    temp_dir_settings = ("CONVERSATION_ARCHIVE_DIR",)
+
+    def setUp(self):
+        super().setUp()
+        self.stale = []
+        for i in range(4):
+            conversation = Conversation.objects.create(title=f"Scratch {i}")
+            for j in range(5):
+                Message.objects.create(conversation=conversation, content=f"throwaway note {j}")
+            self.stale.append(conversation.id)
+        self.keep = Conversation.objects.create(title="Keeper")
+        Message.objects.create(conversation=self.keep, content="important note")
+        Conversation.objects.filter(id__in=self.stale).update(updated_at="2024-01-01T00:00:00+00:00")
+
+    def post(self, name, data):
+        return self.client.post(reverse(name), data, content_type="application/json")
+
+    def test_bulk_delete_by_filter_runs_in_batches(self):
+        with mock.patch.object(bulk_ops, "BULK_DELETE_ROWS", 3), mock.patch.object(bulk_ops, "BULK_DELETE_PAUSE", 0):
+            response = self.post("bulk_delete_conversations", {"filter": {"older_than_days": 30, "title_contains": "scratch"}})
+        self.assertEqual((response.json()["deleted"], response.json()["messages"]), (4, 20))
+        self.assertEqual(list(Conversation.objects.values_list("id", flat=True)), [self.keep.id])
+        self.assertEqual(Message.objects.count(), 1)
+        self.assertEqual(len(message_search.search("note")[0]), 1)
+
+        self.assertEqual(self.post("bulk_delete_conversations", {"filter": {"colour": "red"}}).status_code, 400)
+        self.assertEqual(self.post("bulk_delete_conversations", {}).status_code, 400)
+
+    def test_bulk_rename_and_archive(self):
+        response = self.post("bulk_rename_conversations", {"ids": self.stale[:2] + [999], "title": "Old"})
+        self.assertEqual(response.json()["renamed"], 2)
+        response = self.post("bulk_rename_conversations", {"titles": {str(self.keep.id): "Pinned"}})
+        self.assertEqual(response.json()["renamed"], 1)
+        self.assertEqual(Conversation.objects.get(id=self.keep.id).title, "Pinned")
+        self.assertEqual(self.post("bulk_rename_conversations", {"ids": self.stale, "title": " "}).status_code, 400)
+
+        response = self.post("bulk_archive_conversations", {"ids": self.stale[2:]})
+        self.assertEqual((response.json()["archived"], response.json()["messages"]), (2, 10))
+        response = self.post("bulk_archive_conversations", {"filter": {"archived": True}})
+        self.assertEqual(response.json()["archived"], 0)  # already there
+
+
+class StaticAssetTests(TempDirSettingsMixin, TestCase):
+    temp_dir_settings = ("ASSET_BUILD_DIR",)
+
+    def test_minifiers_keep_strings_regexes_and_statement_breaks(self):
+        script = (
+            "// greeting\nconst url = 'http://x/*y*/' + `a ${ {b: 1}.b } // c`;\n"
+            "let n = a + +b - -c / 2 /* half */;\nconst re = /[/]\\/\\d+/g.test(s)\n(x)\nreturn\nn\n"
+        )
+        self.assertEqual(
+            assets.minify_js(script),
+            "const url='http://x/*y*/'+`a ${{b:1}.b} // c`;let n=a+ +b- -c/2;const re=/[/]\\/\\d+/g.test(s)\n(x)\nreturn\nn\n",
+        )
+        self.assertEqual(
+            assets.minify_css("/* it's */ .a :hover > b {\n  content: ' ; } ';\n  margin: 0 auto;\n}\n"),
+            ".a :hover>b{content:' ; } ';margin:0 auto}\n",
+        )
+
+    def test_pages_load_hashed_bundles_served_precompressed_and_immutable(self):
+        page = self.client.get(reverse("conversation_list")).content.decode()
+        self.assertNotIn("<script>", page)
+        self.assertNotIn("<style>", page)
+        url = assets.asset_url("app.css")
+        self.assertRegex(url, r"^/assets/app\.[0-9a-f]{12}\.css$")
+        self.assertIn(url, page)
+
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING="gzip, deflate")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(response["Cache-Control"], "public, max-age=31536000, immutable")
+        self.assertEqual(response["Content-Type"], "text/css; charset=utf-8")
+        body = gzip.decompress(b"".join(response.streaming_content))
+        self.assertEqual(body, assets.bundle("app.css"))
+        self.assertIn(b"--primary-50:", body)
+
+        plain = self.client.get(url, HTTP_ACCEPT_ENCODING="gzip;q=0")
+        self.assertFalse(plain.has_header("Content-Encoding"))
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"]).status_code, 304)
+        self.assertEqual(self.client.get("/assets/manifest.json").status_code, 404)
+        self.assertEqual(self.client.get("/assets/app.000000000000.css").status_code, 404)
 
-# Create your tests here.
@@ -0,0 +1,324 @@
+"""Latency and payload accounting for chat tools
+
+Tool functions in ``ai_utils`` are wrapped with ``tracked``, which times
+each call and queues its digest and payload sizes (never the payloads
+themselves). A background thread writes the queue as ToolInvocation rows
+with one ``bulk_create`` every TOOL_METRICS_FLUSH_INTERVAL seconds, or
+sooner once a batch fills, so a tool call costs a deque append rather than
+a database write. ``report`` summarises the table for the ``tool_report``
+command and ``/chat/metrics/tools/``.
+
+The model is imported where it is used, so ``ai_utils`` (and the scripts
+that drive its tools directly) can be imported before Django is set up.
+"""
+
+import atexit
+import functools
+import hashlib
+import inspect
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Seconds between background writes of queued invocations (0 disables the
+# thread; call writer.flush() instead)
+TOOL_METRICS_FLUSH_INTERVAL = float(os.getenv("TOOL_METRICS_FLUSH_INTERVAL", "2"))
+# A batch this large is written without waiting for the interval
+TOOL_METRICS_BATCH_SIZE = 200
+# Invocations beyond this many unwritten ones are dropped, not queued
+TOOL_METRICS_MAX_PENDING = 10_000
+
+# ToolInvocation.STATUS_* values
+STATUS_OK = "ok"
+STATUS_ERROR = "error"
+STATUS_CANCELLED = "cancelled"
+
+ERROR_PREFIXES = {"Error": "ToolError", "Access denied": "AccessDenied", "Invalid path": "InvalidPath"}
+PERCENTILES = (50, 90, 99)
+
+
+def is_error_result(result):
+    """Whether a tool's returned text reports a failure"""
+    return isinstance(result, str) and result.startswith(tuple(ERROR_PREFIXES))
+
+
+def _error_class(result):
+    for prefix, name in ERROR_PREFIXES.items():
+        if result.startswith(prefix):
+            return name
+    return ""
+
+
+class InvocationWriter:
+    def __init__(self, interval=TOOL_METRICS_FLUSH_INTERVAL, batch_size=TOOL_METRICS_BATCH_SIZE,
+                 max_pending=TOOL_METRICS_MAX_PENDING):
+        self.interval = interval
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self._pending = deque()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self.dropped = 0
+
+    def record(self, call):
+        """Queue the ToolInvocation fields of one call"""
+        with self._lock:
+            if len(self._pending) >= self.max_pending:
+                self.dropped += 1
+                return
+            self._pending.append(call)
+            full = len(self._pending) >= self.batch_size
+        if self.interval > 0:
+            self.start()
+            if full:
+                self._wake.set()
+
+    def start(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="tool-metrics", daemon=True)
+                    self._thread.start()
+                    atexit.register(self._flush_logged)
+
+    def stop(self, discard=False):
+        """Stop the background thread; later calls are written only by flush()"""
+        self.interval = 0
+        self._wake.set()
+        if discard:
+            with self._lock:
+                self._pending.clear()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            if self.interval <= 0:
+                return
+            self._flush_logged()
+            connection.close()
+
+    def _flush_logged(self):
+        try:
+            self.flush()
+        except Exception as e:
+            logger.warning("Writing tool invocations failed: %s", e)
+
+    def flush(self):
+        """Write every queued invocation now; returns how many were written"""
+        with self._lock:
+            batch = list(self._pending)
+            self._pending.clear()
+        if batch:
+            from .models import ToolInvocation
+
+            ToolInvocation.objects.bulk_create(
+                [ToolInvocation(**fields) for fields in batch], batch_size=self.batch_size
+            )
+        return len(batch)
+
+
+writer = InvocationWriter()
+# Tools called by other tools are accounted to the outer call only
+_depth = threading.local()
+
+
+def _payload_bytes(arguments):
+    return sum(len(value.encode("utf-8")) for value in arguments.values() if isinstance(value, str))
+
+
+def _digest(arguments):
+    encoded = json.dumps(arguments, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()
+
+
+def _invocation(spec, args, kwargs, duration_ms, result, status, error_class, created_at):
+    """The ToolInvocation fields for a call
+
+    The arguments and result are reduced to a digest and byte counts here,
+    so the queue never holds a whole file or tool output.
+    """
+    tool, backend, target, signature = spec
+    try:
+        arguments = dict(signature.bind(*args, **kwargs).arguments)
+    except TypeError:
+        # The call itself failed on these arguments
+        arguments = {"args": args, **kwargs}
+    conversation_id = arguments.pop("conversation_id", None)
+    return dict(
+        tool=tool,
+        args_sha256=_digest(arguments),
+        target=str(arguments.get(target, ""))[:512] if target else "",
+        backend=backend,
+        conversation_id=conversation_id,
+        duration_ms=duration_ms,
+        bytes_in=_payload_bytes(arguments),
+        bytes_out=len(result.encode("utf-8")) if isinstance(result, str) else 0,
+        status=status,
+        error_class=error_class[:64],
+        created_at=created_at,
+    )
+
+
+def _record(spec, args, kwargs, started, result, status, error_class):
+    if not settings.configured:
+        # Tools driven without Django (the demo scripts) have nowhere to write
+        return
+    try:
+        duration_ms = (time.perf_counter() - started) * 1000
+        writer.record(_invocation(spec, args, kwargs, duration_ms, result, status, error_class, timezone.now()))
+    except Exception as e:
+        # Accounting must never break the tool itself
+        logger.warning("Recording a %s invocation failed: %s", spec[0], e)
+
+
+def tracked(tool, backend, target=None):
+    """Decorator recording a ToolInvocation for every call of a tool function
+
+    ``target`` names the argument holding the path or URL acted on.
+    Generator functions (streaming tools) are timed until they finish, and
+    the last text they yield is taken as the result.
+    """
+
+    def decorate(fn):
+        spec = (tool, backend, target, inspect.signature(fn))
+
+        def enter():
+            depth = getattr(_depth, "value", 0)
+            _depth.value = depth + 1
+            return depth == 0
+
+        def leave():
+            _depth.value -= 1
+
+        if inspect.isgeneratorfunction(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                items = fn(*args, **kwargs)
+                last, status, error_class = None, STATUS_OK, ""
+                try:
+                    while True:
+                        enter()
+                        try:
+                            item = next(items)
+                        except StopIteration:
+                            break
+                        finally:
+                            leave()
+                        value = item[-1] if isinstance(item, tuple) else item
+                        if isinstance(value, str):
+                            last = value
+                        yield item
+                    if is_error_result(last):
+                        status, error_class = STATUS_ERROR, _error_class(last)
+                except GeneratorExit:
+                    status, error_class = STATUS_CANCELLED, "GeneratorExit"
+                    items.close()
+                    raise
+                except Exception as e:
+                    status, error_class = STATUS_ERROR, type(e).__name__
+                    raise
+                finally:
+                    _record(spec, args, kwargs, started, last, status, error_class)
+
+            return wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not enter():
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    leave()
+            started = time.perf_counter()
+            result, status, error_class = None, STATUS_OK, ""
+            try:
+                result = fn(*args, **kwargs)
+                if is_error_result(result):
+                    status, error_class = STATUS_ERROR, _error_class(result)
+                return result
+            except Exception as e:
+                status, error_class = STATUS_ERROR, type(e).__name__
+                raise
+            finally:
+                leave()
+                _record(spec, args, kwargs, started, result, status, error_class)
+
+        return wrapper
+
+    return decorate
+
+
+def _percentile(ordered, percent):
+    """Nearest-rank percentile of an ascending list"""
+    rank = max(1, -(-len(ordered) * percent // 100))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def report(hours=24, top=10):
+    """Per-tool latency percentiles and payload totals, and the slowest targets"""
+    from .models import ToolInvocation
+
+    since = timezone.now() - timedelta(hours=hours)
+    recent = ToolInvocation.objects.filter(created_at__gte=since)
+
+    durations = defaultdict(list)
+    for tool, duration in recent.order_by("tool", "duration_ms").values_list("tool", "duration_ms").iterator():
+        durations[tool].append(duration)
+    totals = {
+        row["tool"]: row
+        for row in recent.values("tool").annotate(
+            calls=Count("id"), bytes_in=Sum("bytes_in"), bytes_out=Sum("bytes_out")
+        )
+    }
+    errors = dict(
+        recent.exclude(status=STATUS_OK).values("tool").annotate(n=Count("id")).values_list("tool", "n")
+    )
+    tools = []
+    for tool, ordered in durations.items():
+        row = totals[tool]
+        tools.append(
+            {
+                "tool": tool,
+                "calls": row["calls"],
+                "errors": errors.get(tool, 0),
+                **{f"p{p}_ms": round(_percentile(ordered, p), 2) for p in PERCENTILES},
+                "max_ms": round(ordered[-1], 2),
+                "bytes_in": row["bytes_in"],
+                "bytes_out": row["bytes_out"],
+            }
+        )
+    tools.sort(key=lambda row: row[f"p{PERCENTILES[-1]}_ms"], reverse=True)
+
+    slowest = [
+        {
+            "tool": invocation.tool,
+            "target": invocation.target,
+            "duration_ms": round(invocation.duration_ms, 2),
+            "status": invocation.status,
+            "created_at": invocation.created_at.isoformat(),
+        }
+        for invocation in recent.exclude(target="").order_by("-duration_ms")[:top]
+    ]
+    return {"hours": hours, "tools": tools, "slowest": slowest, "dropped": writer.dropped}
+
+
+def prune(days):
+    """Delete invocations older than ``days`` days; returns how many"""
+    from .models import ToolInvocation
+
+    deleted, _ = ToolInvocation.objects.filter(created_at__lt=timezone.now() - timedelta(days=days)).delete()
+    return deleted
@@ -0,0 +1,75 @@
+import hashlib
+import os
+import re
+
+# Largest chunk accepted per request; clients may send smaller ones
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(8 * 1024 * 1024)))
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(10 * 1024**3)))
+# Partial uploads are staged here, relative to the workspace (skipped by
+# listings and search like the rest of .prime)
+UPLOAD_STAGING_DIR = ".prime/uploads"
+# Request bodies are read and written in blocks of this size
+UPLOAD_BLOCK_SIZE = 256 * 1024
+
+_SHA256_RE = re.compile(r"^[0-9a-f]{64}$")
+
+
+def is_sha256(value):
+    return bool(_SHA256_RE.match(value or ""))
+
+
+def staging_name(upload_id):
+    """Staging file name for an upload, safe to use in a path or shell command"""
+    if not re.match(r"^[0-9a-f]{32}$", upload_id):
+        raise ValueError(f"invalid upload id '{upload_id}'")
+    return f"{UPLOAD_STAGING_DIR}/{upload_id}"
+
+
+class HashingReader:
+    """Iterate a request body in blocks, counting and hashing as it goes
+
+    ``limit`` bytes at most are read; anything more marks the chunk as
+    oversized instead of being buffered.
+    """
+
+    def __init__(self, stream, limit, block_size=UPLOAD_BLOCK_SIZE):
+        self._stream = stream
+        self._limit = limit
+        self._block_size = block_size
+        self.size = 0
+        self.oversized = False
+        self._sha256 = hashlib.sha256()
+
+    def __iter__(self):
+        while True:
+            block = self._stream.read(min(self._block_size, self._limit + 1 - self.size))
+            if not block:
+                return
+            self.size += len(block)
+            if self.size > self._limit:
+                self.oversized = True
+                return
+            self._sha256.update(block)
+            yield block
+
+    def hexdigest(self):
+        return self._sha256.hexdigest()
+
+
+def check_upload(file_path, size, expected_size, digest, expected_sha256):
+    """Error message when an assembled upload does not match, else None"""
+    if size != expected_size:
+        return (
+            f"Error: Upload of '{file_path}' is incomplete "
+            f"({size} of {expected_size} bytes received)"
+        )
+    if expected_sha256 and digest != expected_sha256:
+        return (
+            f"Error: Checksum mismatch for '{file_path}' "
+            f"(expected {expected_sha256}, got {digest}). The file was not written."
+        )
+    return None
+
+
+def format_upload_result(file_path, size, digest):
+    return f"Successfully uploaded {file_path} ({size} bytes, sha256 {digest})"
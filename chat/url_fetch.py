@@ -0,0 +1,382 @@
+"""The ``fetch url:`` tool: readable text of a web page
+
+Pages are streamed and fed to an incremental HTML-to-text extractor one
+chunk at a time, so neither the download nor the extracted text grows past
+its cap. Results are cached with the page's ETag / Last-Modified; once
+stale they are revalidated with a conditional GET, and a 304 reuses the
+stored text.
+
+Unless FETCH_ALLOW_PRIVATE is set, a host is refused when any address it
+resolves to is private, loopback or link-local. The check is made where
+the connection is opened, on the same lookup the socket connects to, so a
+host cannot pass with a public answer and then rebind to a private one.
+"""
+
+import codecs
+import hashlib
+import ipaddress
+import logging
+import os
+import re
+import socket
+import threading
+import time
+from html.parser import HTMLParser
+from urllib.parse import urljoin, urlsplit
+
+import requests
+from django.core.cache import caches
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import NameResolutionError, NewConnectionError
+
+from . import http_client
+
+logger = logging.getLogger(__name__)
+
+# Most bytes downloaded per page, and most characters of text returned
+FETCH_MAX_BYTES = int(os.getenv("FETCH_MAX_BYTES", str(2 * 1024 * 1024)))
+FETCH_TEXT_LIMIT = int(os.getenv("FETCH_TEXT_LIMIT", "20000"))
+# Seconds a page is reused without revalidation when it sends no max-age
+FETCH_FRESH_SECONDS = int(os.getenv("FETCH_FRESH_SECONDS", "300"))
+# Pages resolving to private, loopback or link-local addresses are refused;
+# the addresses are checked on the lookup the connection uses
+FETCH_ALLOW_PRIVATE = os.getenv("FETCH_ALLOW_PRIVATE", "").lower() in ("1", "true", "yes")
+FETCH_CHUNK_SIZE = 16 * 1024
+FETCH_MAX_REDIRECTS = 5
+# Pages with validators are kept this long so they can be revalidated
+FETCH_CACHE_KEEP = 7 * 24 * 3600
+# Django cache alias holding fetched pages (file-based, see settings.CACHES)
+URL_FETCH_CACHE = "url_fetch"
+
+HTML_TYPES = ("text/html", "application/xhtml+xml")
+TEXT_TYPES = ("application/json", "application/xml", "application/javascript", "application/x-yaml")
+
+SKIP_TAGS = {"script", "style", "noscript", "template", "svg", "iframe", "canvas", "object", "nav", "footer"}
+HEADING_TAGS = {"h1", "h2", "h3", "h4", "h5", "h6"}
+BLOCK_TAGS = {
+    "p", "div", "section", "article", "main", "header", "aside", "ul", "ol", "table", "tr",
+    "blockquote", "br", "hr", "dl", "dt", "dd", "figure", "figcaption", "form", "details", "summary",
+}
+
+
+class TextExtractor(HTMLParser):
+    """Incremental HTML-to-text conversion that stops collecting at ``limit`` characters"""
+
+    def __init__(self, limit=FETCH_TEXT_LIMIT):
+        super().__init__(convert_charrefs=True)
+        self.limit = limit
+        self.title = ""
+        self._parts = []
+        self._length = 0
+        self._skip = 0
+        self._pre = 0
+        self._in_title = False
+
+    @property
+    def full(self):
+        return self._length >= self.limit
+
+    def _emit(self, text):
+        self._parts.append(text)
+        self._length += len(text)
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIP_TAGS:
+            self._skip += 1
+        elif tag == "title":
+            self._in_title = True
+        elif tag == "pre":
+            self._pre += 1
+            self._emit("\n")
+        elif tag in HEADING_TAGS:
+            self._emit("\n\n" + "#" * int(tag[1]) + " ")
+        elif tag == "li":
+            self._emit("\n- ")
+        elif tag in BLOCK_TAGS:
+            self._emit("\n")
+
+    def handle_endtag(self, tag):
+        if tag in SKIP_TAGS:
+            self._skip = max(self._skip - 1, 0)
+        elif tag == "title":
+            self._in_title = False
+        elif tag == "pre":
+            self._pre = max(self._pre - 1, 0)
+            self._emit("\n")
+        elif tag in HEADING_TAGS or tag in BLOCK_TAGS:
+            self._emit("\n")
+
+    def handle_data(self, data):
+        if self._skip:
+            return
+        if self._in_title:
+            self.title += data
+            return
+        if not self._pre:
+            data = re.sub(r"\s+", " ", data)
+        self._emit(data)
+
+    def text(self):
+        text = "".join(self._parts)
+        text = re.sub(r"[ \t]+\n", "\n", text)
+        text = re.sub(r"\n (?=\S)", "\n", text)
+        text = re.sub(r"\n{3,}", "\n\n", text)
+        return text.strip()
+
+
+def _check_url(url):
+    """Error for URLs the tool must not fetch, else None
+
+    Only the scheme is checked here; hosts are vetted as they are connected
+    to (see ``VettedAdapter``).
+    """
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        return f"Error: Only http and https URLs can be fetched, not '{url}'"
+    return None
+
+
+class AddressNotAllowed(Exception):
+    """A host resolved to an address the tool must not connect to"""
+
+
+def _allowed(address):
+    return FETCH_ALLOW_PRIVATE or ipaddress.ip_address(address.split("%")[0]).is_global
+
+
+def _vetted_addresses(host, port):
+    """The addresses ``host`` resolves to, once all of them are allowed"""
+    infos = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    addresses = list(dict.fromkeys(info[4][0] for info in infos))
+    if not all(_allowed(address) for address in addresses):
+        raise AddressNotAllowed(f"Access denied: '{host}' resolves to a private address")
+    return addresses
+
+
+class _VettedConnection:
+    """Connects to the addresses that were checked instead of resolving again
+
+    The hostname is kept for the Host header, SNI and the certificate check.
+    """
+
+    def _new_conn(self):
+        host = self._dns_host
+        try:
+            addresses = _vetted_addresses(host, self.port)
+        except socket.gaierror as e:
+            raise NameResolutionError(self.host, self, e) from e
+        error = None
+        try:
+            for address in addresses:
+                self._dns_host = address
+                try:
+                    return super()._new_conn()
+                except NewConnectionError as e:
+                    error = e
+        finally:
+            self._dns_host = host
+        raise error
+
+
+class _VettedHTTPConnection(_VettedConnection, HTTPConnection):
+    pass
+
+
+class _VettedHTTPSConnection(_VettedConnection, HTTPSConnection):
+    pass
+
+
+class _VettedHTTPPool(HTTPConnectionPool):
+    ConnectionCls = _VettedHTTPConnection
+
+
+class _VettedHTTPSPool(HTTPSConnectionPool):
+    ConnectionCls = _VettedHTTPSConnection
+
+
+class VettedAdapter(HTTPAdapter):
+    """Transport adapter whose connections only reach allowed addresses"""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {"http": _VettedHTTPPool, "https": _VettedHTTPSPool}
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """Session for fetched pages, separate from the API clients' so hosts are vetted"""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = http_client.build_session(adapter_class=VettedAdapter)
+    return _session
+
+
+def _content_type(response):
+    value = response.headers.get("Content-Type", "")
+    media_type = value.split(";")[0].strip().lower()
+    match = re.search(r"charset=[\"']?([\w.:-]+)", value, re.IGNORECASE)
+    encoding = match.group(1) if match else "utf-8"
+    try:
+        codecs.lookup(encoding)
+    except LookupError:
+        encoding = "utf-8"
+    return media_type, encoding
+
+
+def _freshness(response):
+    """Seconds the response may be reused without revalidation; None for no-store"""
+    cache_control = response.headers.get("Cache-Control", "").lower()
+    if "no-store" in cache_control:
+        return None
+    if "no-cache" in cache_control:
+        return 0
+    match = re.search(r"max-age=(\d+)", cache_control)
+    return int(match.group(1)) if match else FETCH_FRESH_SECONDS
+
+
+def _open(url, headers):
+    """GET with streaming, following redirects only to allowed hosts; returns (response, final_url)"""
+    for _ in range(FETCH_MAX_REDIRECTS + 1):
+        error = _check_url(url)
+        if error:
+            raise PermissionError(error)
+        try:
+            response = http_client.get(
+                url, session=get_session(), stream=True, allow_redirects=False, headers=headers,
+            )
+        except AddressNotAllowed as e:
+            raise PermissionError(str(e)) from None
+        if not response.is_redirect:
+            return response, url
+        url = urljoin(url, response.headers["Location"])
+        response.close()
+    raise requests.TooManyRedirects(f"More than {FETCH_MAX_REDIRECTS} redirects")
+
+
+def _read_text(response, media_type, encoding):
+    """(title, text, truncated) from a streamed response, within both caps"""
+    decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+    extractor = TextExtractor() if media_type in HTML_TYPES else None
+    parts, length, received = [], 0, 0
+    truncated = False
+    for chunk in response.iter_content(FETCH_CHUNK_SIZE):
+        received += len(chunk)
+        if received > FETCH_MAX_BYTES:
+            chunk = chunk[: len(chunk) - (received - FETCH_MAX_BYTES)]
+            truncated = True
+        text = decoder.decode(chunk)
+        if extractor is not None:
+            extractor.feed(text)
+            full = extractor.full
+        else:
+            parts.append(text)
+            length += len(text)
+            full = length >= FETCH_TEXT_LIMIT
+        if full or truncated:
+            truncated = True
+            break
+    if extractor is not None:
+        extractor.close()
+        text = extractor.text()
+        title = " ".join(extractor.title.split())
+    else:
+        text = "".join(parts).strip()
+        title = ""
+    if len(text) > FETCH_TEXT_LIMIT:
+        text = text[:FETCH_TEXT_LIMIT]
+        truncated = True
+    return title, text, truncated
+
+
+def format_page(entry, note=""):
+    header = f"Fetched {entry['url']}"
+    if entry["final_url"] != entry["url"]:
+        header += f" (redirected to {entry['final_url']})"
+    if note:
+        header += f" [{note}]"
+    if entry["title"]:
+        header += f"\nTitle: {entry['title']}"
+    result = f"{header}\n\n{entry['text'] or '(no readable text)'}"
+    if entry["truncated"]:
+        result += f"\n\n[Truncated: only the first {FETCH_TEXT_LIMIT} characters or {FETCH_MAX_BYTES} bytes are read]"
+    return result
+
+
+def fetch_url(url):
+    """Fetch a page and return its readable text, using the revalidating cache"""
+    url = url.strip().strip("<>")
+    cache = caches[URL_FETCH_CACHE]
+    key = "url-fetch:" + hashlib.sha256(url.encode("utf-8")).hexdigest()
+    try:
+        entry = cache.get(key)
+    except Exception as e:
+        logger.warning("URL fetch cache read failed: %s", e)
+        entry = None
+
+    if entry and time.time() - entry["stored_at"] < entry["fresh_for"]:
+        return format_page(entry, "cached")
+
+    headers = {"Accept": "text/html,application/xhtml+xml,text/plain;q=0.9,*/*;q=0.5"}
+    if entry and entry.get("etag"):
+        headers["If-None-Match"] = entry["etag"]
+    if entry and entry.get("last_modified"):
+        headers["If-Modified-Since"] = entry["last_modified"]
+
+    try:
+        response, final_url = _open(url, headers)
+    except PermissionError as e:
+        return str(e)
+    except requests.RequestException as e:
+        return f"Error fetching '{url}': {str(e)}"
+
+    with response:
+        if response.status_code == 304 and entry:
+            fresh_for = _freshness(response)
+            entry["stored_at"] = time.time()
+            entry["fresh_for"] = entry["fresh_for"] if fresh_for is None else fresh_for
+            _store(cache, key, entry)
+            return format_page(entry, "not modified")
+        if response.status_code >= 400:
+            return f"Error fetching '{url}': HTTP {response.status_code} {response.reason}"
+
+        media_type, encoding = _content_type(response)
+        if not (media_type.startswith("text/") or media_type in HTML_TYPES or media_type in TEXT_TYPES
+                or media_type.endswith(("+json", "+xml"))):
+            return f"Error: '{url}' is {media_type or 'not text'}; only text and HTML pages can be fetched"
+        try:
+            title, text, truncated = _read_text(response, media_type, encoding)
+        except requests.RequestException as e:
+            return f"Error fetching '{url}': {str(e)}"
+
+        entry = {
+            "url": url,
+            "final_url": final_url,
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "stored_at": time.time(),
+            "fresh_for": _freshness(response),
+            "title": title,
+            "text": text,
+            "truncated": truncated,
+        }
+    if entry["fresh_for"] is not None:
+        _store(cache, key, entry)
+    return format_page(entry)
+
+
+def _store(cache, key, entry):
+    # Without validators a stale entry is useless, so it only lives while fresh
+    keep = FETCH_CACHE_KEEP if entry["etag"] or entry["last_modified"] else entry["fresh_for"]
+    if not keep:
+        return
+    try:
+        cache.set(key, entry, keep)
+    except Exception as e:
+        logger.warning("URL fetch cache write failed: %s", e)
@@ -13,6 +13,16 @@ urlpatterns = [
         views.send_message,
         name="send_message",
     ),
+    path(
+        "conversation/<int:conversation_id>/run/",
+        views.run_code_stream,
+        name="run_code_stream",
+    ),
+    path(
+        "conversation/<int:conversation_id>/run/<str:run_id>/cancel/",
+        views.cancel_code_run,
+        name="cancel_run",
+    ),
     path(
         "conversation/<int:conversation_id>/rename/",
         views.rename_conversation,
@@ -23,5 +33,22 @@ urlpatterns = [
         views.delete_conversation,
         name="delete_conversation",
     ),
+    path("conversations/delete/", views.bulk_delete_conversations, name="bulk_delete_conversations"),
+    path("conversations/rename/", views.bulk_rename_conversations, name="bulk_rename_conversations"),
+    path("conversations/archive/", views.bulk_archive_conversations, name="bulk_archive_conversations"),
+    path("messages/<int:message_id>/body/", views.message_body, name="message_body"),
+    path("files/stream/", views.stream_file, name="stream_file"),
+    path("files/download/", views.download_file, name="download_file"),
+    path("uploads/", views.start_upload, name="start_upload"),
+    path("uploads/<str:upload_id>/", views.upload_status, name="upload_status"),
+    path("uploads/<str:upload_id>/chunk/", views.upload_chunk, name="upload_chunk"),
+    path("uploads/<str:upload_id>/complete/", views.complete_upload, name="complete_upload"),
+    path("uploads/<str:upload_id>/cancel/", views.cancel_upload, name="cancel_upload"),
+    path("export/", views.export_conversations, name="export_conversations"),
+    path("import/", views.import_conversations, name="import_conversations"),
+    path("search/", views.search_conversations, name="search_conversations"),
+    path("metrics/mirror/", views.mirror_metrics, name="mirror_metrics"),
+    path("metrics/search/", views.search_metrics, name="search_metrics"),
+    path("metrics/tools/", views.tool_metrics, name="tool_metrics"),
     path("new/", views.new_conversation, name="new_conversation"),
 ]
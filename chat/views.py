@@ -1,15 +1,40 @@
 from django.shortcuts import render, redirect, get_object_or_404
-from django.http import JsonResponse
-from django.views.decorators.http import require_POST
-from .models import Conversation, Message
+from django.http import FileResponse, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import content_disposition_header
+from django.views.decorators.http import require_GET, require_POST
+from .models import Conversation, Message, Upload
 from .ai_utils import (
     get_ai_response,
     format_messages_for_gemini,
     generate_conversation_title,
     execute_ai_command_with_meta,
+    open_file_stream,
+    read_stream_target,
+    run_code_target,
+    stream_code,
+    cancel_run,
+    write_upload_chunk,
+    finish_upload,
+    discard_upload,
+    mirror_metrics as get_mirror_metrics,
 )
+from .archive import archive_selected, rehydrate
+from .blob_store import get_blob_store
+from .bulk_ops import delete_conversations, rename_conversations, rename_each, select_ids
+from .file_ranges import is_truncated
+from .history_transfer import HistoryFormatError, export_chunks, import_lines
+from .message_render import ensure_rendered
+from .tool_metrics import is_error_result, report as tool_report
+from .web_search import search_metrics as get_search_metrics
+from .message_search import SEARCH_PAGE_SIZE, search as search_messages
+from .uploads import MAX_UPLOAD_BYTES, UPLOAD_CHUNK_SIZE, HashingReader, is_sha256
+from urllib.parse import urlencode
 import json
+import os
 import time
+import uuid
 
 
 def conversation_list(request):
@@ -19,9 +44,17 @@ def conversation_list(request):
     )
 
 
-def conversation_detail(request, conversation_id):
+def _open_conversation(conversation_id):
+    """The conversation, with its messages brought back first if it was archived"""
     conversation = get_object_or_404(Conversation, id=conversation_id)
-    messages = conversation.messages.all()
+    rehydrate(conversation)
+    return conversation
+
+
+def conversation_detail(request, conversation_id):
+    conversation = _open_conversation(conversation_id)
+    # The page shows stored HTML, so bodies are only loaded to re-render
+    messages = ensure_rendered(list(conversation.messages.defer("content")))
     conversations = Conversation.objects.all().order_by("-updated_at")
     return render(
         request,
@@ -36,7 +69,7 @@ def conversation_detail(request, conversation_id):
 
 @require_POST
 def send_message(request, conversation_id):
-    conversation = get_object_or_404(Conversation, id=conversation_id)
+    conversation = _open_conversation(conversation_id)
     data = json.loads(request.body)
     content = data.get("content", "").strip()
 
@@ -48,7 +81,9 @@ def send_message(request, conversation_id):
     )
 
     # Check if this is an AI command first
-    command_result, action_output, action_command = execute_ai_command_with_meta(content)
+    command_result, action_output, action_command = execute_ai_command_with_meta(
+        content, conversation_id=conversation.id
+    )
     if command_result:
         ai_response = command_result
         ai_message = Message.objects.create(
@@ -60,23 +95,25 @@ def send_message(request, conversation_id):
         conversation.updated_at = ai_message.created_at
         conversation.save()
 
+        # Truncated full reads are streamed to the client separately
+        stream_url = None
+        stream_path = read_stream_target(content)
+        if stream_path and is_truncated(action_output):
+            stream_url = reverse("stream_file") + "?" + urlencode({"path": stream_path})
+
         return JsonResponse(
             {
-                "user_message": {
-                    "id": user_message.id,
-                    "content": user_message.content,
-                    "created_at": user_message.created_at.isoformat(),
-                },
-                "ai_message": {
-                    "id": ai_message.id,
-                    "content": ai_message.content,
-                    "created_at": ai_message.created_at.isoformat(),
-                },
+                "user_message": _message_data(user_message),
+                "ai_message": _message_data(ai_message),
                 "conversation_title": conversation.title,
-                "action_output": action_output,
+                # Tool output is usually the message itself; don't send it twice
+                "action_output": None
+                if action_output == ai_response
+                else action_output,
                 "action_command": action_command,
+                "stream_url": stream_url,
                 "action_status": "success"
-                if action_output and not action_output.startswith("Error:")
+                if action_output and not is_error_result(action_output)
                 else "error",
             }
         )
@@ -94,7 +131,9 @@ def send_message(request, conversation_id):
         gemini_messages = format_messages_for_gemini(conversation_messages)
 
         try:
-            ai_response, tool_suggested = get_ai_response(gemini_messages)
+            ai_response, tool_suggested = get_ai_response(
+                gemini_messages, conversation_id=conversation.id
+            )
         except Exception as e:
             ai_response = f"Error: {str(e)}"
             tool_suggested = False
@@ -111,21 +150,110 @@ def send_message(request, conversation_id):
 
     return JsonResponse(
         {
-            "user_message": {
-                "id": user_message.id,
-                "content": user_message.content,
-                "created_at": user_message.created_at.isoformat(),
-            },
-            "ai_message": {
-                "id": ai_message.id,
-                "content": ai_message.content,
-                "created_at": ai_message.created_at.isoformat(),
-            },
+            "user_message": _message_data(user_message),
+            "ai_message": _message_data(ai_message),
             "conversation_title": conversation.title,
         }
     )
 
 
+def _message_data(message):
+    data = {
+        "id": message.id,
+        "content": message.content,
+        "html": message.html,
+        "created_at": message.created_at.isoformat(),
+    }
+    if message.is_offloaded:
+        # Only a preview is inlined; the client fetches the rest on demand
+        data["body_url"] = reverse("message_body", args=[message.id])
+        data["body_size"] = message.body_size
+    return data
+
+
+def _sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@require_POST
+def run_code_stream(request, conversation_id):
+    """Run a 'run code:' message, streaming its output as server-sent events
+
+    Events: "start" (run id and the saved user message), "output" (one line
+    of output) and "done" (the saved AI message with the full result). The
+    result is saved even if the client goes away, which cancels the run.
+    """
+    conversation = _open_conversation(conversation_id)
+    data = json.loads(request.body)
+    content = data.get("content", "").strip()
+    code = run_code_target(content)
+    if not code:
+        return JsonResponse({"error": "Expected a 'run code:' command"}, status=400)
+
+    user_message = Message.objects.create(
+        conversation=conversation, content=content, is_user=True
+    )
+    run_id = uuid.uuid4().hex
+    code_preview = code[:60].replace("\n", " ⏎ ") + ("..." if len(code) > 60 else "")
+
+    def events():
+        output = []
+        result = None
+        runner = stream_code(code, run_id, conversation_id=conversation.id)
+        try:
+            yield _sse_event(
+                "start",
+                {
+                    "run_id": run_id,
+                    "cancel_url": reverse(
+                        "cancel_run",
+                        kwargs={"conversation_id": conversation.id, "run_id": run_id},
+                    ),
+                    "user_message": _message_data(user_message),
+                    "action_command": f"run code:{code_preview}",
+                },
+            )
+            for kind, value in runner:
+                if kind == "output":
+                    output.append(value)
+                    yield _sse_event("output", {"text": value})
+                else:
+                    result = value
+        finally:
+            # Stops the run if the client disconnected before it finished
+            runner.close()
+            # Persist whatever we have, also when the client disconnected
+            if result is None:
+                result = "".join(output) + "\n[Execution stopped: the client disconnected]"
+            ai_message = Message.objects.create(
+                conversation=conversation, content=result, is_user=False, tool_used=True
+            )
+            conversation.updated_at = ai_message.created_at
+            conversation.save()
+        yield _sse_event(
+            "done",
+            {
+                "ai_message": _message_data(ai_message),
+                "conversation_title": conversation.title,
+                "action_status": "error" if is_error_result(result) else "success",
+            },
+        )
+
+    response = StreamingHttpResponse(events(), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    # Stop proxies such as nginx from buffering the stream
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+@require_POST
+def cancel_code_run(request, conversation_id, run_id):
+    conversation = get_object_or_404(Conversation, id=conversation_id)
+    if not cancel_run(run_id, conversation.id):
+        return JsonResponse({"error": "Run is not in progress"}, status=404)
+    return JsonResponse({"success": True})
+
+
 @require_POST
 def rename_conversation(request, conversation_id):
     conversation = get_object_or_404(Conversation, id=conversation_id)
@@ -143,10 +271,337 @@ def rename_conversation(request, conversation_id):
 @require_POST
 def delete_conversation(request, conversation_id):
     conversation = get_object_or_404(Conversation, id=conversation_id)
-    conversation.delete()
+    delete_conversations([conversation.id])
+    return JsonResponse({"success": True})
+
+
+def _bulk_selection(request):
+    """(request data, selected ids) of a bulk request; raises ValueError"""
+    try:
+        data = json.loads(request.body or b"{}")
+    except ValueError:
+        raise ValueError("Request body must be JSON")
+    if not isinstance(data, dict):
+        raise ValueError("Request body must be a JSON object")
+    filters = data.get("filter")
+    if filters is not None and not isinstance(filters, dict):
+        raise ValueError("filter must be an object")
+    return data, select_ids(data.get("ids"), filters)
+
+
+@require_POST
+def bulk_delete_conversations(request):
+    """Delete the conversations picked by ``ids`` or ``filter``"""
+    started = time.perf_counter()
+    try:
+        _, ids = _bulk_selection(request)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    counts = delete_conversations(ids)
+    return JsonResponse(
+        {
+            "success": True,
+            "deleted": counts["conversations"],
+            "messages": counts["messages"],
+            "took_ms": round((time.perf_counter() - started) * 1000, 2),
+        }
+    )
+
+
+@require_POST
+def bulk_rename_conversations(request):
+    """Rename conversations: ``titles`` maps ids to titles, or ``title`` applies to a selection"""
+    try:
+        data = json.loads(request.body or b"{}")
+        if isinstance(data, dict) and isinstance(data.get("titles"), dict):
+            renamed = rename_each(data["titles"])
+        else:
+            data, ids = _bulk_selection(request)
+            renamed = rename_conversations(ids, data.get("title"))
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    return JsonResponse({"success": True, "renamed": renamed})
+
+
+@require_POST
+def bulk_archive_conversations(request):
+    """Move the conversations picked by ``ids`` or ``filter`` to the archive"""
+    started = time.perf_counter()
+    try:
+        _, ids = _bulk_selection(request)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    counts = archive_selected(ids)
+    return JsonResponse(
+        {
+            "success": True,
+            "archived": counts["conversations"],
+            "messages": counts["messages"],
+            "took_ms": round((time.perf_counter() - started) * 1000, 2),
+        }
+    )
+
+
+@require_GET
+def stream_file(request):
+    """Stream a workspace file to the client in fixed-size chunks"""
+    file_path = request.GET.get("path", "").strip()
+    if not file_path:
+        return JsonResponse({"error": "File path is required"}, status=400)
+
+    chunks, error = open_file_stream(file_path)
+    if error:
+        return JsonResponse({"error": error}, status=404)
+
+    response = StreamingHttpResponse(chunks, content_type="text/plain; charset=utf-8")
+    response["X-Content-Type-Options"] = "nosniff"
+    return response
+
+
+@require_GET
+def download_file(request):
+    """Stream a workspace file as an attachment, in fixed-size chunks"""
+    file_path = request.GET.get("path", "").strip()
+    if not file_path:
+        return JsonResponse({"error": "File path is required"}, status=400)
+
+    chunks, error = open_file_stream(file_path)
+    if error:
+        return JsonResponse({"error": error}, status=404)
+
+    response = StreamingHttpResponse(chunks, content_type="application/octet-stream")
+    response["Content-Disposition"] = content_disposition_header(
+        True, os.path.basename(file_path.rstrip("/")) or "download"
+    )
+    response["X-Content-Type-Options"] = "nosniff"
+    return response
+
+
+def _upload_state(upload):
+    return {
+        "upload_id": upload.upload_id,
+        "path": upload.path,
+        "size": upload.size,
+        "received": upload.received,
+        "status": upload.status,
+        "chunk_size": UPLOAD_CHUNK_SIZE,
+        "chunk_url": reverse("upload_chunk", kwargs={"upload_id": upload.upload_id}),
+        "complete_url": reverse("complete_upload", kwargs={"upload_id": upload.upload_id}),
+    }
+
+
+@require_POST
+def start_upload(request):
+    """Begin a resumable upload of ``size`` bytes to a workspace path
+
+    The bytes are then sent with upload_chunk, in order, each at the offset
+    the server has received so far (see upload_status to resume after an
+    interruption), and committed with complete_upload.
+    """
+    data = json.loads(request.body)
+    file_path = data.get("path", "").strip()
+    size = data.get("size")
+    sha256 = (data.get("sha256") or "").strip().lower()
+    if not file_path:
+        return JsonResponse({"error": "File path is required"}, status=400)
+    if not isinstance(size, int) or size < 0:
+        return JsonResponse({"error": "File size must be a non-negative integer"}, status=400)
+    if size > MAX_UPLOAD_BYTES:
+        return JsonResponse(
+            {"error": f"File is too large (max {MAX_UPLOAD_BYTES} bytes)"}, status=413
+        )
+    if sha256 and not is_sha256(sha256):
+        return JsonResponse({"error": "sha256 must be 64 hex digits"}, status=400)
+
+    upload = Upload.objects.create(
+        upload_id=uuid.uuid4().hex, path=file_path, size=size, sha256=sha256
+    )
+    return JsonResponse(_upload_state(upload), status=201)
+
+
+@require_GET
+def upload_status(request, upload_id):
+    upload = get_object_or_404(Upload, upload_id=upload_id)
+    return JsonResponse(_upload_state(upload))
+
+
+@require_POST
+def upload_chunk(request, upload_id):
+    """Stage the next chunk of an upload, streamed straight to the backend
+
+    The chunk is the raw request body, or the "chunk" field of a multipart
+    form. ``offset`` must equal the bytes received so far; an optional
+    X-Chunk-Sha256 header is checked before the chunk is accepted.
+    """
+    upload = get_object_or_404(Upload, upload_id=upload_id)
+    if upload.status != Upload.STATUS_PENDING:
+        return JsonResponse({"error": "Upload is already complete"}, status=409)
+    try:
+        offset = int(request.GET.get("offset", ""))
+    except ValueError:
+        return JsonResponse({"error": "Chunk offset is required"}, status=400)
+    if offset != upload.received:
+        return JsonResponse(
+            {"error": f"Expected the chunk at offset {upload.received}", "received": upload.received},
+            status=409,
+        )
+    expected_sha256 = request.headers.get("X-Chunk-Sha256", "").strip().lower()
+
+    if request.content_type == "multipart/form-data":
+        stream = request.FILES.get("chunk")
+        if stream is None:
+            return JsonResponse({"error": "Missing 'chunk' file field"}, status=400)
+    else:
+        stream = request
+    reader = HashingReader(stream, min(UPLOAD_CHUNK_SIZE, upload.size - offset))
+    error = write_upload_chunk(upload.upload_id, offset, reader)
+    if error:
+        return JsonResponse({"error": error, "received": upload.received}, status=400)
+    if reader.oversized:
+        return JsonResponse(
+            {"error": "Chunk is larger than the chunk size or the rest of the file",
+             "received": upload.received},
+            status=413,
+        )
+    if reader.size == 0 and offset < upload.size:
+        return JsonResponse({"error": "Chunk is empty", "received": upload.received}, status=400)
+    if expected_sha256 and reader.hexdigest() != expected_sha256:
+        return JsonResponse(
+            {"error": "Chunk checksum mismatch; send it again", "received": upload.received},
+            status=400,
+        )
+
+    # Only one of two racing requests for the same offset may advance it
+    received = offset + reader.size
+    advanced = Upload.objects.filter(pk=upload.pk, received=offset).update(
+        received=received, updated_at=timezone.now()
+    )
+    if not advanced:
+        upload.refresh_from_db()
+        return JsonResponse(
+            {"error": "Chunk was sent concurrently", "received": upload.received}, status=409
+        )
+    return JsonResponse({"received": received, "sha256": reader.hexdigest()})
+
+
+@require_POST
+def complete_upload(request, upload_id):
+    """Verify the whole file (size and sha256) and move it into the workspace"""
+    upload = get_object_or_404(Upload, upload_id=upload_id)
+    if upload.status == Upload.STATUS_COMPLETE:
+        return JsonResponse(_upload_state(upload))
+    if upload.received < upload.size:
+        return JsonResponse(
+            {"error": f"Upload is incomplete ({upload.received} of {upload.size} bytes received)",
+             **_upload_state(upload)},
+            status=409,
+        )
+
+    result = finish_upload(upload.upload_id, upload.path, upload.size, upload.sha256)
+    if result.startswith(("Error", "Access denied", "Invalid path")):
+        return JsonResponse({"error": result, **_upload_state(upload)}, status=400)
+
+    upload.status = Upload.STATUS_COMPLETE
+    upload.save()
+    return JsonResponse({"message": result, **_upload_state(upload)})
+
+
+@require_POST
+def cancel_upload(request, upload_id):
+    upload = get_object_or_404(Upload, upload_id=upload_id)
+    if upload.status == Upload.STATUS_PENDING:
+        discard_upload(upload.upload_id)
+    upload.delete()
     return JsonResponse({"success": True})
 
 
+@require_GET
+def message_body(request, message_id):
+    """The full body of a message, streamed from the blob store if it was offloaded"""
+    message = get_object_or_404(Message, id=message_id)
+    if not message.is_offloaded:
+        return HttpResponse(message.content, content_type="text/plain; charset=utf-8")
+    try:
+        body = get_blob_store().open(message.body_sha256)
+    except FileNotFoundError:
+        return JsonResponse({"error": "Message body is missing from the blob store"}, status=404)
+    response = FileResponse(body, content_type="text/plain; charset=utf-8")
+    response["Cache-Control"] = "private, max-age=31536000, immutable"
+    return response
+
+
+@require_GET
+def mirror_metrics(request):
+    return JsonResponse(get_mirror_metrics())
+
+
+@require_GET
+def search_metrics(request):
+    return JsonResponse(get_search_metrics())
+
+
+@require_GET
+def tool_metrics(request):
+    try:
+        hours = float(request.GET.get("hours", 24))
+        top = int(request.GET.get("top", 10))
+    except ValueError:
+        return JsonResponse({"error": "hours and top must be numbers"}, status=400)
+    return JsonResponse(tool_report(hours, top))
+
+
+@require_GET
+def search_conversations(request):
+    query = request.GET.get("q", "").strip()
+    try:
+        page = max(int(request.GET.get("page", 1)), 1)
+        page_size = int(request.GET.get("page_size", SEARCH_PAGE_SIZE))
+    except ValueError:
+        return JsonResponse({"error": "page and page_size must be integers"}, status=400)
+    started = time.perf_counter()
+    results, has_next = search_messages(query, page, page_size)
+    for result in results:
+        url = reverse("conversation_detail", args=[result["conversation_id"]])
+        if result["message_id"]:
+            url += f"#message-{result['message_id']}"
+        result["url"] = url
+    return JsonResponse(
+        {
+            "query": query,
+            "page": page,
+            "has_next": has_next,
+            "results": results,
+            "took_ms": round((time.perf_counter() - started) * 1000, 2),
+        }
+    )
+
+
+@require_GET
+def export_conversations(request):
+    """Stream every conversation (or the ``conversation`` ids given) as JSON Lines"""
+    try:
+        ids = [int(value) for value in request.GET.getlist("conversation")] or None
+    except ValueError:
+        return JsonResponse({"error": "conversation must be an integer id"}, status=400)
+    response = StreamingHttpResponse(export_chunks(ids), content_type="application/x-ndjson")
+    response["Content-Disposition"] = content_disposition_header(
+        True, f"conversations-{timezone.now():%Y%m%d-%H%M%S}.jsonl"
+    )
+    return response
+
+
+@require_POST
+def import_conversations(request):
+    """Import a JSON Lines export sent as the request body or as a ``file`` upload"""
+    # Read line by line from the request stream, never as one body
+    source = request.FILES["file"] if "file" in request.FILES else request
+    try:
+        counts = import_lines(source)
+    except HistoryFormatError as exc:
+        return JsonResponse({"error": str(exc)}, status=400)
+    return JsonResponse({"success": True, **counts})
+
+
 def new_conversation(request):
     if request.method == "POST":
         # Create conversation with default title first
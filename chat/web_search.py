@@ -0,0 +1,394 @@
+"""Web search across several providers at once
+
+A query is sent to every enabled provider concurrently. Whatever has
+arrived when WEB_SEARCH_DEADLINE expires is merged, with results from
+different providers for the same URL folded together and ranked by
+reciprocal rank fusion. Providers still running at the deadline finish in
+the background, so their answers land in the cache for the next time the
+query comes up.
+"""
+
+import hashlib
+import html
+import logging
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from urllib.parse import parse_qsl, quote, urlencode, urlsplit, urlunsplit
+
+import requests
+from django.core.cache import caches
+
+from . import http_client
+
+logger = logging.getLogger(__name__)
+
+DUCKDUCKGO_URL = os.getenv("DUCKDUCKGO_URL", "https://api.duckduckgo.com/")
+WIKIPEDIA_API_URL = os.getenv("WIKIPEDIA_API_URL", "https://en.wikipedia.org/w/api.php")
+# Base URL of a SearXNG instance with the JSON format enabled
+SEARXNG_URL = os.getenv("SEARXNG_URL", "")
+BRAVE_SEARCH_URL = "https://api.search.brave.com/res/v1/web/search"
+BRAVE_SEARCH_API_KEY = os.getenv("BRAVE_SEARCH_API_KEY", "")
+
+# Providers queried for each search, in order of preference for ties;
+# searxng and brave are skipped until configured
+WEB_SEARCH_PROVIDERS = [
+    name.strip()
+    for name in os.getenv("WEB_SEARCH_PROVIDERS", "duckduckgo,wikipedia,searxng,brave").split(",")
+    if name.strip()
+]
+# Seconds to wait for providers before merging what has arrived
+WEB_SEARCH_DEADLINE = float(os.getenv("WEB_SEARCH_DEADLINE", "4"))
+WEB_SEARCH_WORKERS = int(os.getenv("WEB_SEARCH_WORKERS", "8"))
+# Seconds results are reused for; empty results are kept for less
+WEB_SEARCH_CACHE_TTL = int(os.getenv("WEB_SEARCH_CACHE_TTL", "3600"))
+WEB_SEARCH_NEGATIVE_TTL = int(os.getenv("WEB_SEARCH_NEGATIVE_TTL", "300"))
+# Django cache alias holding results (file-based, see settings.CACHES)
+WEB_SEARCH_CACHE = "web_search"
+# Bumped when the cached result format changes
+CACHE_VERSION = 2
+# Reciprocal rank fusion constant; larger values flatten rank differences
+RRF_K = 60
+
+_TRACKING_PARAMS = re.compile(r"^(utm_\w+|fbclid|gclid|ref)$")
+_TAG = re.compile(r"<[^>]+>")
+
+
+def _result(title, url, snippet):
+    return {"title": title.strip(), "url": url.strip(), "snippet": snippet.strip()}
+
+
+def _strip_html(text):
+    return html.unescape(_TAG.sub("", text or ""))
+
+
+# Providers: each returns a list of {"title", "url", "snippet"} dicts, best first
+
+
+def duckduckgo_search(query, num_results=5):
+    """DuckDuckGo's instant answer API (no API key required)"""
+    params = {"q": query, "format": "json", "no_html": 1, "skip_disambig": 1}
+    response = http_client.get(DUCKDUCKGO_URL, params=params)
+    response.raise_for_status()
+    data = response.json()
+
+    results = []
+    if data.get("Abstract"):
+        results.append(_result(data.get("Heading") or query, data.get("AbstractURL", ""), data["Abstract"]))
+
+    topics = []
+    for topic in data.get("RelatedTopics") or []:
+        # Disambiguation groups nest their topics one level down
+        topics.extend(topic.get("Topics", [topic]) if isinstance(topic, dict) else [])
+    for topic in topics:
+        if len(results) >= num_results:
+            break
+        if isinstance(topic, dict) and topic.get("Text"):
+            text = topic["Text"]
+            results.append(_result(text.split(" - ")[0], topic.get("FirstURL", ""), text))
+    return results
+
+
+def wikipedia_search(query, num_results=5):
+    """Full-text search of English Wikipedia (no API key required)"""
+    params = {
+        "action": "query",
+        "list": "search",
+        "srsearch": query,
+        "srlimit": num_results,
+        "format": "json",
+        "utf8": 1,
+    }
+    response = http_client.get(WIKIPEDIA_API_URL, params=params)
+    response.raise_for_status()
+    base = urlunsplit(urlsplit(WIKIPEDIA_API_URL)[:2] + ("/wiki/", "", ""))
+    return [
+        _result(hit["title"], base + quote(hit["title"].replace(" ", "_")), _strip_html(hit.get("snippet")))
+        for hit in response.json().get("query", {}).get("search", [])[:num_results]
+    ]
+
+
+def searxng_search(query, num_results=5):
+    """A SearXNG metasearch instance (SEARXNG_URL)"""
+    response = http_client.get(
+        SEARXNG_URL.rstrip("/") + "/search", params={"q": query, "format": "json"}
+    )
+    response.raise_for_status()
+    return [
+        _result(hit.get("title", ""), hit.get("url", ""), hit.get("content", ""))
+        for hit in response.json().get("results", [])[:num_results]
+    ]
+
+
+def brave_search(query, num_results=5):
+    """Brave Search API (BRAVE_SEARCH_API_KEY)"""
+    response = http_client.get(
+        BRAVE_SEARCH_URL,
+        params={"q": query, "count": num_results},
+        headers={"Accept": "application/json", "X-Subscription-Token": BRAVE_SEARCH_API_KEY},
+    )
+    response.raise_for_status()
+    return [
+        _result(hit.get("title", ""), hit.get("url", ""), _strip_html(hit.get("description")))
+        for hit in response.json().get("web", {}).get("results", [])[:num_results]
+    ]
+
+
+PROVIDERS = {
+    "duckduckgo": duckduckgo_search,
+    "wikipedia": wikipedia_search,
+    "searxng": searxng_search,
+    "brave": brave_search,
+}
+
+
+def enabled_providers():
+    """Configured provider names that can be queried"""
+    missing = {"searxng": not SEARXNG_URL, "brave": not BRAVE_SEARCH_API_KEY}
+    return [name for name in WEB_SEARCH_PROVIDERS if name in PROVIDERS and not missing.get(name)]
+
+
+# Caching
+
+
+def _cache_key(provider, query, num_results):
+    # Queries differing only in case or spacing share an entry
+    normalized = " ".join(query.lower().split())
+    digest = hashlib.sha256(f"{provider}\n{num_results}\n{normalized}".encode("utf-8")).hexdigest()
+    return f"web-search:{digest}"
+
+
+def cached_search(provider, query, num_results, search):
+    """Results of ``search()`` through the persistent cache
+
+    Empty results are cached too (for WEB_SEARCH_NEGATIVE_TTL) so a query
+    with no answers is not retried on every turn; errors are not cached.
+    """
+    cache = caches[WEB_SEARCH_CACHE]
+    key = _cache_key(provider, query, num_results)
+    try:
+        results = cache.get(key, version=CACHE_VERSION)
+    except Exception as e:
+        logger.warning("Web search cache read failed: %s", e)
+        results = None
+    if results is not None:
+        return results
+
+    results = search()
+    try:
+        cache.set(
+            key,
+            results,
+            WEB_SEARCH_CACHE_TTL if results else WEB_SEARCH_NEGATIVE_TTL,
+            version=CACHE_VERSION,
+        )
+    except Exception as e:
+        logger.warning("Web search cache write failed: %s", e)
+    return results
+
+
+# Per-provider statistics
+
+
+class ProviderStats:
+    """Latency and outcome counters per provider, shared by all searches"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def _entry(self, provider):
+        return self._stats.setdefault(
+            provider,
+            {
+                "calls": 0,
+                "errors": 0,
+                "timeouts": 0,
+                "results": 0,
+                "total_ms": 0.0,
+                "max_ms": 0.0,
+                "last_ms": None,
+                "last_error": None,
+            },
+        )
+
+    def record(self, provider, elapsed, results=None, error=None):
+        ms = elapsed * 1000
+        with self._lock:
+            entry = self._entry(provider)
+            entry["calls"] += 1
+            entry["total_ms"] += ms
+            entry["max_ms"] = max(entry["max_ms"], ms)
+            entry["last_ms"] = round(ms, 1)
+            if error is not None:
+                entry["errors"] += 1
+                entry["last_error"] = error
+            else:
+                entry["results"] += len(results)
+
+    def record_timeout(self, provider):
+        with self._lock:
+            self._entry(provider)["timeouts"] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                provider: {
+                    "calls": entry["calls"],
+                    "errors": entry["errors"],
+                    "timeouts": entry["timeouts"],
+                    "results": entry["results"],
+                    "avg_ms": round(entry["total_ms"] / entry["calls"], 1) if entry["calls"] else None,
+                    "max_ms": round(entry["max_ms"], 1),
+                    "last_ms": entry["last_ms"],
+                    "last_error": entry["last_error"],
+                }
+                for provider, entry in self._stats.items()
+            }
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+
+provider_stats = ProviderStats()
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(WEB_SEARCH_WORKERS, thread_name_prefix="web-search")
+    return _executor
+
+
+# Fan-out and merge
+
+
+def normalize_url(url):
+    """Key that identifies the same page across providers"""
+    parts = urlsplit(url.strip())
+    host = parts.netloc.lower()
+    if host.startswith("www."):
+        host = host[4:]
+    query = urlencode(
+        [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if not _TRACKING_PARAMS.match(k)]
+    )
+    return urlunsplit(("", host, parts.path.rstrip("/") or "/", query, ""))
+
+
+def merge_results(ranked_lists, limit):
+    """Fold per-provider result lists into one, deduplicated by URL
+
+    ``ranked_lists`` is [(provider, results)]. A page found by several
+    providers scores the sum of 1 / (RRF_K + rank) over them and keeps the
+    longest snippet seen.
+    """
+    merged = {}
+    for order, (provider, results) in enumerate(ranked_lists):
+        for rank, result in enumerate(results):
+            key = normalize_url(result["url"]) if result["url"] else "text:" + result["snippet"].lower()
+            entry = merged.get(key)
+            if entry is None:
+                entry = merged[key] = dict(result, sources=[], score=0.0, first=(rank, order))
+            entry["score"] += 1.0 / (RRF_K + rank + 1)
+            if provider not in entry["sources"]:
+                entry["sources"].append(provider)
+            if len(result["snippet"]) > len(entry["snippet"]):
+                entry["snippet"] = result["snippet"]
+            if not entry["title"]:
+                entry["title"] = result["title"]
+    ranked = sorted(merged.values(), key=lambda e: (-e["score"], e["first"]))
+    return [
+        {"title": e["title"], "url": e["url"], "snippet": e["snippet"], "sources": e["sources"]}
+        for e in ranked[:limit]
+    ]
+
+
+def search_all(query, num_results=5, providers=None, deadline=None):
+    """Query providers concurrently; returns (merged results, {provider: outcome})
+
+    Outcomes are "ok", "timeout" or the error message. Only what has
+    arrived within ``deadline`` seconds is merged.
+    """
+    names = enabled_providers() if providers is None else list(providers)
+    deadline = WEB_SEARCH_DEADLINE if deadline is None else deadline
+    executor = _get_executor()
+
+    def run(name):
+        started = time.monotonic()
+        try:
+            results = cached_search(
+                name, query, num_results, lambda: PROVIDERS[name](query, num_results)
+            )
+        except Exception as e:
+            provider_stats.record(name, time.monotonic() - started, error=str(e))
+            raise
+        provider_stats.record(name, time.monotonic() - started, results)
+        return results
+
+    futures = {executor.submit(run, name): name for name in names}
+    done, _ = wait(futures, timeout=deadline)
+
+    ranked_lists = []
+    outcomes = {}
+    for future, name in futures.items():
+        if future not in done:
+            provider_stats.record_timeout(name)
+            outcomes[name] = "timeout"
+        elif future.exception() is not None:
+            outcomes[name] = str(future.exception())
+        else:
+            ranked_lists.append((name, future.result()))
+            outcomes[name] = "ok"
+    # Keep the configured order so ties favour preferred providers
+    ranked_lists.sort(key=lambda item: names.index(item[0]))
+    return merge_results(ranked_lists, num_results), outcomes
+
+
+def format_results(query, results, outcomes):
+    lines = []
+    for result in results:
+        line = f"• {result['title']}: {result['snippet']}" if result["title"] else f"• {result['snippet']}"
+        if result["url"]:
+            line += f"\n  {result['url']}"
+        lines.append(line)
+    answered = [name for name, outcome in outcomes.items() if outcome == "ok"]
+    missing = [name for name, outcome in outcomes.items() if outcome != "ok"]
+    footer = f"Sources: {', '.join(answered)}"
+    if missing:
+        footer += f" (no answer from {', '.join(missing)})"
+    return f"Web search results for '{query}':\n\n" + "\n\n".join(lines) + f"\n\n{footer}"
+
+
+def web_search(query, num_results=5):
+    """Search the enabled providers in parallel and merge their results"""
+    try:
+        providers = enabled_providers()
+        if not providers:
+            return "Error performing web search: no search providers are enabled"
+        results, outcomes = search_all(query, num_results, providers)
+        if not results:
+            errors = [f"{name}: {outcome}" for name, outcome in outcomes.items() if outcome != "ok"]
+            if len(errors) == len(outcomes):
+                return "Error performing web search: " + "; ".join(errors)
+            return f"No results found for query: {query}"
+        return format_results(query, results, outcomes)
+    except requests.RequestException as e:
+        return f"Error performing web search: {str(e)}"
+    except Exception as e:
+        return f"Error during web search: {str(e)}"
+
+
+def search_metrics():
+    return {
+        "providers": enabled_providers(),
+        "deadline_seconds": WEB_SEARCH_DEADLINE,
+        "stats": provider_stats.snapshot(),
+    }
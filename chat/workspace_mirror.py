@@ -0,0 +1,409 @@
+import base64
+import json
+import logging
+import os
+import posixpath
+import shlex
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+
+from . import mirror_sync
+from .code_search import SKIP_DIRS
+from .path_confinement import PathEscape, confine
+from .remote_metadata import MISSING, RemoteStat
+
+logger = logging.getLogger(__name__)
+
+# Set to a local directory to mirror the Daytona workspace there
+MIRROR_DIR = os.getenv("DAYTONA_MIRROR_DIR", "")
+# Seconds between reconciliations with the sandbox
+MIRROR_SYNC_INTERVAL = float(os.getenv("DAYTONA_MIRROR_SYNC_INTERVAL", "30"))
+# Reads fall back to the sandbox when the last reconciliation is older than this
+MIRROR_MAX_STALENESS = float(os.getenv("DAYTONA_MIRROR_MAX_STALENESS", "60"))
+# Larger files are listed and stat'ed from the mirror but read from the sandbox
+MIRROR_MAX_FILE_BYTES = int(os.getenv("DAYTONA_MIRROR_MAX_FILE_MB", "64")) * 1024 * 1024
+# Upper bound on the file bytes requested from the sandbox per fetch command
+MIRROR_BATCH_BYTES = 4 * 1024 * 1024
+
+
+
+def sync_command(*args):
+    """Shell command running mirror_sync.py with ``args`` in the sandbox
+
+    The script is passed inline with every command instead of being left in
+    the sandbox, where a code run could replace it.
+    """
+    with open(mirror_sync.__file__, "r", encoding="utf-8") as f:
+        script = f.read()
+    return f"python -c {shlex.quote(script)} " + " ".join(shlex.quote(arg) for arg in args)
+
+
+class WorkspaceMirror:
+    """Local copy of a sandbox workspace that read-only tools are served from
+
+    ``run_command(command)`` runs a shell command in the sandbox workspace
+    and ``upload(path, text)`` writes a file there. A background thread
+    reconciles the mirror with the sandbox every MIRROR_SYNC_INTERVAL
+    seconds, transferring only the changed blocks of changed files. Changes
+    made through the backend are applied to the mirror as they happen;
+    changes it cannot follow (code runs) mark the mirror stale so reads go
+    to the sandbox until the next reconciliation.
+
+    Metadata is kept as the sandbox reported it, so stat results match
+    the sandbox's rather than the mirror files'. Files over
+    MIRROR_MAX_FILE_BYTES are kept as metadata only. Paths reported by the
+    sandbox are not trusted: rows whose path would lead outside the mirror
+    root, or that answer for a file that was not asked for, are dropped.
+
+    ``_lock`` serialises the writers (reconciliation and the backend's
+    changes) and is held for a whole pass. Readers take only ``_view_lock``,
+    which every change to ``_entries`` and ``_children`` also holds, so a
+    lookup never waits on the sandbox or sees a dict mid-update.
+    """
+
+    def __init__(self, run_command, upload, root, interval=MIRROR_SYNC_INTERVAL,
+                 max_staleness=MIRROR_MAX_STALENESS):
+        self._run_command = run_command
+        self._upload = upload
+        self.root = os.path.realpath(root)
+        self.interval = interval
+        self.max_staleness = max_staleness
+        self._entries = {}  # rel path -> (kind, RemoteStat)
+        self._children = {"": {}}  # rel dir -> {name: is_dir}
+        self._lock = threading.Lock()
+        self._view_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._synced_at = None  # monotonic time the last full snapshot was taken
+        self._stale_since = None
+        self.stats = {
+            "reconciles": 0,
+            "errors": 0,
+            "hits": 0,
+            "misses": 0,
+            "files_fetched": 0,
+            "bytes_fetched": 0,
+            "bytes_reused": 0,
+            "last_reconcile_seconds": None,
+            "last_sync_lag_seconds": None,
+            "max_sync_lag_seconds": 0.0,
+        }
+        shutil.rmtree(self.root, ignore_errors=True)
+        os.makedirs(self.root)
+
+    def start(self):
+        """Start background reconciliation (the first pass runs immediately)"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="workspace-mirror", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                self.reconcile()
+            except Exception as e:
+                self.stats["errors"] += 1
+                logger.warning("Workspace mirror reconciliation failed: %s", e)
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    # Serving reads
+
+    def fresh(self):
+        return (
+            self._synced_at is not None
+            and self._stale_since is None
+            and time.monotonic() - self._synced_at <= self.max_staleness
+        )
+
+    def _answerable(self, rel_path):
+        """Whether the mirror knows the truth about a path"""
+        return self.fresh() and self._mirrored(rel_path)
+
+    def _mirrored(self, rel_path):
+        parts = [] if rel_path in ("", ".") else rel_path.split("/")
+        for depth in range(len(parts)):
+            entry = self._entries.get("/".join(parts[: depth + 1]))
+            if entry is None:
+                return True  # known not to exist
+            if entry[0] in ("s", "l"):
+                # Not mirrored: skipped directories and symlinks
+                return False
+        return True
+
+    def lookup(self, rel_path):
+        """RemoteStat for a path, or None when the sandbox must be asked"""
+        rel_path = "" if rel_path == "." else rel_path
+        with self._view_lock:
+            answerable = self._answerable(rel_path)
+            entry = self._entries.get(rel_path)
+        if not answerable:
+            self.stats["misses"] += 1
+            return None
+        self.stats["hits"] += 1
+        if rel_path == "":
+            return RemoteStat(True, True, 0, 0.0, 0o755, True)
+        return entry[1] if entry else MISSING
+
+    def list_dir(self, rel_dir):
+        """[(name, is_dir)] of a mirrored directory, or None"""
+        rel_dir = "" if rel_dir == "." else rel_dir
+        with self._view_lock:
+            answerable = self._answerable(rel_dir)
+            children = self._children.get(rel_dir)
+            children = None if children is None else list(children.items())
+        if not answerable:
+            self.stats["misses"] += 1
+            return None
+        if children is None:
+            return None
+        self.stats["hits"] += 1
+        return children
+
+    def local_file(self, rel_path):
+        """Path of the mirrored copy of a file, or None if it is not mirrored"""
+        info = self.lookup(rel_path)
+        if info is None or not info.exists or info.is_dir or info.size > MIRROR_MAX_FILE_BYTES:
+            return None
+        return os.path.join(self.root, rel_path)
+
+    # Following changes made through the backend
+
+    def mark_stale(self):
+        """The sandbox changed in unknown ways; serve nothing until reconciled"""
+        if self._stale_since is None:
+            self._stale_since = time.monotonic()
+        self._wake.set()
+
+    def put(self, rel_path, data):
+        """Mirror a file the backend just wrote"""
+        with self._lock:
+            if not self._mirrored(rel_path):
+                return
+            previous = self._entries.get(rel_path)
+            mode = previous[1].mode if previous else 0o644
+            self._ensure_parents(rel_path)
+            self._write_local(rel_path, lambda temp: _write_bytes(temp, data))
+            # The sandbox mtime is unknown; reconciliation will correct it
+            info = RemoteStat(True, False, len(data), time.time(), mode, True)
+            self._set_entry(rel_path, "f", info)
+
+    def remove(self, rel_path):
+        """Mirror a file the backend just deleted"""
+        with self._lock:
+            self._drop(rel_path)
+
+    def refresh(self, rel_paths):
+        """Re-fetch specific files (changed blocks only), e.g. after an edit"""
+        with self._lock:
+            self._fetch([(p, None) for p in rel_paths if self._mirrored(p)])
+
+    # Reconciliation
+
+    def reconcile(self):
+        """Bring the whole mirror up to date with one manifest command"""
+        started = time.monotonic()
+        with self._lock:
+            exit_code, stdout, stderr = self._run_command(sync_command("manifest", *sorted(SKIP_DIRS)))
+            if exit_code:
+                raise IOError(stderr or stdout or "manifest failed")
+            rows = json.loads(stdout.strip().splitlines()[-1])
+
+            seen = set()
+            changed = []
+            for rel_path, kind, size, mtime, mode in rows:
+                if self._local_path(rel_path) is None:
+                    logger.warning("Workspace mirror ignored the manifest path %r", rel_path)
+                    continue
+                seen.add(rel_path)
+                info = RemoteStat(True, kind in ("d", "s"), size, mtime, mode, True)
+                previous = self._entries.get(rel_path)
+                if kind == "f":
+                    if previous is None or previous[0] != "f" or previous[1][2:5] != info[2:5]:
+                        changed.append((rel_path, info))
+                    continue
+                if previous is not None and previous[0] != kind:
+                    self._drop(rel_path)
+                if kind in ("d", "s"):
+                    self._ensure_parents(rel_path + "/x")
+                self._set_entry(rel_path, kind, info)
+
+            for rel_path in [p for p in self._entries if p not in seen]:
+                self._drop(rel_path)
+            self._fetch(changed)
+
+            self._synced_at = started
+            if self._stale_since is not None and self._stale_since <= started:
+                lag = time.monotonic() - self._stale_since
+                self.stats["last_sync_lag_seconds"] = round(lag, 3)
+                self.stats["max_sync_lag_seconds"] = round(
+                    max(self.stats["max_sync_lag_seconds"], lag), 3
+                )
+                self._stale_since = None
+        self.stats["reconciles"] += 1
+        self.stats["last_reconcile_seconds"] = round(time.monotonic() - started, 3)
+
+    def _fetch(self, files):
+        """Fetch files in batches, sending block hashes of the mirrored copies
+
+        ``files`` holds (rel path, RemoteStat from the manifest), or None
+        for the last known metadata.
+        """
+        batch, batch_bytes = [], 0
+        for rel_path, info in files:
+            if info is None:
+                entry = self._entries.get(rel_path)
+                info = entry[1] if entry else None
+            size = info.size if info else 0
+            if size > MIRROR_MAX_FILE_BYTES:
+                # Too large to mirror: metadata only, until its size changes
+                self._drop_local(rel_path)
+                self._set_entry(rel_path, "f", info)
+                continue
+            local_path = self._confined(rel_path)
+            hashes = None
+            if os.path.isfile(local_path) and os.path.getsize(local_path) > mirror_sync.BLOCK_SIZE:
+                hashes = mirror_sync.block_hashes(local_path)
+            batch.append([rel_path, hashes])
+            batch_bytes += size
+            if batch_bytes >= MIRROR_BATCH_BYTES:
+                self._fetch_batch(batch)
+                batch, batch_bytes = [], 0
+        if batch:
+            self._fetch_batch(batch)
+
+    def _fetch_batch(self, batch):
+        request_path = f".prime/runs/{uuid.uuid4().hex}.json"
+        self._upload(request_path, json.dumps({"files": batch}))
+        exit_code, stdout, stderr = self._run_command(
+            f"{sync_command('fetch', request_path)}; status=$?; rm -f {request_path}; exit $status"
+        )
+        if exit_code:
+            raise IOError(stderr or stdout or "fetch failed")
+        # Each requested file is answered once; anything else is ignored
+        requested = {rel_path for rel_path, _ in batch}
+        for line in stdout.splitlines():
+            if not line.startswith("{"):
+                continue
+            row = json.loads(line)
+            rel_path = row.get("path")
+            if rel_path not in requested:
+                logger.warning("Workspace mirror ignored an unrequested fetch of %r", rel_path)
+                continue
+            requested.discard(rel_path)
+            if row.get("missing"):
+                self._drop(rel_path)
+                continue
+            blocks = {int(i): base64.b64decode(data) for i, data in row["blocks"].items()}
+            local_path = self._confined(rel_path)
+            self._ensure_parents(rel_path)
+            self._write_local(
+                rel_path,
+                lambda temp: mirror_sync.apply_delta(local_path, temp, row["size"], blocks),
+            )
+            fetched = sum(len(block) for block in blocks.values())
+            self.stats["files_fetched"] += 1
+            self.stats["bytes_fetched"] += fetched
+            self.stats["bytes_reused"] += row["size"] - fetched
+            info = RemoteStat(True, False, row["size"], row["mtime"], row["mode"], True)
+            self._set_entry(rel_path, "f", info)
+
+    # Local bookkeeping (callers hold the lock)
+
+    def _local_path(self, rel_path):
+        """Mirror path of a sandbox-reported relative path, or None if it leads outside the root"""
+        if (
+            not isinstance(rel_path, str)
+            or not rel_path
+            or os.path.isabs(rel_path)
+            or posixpath.normpath(rel_path) != rel_path
+        ):
+            return None
+        path, error = confine(self.root, rel_path, aliases=())
+        return None if error or path == self.root else path
+
+    def _confined(self, rel_path):
+        """``_local_path`` for paths that were already checked; raises PathEscape otherwise"""
+        path = self._local_path(rel_path)
+        if path is None:
+            raise PathEscape()
+        return path
+
+    def _set_entry(self, rel_path, kind, info):
+        parent, _, name = rel_path.rpartition("/")
+        with self._view_lock:
+            self._entries[rel_path] = (kind, info)
+            self._children.setdefault(parent, {})[name] = info.is_dir
+            if info.is_dir:
+                self._children.setdefault(rel_path, {})
+
+    def _ensure_parents(self, rel_path):
+        parent = rel_path.rpartition("/")[0]
+        if not parent:
+            return
+        os.makedirs(self._confined(parent), exist_ok=True)
+        parts = parent.split("/")
+        for depth in range(1, len(parts) + 1):
+            rel_dir = "/".join(parts[:depth])
+            entry = self._entries.get(rel_dir)
+            if entry is None or not entry[1].is_dir:
+                self._set_entry(rel_dir, "d", RemoteStat(True, True, 4096, time.time(), 0o755, True))
+
+    def _write_local(self, rel_path, write):
+        full_path = self._confined(rel_path)
+        if os.path.isdir(full_path):
+            shutil.rmtree(full_path)
+        fd, temp_path = tempfile.mkstemp(prefix=".mirror-", dir=os.path.dirname(full_path))
+        os.close(fd)
+        try:
+            write(temp_path)
+            os.replace(temp_path, full_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+
+    def _drop_local(self, rel_path):
+        full_path = self._confined(rel_path)
+        if os.path.isdir(full_path) and not os.path.islink(full_path):
+            shutil.rmtree(full_path, ignore_errors=True)
+        elif os.path.lexists(full_path):
+            os.unlink(full_path)
+
+    def _drop(self, rel_path):
+        self._drop_local(rel_path)
+        prefix = rel_path + "/"
+        parent, _, name = rel_path.rpartition("/")
+        with self._view_lock:
+            for path in [p for p in self._entries if p == rel_path or p.startswith(prefix)]:
+                del self._entries[path]
+            for path in [p for p in self._children if p == rel_path or p.startswith(prefix)]:
+                del self._children[path]
+            self._children.get(parent, {}).pop(name, None)
+
+    def metrics(self):
+        now = time.monotonic()
+        with self._view_lock:
+            files = [info.size for kind, info in self._entries.values() if kind == "f"]
+        staleness = None if self._synced_at is None else round(now - self._synced_at, 3)
+        return {
+            "enabled": True,
+            "fresh": self.fresh(),
+            "staleness_seconds": staleness,
+            "max_staleness_seconds": self.max_staleness,
+            "sync_interval_seconds": self.interval,
+            "pending_sync_seconds": (
+                None if self._stale_since is None else round(now - self._stale_since, 3)
+            ),
+            "files": len(files),
+            "bytes": sum(files),
+            **self.stats,
+        }
+
+
+def _write_bytes(path, data):
+    with open(path, "wb") as f:
+        f.write(data)
@@ -48,6 +48,7 @@ python manage.py migrate
 # Collect static files
 echo "📁 Collecting static files..."
 python manage.py collectstatic --noinput
+python manage.py build_assets
 
 # Create superuser (optional)
 echo ""
@@ -0,0 +1,726 @@
+// Values rendered by the template are read from <body data-*>
+const pageData = document.body.dataset;
+
+// Theme toggle functionality
+function toggleTheme() {
+    const html = document.documentElement;
+    const currentTheme = html.getAttribute('data-theme');
+    const newTheme = currentTheme === 'light' ? 'dark' : 'light';
+
+    html.setAttribute('data-theme', newTheme);
+    localStorage.setItem('theme', newTheme);
+}
+
+// Initialize theme
+document.addEventListener('DOMContentLoaded', function() {
+    const savedTheme = localStorage.getItem('theme') || 'dark';
+    document.documentElement.setAttribute('data-theme', savedTheme);
+
+    // Scroll to bottom
+    scrollToBottom();
+
+    // Setup scroll detection
+    setupScrollDetection();
+
+    // Setup keyboard shortcuts
+    setupKeyboardShortcuts();
+});
+
+// Message form handling
+const messageForm = document.getElementById('message-form');
+const messageInput = document.getElementById('message-input');
+const chatMessages = document.getElementById('chat-messages');
+const actionOutput = document.getElementById('action-output');
+const actionStatus = document.getElementById('action-status');
+const actionCommand = document.getElementById('action-command');
+const typingIndicator = document.getElementById('typing-indicator');
+const sendBtn = document.getElementById('send-btn');
+const cancelRunBtn = document.getElementById('cancel-run-btn');
+let currentCancelUrl = null;
+
+messageForm.addEventListener('submit', async (e) => {
+    e.preventDefault();
+
+    const content = messageInput.value.trim();
+    if (!content) return;
+
+    // Hide keyboard on mobile after submit
+    if (window.innerWidth <= 768) {
+        messageInput.blur();
+    }
+
+    // Close mobile menu if open
+    closeMobileMenu();
+
+    // Disable form
+    sendBtn.disabled = true;
+    messageInput.disabled = true;
+
+    // Add user message
+    const userMessageDiv = addMessageToChat(content, true);
+    messageInput.value = '';
+
+    // Show typing indicator
+    showTypingIndicator();
+
+    try {
+        // Code runs stream their output while they execute
+        if (/^run\s+code:/i.test(content)) {
+            await streamCodeRun(content, userMessageDiv);
+            return;
+        }
+
+        const response = await fetch(pageData.sendUrl, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                'X-CSRFToken': pageData.csrfToken
+            },
+            body: JSON.stringify({ content })
+        });
+
+        if (response.ok) {
+            const data = await response.json();
+            hideTypingIndicator();
+            setMessageBody(userMessageDiv, data.user_message);
+            addMessageToChat(data.ai_message.content, false, data.ai_message);
+
+            // Update action output if available (tool output that matches
+            // the AI message is only sent once, as the message content)
+            const actionText = data.action_output || (data.action_command ? data.ai_message.content : null);
+            if (actionText) {
+                if (data.action_command) {
+                    actionCommand.textContent = data.action_command;
+                }
+                updateActionOutput(actionText, data.action_status || 'success');
+            }
+
+            // Large full-file reads arrive as a preview; stream the rest
+            if (data.stream_url) {
+                streamActionOutput(data.stream_url);
+            }
+
+            // Update conversation title if AI generated a new one
+            if (data.conversation_title && data.conversation_title !== pageData.conversationTitle) {
+                const titleElement = document.getElementById('conversation-title');
+                titleElement.textContent = data.conversation_title;
+                document.title = `Prime - ${data.conversation_title}`;
+            }
+        } else {
+            hideTypingIndicator();
+            addMessageToChat('Error: Failed to get response', false);
+            updateActionOutput('Failed to get AI response', 'error');
+        }
+    } catch (error) {
+        hideTypingIndicator();
+        addMessageToChat('Error: ' + error.message, false);
+        updateActionOutput('Network error: ' + error.message, 'error');
+    } finally {
+        // Re-enable form
+        sendBtn.disabled = false;
+        messageInput.disabled = false;
+        messageInput.focus();
+    }
+});
+
+function showTypingIndicator() {
+    typingIndicator.style.display = 'flex';
+    scrollToBottom();
+}
+
+function hideTypingIndicator() {
+    typingIndicator.style.display = 'none';
+}
+
+function addMessageToChat(content, isUser, message = null) {
+    const emptyState = chatMessages.querySelector('.empty-state');
+    if (emptyState) {
+        emptyState.remove();
+    }
+
+    const messageDiv = document.createElement('div');
+    messageDiv.className = `message ${isUser ? 'user' : 'ai'}`;
+    messageDiv.dataset.messageId = Date.now();
+
+    const avatarDiv = document.createElement('div');
+    avatarDiv.className = 'message-avatar';
+    avatarDiv.textContent = isUser ? 'U' : 'AI';
+
+    const contentDiv = document.createElement('div');
+    contentDiv.className = 'message-content';
+    contentDiv.style.position = 'relative';
+
+    // Add message actions
+    const actionsDiv = document.createElement('div');
+    actionsDiv.className = 'message-actions';
+
+    const copyBtn = document.createElement('button');
+    copyBtn.className = 'message-action-btn';
+    copyBtn.onclick = () => copyMessageContent(copyBtn);
+    copyBtn.setAttribute('aria-label', 'Copy message');
+    copyBtn.innerHTML = `
+        <svg width="14" height="14" viewBox="0 0 24 24" fill="none" stroke="currentColor" stroke-width="2">
+            <rect x="9" y="9" width="13" height="13" rx="2" ry="2"></rect>
+            <path d="M5 15H4a2 2 0 0 1-2-2V4a2 2 0 0 1 2-2h9a2 2 0 0 1 2 2v1"></path>
+        </svg>
+    `;
+
+    actionsDiv.appendChild(copyBtn);
+
+    if (!isUser) {
+        const regenerateBtn = document.createElement('button');
+        regenerateBtn.className = 'message-action-btn';
+        regenerateBtn.onclick = regenerateResponse;
+        regenerateBtn.setAttribute('aria-label', 'Regenerate response');
+        regenerateBtn.innerHTML = `
+            <svg width="14" height="14" viewBox="0 0 24 24" fill="none" stroke="currentColor" stroke-width="2">
+                <polyline points="23 4 23 10 17 10"></polyline>
+                <path d="M20.49 15a9 9 0 1 1-2.12-9.36L23 10"></path>
+            </svg>
+        `;
+        actionsDiv.appendChild(regenerateBtn);
+    }
+
+    contentDiv.appendChild(actionsDiv);
+
+    // Saved messages come with HTML rendered by the server; until then
+    // (and for local errors) the text is shown as it is
+    const bodyDiv = document.createElement('div');
+    bodyDiv.className = 'message-body';
+    if (message) {
+        bodyDiv.innerHTML = message.html;
+    } else {
+        bodyDiv.textContent = content;
+    }
+    contentDiv.appendChild(bodyDiv);
+
+    // Long tool output arrives as a preview; the rest loads on demand
+    if (message && message.body_url) {
+        const expandBtn = document.createElement('button');
+        expandBtn.className = 'btn btn-sm btn-ghost message-expand';
+        expandBtn.dataset.bodyUrl = message.body_url;
+        expandBtn.onclick = () => expandMessage(expandBtn);
+        expandBtn.textContent = `Show full output (${formatBytes(message.body_size)})`;
+        contentDiv.appendChild(expandBtn);
+    }
+
+    messageDiv.appendChild(avatarDiv);
+    messageDiv.appendChild(contentDiv);
+    chatMessages.appendChild(messageDiv);
+
+    scrollToBottom();
+    return messageDiv;
+}
+
+async function expandMessage(button) {
+    button.disabled = true;
+    try {
+        const response = await fetch(button.dataset.bodyUrl);
+        if (!response.ok) {
+            throw new Error(`HTTP ${response.status}`);
+        }
+        const full = document.createElement('pre');
+        full.className = 'message-full';
+        full.textContent = await response.text();
+        const body = button.closest('.message-content').querySelector('.message-body');
+        body.replaceChildren(full);
+        button.remove();
+    } catch (error) {
+        button.disabled = false;
+        showNotification('Could not load the full output: ' + error.message, 'error');
+    }
+}
+
+function formatBytes(size) {
+    const units = ['bytes', 'KB', 'MB', 'GB'];
+    let unit = 0;
+    while (size >= 1024 && unit < units.length - 1) {
+        size /= 1024;
+        unit++;
+    }
+    return `${unit ? size.toFixed(1) : size} ${units[unit]}`;
+}
+
+function setMessageBody(messageDiv, message) {
+    messageDiv.querySelector('.message-body').innerHTML = message.html;
+}
+
+function copyMessageContent(button) {
+    const messageContent = button.closest('.message-content').querySelector('.message-body').textContent.trim();
+    navigator.clipboard.writeText(messageContent).then(() => {
+        showNotification('Message copied to clipboard', 'success');
+    });
+}
+
+function copyCodeBlock(button) {
+    const codeBlock = button.closest('.code-block');
+    const code = codeBlock.querySelector('code').textContent;
+    navigator.clipboard.writeText(code).then(() => {
+        button.textContent = 'Copied!';
+        setTimeout(() => {
+            button.textContent = 'Copy';
+        }, 2000);
+    });
+}
+
+function regenerateResponse() {
+    // Implementation for regenerating AI response
+    showNotification('Regenerating response...', 'info');
+}
+
+function updateActionOutput(output, status = 'success') {
+    actionOutput.textContent = output;
+
+    // Update status indicator
+    actionStatus.style.display = 'block';
+    actionStatus.className = 'action-status ' + status;
+
+    if (status === 'success') {
+        actionStatus.textContent = '✅ Action completed successfully';
+    } else if (status === 'error') {
+        actionStatus.textContent = '❌ Action failed';
+    } else if (status === 'processing') {
+        actionStatus.textContent = '⏳ Processing...';
+    }
+
+    // Auto-hide success status after 3 seconds
+    if (status === 'success') {
+        setTimeout(() => {
+            actionStatus.style.display = 'none';
+        }, 3000);
+    }
+}
+
+async function streamActionOutput(url) {
+    try {
+        const response = await fetch(url);
+        if (!response.ok || !response.body) {
+            return;
+        }
+
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        updateActionOutput('', 'processing');
+
+        while (true) {
+            const { done, value } = await reader.read();
+            if (done) break;
+            actionOutput.append(decoder.decode(value, { stream: true }));
+        }
+        actionOutput.append(decoder.decode());
+
+        actionStatus.className = 'action-status success';
+        actionStatus.textContent = '✅ Full file loaded';
+    } catch (error) {
+        updateActionOutput('Streaming error: ' + error.message, 'error');
+    }
+}
+
+async function streamCodeRun(content, userMessageDiv) {
+    const response = await fetch(pageData.runCodeUrl, {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+            'X-CSRFToken': pageData.csrfToken
+        },
+        body: JSON.stringify({ content })
+    });
+    if (!response.ok || !response.body) {
+        hideTypingIndicator();
+        addMessageToChat('Error: Failed to run code', false);
+        updateActionOutput('Failed to start code execution', 'error');
+        return;
+    }
+
+    // Server-sent events, separated by blank lines
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    try {
+        while (true) {
+            const { done, value } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                handleRunEvent(buffer.slice(0, boundary), userMessageDiv);
+                buffer = buffer.slice(boundary + 2);
+            }
+        }
+    } finally {
+        hideTypingIndicator();
+        currentCancelUrl = null;
+        cancelRunBtn.style.display = 'none';
+    }
+}
+
+function handleRunEvent(frame, userMessageDiv) {
+    let event = 'message';
+    let data = '';
+    for (const line of frame.split('\n')) {
+        if (line.startsWith('event: ')) {
+            event = line.slice(7);
+        } else if (line.startsWith('data: ')) {
+            data += line.slice(6);
+        }
+    }
+    const payload = JSON.parse(data);
+
+    if (event === 'start') {
+        setMessageBody(userMessageDiv, payload.user_message);
+        actionCommand.textContent = payload.action_command;
+        updateActionOutput('', 'processing');
+        currentCancelUrl = payload.cancel_url;
+        cancelRunBtn.disabled = false;
+        cancelRunBtn.style.display = 'inline-flex';
+    } else if (event === 'output') {
+        actionOutput.append(payload.text);
+        actionOutput.scrollTop = actionOutput.scrollHeight;
+    } else if (event === 'done') {
+        hideTypingIndicator();
+        addMessageToChat(payload.ai_message.content, false, payload.ai_message);
+        // Keep the streamed output when the saved message is only a preview
+        const output = payload.ai_message.body_url ? actionOutput.textContent : payload.ai_message.content;
+        updateActionOutput(output, payload.action_status);
+    }
+}
+
+async function cancelRun() {
+    if (!currentCancelUrl) return;
+    cancelRunBtn.disabled = true;
+    try {
+        await fetch(currentCancelUrl, {
+            method: 'POST',
+            headers: { 'X-CSRFToken': pageData.csrfToken }
+        });
+    } catch (error) {
+        showNotification('Could not stop the run: ' + error.message, 'error');
+    }
+}
+
+function scrollToBottom() {
+    chatMessages.scrollTop = chatMessages.scrollHeight;
+}
+
+function setupScrollDetection() {
+    const scrollToBottomBtn = document.getElementById('scroll-to-bottom');
+
+    chatMessages.addEventListener('scroll', () => {
+        const isAtBottom = chatMessages.scrollHeight - chatMessages.scrollTop <= chatMessages.clientHeight + 100;
+
+        if (isAtBottom) {
+            scrollToBottomBtn.classList.remove('visible');
+        } else {
+            scrollToBottomBtn.classList.add('visible');
+        }
+    });
+}
+
+function setupKeyboardShortcuts() {
+    messageInput.addEventListener('keydown', (e) => {
+        // Ctrl+Enter to send
+        if ((e.ctrlKey || e.metaKey) && e.key === 'Enter') {
+            e.preventDefault();
+            messageForm.dispatchEvent(new Event('submit'));
+        }
+
+        // Escape to clear input
+        if (e.key === 'Escape') {
+            clearInput();
+        }
+    });
+}
+
+function clearInput() {
+    messageInput.value = '';
+    messageInput.focus();
+}
+
+function attachFile() {
+    uploadInput.click();
+}
+
+// Resumable uploads: files go to the workspace in chunks, never into the chat
+const uploadInput = document.getElementById('upload-input');
+const UPLOADS_KEY = 'pendingUploads';
+uploadInput.addEventListener('change', async () => {
+    for (const file of uploadInput.files) {
+        await uploadFile(file);
+    }
+    uploadInput.value = '';
+});
+
+async function sha256Hex(buffer) {
+    if (!window.crypto || !crypto.subtle) return null;
+    const digest = await crypto.subtle.digest('SHA-256', buffer);
+    return Array.from(new Uint8Array(digest), b => b.toString(16).padStart(2, '0')).join('');
+}
+
+async function resumeOrStartUpload(file) {
+    // Pick up where an interrupted upload of the same file left off
+    const key = `${file.name}:${file.size}:${file.lastModified}`;
+    const pending = JSON.parse(localStorage.getItem(UPLOADS_KEY) || '{}');
+    if (pending[key]) {
+        const response = await fetch(`${pageData.uploadUrl}${pending[key]}/`);
+        if (response.ok) {
+            const upload = await response.json();
+            if (upload.status === 'pending') return { key, upload };
+        }
+    }
+    const response = await fetch(pageData.uploadUrl, {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+            'X-CSRFToken': pageData.csrfToken
+        },
+        body: JSON.stringify({ path: file.name, size: file.size })
+    });
+    const upload = await response.json();
+    if (!response.ok) throw new Error(upload.error);
+    pending[key] = upload.upload_id;
+    localStorage.setItem(UPLOADS_KEY, JSON.stringify(pending));
+    return { key, upload };
+}
+
+async function uploadFile(file) {
+    actionCommand.textContent = `upload: ${file.name}`;
+    updateActionOutput('', 'processing');
+    try {
+        const { key, upload } = await resumeOrStartUpload(file);
+        let received = upload.received;
+        let retries = 0;
+        while (received < file.size) {
+            const chunk = await file.slice(received, received + upload.chunk_size).arrayBuffer();
+            const headers = {
+                'Content-Type': 'application/octet-stream',
+                'X-CSRFToken': pageData.csrfToken
+            };
+            const digest = await sha256Hex(chunk);
+            if (digest) headers['X-Chunk-Sha256'] = digest;
+            let result;
+            try {
+                const response = await fetch(`${upload.chunk_url}?offset=${received}`, {
+                    method: 'POST', headers, body: chunk
+                });
+                result = await response.json();
+                if (!response.ok) throw new Error(result.error);
+            } catch (error) {
+                if (++retries > 5) throw error;
+                await new Promise(resolve => setTimeout(resolve, 1000 * retries));
+                // The server says which offset it expects next
+                if (result && result.received !== undefined) received = result.received;
+                continue;
+            }
+            retries = 0;
+            received = result.received;
+            actionOutput.textContent = `Uploaded ${received} of ${file.size} bytes (${Math.floor(received * 100 / (file.size || 1))}%)`;
+        }
+
+        const response = await fetch(upload.complete_url, {
+            method: 'POST',
+            headers: { 'X-CSRFToken': pageData.csrfToken }
+        });
+        const result = await response.json();
+        const pending = JSON.parse(localStorage.getItem(UPLOADS_KEY) || '{}');
+        delete pending[key];
+        localStorage.setItem(UPLOADS_KEY, JSON.stringify(pending));
+        if (!response.ok) throw new Error(result.error);
+        updateActionOutput(result.message, 'success');
+    } catch (error) {
+        updateActionOutput('Upload failed: ' + error.message, 'error');
+    }
+}
+
+// Sidebar functionality
+function toggleSidebar() {
+    const sidebar = document.getElementById('sidebar');
+    const toggle = document.getElementById('sidebar-toggle');
+    const icon = document.getElementById('sidebar-toggle-icon');
+
+    sidebar.classList.toggle('collapsed');
+
+    if (sidebar.classList.contains('collapsed')) {
+        icon.textContent = '▶';
+        toggle.title = 'Show Prime Menu';
+    } else {
+        icon.textContent = '◀';
+        toggle.title = 'Hide Prime Menu';
+    }
+}
+
+function toggleMobileMenu() {
+    const sidebar = document.querySelector('.sidebar');
+    const menuToggle = document.getElementById('mobile-menu-toggle');
+    const overlay = document.getElementById('sidebar-overlay');
+
+    sidebar.classList.toggle('mobile-open');
+    menuToggle.classList.toggle('active');
+    overlay.classList.toggle('active');
+
+    // Prevent body scroll when menu is open
+    if (sidebar.classList.contains('mobile-open')) {
+        document.body.style.overflow = 'hidden';
+    } else {
+        document.body.style.overflow = '';
+    }
+}
+
+function closeMobileMenu() {
+    const sidebar = document.querySelector('.sidebar');
+    const menuToggle = document.getElementById('mobile-menu-toggle');
+    const overlay = document.getElementById('sidebar-overlay');
+
+    sidebar.classList.remove('mobile-open');
+    menuToggle.classList.remove('active');
+    overlay.classList.remove('active');
+    document.body.style.overflow = '';
+}
+
+// Rename functionality
+let isRenaming = false;
+
+function startRename() {
+    if (isRenaming) return;
+
+    isRenaming = true;
+    const titleElement = document.getElementById('conversation-title');
+    const currentTitle = titleElement.textContent;
+
+    const input = document.createElement('input');
+    input.type = 'text';
+    input.className = 'form-input';
+    input.value = currentTitle;
+    input.id = 'title-input';
+    input.style.cssText = 'flex: 1; background: var(--glass-bg); border: 1px solid var(--glass-border);';
+
+    titleElement.replaceWith(input);
+    input.focus();
+    input.select();
+
+    input.addEventListener('blur', saveRename);
+    input.addEventListener('keydown', (e) => {
+        if (e.key === 'Enter') {
+            saveRename();
+        } else if (e.key === 'Escape') {
+            cancelRename();
+        }
+    });
+}
+
+async function saveRename() {
+    const input = document.getElementById('title-input');
+    const newTitle = input.value.trim();
+
+    if (!newTitle) {
+        cancelRename();
+        return;
+    }
+
+    try {
+        const response = await fetch(pageData.renameUrl, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                'X-CSRFToken': pageData.csrfToken
+            },
+            body: JSON.stringify({ title: newTitle })
+        });
+
+        if (response.ok) {
+            const data = await response.json();
+            const h1 = document.createElement('h1');
+            h1.id = 'conversation-title';
+            h1.style.cssText = 'flex: 1; cursor: pointer;';
+            h1.textContent = data.title;
+            h1.onclick = startRename;
+
+            input.replaceWith(h1);
+            isRenaming = false;
+
+            // Update page title
+            document.title = `Prime - ${data.title}`;
+            showNotification('Conversation renamed successfully', 'success');
+        } else {
+            showNotification('Failed to rename conversation', 'error');
+            cancelRename();
+        }
+    } catch (error) {
+        showNotification('Error: ' + error.message, 'error');
+        cancelRename();
+    }
+}
+
+function cancelRename() {
+    const input = document.getElementById('title-input');
+    if (input) {
+        const h1 = document.createElement('h1');
+        h1.id = 'conversation-title';
+        h1.style.cssText = 'flex: 1; cursor: pointer;';
+        h1.textContent = input.value || pageData.conversationTitle;
+        h1.onclick = startRename;
+
+        input.replaceWith(h1);
+        isRenaming = false;
+    }
+}
+
+async function deleteConversation(conversationId) {
+    if (!confirm('Are you sure you want to delete this conversation?')) {
+        return;
+    }
+
+    try {
+        const response = await fetch(`/chat/conversation/${conversationId}/delete/`, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                'X-CSRFToken': pageData.csrfToken
+            }
+        });
+
+        if (response.ok) {
+            showNotification('Conversation deleted successfully', 'success');
+            setTimeout(() => {
+                window.location.href = '/chat/';
+            }, 1000);
+        } else {
+            showNotification('Failed to delete conversation', 'error');
+        }
+    } catch (error) {
+        showNotification('Error: ' + error.message, 'error');
+    }
+}
+
+// Notification system
+function showNotification(message, type = 'info') {
+    const notification = document.createElement('div');
+    notification.className = `alert alert-${type} animate-slide-in-down`;
+    notification.style.cssText = `
+        position: fixed;
+        top: 20px;
+        right: 20px;
+        z-index: 9999;
+        min-width: 300px;
+        max-width: 400px;
+    `;
+    notification.textContent = message;
+
+    document.body.appendChild(notification);
+
+    setTimeout(() => {
+        notification.classList.add('animate-fade-out');
+        setTimeout(() => {
+            document.body.removeChild(notification);
+        }, 300);
+    }, 3000);
+}
+
+// Auto-scroll to bottom on new messages
+const observer = new MutationObserver(() => {
+    const isAtBottom = chatMessages.scrollHeight - chatMessages.scrollTop <= chatMessages.clientHeight + 100;
+    if (isAtBottom) {
+        scrollToBottom();
+    }
+});
+
+observer.observe(chatMessages, { childList: true });
@@ -0,0 +1,303 @@
+// Values rendered by the template are read from <body data-*>
+const pageData = document.body.dataset;
+
+// Theme toggle functionality
+function toggleTheme() {
+    const html = document.documentElement;
+    const currentTheme = html.getAttribute('data-theme');
+    const newTheme = currentTheme === 'light' ? 'dark' : 'light';
+
+    html.setAttribute('data-theme', newTheme);
+    localStorage.setItem('theme', newTheme);
+}
+
+// Initialize theme
+document.addEventListener('DOMContentLoaded', function() {
+    const savedTheme = localStorage.getItem('theme') || 'dark';
+    document.documentElement.setAttribute('data-theme', savedTheme);
+
+    // Calculate stats
+    updateStats();
+
+    // Add stagger animation to conversation items
+    const items = document.querySelectorAll('.conversation-item');
+    items.forEach((item, index) => {
+        item.style.animationDelay = `${0.1 * (index + 1)}s`;
+    });
+});
+
+// Update statistics
+function updateStats() {
+    const conversations = document.querySelectorAll('.conversation-item');
+    const today = new Date().toISOString().split('T')[0];
+    const oneWeekAgo = new Date(Date.now() - 7 * 24 * 60 * 60 * 1000).toISOString().split('T')[0];
+
+    let recentCount = 0;
+    let todayCount = 0;
+
+    conversations.forEach(item => {
+        const date = item.getAttribute('data-date');
+        if (date >= oneWeekAgo) recentCount++;
+        if (date === today) todayCount++;
+    });
+
+    document.getElementById('recent-count').textContent = recentCount;
+    document.getElementById('today-count').textContent = todayCount;
+}
+
+// Search titles and messages on the server (debounced)
+let searchTimer = null;
+let searchController = null;
+let searchPage = 1;
+
+function filterConversations() {
+    clearTimeout(searchTimer);
+    searchTimer = setTimeout(() => runSearch(1), 200);
+}
+
+function runSearch(page) {
+    const query = document.getElementById('search-input').value.trim();
+    const list = document.getElementById('conversation-list');
+    const results = document.getElementById('search-results');
+
+    if (searchController) {
+        searchController.abort();
+    }
+    if (!query) {
+        results.classList.remove('active');
+        results.innerHTML = '';
+        list.style.display = '';
+        return;
+    }
+
+    searchController = new AbortController();
+    const params = new URLSearchParams({ q: query, page: page });
+    fetch(`${results.dataset.url}?${params}`, { signal: searchController.signal })
+        .then(response => response.json())
+        .then(data => {
+            searchPage = data.page;
+            if (page === 1) {
+                results.innerHTML = '';
+            } else {
+                const more = results.querySelector('.search-more');
+                if (more) more.remove();
+            }
+
+            // Titles and snippets arrive HTML-escaped, with matches in <mark>
+            data.results.forEach(hit => {
+                const item = document.createElement('li');
+                item.innerHTML = `
+                    <a class="search-result" href="${hit.url}">
+                        <div class="search-result-title">${hit.title}</div>
+                        ${hit.snippet ? `<div class="search-result-snippet">${hit.is_user ? 'You: ' : ''}${hit.snippet}</div>` : ''}
+                    </a>`;
+                results.appendChild(item);
+            });
+
+            if (!results.children.length) {
+                results.innerHTML = '<li class="search-status">No matches</li>';
+            }
+            if (data.has_next) {
+                const more = document.createElement('li');
+                more.className = 'search-more';
+                more.innerHTML = '<button class="btn btn-sm btn-ghost">More results</button>';
+                more.querySelector('button').onclick = () => runSearch(searchPage + 1);
+                results.appendChild(more);
+            }
+
+            list.style.display = 'none';
+            results.classList.add('active');
+        })
+        .catch(error => {
+            if (error.name !== 'AbortError') {
+                console.error('Search failed:', error);
+            }
+        });
+}
+
+// Mobile menu toggle
+function toggleMobileMenu() {
+    const sidebar = document.querySelector('.sidebar');
+    const menuToggle = document.getElementById('mobile-menu-toggle');
+    const overlay = document.getElementById('sidebar-overlay');
+
+    sidebar.classList.toggle('mobile-open');
+    menuToggle.classList.toggle('active');
+    overlay.classList.toggle('active');
+
+    // Prevent body scroll when menu is open
+    if (sidebar.classList.contains('mobile-open')) {
+        document.body.style.overflow = 'hidden';
+    } else {
+        document.body.style.overflow = '';
+    }
+}
+
+function closeMobileMenu() {
+    const sidebar = document.querySelector('.sidebar');
+    const menuToggle = document.getElementById('mobile-menu-toggle');
+    const overlay = document.getElementById('sidebar-overlay');
+
+    sidebar.classList.remove('mobile-open');
+    menuToggle.classList.remove('active');
+    overlay.classList.remove('active');
+    document.body.style.overflow = '';
+}
+
+// Rename functionality
+let editingConversationId = null;
+
+function startRename(conversationId, currentTitle) {
+    if (editingConversationId) {
+        cancelRename();
+    }
+
+    editingConversationId = conversationId;
+    const conversationItem = document.getElementById(`conversation-${conversationId}`);
+    const titleDiv = conversationItem.querySelector('.conversation-title');
+
+    const input = document.createElement('input');
+    input.type = 'text';
+    input.className = 'rename-input';
+    input.value = currentTitle;
+    input.id = `rename-input-${conversationId}`;
+
+    titleDiv.replaceWith(input);
+    input.focus();
+    input.select();
+
+    input.addEventListener('blur', () => saveRename(conversationId));
+    input.addEventListener('keydown', (e) => {
+        if (e.key === 'Enter') {
+            saveRename(conversationId);
+        } else if (e.key === 'Escape') {
+            cancelRename();
+        }
+    });
+}
+
+async function saveRename(conversationId) {
+    const input = document.getElementById(`rename-input-${conversationId}`);
+    const newTitle = input.value.trim();
+
+    if (!newTitle) {
+        cancelRename();
+        return;
+    }
+
+    try {
+        const response = await fetch(`/chat/conversation/${conversationId}/rename/`, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                'X-CSRFToken': pageData.csrfToken
+            },
+            body: JSON.stringify({ title: newTitle })
+        });
+
+        if (response.ok) {
+            const data = await response.json();
+            const titleDiv = document.createElement('div');
+            titleDiv.className = 'conversation-title';
+            titleDiv.textContent = data.title;
+            titleDiv.onclick = () => startRename(conversationId, data.title);
+            titleDiv.setAttribute('data-title', data.title.toLowerCase());
+
+            input.replaceWith(titleDiv);
+            editingConversationId = null;
+
+            // Update the conversation item data attribute
+            const conversationItem = document.getElementById(`conversation-${conversationId}`);
+            conversationItem.setAttribute('data-title', data.title.toLowerCase());
+        } else {
+            showNotification('Failed to rename conversation', 'error');
+            cancelRename();
+        }
+    } catch (error) {
+        showNotification('Error: ' + error.message, 'error');
+        cancelRename();
+    }
+}
+
+function cancelRename() {
+    if (!editingConversationId) return;
+
+    const input = document.getElementById(`rename-input-${editingConversationId}`);
+    if (input) {
+        const titleDiv = document.createElement('div');
+        titleDiv.className = 'conversation-title';
+        titleDiv.textContent = input.value || 'Untitled';
+        titleDiv.onclick = () => startRename(editingConversationId, titleDiv.textContent);
+
+        input.replaceWith(titleDiv);
+    }
+    editingConversationId = null;
+}
+
+// Delete functionality
+async function deleteConversation(conversationId) {
+    if (!confirm('Are you sure you want to delete this conversation?')) {
+        return;
+    }
+
+    try {
+        const response = await fetch(`/chat/conversation/${conversationId}/delete/`, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                'X-CSRFToken': pageData.csrfToken
+            }
+        });
+
+        if (response.ok) {
+            const item = document.getElementById(`conversation-${conversationId}`);
+            item.classList.add('animate-scale-out');
+            setTimeout(() => {
+                location.reload();
+            }, 300);
+        } else {
+            showNotification('Failed to delete conversation', 'error');
+        }
+    } catch (error) {
+        showNotification('Error: ' + error.message, 'error');
+    }
+}
+
+// Notification system
+function showNotification(message, type = 'info') {
+    const notification = document.createElement('div');
+    notification.className = `alert alert-${type} animate-slide-in-down`;
+    notification.style.cssText = `
+        position: fixed;
+        top: 20px;
+        right: 20px;
+        z-index: 9999;
+        min-width: 300px;
+        max-width: 400px;
+    `;
+    notification.textContent = message;
+
+    document.body.appendChild(notification);
+
+    setTimeout(() => {
+        notification.classList.add('animate-fade-out');
+        setTimeout(() => {
+            document.body.removeChild(notification);
+        }, 300);
+    }, 3000);
+}
+
+// Keyboard shortcuts
+document.addEventListener('keydown', function(e) {
+    // Ctrl/Cmd + K for search
+    if ((e.ctrlKey || e.metaKey) && e.key === 'k') {
+        e.preventDefault();
+        document.getElementById('search-input').focus();
+    }
+
+    // Ctrl/Cmd + N for new chat
+    if ((e.ctrlKey || e.metaKey) && e.key === 'n') {
+        e.preventDefault();
+        window.location.href = pageData.newConversationUrl;
+    }
+});